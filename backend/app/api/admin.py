@@ -5,11 +5,17 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 from typing import List
-from app.core.database import get_db
+from app.core.database import get_db, get_pool_status
 from app.core.rbac import admin_only
 from app.models.user import User
 from app.schemas.user import UserResponse, UserUpdate
 from app.core.security import get_password_hash
+from app.services.suggest_index import suggest_index
+from app.services.notification_counters import unread_counters
+from app.services.notification_dispatcher import notification_dispatcher
+from app.services.keyword_tracker import keyword_tracker
+from app.services.presence_index import presence_index
+from app.services.booking_availability import booking_availability
 from pydantic import BaseModel, EmailStr
 
 
@@ -154,6 +160,7 @@ async def create_user(
     db.add(new_user)
     db.commit()
     db.refresh(new_user)
+    suggest_index.upsert('user', new_user.id, new_user.full_name)
     
     # Add custom roles if provided
     custom_roles = []
@@ -229,6 +236,7 @@ async def update_user(
         setattr(user, field, value)
     
     db.commit()
+    suggest_index.upsert('user', user.id, user.full_name)
     
     # Update custom roles if provided
     if custom_roles_to_update is not None:
@@ -356,6 +364,7 @@ async def delete_user(
     
     db.delete(user)
     db.commit()
+    suggest_index.remove('user', user_id)
     
     return {"message": f"User {user.email} deleted successfully"}
 
@@ -389,3 +398,35 @@ async def get_custom_roles(db: Session = Depends(get_db), current_user: User = D
         ]
     }
 
+
+@router.get("/metrics/database")
+async def get_database_pool_metrics(current_user: User = Depends(admin_only)):
+    """Connection pool occupancy and checkout wait times for this worker - Admin only"""
+    return get_pool_status()
+
+
+@router.get("/metrics/notifications")
+def get_notification_delivery_metrics(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(admin_only)
+):
+    """Notification outbox backlog, queue lag and delivery throughput - Admin only"""
+    return dict(notification_dispatcher.get_metrics(db), unread_counters=unread_counters.get_metrics())
+
+
+@router.get("/metrics/keywords")
+async def get_keyword_tracking_metrics(current_user: User = Depends(admin_only)):
+    """Feedback keyword tracking mode, buffered increments and flushes for this worker - Admin only"""
+    return keyword_tracker.get_metrics()
+
+
+@router.get("/metrics/presence")
+async def get_presence_index_metrics(current_user: User = Depends(admin_only)):
+    """Attendance presence index size, age and applied events for this worker - Admin only"""
+    return presence_index.get_metrics()
+
+
+@router.get("/metrics/booking-availability")
+async def get_booking_availability_metrics(current_user: User = Depends(admin_only)):
+    """Office booking availability engine size, age and applied events for this worker - Admin only"""
+    return booking_availability.get_metrics()
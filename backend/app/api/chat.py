@@ -1,20 +1,22 @@
 from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect, HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List
 import json
 from datetime import datetime
 
-from app.core.database import get_db
+from app.core.database import get_db, get_async_db, AsyncSessionLocal
 from app.core.security import verify_token
 from app.models.user import User
-from app.models.chat import ChatRoom
+from app.models.chat import ChatRoom, chat_participants
 from app.schemas.chat import (
     ChatRoomResponse, ChatRoomWithMessages, MessageCreate, MessageResponse,
     WebSocketMessage
 )
 from app.services.chat_service import chat_service
 from app.utils.websocket_manager import manager
-from app.api.auth import get_current_user
+from app.api.auth import get_current_user, get_current_user_async
 from app.services.notification_service import notification_service
 
 router = APIRouter()
@@ -64,18 +66,18 @@ async def get_user_chat_rooms(
 @router.get("/{chat_id}/messages", response_model=List[MessageResponse])
 async def get_chat_messages(
     chat_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Get messages for a specific chat room"""
     # Check if user is in the chat
-    if not chat_service.is_user_in_chat(db, current_user.id, chat_id):
+    if not await chat_service.is_user_in_chat_async(db, current_user.id, chat_id):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Access denied to this chat room"
         )
     
-    messages = chat_service.get_chat_messages(db, chat_id)
+    messages = await chat_service.get_chat_messages_async(db, chat_id)
     return [
         MessageResponse(
             id=msg.id,
@@ -224,26 +226,26 @@ async def create_message(
         # Get chat room to determine type and participants
         chat_room = db.query(ChatRoom).filter(ChatRoom.id == chat_id).first()
         if chat_room:
-            # Get all participants except the sender
-            participants = [p for p in chat_room.participants if p.id != current_user.id]
+            notification_type = 'private_message'
+            if chat_room.type == 'department':
+                notification_type = 'department_message'
+            elif chat_room.type == 'company':
+                notification_type = 'company_message'
             
-            for participant in participants:
-                notification_type = 'private_message'
-                if chat_room.type == 'department':
-                    notification_type = 'department_message'
-                elif chat_room.type == 'company':
-                    notification_type = 'company_message'
-                
-                notification_service.create_notification(
-                    db=db,
-                    user_id=participant.id,
-                    notification_type=notification_type,
-                    data={
-                        'sender_name': current_user.full_name,
-                        'chat_id': chat_id,
-                        'message_preview': message.text[:100] + '...' if len(message.text) > 100 else message.text
-                    }
-                )
+            # One insert for all participants except the sender
+            notification_service.create_notifications_bulk(
+                db=db,
+                user_ids=[row.user_id for row in db.query(chat_participants.c.user_id).filter(
+                    chat_participants.c.chat_id == chat_id
+                )],
+                notification_type=notification_type,
+                data={
+                    'sender_name': current_user.full_name,
+                    'chat_id': chat_id,
+                    'message_preview': message.text[:100] + '...' if len(message.text) > 100 else message.text
+                },
+                exclude_user_id=current_user.id
+            )
     except Exception as e:
         print(f"⚠️ Failed to send chat notification: {e}")
     
@@ -259,12 +261,23 @@ async def create_message(
         sender_avatar_url=current_user.avatar_url
     )
 
+@router.get("/metrics")
+async def get_websocket_metrics(
+    current_user: User = Depends(get_current_user)
+):
+    """WebSocket queue depth and send latency for this worker (admin only)"""
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    return manager.get_metrics()
+
 @router.websocket("/ws/{chat_id}")
 async def websocket_endpoint(
     websocket: WebSocket,
     chat_id: int,
-    token: str,
-    db: Session = Depends(get_db)
+    token: str
 ):
     """WebSocket endpoint for real-time chat"""
     # Verify token
@@ -273,17 +286,19 @@ async def websocket_endpoint(
         await websocket.close(code=1008, reason="Invalid token")
         return
     
-    # Get user from token
-    user_email = payload.get("sub")
-    user = db.query(User).filter(User.email == user_email).first()
-    if not user:
-        await websocket.close(code=1008, reason="User not found")
-        return
-    
-    # Check if user is in the chat
-    if not chat_service.is_user_in_chat(db, user.id, chat_id):
-        await websocket.close(code=1008, reason="Access denied")
-        return
+    # Sessions are opened per operation; none is held for the socket's lifetime
+    async with AsyncSessionLocal() as db:
+        # Get user from token
+        user_email = payload.get("sub")
+        user = (await db.execute(select(User).where(User.email == user_email))).scalars().first()
+        if not user:
+            await websocket.close(code=1008, reason="User not found")
+            return
+        
+        # Check if user is in the chat
+        if not await chat_service.is_user_in_chat_async(db, user.id, chat_id):
+            await websocket.close(code=1008, reason="Access denied")
+            return
     
     # Connect to chat room
     user_info = {
@@ -302,7 +317,8 @@ async def websocket_endpoint(
             if message_data.get("type") == "message":
                 # Create message in database
                 message_create = MessageCreate(text=message_data["text"])
-                message = chat_service.create_message(db, message_create, user.id, chat_id)
+                async with AsyncSessionLocal() as db:
+                    message = await chat_service.create_message_async(db, message_create, user.id, chat_id)
                 
                 # Broadcast to all participants
                 ws_message = WebSocketMessage(
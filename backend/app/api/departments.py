@@ -6,6 +6,7 @@ from app.models.department import Department
 from app.models.user import User
 from app.schemas.department import DepartmentResponse, DepartmentCreate, DepartmentUpdate
 from app.api.auth import get_current_user
+from app.services.suggest_index import suggest_index
 
 router = APIRouter()
 
@@ -37,6 +38,7 @@ async def create_department(
     db.add(db_department)
     db.commit()
     db.refresh(db_department)
+    suggest_index.upsert('department', db_department.id, db_department.name)
     return db_department
 
 @router.get("/{department_id}", response_model=DepartmentResponse)
@@ -75,6 +77,7 @@ async def update_department(
     
     db.commit()
     db.refresh(department)
+    suggest_index.upsert('department', department.id, department.name)
     return department
 
 @router.delete("/{department_id}")
@@ -96,4 +99,5 @@ async def delete_department(
     
     db.delete(department)
     db.commit()
+    suggest_index.remove('department', department_id)
     return {"message": "Department deleted successfully"}
@@ -4,12 +4,11 @@ Supports feedback to specific users, admins, and everyone (company-wide).
 Includes anonymous feedback and admin insights.
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Response, status, Query
+from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import func, or_, and_, desc, distinct
 from typing import List, Optional
-from datetime import datetime, timedelta
-from collections import Counter
+from datetime import datetime
 
 from app.core.database import get_db
 from app.api.auth import get_current_user
@@ -20,15 +19,13 @@ from app.schemas.feedback import (
     FeedbackOut, 
     FeedbackAuthor,
     FeedbackInsights,
-    FeedbackSentimentDistribution,
-    KeywordCount,
-    TrendPoint,
-    TopRecipient
+    ModerationWordlistUpdate
 )
 from app.services.insights_service import analyze_feedback, update_keyword_tracking
+from app.services.feedback_insights import feedback_insights_cache
 from app.services.notification_service import notification_service
 from app.services.notification_service_enhanced import send_weekly_digest_email
-from app.utils.moderation import check_content_moderation, sanitize_content
+from app.utils.moderation import check_content_moderation, sanitize_content, moderation_engine
 from app.api.settings import get_organization_settings
 
 router = APIRouter()
@@ -42,7 +39,7 @@ def require_admin(current_user: User = Depends(get_current_user)):
         )
     return current_user
 
-def serialize_feedback(feedback: Feedback, viewer: User, db: Session) -> dict:
+def serialize_feedback(feedback: Feedback, viewer: User, db: Session, reply_count: Optional[int] = None) -> dict:
     """
     Serialize feedback with proper author masking.
     
@@ -51,9 +48,12 @@ def serialize_feedback(feedback: Feedback, viewer: User, db: Session) -> dict:
       mask author as "Anonymous"
     - Admin can always see true author
     - Author can always see themselves
+    
+    Pass reply_count when it is already known (see serialize_feedback_page).
     """
     # Count replies
-    reply_count = db.query(Feedback).filter(Feedback.parent_id == feedback.id).count()
+    if reply_count is None:
+        reply_count = db.query(Feedback).filter(Feedback.parent_id == feedback.id).count()
     
     # Normalize sentiment label to lowercase for API consistency
     sentiment_label = None
@@ -102,6 +102,69 @@ def serialize_feedback(feedback: Feedback, viewer: User, db: Session) -> dict:
     
     return feedback_dict
 
+def serialize_feedback_page(feedbacks: List[Feedback], viewer: User, db: Session) -> List[dict]:
+    """
+    Serialize a list of feedback with one grouped reply-count query for the
+    whole page. Load the list with joinedload(Feedback.author).
+    """
+    ids = [fb.id for fb in feedbacks]
+    reply_counts = {}
+    if ids:
+        reply_counts = dict(
+            db.query(Feedback.parent_id, func.count(Feedback.id))
+            .filter(Feedback.parent_id.in_(ids))
+            .group_by(Feedback.parent_id)
+            .all()
+        )
+    return [serialize_feedback(fb, viewer, db, reply_counts.get(fb.id, 0)) for fb in feedbacks]
+
+def encode_feedback_cursor(feedback: Feedback) -> str:
+    """Keyset cursor for the page after `feedback`: '<created_at ISO>_<id>'"""
+    return f"{feedback.created_at.isoformat()}_{feedback.id}"
+
+def paginate_feedback(
+    query,
+    viewer: User,
+    db: Session,
+    response: Response,
+    skip: int,
+    limit: int,
+    cursor: Optional[str] = None
+) -> List[dict]:
+    """
+    Newest-first page of a feedback query, serialized.
+    
+    With a cursor (from the previous page's X-Next-Cursor header) the page
+    starts right after that row by (created_at, id), so deep pages cost the
+    same as the first; otherwise skip/limit offsets apply. X-Next-Cursor is
+    set whenever the page is full.
+    """
+    if cursor:
+        created_at, _, feedback_id = cursor.rpartition("_")
+        try:
+            created_at = datetime.fromisoformat(created_at)
+            feedback_id = int(feedback_id)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid cursor"
+            )
+        query = query.filter(or_(
+            Feedback.created_at < created_at,
+            and_(Feedback.created_at == created_at, Feedback.id < feedback_id)
+        ))
+    
+    query = query.options(joinedload(Feedback.author))
+    query = query.order_by(desc(Feedback.created_at), desc(Feedback.id))
+    if not cursor:
+        query = query.offset(skip)
+    feedbacks = query.limit(limit).all()
+    
+    if len(feedbacks) == limit:
+        response.headers["X-Next-Cursor"] = encode_feedback_cursor(feedbacks[-1])
+    
+    return serialize_feedback_page(feedbacks, viewer, db)
+
 @router.post("/feedback", response_model=FeedbackOut, status_code=status.HTTP_201_CREATED)
 def create_feedback(
     payload: FeedbackCreate,
@@ -193,7 +256,7 @@ def create_feedback(
             db,
             feedback,
             analysis['sentiment_label'],
-            department=current_user.department
+            department=current_user.department.name if current_user.department else None
         )
     except Exception as e:
         # Don't fail feedback creation if keyword tracking fails
@@ -217,37 +280,35 @@ def create_feedback(
             )
         elif payload.recipient_type == "EVERYONE":
             # Public feedback - notify all users
-            all_users = db.query(User).filter(User.is_active == True).all()
-            for user in all_users:
-                if user.id != current_user.id:
-                    notification_service.create_notification(
-                        db=db,
-                        user_id=user.id,
-                        notification_type='public_feedback',
-                        data={
-                            'sender_name': 'Anonymous' if is_anonymous else current_user.full_name,
-                            'feedback_id': feedback.id,
-                            'channel': 'Everyone'
-                        }
-                    )
+            all_user_ids = [row.id for row in db.query(User.id).filter(User.is_active == True)]
+            notification_service.create_notifications_bulk(
+                db=db,
+                user_ids=all_user_ids,
+                notification_type='public_feedback',
+                data={
+                    'sender_name': 'Anonymous' if is_anonymous else current_user.full_name,
+                    'feedback_id': feedback.id,
+                    'channel': 'Everyone'
+                },
+                exclude_user_id=current_user.id
+            )
         elif payload.recipient_type == "ADMIN":
             # Admin feedback - notify all admins
-            admins = db.query(User).filter(
+            admin_ids = [row.id for row in db.query(User.id).filter(
                 User.is_active == True,
                 User.role == 'admin'
-            ).all()
-            for admin in admins:
-                if admin.id != current_user.id:
-                    notification_service.create_notification(
-                        db=db,
-                        user_id=admin.id,
-                        notification_type='feedback_received',
-                        data={
-                            'sender_name': 'Anonymous' if is_anonymous else current_user.full_name,
-                            'feedback_id': feedback.id,
-                            'is_anonymous': is_anonymous
-                        }
-                    )
+            )]
+            notification_service.create_notifications_bulk(
+                db=db,
+                user_ids=admin_ids,
+                notification_type='feedback_received',
+                data={
+                    'sender_name': 'Anonymous' if is_anonymous else current_user.full_name,
+                    'feedback_id': feedback.id,
+                    'is_anonymous': is_anonymous
+                },
+                exclude_user_id=current_user.id
+            )
     except Exception as e:
         print(f"⚠️ Failed to send new feedback notifications: {e}")
     
@@ -256,8 +317,10 @@ def create_feedback(
 
 @router.get("/feedback/my", response_model=List[FeedbackOut])
 def get_my_feedback(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page (replaces skip)"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -289,17 +352,15 @@ def get_my_feedback(
         conditions.append(Feedback.recipient_type == "ADMIN")
     
     query = db.query(Feedback).filter(or_(*conditions))
-    query = query.order_by(desc(Feedback.created_at))
-    query = query.offset(skip).limit(limit)
     
-    feedbacks = query.all()
-    
-    return [serialize_feedback(fb, current_user, db) for fb in feedbacks]
+    return paginate_feedback(query, current_user, db, response, skip, limit, cursor)
 
 @router.get("/feedback/sent", response_model=List[FeedbackOut])
 def get_sent_feedback(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page (replaces skip)"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -309,12 +370,8 @@ def get_sent_feedback(
     Author can always see their own feedback (never masked to self).
     """
     query = db.query(Feedback).filter(Feedback.author_id == current_user.id)
-    query = query.order_by(desc(Feedback.created_at))
-    query = query.offset(skip).limit(limit)
-    
-    feedbacks = query.all()
     
-    return [serialize_feedback(fb, current_user, db) for fb in feedbacks]
+    return paginate_feedback(query, current_user, db, response, skip, limit, cursor)
 
 @router.get("/feedback/{feedback_id}/replies", response_model=List[FeedbackOut])
 def get_feedback_replies(
@@ -340,20 +397,22 @@ def get_feedback_replies(
         )
     
     # Get replies
-    replies = db.query(Feedback).filter(
+    replies = db.query(Feedback).options(joinedload(Feedback.author)).filter(
         Feedback.parent_id == feedback_id
     ).order_by(Feedback.created_at).all()
     
-    return [serialize_feedback(fb, current_user, db) for fb in replies]
+    return serialize_feedback_page(replies, current_user, db)
 
 @router.get("/admin/feedback", response_model=List[FeedbackOut])
 def get_all_feedback(
+    response: Response,
     recipient_type: Optional[str] = Query(None, description="Filter by recipient type: USER, ADMIN, EVERYONE"),
     recipient_id: Optional[int] = Query(None, description="Filter by recipient user ID"),
     start_date: Optional[datetime] = Query(None, description="Filter by start date"),
     end_date: Optional[datetime] = Query(None, description="Filter by end date"),
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page (replaces skip)"),
     db: Session = Depends(get_db),
     current_user: User = Depends(require_admin)
 ):
@@ -389,12 +448,7 @@ def get_all_feedback(
         query = query.filter(Feedback.created_at <= end_date)
     
     # Order and paginate
-    query = query.order_by(desc(Feedback.created_at))
-    query = query.offset(skip).limit(limit)
-    
-    feedbacks = query.all()
-    
-    return [serialize_feedback(fb, current_user, db) for fb in feedbacks]
+    return paginate_feedback(query, current_user, db, response, skip, limit, cursor)
 
 @router.get("/admin/feedback/insights", response_model=FeedbackInsights)
 def get_feedback_insights(
@@ -411,142 +465,10 @@ def get_feedback_insights(
     - Time trend (daily counts and average sentiment)
     - Top recipients (by volume)
     
-    Data is aggregated over the specified window_days (default: 30).
+    Data is aggregated over the specified window_days (default: 30) with
+    SQL aggregates and the per-day keyword rollup, and cached briefly.
     """
-    # Calculate date range
-    end_date = datetime.utcnow()
-    start_date = end_date - timedelta(days=window_days)
-    
-    # Query feedback in window
-    feedback_query = db.query(Feedback).filter(Feedback.created_at >= start_date)
-    feedbacks = feedback_query.all()
-    
-    total_feedback = len(feedbacks)
-    
-    # 1. Sentiment Distribution
-    sentiment_counts = {
-        'positive': 0,
-        'neutral': 0,
-        'negative': 0
-    }
-    
-    for fb in feedbacks:
-        if fb.sentiment_label:
-            # Normalize to lowercase for consistency
-            label = fb.sentiment_label.lower()
-            if label in sentiment_counts:
-                sentiment_counts[label] += 1
-    
-    sentiment_dist = FeedbackSentimentDistribution(
-        positive=sentiment_counts['positive'],
-        neutral=sentiment_counts['neutral'],
-        negative=sentiment_counts['negative'],
-        total=total_feedback,
-        positive_pct=round((sentiment_counts['positive'] / max(total_feedback, 1)) * 100, 2),
-        neutral_pct=round((sentiment_counts['neutral'] / max(total_feedback, 1)) * 100, 2),
-        negative_pct=round((sentiment_counts['negative'] / max(total_feedback, 1)) * 100, 2)
-    )
-    
-    # 2. Top Keywords
-    all_keywords = []
-    for fb in feedbacks:
-        if fb.keywords:
-            all_keywords.extend(fb.keywords)
-    
-    keyword_counter = Counter(all_keywords)
-    top_keywords = [
-        KeywordCount(term=term, count=count)
-        for term, count in keyword_counter.most_common(20)
-    ]
-    
-    # 3. Time Trend (daily)
-    # Group by date
-    daily_data = {}
-    for fb in feedbacks:
-        date_key = fb.created_at.date().isoformat()
-        if date_key not in daily_data:
-            daily_data[date_key] = {
-                'count': 0,
-                'sentiment_scores': []
-            }
-        daily_data[date_key]['count'] += 1
-        if fb.sentiment_score is not None:
-            daily_data[date_key]['sentiment_scores'].append(fb.sentiment_score)
-    
-    trend = []
-    for date_str in sorted(daily_data.keys()):
-        data = daily_data[date_str]
-        avg_sentiment = None
-        if data['sentiment_scores']:
-            avg_sentiment = round(sum(data['sentiment_scores']) / len(data['sentiment_scores']), 3)
-        
-        trend.append(TrendPoint(
-            date=date_str,
-            count=data['count'],
-            avg_sentiment=avg_sentiment
-        ))
-    
-    # 4. Top Recipients
-    recipient_counts = {}
-    
-    for fb in feedbacks:
-        if fb.recipient_type == "USER" and fb.recipient_id:
-            key = f"USER_{fb.recipient_id}"
-            if key not in recipient_counts:
-                recipient = db.query(User).filter(User.id == fb.recipient_id).first()
-                recipient_counts[key] = {
-                    'id': fb.recipient_id,
-                    'name': recipient.full_name if recipient else "Unknown",
-                    'type': 'USER',
-                    'count': 0
-                }
-            recipient_counts[key]['count'] += 1
-        elif fb.recipient_type == "ADMIN":
-            key = "ADMIN"
-            if key not in recipient_counts:
-                recipient_counts[key] = {
-                    'id': None,
-                    'name': 'Admin',
-                    'type': 'ADMIN',
-                    'count': 0
-                }
-            recipient_counts[key]['count'] += 1
-        elif fb.recipient_type == "EVERYONE":
-            key = "EVERYONE"
-            if key not in recipient_counts:
-                recipient_counts[key] = {
-                    'id': None,
-                    'name': 'Everyone',
-                    'type': 'EVERYONE',
-                    'count': 0
-                }
-            recipient_counts[key]['count'] += 1
-    
-    # Sort by count and get top recipients
-    top_recipients = sorted(
-        recipient_counts.values(),
-        key=lambda x: x['count'],
-        reverse=True
-    )[:10]
-    
-    top_recipients_list = [
-        TopRecipient(
-            id=r['id'],
-            name=r['name'],
-            count=r['count'],
-            recipient_type=r['type']
-        )
-        for r in top_recipients
-    ]
-    
-    return FeedbackInsights(
-        sentiment=sentiment_dist,
-        keywords=top_keywords,
-        trend=trend,
-        recipients=top_recipients_list,
-        total_feedback=total_feedback,
-        window_days=window_days
-    )
+    return feedback_insights_cache.get(db, window_days)
 
 @router.get("/admin/feedback/weekly-digest")
 def get_weekly_digest(
@@ -563,8 +485,10 @@ def get_weekly_digest(
 
 @router.get("/admin/feedback/flagged", response_model=List[FeedbackOut])
 def get_flagged_feedback(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page (replaces skip)"),
     db: Session = Depends(get_db),
     current_user: User = Depends(require_admin)
 ):
@@ -573,12 +497,8 @@ def get_flagged_feedback(
     Used for moderation review.
     """
     query = db.query(Feedback).filter(Feedback.is_flagged == True)
-    query = query.order_by(desc(Feedback.created_at))
-    query = query.offset(skip).limit(limit)
-    
-    feedbacks = query.all()
     
-    return [serialize_feedback(fb, current_user, db) for fb in feedbacks]
+    return paginate_feedback(query, current_user, db, response, skip, limit, cursor)
 
 @router.patch("/admin/feedback/{feedback_id}/unflag")
 def unflag_feedback(
@@ -608,16 +528,25 @@ def get_moderation_wordlist(
 ):
     """
     Admin endpoint to view the moderation wordlist.
-    Shows what words are being filtered.
+    Shows what words are being filtered, including custom additions.
     """
-    from app.utils.moderation import PROFANITY_LIST, SEVERE_VIOLATIONS
+    from app.utils.moderation import PROFANITY_LIST, SEVERE_VIOLATIONS, SEVERITY_SEVERE
+    
+    severity = moderation_engine.matcher.severity
+    active_profanity = sorted(w for w, level in severity.items() if level != SEVERITY_SEVERE)
+    active_severe = sorted(w for w, level in severity.items() if level == SEVERITY_SEVERE)
     
     return {
-        "profanity_count": len(PROFANITY_LIST),
-        "severe_violations_count": len(SEVERE_VIOLATIONS),
-        "total_blocked_words": len(PROFANITY_LIST) + len(SEVERE_VIOLATIONS),
-        "profanity_list": sorted(PROFANITY_LIST),
-        "severe_violations": sorted(SEVERE_VIOLATIONS),
+        "profanity_count": len(active_profanity),
+        "severe_violations_count": len(active_severe),
+        "total_blocked_words": len(severity),
+        "profanity_list": active_profanity,
+        "severe_violations": active_severe,
+        "builtin_profanity_count": len(set(PROFANITY_LIST)),
+        "builtin_severe_violations_count": len(set(SEVERE_VIOLATIONS)),
+        "custom": moderation_engine.custom,
+        "version": moderation_engine.version,
+        "loaded_at": datetime.utcfromtimestamp(moderation_engine.loaded_at).isoformat() if moderation_engine.loaded_at else None,
         "categories": {
             "mild_profanity": ["damn", "hell", "crap"],
             "strong_profanity": ["shit", "fuck", "ass", "bitch"],
@@ -628,3 +557,73 @@ def get_moderation_wordlist(
         "note": "Uses word boundaries to avoid false positives"
     }
 
+@router.put("/admin/feedback/moderation-wordlist")
+def update_moderation_wordlist(
+    wordlist: ModerationWordlistUpdate,
+    current_user: User = Depends(require_admin)
+):
+    """
+    Admin endpoint to replace the custom wordlist.
+    Takes effect immediately here and within MODERATION_RELOAD_INTERVAL
+    seconds in other workers.
+    """
+    def clean(words):
+        return sorted({w.strip().lower() for w in words if w.strip()})
+    
+    try:
+        moderation_engine.save_custom(clean(wordlist.profanity), clean(wordlist.severe), clean(wordlist.allow))
+    except OSError as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Could not save moderation wordlist: {e}"
+        )
+    
+    return get_moderation_wordlist(current_user)
+
+@router.post("/admin/feedback/rescreen")
+def rescreen_feedback(
+    dry_run: bool = Query(True),
+    batch_size: int = Query(500, ge=1, le=5000),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_admin)
+):
+    """
+    Admin endpoint to run stored feedback through the current wordlists,
+    e.g. after adding words. Flags matching feedback (unless dry_run);
+    never unflags - that stays a manual review step.
+    """
+    scanned = 0
+    newly_flagged = []
+    last_id = 0
+    while True:
+        rows = db.query(Feedback.id, Feedback.content, Feedback.is_flagged).filter(
+            Feedback.id > last_id
+        ).order_by(Feedback.id).limit(batch_size).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        scanned += len(rows)
+        
+        results = moderation_engine.moderate_many(row.content for row in rows)
+        batch_flagged = [
+            {"id": row.id, "reason": result.reason}
+            for row, result in zip(rows, results)
+            if result.is_flagged and not row.is_flagged
+        ]
+        newly_flagged.extend(batch_flagged)
+        
+        if batch_flagged and not dry_run:
+            for item in batch_flagged:
+                db.query(Feedback).filter(Feedback.id == item["id"]).update(
+                    {Feedback.is_flagged: True, Feedback.flagged_reason: item["reason"]},
+                    synchronize_session=False
+                )
+            db.commit()
+    
+    return {
+        "scanned": scanned,
+        "newly_flagged": len(newly_flagged),
+        "dry_run": dry_run,
+        "feedback": newly_flagged[:100]
+    }
+
@@ -77,6 +77,7 @@ async def get_forecast(
     metric: str = Query("feedback_count", description="Metric to forecast"),
     window: int = Query(90, description="Historical window in days"),
     weeks: int = Query(4, description="Weeks to forecast"),
+    by_department: bool = Query(False, description="Also forecast each department (feedback_count only)"),
     db: Session = Depends(get_db),
     current_user: User = Depends(require_admin)
 ):
@@ -87,22 +88,31 @@ async def get_forecast(
     - metric: Metric to forecast ('feedback_count' or 'sentiment_avg')
     - window: Historical window in days (default 90)
     - weeks: Number of weeks to forecast (default 4)
+    - by_department: Add a forecast per author department
     
     Returns:
-    - Historical data, forecast with confidence intervals, and trend analysis
+    - Historical data, forecast with prediction intervals, the fitted model
+      (Holt-Winters with a weekly season, or Holt's linear trend), and trend
+      analysis
     """
     if metric not in ["feedback_count", "sentiment_avg"]:
         raise HTTPException(
             status_code=400,
             detail="Invalid metric. Must be 'feedback_count' or 'sentiment_avg'"
         )
+    if by_department and metric != "feedback_count":
+        raise HTTPException(
+            status_code=400,
+            detail="Department forecasts are only available for 'feedback_count'"
+        )
     
     try:
         forecast_data = get_forecast_data(
             db,
             metric=metric,
             window_days=window,
-            forecast_weeks=weeks
+            forecast_weeks=weeks,
+            by_department=by_department
         )
         
         return {
@@ -11,7 +11,10 @@ from app.core.database import get_db
 from app.api.auth import get_current_user
 from app.models.user import User
 from app.services.kpi_calculator import KPICalculator, run_kpi_calculation_job
+from app.services.kpi_rollup import kpi_rollup_service
+from app.services.kpi_scheduler import get_scheduler_status, kpi_calculation_job, kpi_job_running
 from app.models.performance import KpiSnapshot
+from app.utils.forecasting import forecast_batch
 from sqlalchemy import func, desc
 
 import logging
@@ -46,6 +49,7 @@ def require_manager(current_user: User = Depends(get_current_user)):
 async def trigger_kpi_calculation(
     background_tasks: BackgroundTasks,
     user_id: Optional[int] = Query(None, description="Calculate for specific user (None = all users)"),
+    mode: Optional[str] = Query(None, pattern="^(incremental|full)$", description="'incremental' (changed users only) or 'full'"),
     db: Session = Depends(get_db),
     current_user: User = Depends(require_manager)
 ):
@@ -55,10 +59,21 @@ async def trigger_kpi_calculation(
     
     - **user_id**: Optional - calculate for specific user
     - If user_id is None, calculates for all users + company-wide metrics
+      through the scheduled job; 409 while a run is already in progress
     """
+    if user_id is None and kpi_job_running():
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A KPI calculation run is already in progress"
+        )
+    
     try:
         # Run in background to avoid timeout
-        background_tasks.add_task(run_kpi_calculation_job, db, user_id)
+        if user_id is None:
+            # Same run lock as the cron job (a run starting in between is skipped)
+            background_tasks.add_task(kpi_calculation_job, mode)
+        else:
+            background_tasks.add_task(run_kpi_calculation_job, db, user_id, mode)
         
         return {
             "status": "started",
@@ -70,6 +85,27 @@ async def trigger_kpi_calculation(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/rollups/rebuild")
+async def rebuild_kpi_rollups(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_admin)
+):
+    """
+    Recompute the daily KPI rollup buckets from tasks and time entries.
+    Needed after bulk imports or edits made outside the API.
+    """
+    try:
+        buckets = kpi_rollup_service.rebuild(db)
+        return {
+            "status": "success",
+            "buckets": buckets,
+            "timestamp": datetime.utcnow().isoformat()
+        }
+    except Exception as e:
+        logger.error(f"Error rebuilding KPI rollups: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.post("/calculate-now")
 async def calculate_kpis_now(
     user_id: Optional[int] = Query(None),
@@ -113,12 +149,14 @@ async def calculate_kpis_now(
 async def get_auto_calculated_kpis(
     user_id: Optional[int] = Query(None),
     days: int = Query(90),
+    forecast_days: int = Query(14, ge=0, le=90),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     Get automatically calculated KPIs with trends and insights.
-    Returns latest value for each metric + historical data.
+    Returns latest value for each metric + historical data, and a daily
+    forecast per metric (all metrics fitted in one batch; 0 days skips it).
     """
     try:
         # If no user_id specified, use current user
@@ -193,6 +231,25 @@ async def get_auto_calculated_kpis(
                             data["unit"]
                         )
         
+        if forecast_days:
+            forecasts = forecast_batch(
+                {
+                    metric_name: (
+                        [datetime.fromisoformat(p["date"]) for p in data["data_points"]],
+                        [p["value"] for p in data["data_points"]]
+                    )
+                    for metric_name, data in metrics_data.items()
+                },
+                horizon=forecast_days,
+                # Only metrics that never went negative are clamped at 0
+                non_negative={
+                    metric_name: all(p["value"] >= 0 for p in data["data_points"])
+                    for metric_name, data in metrics_data.items()
+                }
+            )
+            for metric_name, data in metrics_data.items():
+                data["forecast"] = serialize_kpi_forecast(forecasts[metric_name])
+        
         return {
             "user_id": target_user_id,
             "date_range": {
@@ -260,6 +317,7 @@ async def get_kpi_calculation_status(
             ],
             "auto_calculation_enabled": True,
             "calculation_frequency": "Every 6 hours",
+            "scheduler": get_scheduler_status(),
         }
         
     except Exception as e:
@@ -299,11 +357,31 @@ def generate_insight(
         return f"➡️ {metric_name} remains stable at {value_str}"
 
 
+def serialize_kpi_forecast(forecast: dict) -> dict:
+    """Daily forecast points with prediction intervals for a KPI response"""
+    return {
+        "method": forecast["method"],
+        "params": forecast["params"],
+        "points": [
+            {
+                "date": day.isoformat(),
+                "value": round(value, 2),
+                "lower": round(lower, 2),
+                "upper": round(upper, 2)
+            }
+            for day, value, lower, upper in zip(
+                forecast["dates"], forecast["values"], forecast["lower"], forecast["upper"]
+            )
+        ]
+    }
+
+
 @router.get("/insights/{metric_name}")
 async def get_metric_insights(
     metric_name: str,
     user_id: Optional[int] = Query(None),
     days: int = Query(90),
+    forecast_days: int = Query(14, ge=0, le=90),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -313,6 +391,7 @@ async def get_metric_insights(
     - Historical trend
     - Comparisons to team/company average
     - Recommendations
+    - Daily forecast with 95% prediction intervals (0 days skips it)
     """
     target_user_id = user_id if user_id else current_user.id
     end_date = datetime.utcnow()
@@ -363,6 +442,11 @@ async def get_metric_insights(
             }
             for s in snapshots
         ],
+        "forecast": serialize_kpi_forecast(forecast_batch(
+            {metric_name: ([s.snapshot_date for s in snapshots], values)},
+            horizon=forecast_days,
+            non_negative=min_val >= 0
+        )[metric_name]) if forecast_days else None,
         "recommendations": generate_recommendations(metric_name, current, avg, change_percent)
     }
 
@@ -14,6 +14,7 @@ from app.api.auth import get_current_user
 from app.core.rbac import admin_only, manager_or_admin
 from app.models.user import User
 from app.models.leave import LeaveType, LeaveBalance, LeaveRequest
+from app.services.notification_service import notification_service
 from app.schemas.leave import (
     LeaveTypeResponse,
     LeaveBalanceResponse,
@@ -377,6 +378,20 @@ async def review_leave_request(
             balance.used_days = float(balance.used_days) + float(leave_request.total_days)
             balance.remaining_days = float(balance.total_days) - float(balance.used_days)
     
+    # Notify the requester in the same transaction as the review
+    notification_service.create_notifications_bulk(
+        db=db,
+        user_ids=[leave_request.user_id],
+        notification_type=f'leave_{review.status}',
+        data={
+            'leave_request_id': leave_request.id,
+            'date_range': f"{leave_request.start_date} - {leave_request.end_date}",
+            'reviewer_name': current_user.full_name
+        },
+        exclude_user_id=current_user.id,
+        commit=False
+    )
+    
     db.commit()
     db.refresh(leave_request)
     
@@ -3,12 +3,16 @@ Notification API Endpoints
 Handles in-app notifications, push tokens, and user preferences
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, WebSocket, WebSocketDisconnect
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List, Optional
+import json
 
-from app.core.database import get_db
-from app.api.auth import get_current_user
+from app.core.database import get_db, get_async_db, AsyncSessionLocal
+from app.core.security import verify_token
+from app.api.auth import get_current_user, get_current_user_async
 from app.models.user import User
 from app.models.notification import Notification, PushNotificationToken, UserNotificationPreferences
 from app.schemas.notification import (
@@ -16,6 +20,7 @@ from app.schemas.notification import (
     NotificationPreferencesUpdate, NotificationPreferencesOut
 )
 from app.services.notification_service import notification_service
+from app.utils.websocket_manager import manager
 
 router = APIRouter()
 
@@ -23,32 +28,74 @@ router = APIRouter()
 async def get_notifications(
     limit: int = Query(50, ge=1, le=100),
     unread_only: bool = Query(False),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Get notifications for the current user"""
-    notifications = notification_service.get_user_notifications(
+    notifications = await notification_service.get_user_notifications_async(
         db, current_user.id, limit, unread_only
     )
     return notifications
 
 @router.get("/unread-count", response_model=dict)
 async def get_unread_count(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Get unread notification count"""
-    count = notification_service.get_unread_count(db, current_user.id)
+    count = await notification_service.get_unread_count(db, current_user.id)
     return {"unread_count": count}
 
+@router.websocket("/ws")
+async def notifications_websocket(
+    websocket: WebSocket,
+    token: str
+):
+    """
+    Live notifications for the current user, replacing unread-count polling.
+    Sends {"type": "unread_count", "unread_count": n} on connect and whenever
+    the count changes, and {"type": "notification", "notification": {...},
+    "unread_count": n} for each new notification.
+    """
+    payload = verify_token(token)
+    if not payload:
+        await websocket.close(code=1008, reason="Invalid token")
+        return
+    
+    async with AsyncSessionLocal() as db:
+        user = (await db.execute(select(User).where(User.email == payload.get("sub")))).scalars().first()
+        if not user or not user.is_active:
+            await websocket.close(code=1008, reason="User not found")
+            return
+        unread_count = await notification_service.get_unread_count(db, user.id)
+    
+    await manager.connect_user(websocket, {"user_id": user.id, "full_name": user.full_name})
+    manager.send_to_user(user.id, {"type": "unread_count", "unread_count": unread_count})
+    
+    try:
+        while True:
+            # Nothing is expected from the client beyond keep-alive pings
+            data = await websocket.receive_text()
+            try:
+                is_ping = json.loads(data).get("type") == "ping"
+            except (ValueError, AttributeError):
+                is_ping = False
+            if is_ping:
+                manager.send_to_user(user.id, {"type": "pong"})
+    except WebSocketDisconnect:
+        manager.disconnect(websocket)
+    except Exception as e:
+        print(f"Notification WebSocket error: {e}")
+        manager.disconnect(websocket)
+
 @router.patch("/{notification_id}/read", response_model=dict)
 async def mark_notification_read(
     notification_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Mark a notification as read"""
-    success = notification_service.mark_notification_read(
+    success = await notification_service.mark_notification_read(
         db, notification_id, current_user.id
     )
     
@@ -62,11 +109,11 @@ async def mark_notification_read(
 
 @router.patch("/mark-all-read", response_model=dict)
 async def mark_all_notifications_read(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Mark all notifications as read for the current user"""
-    updated_count = notification_service.mark_all_notifications_read(
+    updated_count = await notification_service.mark_all_notifications_read(
         db, current_user.id
     )
     
@@ -5,7 +5,7 @@ Endpoints for managing offices and meeting bookings
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, or_, func
-from typing import List, Optional
+from typing import Dict, Iterable, List, Optional, Tuple
 from datetime import datetime, timedelta
 
 from app.core.database import get_db
@@ -18,6 +18,9 @@ from app.schemas.office import (
     OfficeUpdate,
     OfficeResponse,
     OfficeAvailability,
+    OfficeFreeBusy,
+    OfficeSlot,
+    BookedSlot,
     MeetingBookingCreate,
     MeetingBookingUpdate,
     MeetingBookingResponse,
@@ -27,10 +30,108 @@ from app.schemas.office import (
     CalendarEvent
 )
 from app.services.notification_service import notification_service
+from app.services.booking_availability import (
+    BLOCKING_STATUSES,
+    as_naive_utc,
+    booking_availability,
+    find_conflict_in_db
+)
 
 router = APIRouter()
 
 
+# ==================== Response Assembly ====================
+
+def load_booking_refs(
+    db: Session,
+    bookings: Iterable[MeetingBooking],
+    include_participants: bool = True
+) -> Tuple[Dict[int, Office], Dict[int, User]]:
+    """
+    Every office and user (organizers, and participants unless
+    include_participants is False) referenced by `bookings`, resolved with
+    one IN query each: (office_id -> Office, user_id -> User)
+    """
+    office_ids = set()
+    user_ids = set()
+    for booking in bookings:
+        office_ids.add(booking.office_id)
+        user_ids.add(booking.organizer_id)
+        if include_participants:
+            user_ids.update(booking.participant_ids or [])
+    
+    offices = {}
+    if office_ids:
+        offices = {office.id: office for office in db.query(Office).filter(Office.id.in_(office_ids))}
+    users = {}
+    if user_ids:
+        users = {user.id: user for user in db.query(User).filter(User.id.in_(user_ids))}
+    return offices, users
+
+
+def build_booking_response(
+    booking: MeetingBooking,
+    offices: Dict[int, Office],
+    users: Dict[int, User]
+) -> MeetingBookingResponse:
+    """MeetingBookingResponse from maps filled by load_booking_refs"""
+    office = offices.get(booking.office_id)
+    organizer = users.get(booking.organizer_id)
+    participant_names = [
+        users[pid].full_name for pid in (booking.participant_ids or []) if pid in users
+    ]
+    duration_minutes = int((booking.end_time - booking.start_time).total_seconds() / 60)
+    
+    return MeetingBookingResponse(
+        id=booking.id,
+        office_id=booking.office_id,
+        title=booking.title,
+        description=booking.description,
+        organizer_id=booking.organizer_id,
+        organizer_name=organizer.full_name if organizer else "Unknown",
+        office_name=office.name if office else "Unknown",
+        start_time=booking.start_time,
+        end_time=booking.end_time,
+        participant_ids=booking.participant_ids or [],
+        participant_names=participant_names,
+        status=booking.status,
+        duration_minutes=duration_minutes,
+        created_at=booking.created_at,
+        updated_at=booking.updated_at
+    )
+
+
+def build_booking_responses(db: Session, bookings: List[MeetingBooking]) -> List[MeetingBookingResponse]:
+    """Responses for a page of bookings, with two lookup queries in total"""
+    offices, users = load_booking_refs(db, bookings)
+    return [build_booking_response(booking, offices, users) for booking in bookings]
+
+
+def validate_participants(db: Session, participant_ids: Optional[List[int]]) -> None:
+    """400 for the first participant id with no user, checked with one IN query"""
+    if not participant_ids:
+        return
+    found_ids = {
+        user_id for (user_id,) in
+        db.query(User.id).filter(User.id.in_(set(participant_ids)))
+    }
+    for participant_id in participant_ids:
+        if participant_id not in found_ids:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Participant with ID {participant_id} not found"
+            )
+
+
+def _participant(user: User) -> MeetingParticipant:
+    return MeetingParticipant(
+        id=user.id,
+        full_name=user.full_name,
+        email=user.email,
+        avatar_url=user.avatar_url
+    )
+
+
 # ==================== Office Management (Admin) ====================
 
 @router.get("/offices", response_model=List[OfficeResponse])
@@ -48,22 +149,16 @@ async def get_offices(
     offices = query.order_by(Office.name).all()
     
     # Add current booking info
+    booking_availability.ensure_fresh(db)
+    current_bookings = booking_availability.current([office.id for office in offices], datetime.utcnow())
     result = []
-    now = datetime.utcnow()
     for office in offices:
-        current_booking = db.query(MeetingBooking).filter(
-            and_(
-                MeetingBooking.office_id == office.id,
-                MeetingBooking.start_time <= now,
-                MeetingBooking.end_time >= now,
-                MeetingBooking.status == "ongoing"
-            )
-        ).first()
+        current_booking = current_bookings.get(office.id)
         
         office_dict = OfficeResponse.from_orm(office).dict()
         if current_booking:
             office_dict['current_booking'] = {
-                'id': current_booking.id,
+                'id': current_booking.booking_id,
                 'title': current_booking.title,
                 'end_time': current_booking.end_time.isoformat()
             }
@@ -168,8 +263,10 @@ async def delete_office(
             detail=f"Cannot delete office with {future_bookings} active/upcoming bookings"
         )
     
+    removed_booking_ids = booking_availability.booking_ids_for_office(office_id)
     db.delete(office)
     db.commit()
+    await booking_availability.publish_removed(removed_booking_ids)
     
     return {"message": "Office deleted successfully"}
 
@@ -191,17 +288,9 @@ async def check_office_availability(
         )
     
     # Check for conflicting bookings
-    conflict = db.query(MeetingBooking).filter(
-        and_(
-            MeetingBooking.office_id == office_id,
-            MeetingBooking.status.in_(["upcoming", "ongoing"]),
-            or_(
-                and_(MeetingBooking.start_time <= start_time, MeetingBooking.end_time > start_time),
-                and_(MeetingBooking.start_time < end_time, MeetingBooking.end_time >= end_time),
-                and_(MeetingBooking.start_time >= start_time, MeetingBooking.end_time <= end_time)
-            )
-        )
-    ).first()
+    booking_availability.ensure_fresh(db)
+    conflicts = booking_availability.conflicts(office_id, start_time, end_time)
+    conflict = conflicts[0] if conflicts else None
     
     is_available = conflict is None
     
@@ -209,16 +298,107 @@ async def check_office_availability(
         office_id=office.id,
         office_name=office.name,
         is_available=is_available,
-        current_booking={
-            'id': conflict.id,
-            'title': conflict.title,
-            'start_time': conflict.start_time,
-            'end_time': conflict.end_time
-        } if conflict else None,
+        current_booking=conflict.as_dict() if conflict else None,
         next_available=conflict.end_time if conflict else None
     )
 
 
+def _matching_offices(db: Session, min_capacity: int, amenities: Optional[List[str]]) -> List[Office]:
+    """Active offices with at least min_capacity seats and every amenity (case-insensitive)"""
+    offices = db.query(Office).filter(
+        and_(Office.is_active == True, Office.capacity >= min_capacity)
+    ).order_by(Office.name).all()
+    wanted = {amenity.strip().lower() for amenity in (amenities or []) if amenity.strip()}
+    if not wanted:
+        return offices
+    return [
+        office for office in offices
+        if wanted <= {amenity.lower() for amenity in (office.amenities or [])}
+    ]
+
+
+@router.get("/availability", response_model=List[OfficeFreeBusy])
+async def get_rooms_availability(
+    start_time: datetime,
+    end_time: datetime,
+    min_capacity: int = Query(1, ge=1),
+    amenities: Optional[List[str]] = Query(None, description="Required amenities, e.g. ?amenities=Projector"),
+    only_available: bool = Query(False),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Free/busy of every active office with the capacity and amenities asked
+    for, over one time range, e.g. rooms for 8 with a projector that are
+    free on Tuesday 14:00-15:00 (only_available=true)
+    """
+    if end_time <= start_time:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="end_time must be after start_time"
+        )
+    
+    offices = _matching_offices(db, min_capacity, amenities)
+    booking_availability.ensure_fresh(db)
+    busy = booking_availability.busy([office.id for office in offices], start_time, end_time)
+    
+    result = []
+    for office in offices:
+        intervals = busy[office.id]
+        if only_available and intervals:
+            continue
+        result.append(OfficeFreeBusy(
+            office_id=office.id,
+            office_name=office.name,
+            capacity=office.capacity,
+            amenities=office.amenities,
+            is_available=not intervals,
+            busy=[BookedSlot(**interval.as_dict()) for interval in intervals]
+        ))
+    
+    return result
+
+
+@router.get("/availability/first-free", response_model=List[OfficeSlot])
+async def find_first_free_slots(
+    duration_minutes: int = Query(..., ge=1, le=24 * 60),
+    after: Optional[datetime] = Query(None, description="Earliest start (default: now)"),
+    within_days: int = Query(14, ge=1, le=90, description="How far past `after` to search"),
+    min_capacity: int = Query(1, ge=1),
+    amenities: Optional[List[str]] = Query(None),
+    office_id: Optional[int] = Query(None),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    The earliest free slot of duration_minutes in each matching office,
+    soonest first; the first entry is the first free slot overall
+    """
+    after = as_naive_utc(after) if after else datetime.utcnow()
+    before = after + timedelta(days=within_days)
+    duration = timedelta(minutes=duration_minutes)
+    
+    offices = _matching_offices(db, min_capacity, amenities)
+    if office_id is not None:
+        offices = [office for office in offices if office.id == office_id]
+    booking_availability.ensure_fresh(db)
+    
+    result = []
+    for office in offices:
+        start = booking_availability.first_free_slot(office.id, duration, after, before)
+        if start is not None:
+            result.append(OfficeSlot(
+                office_id=office.id,
+                office_name=office.name,
+                capacity=office.capacity,
+                start_time=start,
+                end_time=start + duration
+            ))
+    
+    result.sort(key=lambda slot: slot.start_time)
+    return result
+
+
 # ==================== Meeting Bookings ====================
 
 @router.post("/bookings", response_model=MeetingBookingResponse, status_code=status.HTTP_201_CREATED)
@@ -239,18 +419,9 @@ async def create_booking(
             detail="Office not found or inactive"
         )
     
-    # Check if office is available
-    conflict = db.query(MeetingBooking).filter(
-        and_(
-            MeetingBooking.office_id == booking_data.office_id,
-            MeetingBooking.status.in_(["upcoming", "ongoing"]),
-            or_(
-                and_(MeetingBooking.start_time <= booking_data.start_time, MeetingBooking.end_time > booking_data.start_time),
-                and_(MeetingBooking.start_time < booking_data.end_time, MeetingBooking.end_time >= booking_data.end_time),
-                and_(MeetingBooking.start_time >= booking_data.start_time, MeetingBooking.end_time <= booking_data.end_time)
-            )
-        )
-    ).first()
+    # Check if office is available (in the database: a booking committed by
+    # another worker a moment ago may not be in the availability engine yet)
+    conflict = find_conflict_in_db(db, booking_data.office_id, booking_data.start_time, booking_data.end_time)
     
     if conflict:
         raise HTTPException(
@@ -259,14 +430,7 @@ async def create_booking(
         )
     
     # Validate participants exist
-    if booking_data.participant_ids:
-        for participant_id in booking_data.participant_ids:
-            participant = db.query(User).filter(User.id == participant_id).first()
-            if not participant:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"Participant with ID {participant_id} not found"
-                )
+    validate_participants(db, booking_data.participant_ids)
     
     # Create booking
     booking = MeetingBooking(
@@ -283,53 +447,30 @@ async def create_booking(
     db.add(booking)
     db.commit()
     db.refresh(booking)
+    await booking_availability.publish([booking])
     
     # Send notifications to participants
-    for participant_id in (booking_data.participant_ids or []):
-        if participant_id != current_user.id:
-            try:
-                notification_service.create_notification(
-                    db=db,
-                    user_id=participant_id,
-                    notification_type='meeting_invited',
-                    data={
-                        'meeting_id': booking.id,
-                        'meeting_title': booking.title,
-                        'organizer_name': current_user.full_name,
-                        'office_name': office.name,
-                        'start_time': booking.start_time.isoformat(),
-                        'end_time': booking.end_time.isoformat()
-                    }
-                )
-            except Exception as e:
-                print(f"⚠️ Failed to send notification to user {participant_id}: {e}")
+    try:
+        notification_service.create_notifications_bulk(
+            db=db,
+            user_ids=booking_data.participant_ids or [],
+            notification_type='meeting_invited',
+            data={
+                'meeting_id': booking.id,
+                'meeting_title': booking.title,
+                'organizer_name': current_user.full_name,
+                'office_name': office.name,
+                'start_time': booking.start_time.isoformat(),
+                'end_time': booking.end_time.isoformat()
+            },
+            exclude_user_id=current_user.id
+        )
+    except Exception as e:
+        db.rollback()
+        print(f"⚠️ Failed to send meeting invitations: {e}")
     
     # Build response
-    participant_names = []
-    for pid in (booking.participant_ids or []):
-        user = db.query(User).filter(User.id == pid).first()
-        if user:
-            participant_names.append(user.full_name)
-    
-    duration_minutes = int((booking.end_time - booking.start_time).total_seconds() / 60)
-    
-    return MeetingBookingResponse(
-        id=booking.id,
-        office_id=booking.office_id,
-        title=booking.title,
-        description=booking.description,
-        organizer_id=booking.organizer_id,
-        organizer_name=current_user.full_name,
-        office_name=office.name,
-        start_time=booking.start_time,
-        end_time=booking.end_time,
-        participant_ids=booking.participant_ids or [],
-        participant_names=participant_names,
-        status=booking.status,
-        duration_minutes=duration_minutes,
-        created_at=booking.created_at,
-        updated_at=booking.updated_at
-    )
+    return build_booking_responses(db, [booking])[0]
 
 
 @router.get("/bookings", response_model=List[MeetingBookingResponse])
@@ -370,38 +511,7 @@ async def get_bookings(
     bookings = query.order_by(MeetingBooking.start_time.desc()).all()
     
     # Build responses
-    result = []
-    for booking in bookings:
-        office = db.query(Office).filter(Office.id == booking.office_id).first()
-        organizer = db.query(User).filter(User.id == booking.organizer_id).first()
-        
-        participant_names = []
-        for pid in (booking.participant_ids or []):
-            user = db.query(User).filter(User.id == pid).first()
-            if user:
-                participant_names.append(user.full_name)
-        
-        duration_minutes = int((booking.end_time - booking.start_time).total_seconds() / 60)
-        
-        result.append(MeetingBookingResponse(
-            id=booking.id,
-            office_id=booking.office_id,
-            title=booking.title,
-            description=booking.description,
-            organizer_id=booking.organizer_id,
-            organizer_name=organizer.full_name if organizer else "Unknown",
-            office_name=office.name if office else "Unknown",
-            start_time=booking.start_time,
-            end_time=booking.end_time,
-            participant_ids=booking.participant_ids or [],
-            participant_names=participant_names,
-            status=booking.status,
-            duration_minutes=duration_minutes,
-            created_at=booking.created_at,
-            updated_at=booking.updated_at
-        ))
-    
-    return result
+    return build_booking_responses(db, bookings)
 
 
 @router.get("/bookings/{booking_id}", response_model=MeetingDetails)
@@ -419,19 +529,13 @@ async def get_booking_details(
         )
     
     # Get related data
-    office = db.query(Office).filter(Office.id == booking.office_id).first()
-    organizer = db.query(User).filter(User.id == booking.organizer_id).first()
-    
-    participants = []
-    for pid in (booking.participant_ids or []):
-        user = db.query(User).filter(User.id == pid).first()
-        if user:
-            participants.append(MeetingParticipant(
-                id=user.id,
-                full_name=user.full_name,
-                email=user.email,
-                avatar_url=user.avatar_url
-            ))
+    offices, users = load_booking_refs(db, [booking])
+    office = offices.get(booking.office_id)
+    organizer = users.get(booking.organizer_id)
+    
+    participants = [
+        _participant(users[pid]) for pid in (booking.participant_ids or []) if pid in users
+    ]
     
     duration_minutes = int((booking.end_time - booking.start_time).total_seconds() / 60)
     
@@ -440,12 +544,7 @@ async def get_booking_details(
         title=booking.title,
         description=booking.description,
         office=OfficeResponse.from_orm(office),
-        organizer=MeetingParticipant(
-            id=organizer.id,
-            full_name=organizer.full_name,
-            email=organizer.email,
-            avatar_url=organizer.avatar_url
-        ) if organizer else None,
+        organizer=_participant(organizer) if organizer else None,
         participants=participants,
         start_time=booking.start_time,
         end_time=booking.end_time,
@@ -480,42 +579,39 @@ async def update_booking(
     
     # Update fields
     update_data = booking_data.dict(exclude_unset=True)
+    start_time = as_naive_utc(update_data.get('start_time') or booking.start_time)
+    end_time = as_naive_utc(update_data.get('end_time') or booking.end_time)
+    new_status = update_data.get('status') or booking.status
+    if end_time <= start_time:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="end_time must be after start_time"
+        )
+    
+    if 'participant_ids' in update_data:
+        validate_participants(db, update_data['participant_ids'])
+    
+    # A booking moved to a new time (or brought back from cancelled) must
+    # not overlap another one
+    moved = start_time != booking.start_time or end_time != booking.end_time
+    if new_status in BLOCKING_STATUSES and (moved or booking.status not in BLOCKING_STATUSES):
+        conflict = find_conflict_in_db(db, booking.office_id, start_time, end_time, exclude_booking_id=booking.id)
+        if conflict:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Office is already booked from {conflict.start_time} to {conflict.end_time}"
+            )
+    
     for field, value in update_data.items():
         setattr(booking, field, value)
     
     booking.updated_at = datetime.utcnow()
     db.commit()
     db.refresh(booking)
+    await booking_availability.publish([booking])
     
     # Build response
-    office = db.query(Office).filter(Office.id == booking.office_id).first()
-    organizer = db.query(User).filter(User.id == booking.organizer_id).first()
-    
-    participant_names = []
-    for pid in (booking.participant_ids or []):
-        user = db.query(User).filter(User.id == pid).first()
-        if user:
-            participant_names.append(user.full_name)
-    
-    duration_minutes = int((booking.end_time - booking.start_time).total_seconds() / 60)
-    
-    return MeetingBookingResponse(
-        id=booking.id,
-        office_id=booking.office_id,
-        title=booking.title,
-        description=booking.description,
-        organizer_id=booking.organizer_id,
-        organizer_name=organizer.full_name if organizer else "Unknown",
-        office_name=office.name if office else "Unknown",
-        start_time=booking.start_time,
-        end_time=booking.end_time,
-        participant_ids=booking.participant_ids or [],
-        participant_names=participant_names,
-        status=booking.status,
-        duration_minutes=duration_minutes,
-        created_at=booking.created_at,
-        updated_at=booking.updated_at
-    )
+    return build_booking_responses(db, [booking])[0]
 
 
 @router.delete("/bookings/{booking_id}")
@@ -542,23 +638,24 @@ async def cancel_booking(
     booking.status = "cancelled"
     booking.updated_at = datetime.utcnow()
     db.commit()
+    await booking_availability.publish([booking])
     
     # Notify participants
-    for participant_id in (booking.participant_ids or []):
-        if participant_id != current_user.id:
-            try:
-                notification_service.create_notification(
-                    db=db,
-                    user_id=participant_id,
-                    notification_type='meeting_cancelled',
-                    data={
-                        'meeting_id': booking.id,
-                        'meeting_title': booking.title,
-                        'cancelled_by': current_user.full_name
-                    }
-                )
-            except Exception as e:
-                print(f"⚠️ Failed to send cancellation notification: {e}")
+    try:
+        notification_service.create_notifications_bulk(
+            db=db,
+            user_ids=booking.participant_ids or [],
+            notification_type='meeting_cancelled',
+            data={
+                'meeting_id': booking.id,
+                'meeting_title': booking.title,
+                'cancelled_by': current_user.full_name
+            },
+            exclude_user_id=current_user.id
+        )
+    except Exception as e:
+        db.rollback()
+        print(f"⚠️ Failed to send cancellation notification: {e}")
     
     return {"message": "Booking cancelled successfully"}
 
@@ -584,11 +681,12 @@ async def get_calendar_events(
         query = query.filter(MeetingBooking.office_id == office_id)
     
     bookings = query.order_by(MeetingBooking.start_time).all()
+    offices, users = load_booking_refs(db, bookings, include_participants=False)
     
     result = []
     for booking in bookings:
-        office = db.query(Office).filter(Office.id == booking.office_id).first()
-        organizer = db.query(User).filter(User.id == booking.organizer_id).first()
+        office = offices.get(booking.office_id)
+        organizer = users.get(booking.organizer_id)
         
         participant_count = len(booking.participant_ids or [])
         is_organizer = booking.organizer_id == current_user.id
@@ -696,6 +794,7 @@ async def update_booking_statuses(
         booking.status = "completed"
     
     db.commit()
+    await booking_availability.publish(upcoming_to_ongoing + ongoing_to_completed)
     
     return {
         "message": "Statuses updated successfully",
@@ -1,10 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session, joinedload
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy.orm import Session
 from typing import List, Optional
 from app.core.database import get_db
 from app.models.user import User
 from app.models.department import Department
 from app.api.auth import get_current_user
+from app.services.org_hierarchy import org_hierarchy
 from pydantic import BaseModel
 
 router = APIRouter()
@@ -15,6 +16,7 @@ class OrgChartNode(BaseModel):
     title: str
     department: Optional[str] = None
     avatar_url: Optional[str] = None
+    child_count: int = 0
     children: List["OrgChartNode"] = []
 
 class ReassignRequest(BaseModel):
@@ -22,120 +24,39 @@ class ReassignRequest(BaseModel):
     new_manager_id: Optional[int] = None
     new_department_id: Optional[int] = None
 
-def build_org_tree(users: List[User], root_id: Optional[int] = None) -> List[OrgChartNode]:
-    """Build hierarchical org chart tree from flat user list"""
-    user_map = {user.id: user for user in users}
-    
-    # Find root users (no manager or specified root)
-    if root_id:
-        root_users = [user for user in users if user.id == root_id]
-    else:
-        # Find users with no manager or users whose manager is not in the list
-        root_users = []
-        for user in users:
-            if not hasattr(user, 'manager_id') or user.manager_id is None:
-                root_users.append(user)
-            elif user.manager_id not in user_map:
-                root_users.append(user)
-    
-    def build_subtree(user: User) -> OrgChartNode:
-        # Find direct reports
-        direct_reports = [u for u in users if hasattr(u, 'manager_id') and u.manager_id == user.id]
-        
-        return OrgChartNode(
-            id=str(user.id),
-            name=user.full_name,
-            title=user.job_role or "Employee",
-            department=user.department.name if user.department else None,
-            avatar_url=user.avatar_url,
-            children=[build_subtree(report) for report in direct_reports]
-        )
-    
-    return [build_subtree(user) for user in root_users]
-
 @router.get("/orgchart", response_model=dict)
 async def get_org_chart(
     department_id: Optional[int] = None,
+    root_id: Optional[int] = Query(None, description="Only return the subtree under this user"),
+    depth: Optional[int] = Query(None, ge=1, description="Levels to expand; deeper nodes only report child_count"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Get organization chart with hierarchical structure and unassigned employees"""
-    # Load all users with their departments
-    all_users = db.query(User).options(joinedload(User.department)).all()
-    
-    if not all_users:
-        return {"assigned": [], "unassigned": []}
-    
-    # If department filter is specified, find users in that department
-    # but also include their entire manager chain
-    if department_id:
-        dept_users = [u for u in all_users if u.department_id == department_id]
-        
-        # For each user in the department, walk up the manager chain
-        users_to_include = set()
-        for user in dept_users:
-            users_to_include.add(user.id)
-            # Walk up manager chain
-            current = user
-            while hasattr(current, 'manager_id') and current.manager_id:
-                manager = next((u for u in all_users if u.id == current.manager_id), None)
-                if manager:
-                    users_to_include.add(manager.id)
-                    current = manager
-                else:
-                    break
-        
-        # Filter to only users we need
-        users = [u for u in all_users if u.id in users_to_include]
-    else:
-        users = all_users
-    
-    if not users:
-        return {"assigned": [], "unassigned": []}
-    
-    # Separate assigned and unassigned employees
-    # Users with manager_id = None are root users (CEO/top level) and should be in the tree
-    # Only users with no department AND no manager are truly unassigned
-    assigned_users = []
-    unassigned_users = []
-    
-    # First, find users who are part of the hierarchy (have manager or have direct reports)
-    user_ids_with_reports = set()
-    for user in users:
-        if hasattr(user, 'manager_id') and user.manager_id is not None:
-            user_ids_with_reports.add(user.manager_id)
-    
-    for user in users:
-        has_manager = hasattr(user, 'manager_id') and user.manager_id is not None
-        has_reports = user.id in user_ids_with_reports
-        is_root = (not has_manager) and has_reports
-        
-        # User is assigned if they have a manager OR they are a root with reports (CEO)
-        if has_manager or is_root:
-            assigned_users.append(user)
-        else:
-            # Truly unassigned: no manager and no one reports to them
-            unassigned_users.append(user)
-    
-    # Build tree for assigned users (includes root users like CEO)
-    assigned_tree = build_org_tree(assigned_users)
-    
-    # Convert unassigned users to OrgChartNode format
-    unassigned_tree = []
-    for user in unassigned_users:
-        unassigned_tree.append(OrgChartNode(
-            id=str(user.id),
-            name=user.full_name,
-            title=user.job_role or "Employee",
-            department=user.department.name if user.department else None,
-            avatar_url=user.avatar_url,
-            children=[]
-        ))
-    
-    return {
-        "assigned": assigned_tree,
-        "unassigned": unassigned_tree
-    }
+    body = org_hierarchy.get_chart(db, department_id=department_id, root_id=root_id, depth=depth)
+    if body is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found in org chart"
+        )
+    # Served from the cached serialised tree
+    return Response(content=body, media_type="application/json")
+
+@router.get("/orgchart/{user_id}/children", response_model=List[OrgChartNode])
+async def get_org_chart_children(
+    user_id: int,
+    depth: int = Query(1, ge=1, le=10),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Direct reports of a user, for expanding a depth-limited chart on demand"""
+    children = org_hierarchy.get_children(db, user_id, depth)
+    if children is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+    return children
 
 @router.patch("/orgchart/reassign")
 async def reassign_user(
@@ -262,6 +183,7 @@ async def reassign_user(
             user.department_id = new_manager.department_id
     
     db.commit()
+    org_hierarchy.invalidate()
     db.refresh(user)
     
     print(f"✅ [BACKEND] Database committed. Final state: user {user.id} manager_id={user.manager_id if hasattr(user, 'manager_id') else 'N/A'}")
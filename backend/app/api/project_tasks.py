@@ -7,6 +7,7 @@ from app.models.project import Project
 from app.models.user import User
 from app.schemas.task import TaskCreate, TaskResponse, TaskReorderRequest, TaskAttachRequest
 from app.api.auth import get_current_user
+from app.services.suggest_index import suggest_index
 
 router = APIRouter()
 
@@ -54,6 +55,7 @@ async def create_task_in_project(
     db.add(db_task)
     db.commit()
     db.refresh(db_task)
+    suggest_index.upsert('task', db_task.id, None if db_task.is_private else db_task.title)
     
     return db_task
 
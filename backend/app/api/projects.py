@@ -7,6 +7,7 @@ from app.models.task import Task
 from app.models.user import User
 from app.schemas.project import ProjectCreate, ProjectUpdate, ProjectResponse, ProjectWithTasks
 from app.api.auth import get_current_user
+from app.services.suggest_index import suggest_index
 
 router = APIRouter()
 
@@ -32,6 +33,7 @@ async def create_project(
     db.add(project)
     db.commit()
     db.refresh(project)
+    suggest_index.upsert('project', project.id, project.title)
     
     return ProjectResponse(
         id=project.id,
@@ -170,6 +172,7 @@ async def update_project(
     
     db.commit()
     db.refresh(project)
+    suggest_index.upsert('project', project.id, project.title)
     
     # Get creator name
     creator = db.query(User).filter(User.id == project.created_by).first()
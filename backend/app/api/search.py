@@ -1,22 +1,25 @@
 """
 Universal search endpoint - Search across all resources in the system
 """
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
 from sqlalchemy import or_, func
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 import time
 
 from app.core.database import get_db
-from app.api.auth import get_current_user
+from app.core.security import verify_token
+from app.api.auth import get_current_user, oauth2_scheme
 from app.models.user import User
 from app.models.task import Task
 from app.models.project import Project
 from app.models.department import Department
 from app.models.feedback import Feedback
 from app.models.chat import ChatRoom
-from app.schemas.search import SearchResult, SearchResponse
+from app.schemas.search import SearchResult, SearchResponse, SuggestItem, SuggestResponse
+from app.services.search_index import search_index_service, INDEXED_ENTITIES
+from app.services.suggest_index import suggest_index
 
 router = APIRouter()
 
@@ -51,30 +54,146 @@ def calculate_relevance(text: str, query: str) -> float:
     return 0.0
 
 
-@router.get("/search", response_model=SearchResponse)
-async def universal_search(
-    q: str = Query(..., min_length=1, description="Search query"),
-    types: Optional[str] = Query(None, description="Comma-separated list of types to search (user,task,project,etc)"),
-    limit: int = Query(20, ge=1, le=100),
-    offset: int = Query(0, ge=0),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
+def user_result(user: User, relevance: float) -> SearchResult:
+    return SearchResult(
+        id=user.id,
+        type='user',
+        title=user.full_name,
+        subtitle=user.job_role or 'No role',
+        description=user.email,
+        avatar_url=user.avatar_url,
+        icon='user',
+        url=f'/people/{user.id}',
+        metadata={
+            'email': user.email,
+            'department_id': user.department_id,
+            'is_active': user.is_active
+        },
+        relevance_score=relevance
+    )
+
+
+def task_result(task: Task, relevance: float) -> SearchResult:
+    return SearchResult(
+        id=task.id,
+        type='task',
+        title=task.title,
+        subtitle=f'Status: {task.status}',
+        description=task.description[:100] if task.description else None,
+        icon='task',
+        url=f'/tasks/{task.id}',
+        metadata={
+            'status': task.status,
+            'priority': task.priority,
+            'due_date': task.due_date.isoformat() if task.due_date and hasattr(task.due_date, 'isoformat') else str(task.due_date) if task.due_date else None
+        },
+        relevance_score=relevance
+    )
+
+
+def project_result(project: Project, relevance: float) -> SearchResult:
+    return SearchResult(
+        id=project.id,
+        type='project',
+        title=project.title,
+        subtitle='Project',
+        description=project.description[:100] if project.description else None,
+        icon='project',
+        url=f'/projects/{project.id}',
+        metadata={
+            'created_at': project.created_at.isoformat() if project.created_at else None
+        },
+        relevance_score=relevance
+    )
+
+
+def department_result(dept: Department, relevance: float) -> SearchResult:
+    return SearchResult(
+        id=dept.id,
+        type='department',
+        title=dept.name,
+        subtitle='Department',
+        description=dept.description,
+        icon='department',
+        url=f'/people/org-chart?department={dept.id}',
+        metadata={
+            'description': dept.description
+        },
+        relevance_score=relevance
+    )
+
+
+def feedback_result(feedback: Feedback, relevance: float) -> SearchResult:
+    return SearchResult(
+        id=feedback.id,
+        type='feedback',
+        title=f'Feedback: {feedback.content[:50]}...',
+        subtitle=f'{feedback.sentiment_label if feedback.sentiment_label else "Neutral"}',
+        description=feedback.content[:100],
+        icon='feedback',
+        url=f'/feedback',
+        metadata={
+            'sentiment': feedback.sentiment_label if feedback.sentiment_label else None,
+            'is_anonymous': feedback.is_anonymous
+        },
+        relevance_score=relevance
+    )
+
+
+def chat_result(room: ChatRoom, relevance: float) -> SearchResult:
+    return SearchResult(
+        id=room.id,
+        type='chat',
+        title=room.name,
+        subtitle=f'Chat Room - {room.type}',
+        description=None,
+        icon='chat',
+        url=f'/chat?room={room.id}',
+        metadata={
+            'type': room.type
+        },
+        relevance_score=relevance
+    )
+
+
+RESULT_BUILDERS = {
+    'user': user_result,
+    'task': task_result,
+    'project': project_result,
+    'department': department_result,
+    'feedback': feedback_result,
+    'chat': chat_result,
+}
+
+
+def hydrate_results(db: Session, hits: List[tuple]) -> List[SearchResult]:
+    """Load the entities for a page of index hits with one IN query per type, preserving rank order"""
+    ids_by_type: Dict[str, List[int]] = {}
+    for entity_type, entity_id, _ in hits:
+        ids_by_type.setdefault(entity_type, []).append(entity_id)
+
+    entities = {}
+    for entity_type, ids in ids_by_type.items():
+        model = INDEXED_ENTITIES[entity_type][0]
+        for entity in db.query(model).filter(model.id.in_(ids)).all():
+            entities[(entity_type, entity.id)] = entity
+
+    results = []
+    for entity_type, entity_id, score in hits:
+        entity = entities.get((entity_type, entity_id))
+        if entity is not None:
+            results.append(RESULT_BUILDERS[entity_type](entity, round(score, 4)))
+    return results
+
+
+def scan_search(db: Session, q: str, search_types: List[str]) -> List[SearchResult]:
     """
-    Universal search across all resources.
-    Searches: Users, Tasks, Projects, Departments, Feedback, Chat Rooms.
+    Fallback used when no full-text index is available:
+    ILIKE scans capped at 10 rows per type, ranked in Python.
     """
-    start_time = time.time()
-    
-    # Parse types filter
-    search_types = types.split(',') if types else ['user', 'task', 'project', 'department', 'feedback', 'chat']
-    
     results: List[SearchResult] = []
-    results_by_type = {t: 0 for t in search_types}
-    
     search_pattern = f"%{q}%"
     
-    # Search Users
     if 'user' in search_types:
         users = db.query(User).filter(
             or_(
@@ -83,33 +202,14 @@ async def universal_search(
                 User.job_role.ilike(search_pattern)
             )
         ).limit(10).all()
-        
         for user in users:
             relevance = max(
                 calculate_relevance(user.full_name, q),
                 calculate_relevance(user.email, q),
                 calculate_relevance(user.job_role or '', q)
             )
-            
-            results.append(SearchResult(
-                id=user.id,
-                type='user',
-                title=user.full_name,
-                subtitle=user.job_role or 'No role',
-                description=user.email,
-                avatar_url=user.avatar_url,
-                icon='user',
-                url=f'/people/{user.id}',
-                metadata={
-                    'email': user.email,
-                    'department_id': user.department_id,
-                    'is_active': user.is_active
-                },
-                relevance_score=relevance
-            ))
-            results_by_type['user'] += 1
+            results.append(user_result(user, relevance))
     
-    # Search Tasks
     if 'task' in search_types:
         tasks = db.query(Task).filter(
             or_(
@@ -117,31 +217,13 @@ async def universal_search(
                 Task.description.ilike(search_pattern)
             )
         ).limit(10).all()
-        
         for task in tasks:
             relevance = max(
                 calculate_relevance(task.title, q),
                 calculate_relevance(task.description or '', q)
             )
-            
-            results.append(SearchResult(
-                id=task.id,
-                type='task',
-                title=task.title,
-                subtitle=f'Status: {task.status}',
-                description=task.description[:100] if task.description else None,
-                icon='task',
-                url=f'/tasks/{task.id}',
-                metadata={
-                    'status': task.status,
-                    'priority': task.priority,
-                    'due_date': task.due_date.isoformat() if task.due_date and hasattr(task.due_date, 'isoformat') else str(task.due_date) if task.due_date else None
-                },
-                relevance_score=relevance
-            ))
-            results_by_type['task'] += 1
+            results.append(task_result(task, relevance))
     
-    # Search Projects
     if 'project' in search_types:
         projects = db.query(Project).filter(
             or_(
@@ -149,29 +231,13 @@ async def universal_search(
                 Project.description.ilike(search_pattern)
             )
         ).limit(10).all()
-        
         for project in projects:
             relevance = max(
                 calculate_relevance(project.title, q),
                 calculate_relevance(project.description or '', q)
             )
-            
-            results.append(SearchResult(
-                id=project.id,
-                type='project',
-                title=project.title,
-                subtitle='Project',
-                description=project.description[:100] if project.description else None,
-                icon='project',
-                url=f'/projects/{project.id}',
-                metadata={
-                    'created_at': project.created_at.isoformat() if project.created_at else None
-                },
-                relevance_score=relevance
-            ))
-            results_by_type['project'] += 1
+            results.append(project_result(project, relevance))
     
-    # Search Departments
     if 'department' in search_types:
         departments = db.query(Department).filter(
             or_(
@@ -179,83 +245,69 @@ async def universal_search(
                 Department.description.ilike(search_pattern)
             )
         ).limit(10).all()
-        
         for dept in departments:
             relevance = max(
                 calculate_relevance(dept.name, q),
                 calculate_relevance(dept.description or '', q)
             )
-            
-            results.append(SearchResult(
-                id=dept.id,
-                type='department',
-                title=dept.name,
-                subtitle='Department',
-                description=dept.description,
-                icon='department',
-                url=f'/people/org-chart?department={dept.id}',
-                metadata={
-                    'description': dept.description
-                },
-                relevance_score=relevance
-            ))
-            results_by_type['department'] += 1
+            results.append(department_result(dept, relevance))
     
-    # Search Feedback
-    if 'feedback' in search_types and (current_user.is_admin or current_user.role == 'admin'):
+    if 'feedback' in search_types:
         feedback_items = db.query(Feedback).filter(
             Feedback.content.ilike(search_pattern)
         ).limit(10).all()
-        
         for feedback in feedback_items:
-            relevance = calculate_relevance(feedback.content, q)
-            
-            results.append(SearchResult(
-                id=feedback.id,
-                type='feedback',
-                title=f'Feedback: {feedback.content[:50]}...',
-                subtitle=f'{feedback.sentiment_label if feedback.sentiment_label else "Neutral"}',
-                description=feedback.content[:100],
-                icon='feedback',
-                url=f'/feedback',
-                metadata={
-                    'sentiment': feedback.sentiment_label if feedback.sentiment_label else None,
-                    'is_anonymous': feedback.is_anonymous
-                },
-                relevance_score=relevance
-            ))
-            results_by_type['feedback'] += 1
+            results.append(feedback_result(feedback, calculate_relevance(feedback.content, q)))
     
-    # Search Chat Rooms
     if 'chat' in search_types:
         chat_rooms = db.query(ChatRoom).filter(
             ChatRoom.name.ilike(search_pattern)
         ).limit(10).all()
-        
         for room in chat_rooms:
-            relevance = calculate_relevance(room.name, q)
-            
-            results.append(SearchResult(
-                id=room.id,
-                type='chat',
-                title=room.name,
-                subtitle=f'Chat Room - {room.type}',
-                description=None,
-                icon='chat',
-                url=f'/chat?room={room.id}',
-                metadata={
-                    'type': room.type
-                },
-                relevance_score=relevance
-            ))
-            results_by_type['chat'] += 1
+            results.append(chat_result(room, calculate_relevance(room.name, q)))
     
-    # Sort by relevance score
     results.sort(key=lambda x: x.relevance_score, reverse=True)
+    return results
+
+
+@router.get("/search", response_model=SearchResponse)
+async def universal_search(
+    q: str = Query(..., min_length=1, description="Search query"),
+    types: Optional[str] = Query(None, description="Comma-separated list of types to search (user,task,project,etc)"),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Universal search across all resources.
+    Searches: Users, Tasks, Projects, Departments, Feedback, Chat Rooms.
+    
+    Results come from the full-text index ranked by BM25 (ts_rank_cd on
+    PostgreSQL); every query term is prefix-matched so the endpoint also
+    works for type-ahead. Pagination and counts are over the full result set.
+    """
+    start_time = time.time()
+    
+    # Parse types filter
+    search_types = types.split(',') if types else ['user', 'task', 'project', 'department', 'feedback', 'chat']
+    search_types = [t.strip() for t in search_types if t.strip() in RESULT_BUILDERS]
+    
+    # Feedback is only searchable by admins
+    if not (current_user.is_admin or current_user.role == 'admin'):
+        search_types = [t for t in search_types if t != 'feedback']
     
-    # Apply pagination
-    total_results = len(results)
-    results = results[offset:offset + limit]
+    if search_index_service.available:
+        hits, results_by_type = search_index_service.search(db, q, search_types, limit, offset)
+        results = hydrate_results(db, hits)
+        total_results = sum(results_by_type.values())
+    else:
+        results = scan_search(db, q, search_types)
+        results_by_type = {t: 0 for t in search_types}
+        for result in results:
+            results_by_type[result.type] += 1
+        total_results = len(results)
+        results = results[offset:offset + limit]
     
     execution_time = (time.time() - start_time) * 1000  # Convert to milliseconds
     
@@ -267,3 +319,77 @@ async def universal_search(
         execution_time_ms=round(execution_time, 2)
     )
 
+
+def get_token_claims(token: str = Depends(oauth2_scheme)) -> dict:
+    """Validate the bearer token without a database round-trip"""
+    payload = verify_token(token)
+    if payload is None or payload.get("sub") is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return payload
+
+
+@router.get("/search/suggest", response_model=SuggestResponse)
+async def search_suggest(
+    q: str = Query(..., min_length=1, description="Prefix typed so far"),
+    types: Optional[str] = Query(None, description="Comma-separated list of types (user,task,project,department,chat)"),
+    limit: int = Query(10, ge=1, le=50),
+    claims: dict = Depends(get_token_claims)
+):
+    """
+    Type-ahead suggestions for the command palette.
+    Answered entirely from the in-memory prefix index.
+    """
+    start_time = time.perf_counter()
+    
+    search_types = [t.strip() for t in types.split(',')] if types else None
+    suggestions = suggest_index.suggest(q, search_types, limit)
+    
+    return SuggestResponse(
+        query=q,
+        suggestions=[SuggestItem(**s) for s in suggestions],
+        execution_time_ms=round((time.perf_counter() - start_time) * 1000, 3)
+    )
+
+
+@router.post("/search/suggest/rebuild")
+async def rebuild_suggest_index(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Rebuild the type-ahead index from the database (admin only)"""
+    if not (current_user.is_admin or current_user.role == 'admin'):
+        raise HTTPException(status_code=403, detail="Only admins can rebuild the suggest index")
+    
+    counts = suggest_index.rebuild(db)
+    return {"indexed": counts, "total": sum(counts.values())}
+
+
+@router.get("/search/suggest/stats")
+async def get_suggest_index_stats(
+    current_user: User = Depends(get_current_user)
+):
+    """Memory usage and lookup latency of the type-ahead index (admin only)"""
+    if not (current_user.is_admin or current_user.role == 'admin'):
+        raise HTTPException(status_code=403, detail="Only admins can view suggest index stats")
+    
+    return suggest_index.memory_report()
+
+
+@router.post("/search/reindex")
+async def rebuild_search_index(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Rebuild the full-text index from the source tables (admin only)"""
+    if not (current_user.is_admin or current_user.role == 'admin'):
+        raise HTTPException(status_code=403, detail="Only admins can rebuild the search index")
+    if not search_index_service.available:
+        raise HTTPException(status_code=400, detail="Full-text search index is not available on this database")
+    
+    counts = search_index_service.rebuild(db.connection())
+    db.commit()
+    return {"indexed": counts, "total": sum(counts.values())}
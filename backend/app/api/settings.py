@@ -4,6 +4,7 @@ Admin-only endpoints for managing organization-wide settings.
 """
 
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from app.core.database import get_db
@@ -92,14 +93,14 @@ def update_org_settings(
     
     return settings
 
-# Helper functions for time tracking
-def check_breaks_allowed(db: Session) -> bool:
+# Helper functions for time tracking (async session, see get_async_db)
+async def check_breaks_allowed(db: AsyncSession) -> bool:
     """Check if breaks are allowed in organization settings."""
-    settings = get_organization_settings(db)
+    settings = await db.run_sync(get_organization_settings)
     return settings.allow_breaks
 
-def check_documentation_required(db: Session) -> bool:
+async def check_documentation_required(db: AsyncSession) -> bool:
     """Check if documentation is required when clocking out."""
-    settings = get_organization_settings(db)
+    settings = await db.run_sync(get_organization_settings)
     return settings.require_documentation
 
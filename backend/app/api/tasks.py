@@ -9,6 +9,7 @@ from app.models.project import Project
 from app.schemas.task import TaskResponse, TaskCreate, TaskUpdate
 from app.api.auth import get_current_user
 from app.services.notification_service import notification_service
+from app.services.suggest_index import suggest_index
 
 router = APIRouter()
 
@@ -76,6 +77,7 @@ async def create_task(
     db.add(db_task)
     db.commit()
     db.refresh(db_task)
+    suggest_index.upsert('task', db_task.id, None if db_task.is_private else db_task.title)
     
     # Send notification to assignee if task is assigned
     if task.assignee_id and task.assignee_id != current_user.id:
@@ -88,14 +90,11 @@ async def create_task(
                     'task_title': db_task.title,
                     'task_id': db_task.id,
                     'assigner_name': current_user.full_name
-                }
+                },
+                # Delivered in the background from the notification outbox
+                channels=('email', 'push')
             )
             
-            # Send email and push notifications
-            notification = notification_service.get_user_notifications(db, task.assignee_id, limit=1)[0]
-            notification_service.send_email_notification(db, task.assignee_id, notification)
-            notification_service.send_push_notification(db, task.assignee_id, notification)
-            
         except Exception as e:
             print(f"⚠️ Failed to send task assignment notification: {e}")
     
@@ -158,6 +157,7 @@ async def update_task(
     
     db.commit()
     db.refresh(task)
+    suggest_index.upsert('task', task.id, None if task.is_private else task.title)
     
     # Send notifications for status changes
     if "status" in update_data:
@@ -221,4 +221,5 @@ async def delete_task(
     
     db.delete(task)
     db.commit()
+    suggest_index.remove('task', task_id)
     return {"message": "Task deleted successfully"}
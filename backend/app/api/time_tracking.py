@@ -1,22 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, WebSocket, WebSocketDisconnect
 from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime
-import csv
-import io
-from app.core.database import get_db
-from app.api.auth import get_current_user
+import json
+from app.core.database import get_db, get_async_db, AsyncSessionLocal
+from app.core.security import verify_token
+from app.core.roles import UserRole
+from app.api.auth import get_current_user_async
 from app.models.user import User
 from app.core.rbac import admin_only, manager_or_admin
 from app.schemas.time_entry import (
     TimeEntryResponse,
     ActiveUserResponse,
     TimeEntryRecordResponse,
+    TimeRecordSummaryResponse,
     TimeTrackingStatusResponse,
     UserWithStatusResponse
 )
 from app.services.time_tracking_service import TimeTrackingService
+from app.services.presence_index import presence_index, presence_status
+from app.services.time_export import EXPORT_FORMATS, iter_export_rows, require_pyarrow, stream_export
+from app.utils.websocket_manager import manager
 from app.api.settings import check_breaks_allowed, check_documentation_required
 
 
@@ -26,84 +33,84 @@ router = APIRouter()
 @router.post("/clock-in", response_model=TimeEntryResponse)
 async def clock_in(
     is_terrain: bool = False,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Clock in the current user"""
-    entry = TimeTrackingService.clock_in(db, current_user.id, is_terrain)
+    entry = await TimeTrackingService.clock_in(db, current_user.id, is_terrain)
     return entry
 
 
 @router.post("/clock-out", response_model=TimeEntryResponse)
 async def clock_out(
     work_summary: Optional[str] = None,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Clock out the current user"""
     # Check if documentation is required
-    if check_documentation_required(db):
+    if await check_documentation_required(db):
         if not work_summary or not work_summary.strip():
             raise HTTPException(
                 status_code=400,
                 detail="Work summary is required when clocking out"
             )
     
-    entry = TimeTrackingService.clock_out(db, current_user.id, work_summary)
+    entry = await TimeTrackingService.clock_out(db, current_user.id, work_summary)
     return entry
 
 
 @router.post("/start-break", response_model=TimeEntryResponse)
 async def start_break(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Start a break for the current user"""
     # Check if breaks are allowed
-    if not check_breaks_allowed(db):
+    if not await check_breaks_allowed(db):
         raise HTTPException(
             status_code=403,
             detail="Breaks are currently disabled by organization settings"
         )
     
-    entry = TimeTrackingService.start_break(db, current_user.id)
+    entry = await TimeTrackingService.start_break(db, current_user.id)
     return entry
 
 
 @router.post("/end-break", response_model=TimeEntryResponse)
 async def end_break(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """End a break for the current user"""
     # Check if breaks are allowed
-    if not check_breaks_allowed(db):
+    if not await check_breaks_allowed(db):
         raise HTTPException(
             status_code=403,
             detail="Breaks are currently disabled by organization settings"
         )
     
-    entry = TimeTrackingService.end_break(db, current_user.id)
+    entry = await TimeTrackingService.end_break(db, current_user.id)
     return entry
 
 
 @router.post("/terrain", response_model=TimeEntryResponse)
 async def toggle_terrain(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Toggle terrain work status for the current user"""
-    entry = TimeTrackingService.toggle_terrain(db, current_user.id)
+    entry = await TimeTrackingService.toggle_terrain(db, current_user.id)
     return entry
 
 
 @router.get("/status", response_model=TimeTrackingStatusResponse)
 async def get_status(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Get current time tracking status for the user"""
-    status = TimeTrackingService.get_current_status(db, current_user.id)
+    status = await TimeTrackingService.get_current_status(db, current_user.id)
     return status
 
 
@@ -137,94 +144,177 @@ async def get_all_users_with_status(
     return users
 
 
+@router.websocket("/ws/attendance")
+async def attendance_websocket(
+    websocket: WebSocket,
+    token: str
+):
+    """
+    Live attendance board - Manager or Admin.
+    Sends {"type": "snapshot", "users": [...]} with every clocked-in user on
+    connect, then {"type": "presence", "user_id": ..., "is_clocked_in": ...,
+    "is_on_break": ..., "is_terrain": ..., "clock_in": ...,
+    "current_duration_minutes": ...} whenever a user's status changes.
+    """
+    payload = verify_token(token)
+    if not payload:
+        await websocket.close(code=1008, reason="Invalid token")
+        return
+    
+    async with AsyncSessionLocal() as db:
+        user = (await db.execute(select(User).where(User.email == payload.get("sub")))).scalars().first()
+        if not user or not user.is_active:
+            await websocket.close(code=1008, reason="User not found")
+            return
+        if user.role not in [UserRole.ADMIN.value, UserRole.MANAGER.value]:
+            await websocket.close(code=1008, reason="Access denied")
+            return
+    
+    await manager.connect_attendance(websocket, {"user_id": user.id, "full_name": user.full_name})
+    manager.send_to_socket(websocket, {
+        "type": "snapshot",
+        "users": [
+            {"user_id": user_id, **presence_status(presence)}
+            for user_id, presence in presence_index.open_entries().items()
+        ]
+    })
+    
+    try:
+        while True:
+            # Nothing is expected from the client beyond keep-alive pings
+            data = await websocket.receive_text()
+            try:
+                is_ping = json.loads(data).get("type") == "ping"
+            except (ValueError, AttributeError):
+                is_ping = False
+            if is_ping:
+                manager.send_to_socket(websocket, {"type": "pong"})
+    except WebSocketDisconnect:
+        manager.disconnect(websocket)
+    except Exception as e:
+        print(f"Attendance WebSocket error: {e}")
+        manager.disconnect(websocket)
+
+
 @router.get("/records", response_model=List[TimeEntryRecordResponse])
 async def get_time_records(
+    response: Response,
     start_date: Optional[str] = Query(None, description="Start date (ISO format)"),
     end_date: Optional[str] = Query(None, description="End date (ISO format)"),
     user_id: Optional[int] = Query(None, description="Filter by user ID"),
     department_id: Optional[int] = Query(None, description="Filter by department ID"),
     is_terrain: Optional[bool] = Query(None, description="Filter by terrain work"),
+    sort_by: str = Query("clock_in", pattern="^(clock_in|worked_hours|user_name)$"),
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Page size (all records if omitted)"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor from the previous page"),
     db: Session = Depends(get_db),
     current_user: User = Depends(manager_or_admin)
 ):
-    """Get time tracking records with filters - Manager or Admin"""
+    """
+    Get time tracking records with filters - Manager or Admin
+    
+    With a limit, X-Next-Cursor is set whenever the page is full; pass it
+    back as `cursor` (with the same filters and sort) for the next page.
+    """
     
     # Parse dates
     start_dt = datetime.fromisoformat(start_date) if start_date else None
     end_dt = datetime.fromisoformat(end_date) if end_date else None
     
-    records = TimeTrackingService.get_time_records(
+    records, next_cursor = TimeTrackingService.get_time_records_page(
         db=db,
         start_date=start_dt,
         end_date=end_dt,
         user_id=user_id,
         department_id=department_id,
-        is_terrain=is_terrain
+        is_terrain=is_terrain,
+        sort_by=sort_by,
+        order=order,
+        limit=limit,
+        cursor=cursor
     )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     
     return records
 
 
-@router.get("/export")
-async def export_time_records(
+@router.get("/records/summary", response_model=List[TimeRecordSummaryResponse])
+async def get_time_records_summary(
+    group_by: str = Query("week", pattern="^(user|day|week)$", description="'user', 'day' or 'week'"),
     start_date: Optional[str] = Query(None, description="Start date (ISO format)"),
     end_date: Optional[str] = Query(None, description="End date (ISO format)"),
     user_id: Optional[int] = Query(None, description="Filter by user ID"),
     department_id: Optional[int] = Query(None, description="Filter by department ID"),
     is_terrain: Optional[bool] = Query(None, description="Filter by terrain work"),
     db: Session = Depends(get_db),
-    current_user: User = Depends(admin_only)
+    current_user: User = Depends(manager_or_admin)
 ):
-    """Export time tracking records to CSV - Admin only"""
+    """
+    Worked hours, break minutes and weekly overtime (above 40h) per user,
+    per user and day, or per user and ISO week - Manager or Admin
+    """
     
     # Parse dates
     start_dt = datetime.fromisoformat(start_date) if start_date else None
     end_dt = datetime.fromisoformat(end_date) if end_date else None
     
-    records = TimeTrackingService.get_time_records(
+    return TimeTrackingService.get_time_summary(
         db=db,
+        group_by=group_by,
         start_date=start_dt,
         end_date=end_dt,
         user_id=user_id,
         department_id=department_id,
         is_terrain=is_terrain
     )
+
+
+@router.get("/export")
+async def export_time_records(
+    start_date: Optional[str] = Query(None, description="Start date (ISO format)"),
+    end_date: Optional[str] = Query(None, description="End date (ISO format)"),
+    user_id: Optional[int] = Query(None, description="Filter by user ID"),
+    department_id: Optional[int] = Query(None, description="Filter by department ID"),
+    is_terrain: Optional[bool] = Query(None, description="Filter by terrain work"),
+    format: str = Query("csv", pattern="^(csv|csv\\.gz|parquet|arrow)$", description="'csv', 'csv.gz', 'parquet' or 'arrow'"),
+    current_user: User = Depends(admin_only)
+):
+    """
+    Export time tracking records - Admin only
+    
+    Streamed straight from the database cursor, so large exports do not
+    build up in memory. 'parquet' and 'arrow' need pyarrow installed.
+    """
+    if format in ("parquet", "arrow"):
+        try:
+            require_pyarrow()
+        except ImportError:
+            raise HTTPException(
+                status_code=400,
+                detail=f"{format} export requires pyarrow, which is not installed"
+            )
     
-    # Create CSV
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Write header
-    writer.writerow([
-        'Employee Name',
-        'Department',
-        'Clock In',
-        'Clock Out',
-        'Total Worked Hours',
-        'Break Duration (minutes)',
-        'Terrain Work'
-    ])
-    
-    # Write data
-    for record in records:
-        writer.writerow([
-            record.user_name,
-            record.department_name or 'N/A',
-            record.clock_in.strftime('%Y-%m-%d %H:%M:%S'),
-            record.clock_out.strftime('%Y-%m-%d %H:%M:%S') if record.clock_out else 'Still working',
-            f"{record.total_worked_hours:.2f}" if record.total_worked_hours else 'N/A',
-            record.break_duration_minutes or 0,
-            'Yes' if record.is_terrain else 'No'
-        ])
+    # Parse dates
+    start_dt = datetime.fromisoformat(start_date) if start_date else None
+    end_dt = datetime.fromisoformat(end_date) if end_date else None
+    
+    batches = iter_export_rows(
+        start_date=start_dt,
+        end_date=end_dt,
+        user_id=user_id,
+        department_id=department_id,
+        is_terrain=is_terrain
+    )
     
     # Prepare response
-    output.seek(0)
+    media_type, extension = EXPORT_FORMATS[format]
     timestamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
-    filename = f"time_tracking_export_{timestamp}.csv"
+    filename = f"time_tracking_export_{timestamp}.{extension}"
     
     return StreamingResponse(
-        iter([output.getvalue()]),
-        media_type="text/csv",
+        stream_export(batches, format),
+        media_type=media_type,
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
-
@@ -6,6 +6,7 @@ from app.models.user import User
 from app.schemas.user import UserResponse, UserCreate, UserUpdate
 from app.core.security import get_password_hash
 from app.api.auth import get_current_user
+from app.services.suggest_index import suggest_index
 
 router = APIRouter()
 
@@ -66,6 +67,7 @@ async def create_user(
     db.add(user)
     db.commit()
     db.refresh(user)
+    suggest_index.upsert('user', user.id, user.full_name)
     return user
 
 @router.get("/for-tasks", response_model=List[UserResponse])
@@ -119,6 +121,7 @@ async def update_user(
     
     db.commit()
     db.refresh(user)
+    suggest_index.upsert('user', user.id, user.full_name)
     return user
 
 @router.delete("/{user_id}")
@@ -140,4 +143,5 @@ async def delete_user(
     
     db.delete(user)
     db.commit()
+    suggest_index.remove('user', user_id)
     return {"message": "User deleted successfully"}
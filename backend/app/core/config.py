@@ -5,7 +5,20 @@ import os
 class Settings(BaseSettings):
     # Database
     database_url: str = os.getenv("DATABASE_URL", "sqlite:///./hr_app.db")
-    
+
+    # Connection pool (PostgreSQL and file-backed SQLite)
+    db_pool_size: int = int(os.getenv("DB_POOL_SIZE", "5"))
+    db_max_overflow: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    db_pool_timeout: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    db_pool_recycle: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    db_pool_pre_ping: bool = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+
+    # SQLite connection pragmas: how long a writer waits for the lock, and
+    # the page cache / memory-mapped I/O sizes
+    sqlite_busy_timeout_ms: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    sqlite_cache_size_kb: int = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+    sqlite_mmap_size_mb: int = int(os.getenv("SQLITE_MMAP_SIZE_MB", "256"))
+
     # JWT
     secret_key: str = os.getenv("SECRET_KEY", "your-secret-key-change-this-in-production")
     algorithm: str = "HS256"
@@ -14,6 +27,85 @@ class Settings(BaseSettings):
     # CORS
     cors_origins: list = []
     
+    # Chat fan-out between workers: "memory", "redis" or "table"
+    chat_backplane: str = os.getenv("CHAT_BACKPLANE", "memory")
+    chat_backplane_url: str = os.getenv("CHAT_BACKPLANE_URL", "redis://127.0.0.1:6379")
+    chat_backplane_poll_interval: float = float(os.getenv("CHAT_BACKPLANE_POLL_INTERVAL", "0.25"))
+    chat_backplane_retention_seconds: int = int(os.getenv("CHAT_BACKPLANE_RETENTION_SECONDS", "300"))
+    # Table backplane: ids below the newest seen are re-read this long, for
+    # rows whose transactions committed out of id order
+    chat_backplane_late_commit_seconds: float = float(os.getenv("CHAT_BACKPLANE_LATE_COMMIT_SECONDS", "10"))
+    
+    # Per-socket outbound queues: typing events are dropped once a client is
+    # this far behind, and the client is disconnected at the second limit
+    ws_drop_typing_queue_depth: int = int(os.getenv("WS_DROP_TYPING_QUEUE_DEPTH", "16"))
+    ws_max_queued_messages: int = int(os.getenv("WS_MAX_QUEUED_MESSAGES", "256"))
+    
+    # Scheduled KPI job: "incremental" recomputes only users whose daily
+    # rollups changed, "full" recomputes every active user
+    kpi_calculation_mode: str = os.getenv("KPI_CALCULATION_MODE", "incremental")
+    # Users are split into partitions ("id_range" or "department") of at most
+    # kpi_job_partition_size users, run on a "thread" or "process" pool
+    kpi_job_executor: str = os.getenv("KPI_JOB_EXECUTOR", "thread")
+    kpi_job_workers: int = int(os.getenv("KPI_JOB_WORKERS", "4"))
+    kpi_job_partition_by: str = os.getenv("KPI_JOB_PARTITION_BY", "id_range")
+    kpi_job_partition_size: int = int(os.getenv("KPI_JOB_PARTITION_SIZE", "250"))
+
+    # Email/push delivery from the notification outbox. Transports: "log"
+    # (print only), "memory" (kept in-process, for tests), "smtp" / "http"
+    notification_dispatcher_enabled: bool = os.getenv("NOTIFICATION_DISPATCHER_ENABLED", "true").lower() == "true"
+    notification_email_transport: str = os.getenv("NOTIFICATION_EMAIL_TRANSPORT", "log")
+    notification_push_transport: str = os.getenv("NOTIFICATION_PUSH_TRANSPORT", "log")
+    notification_email_from: str = os.getenv("NOTIFICATION_EMAIL_FROM", "noreply@company.com")
+    smtp_host: str = os.getenv("SMTP_HOST", "127.0.0.1")
+    smtp_port: int = int(os.getenv("SMTP_PORT", "1025"))
+    smtp_username: Optional[str] = os.getenv("SMTP_USERNAME")
+    smtp_password: Optional[str] = os.getenv("SMTP_PASSWORD")
+    smtp_use_tls: bool = os.getenv("SMTP_USE_TLS", "false").lower() == "true"
+    push_gateway_url: str = os.getenv("PUSH_GATEWAY_URL", "http://127.0.0.1:8025/push")
+    # Rows claimed per poll, concurrent SMTP connections / push requests,
+    # and retry schedule (retry_base_seconds * 2^attempt, capped)
+    notification_dispatch_batch_size: int = int(os.getenv("NOTIFICATION_DISPATCH_BATCH_SIZE", "200"))
+    notification_dispatch_poll_interval: float = float(os.getenv("NOTIFICATION_DISPATCH_POLL_INTERVAL", "1.0"))
+    notification_email_concurrency: int = int(os.getenv("NOTIFICATION_EMAIL_CONCURRENCY", "2"))
+    notification_push_concurrency: int = int(os.getenv("NOTIFICATION_PUSH_CONCURRENCY", "4"))
+    notification_max_attempts: int = int(os.getenv("NOTIFICATION_MAX_ATTEMPTS", "5"))
+    notification_retry_base_seconds: float = float(os.getenv("NOTIFICATION_RETRY_BASE_SECONDS", "5"))
+    notification_retry_max_seconds: float = float(os.getenv("NOTIFICATION_RETRY_MAX_SECONDS", "900"))
+
+    # Unread-notification counters: "memory" (per worker; counts another
+    # worker changes are dropped and recounted) or "redis" (shared by all
+    # workers; entries expire after the TTL and are recounted)
+    notification_counter_store: str = os.getenv("NOTIFICATION_COUNTER_STORE", "memory")
+    notification_counter_store_url: str = os.getenv("NOTIFICATION_COUNTER_STORE_URL", "redis://127.0.0.1:6379")
+    notification_counter_ttl_seconds: int = int(os.getenv("NOTIFICATION_COUNTER_TTL_SECONDS", "300"))
+
+    # Custom moderation wordlist (JSON with "profanity", "severe" and
+    # "allow" lists), re-read when the file changes
+    moderation_wordlist_path: str = os.getenv("MODERATION_WORDLIST_PATH", "./moderation_wordlist.json")
+    moderation_reload_interval: float = float(os.getenv("MODERATION_RELOAD_INTERVAL", "5"))
+
+    # Feedback keyword counts: "immediate" (upserted with the request) or
+    # "deferred" (buffered per worker, flushed on an interval or when full)
+    keyword_tracking_mode: str = os.getenv("KEYWORD_TRACKING_MODE", "immediate")
+    keyword_flush_interval: float = float(os.getenv("KEYWORD_FLUSH_INTERVAL", "10"))
+    keyword_flush_max_pending: int = int(os.getenv("KEYWORD_FLUSH_MAX_PENDING", "5000"))
+
+    # Admin feedback insights are cached per window for this long
+    feedback_insights_cache_ttl_seconds: float = float(os.getenv("FEEDBACK_INSIGHTS_CACHE_TTL_SECONDS", "60"))
+
+    # Attendance presence index: reloaded from time_entries once older than
+    # this, to pick up writes made outside the time tracking service
+    presence_resync_seconds: float = float(os.getenv("PRESENCE_RESYNC_SECONDS", "300"))
+
+    # Office booking availability engine: reloaded from meeting_bookings once
+    # older than this, to pick up writes made outside the booking API
+    booking_availability_resync_seconds: float = float(os.getenv("BOOKING_AVAILABILITY_RESYNC_SECONDS", "300"))
+
+    # Org chart cache: dropped once older than this, to pick up writes made
+    # outside the ORM (other workers' commits arrive as invalidation events)
+    org_chart_resync_seconds: float = float(os.getenv("ORG_CHART_RESYNC_SECONDS", "300"))
+
     class Config:
         env_file = ".env"
     
@@ -1,21 +1,164 @@
-from sqlalchemy import create_engine
+import time
+from collections import deque
+from typing import Dict, Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from app.core.config import settings
 
-# Configure engine based on database type
-# SQLite needs check_same_thread=False, PostgreSQL doesn't support it
-if settings.database_url.startswith("sqlite"):
-    engine = create_engine(
-        settings.database_url, 
-        connect_args={"check_same_thread": False}
-    )
-else:
-    # PostgreSQL or other databases
-    engine = create_engine(settings.database_url)
+
+class PoolMetrics:
+    """Checkout counts and time spent waiting for a pooled connection"""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_ms = deque(maxlen=2000)
+
+    def record_wait(self, wait_ms: float):
+        self.checkouts += 1
+        self.wait_ms.append(wait_ms)
+
+    def snapshot(self) -> dict:
+        waits = sorted(self.wait_ms)
+
+        def percentile(p: float) -> Optional[float]:
+            if not waits:
+                return None
+            return round(waits[min(len(waits) - 1, int(len(waits) * p))], 3)
+
+        return {
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "wait_ms": {
+                "samples": len(waits),
+                "p50": percentile(0.50),
+                "p99": percentile(0.99),
+                "max": round(waits[-1], 3) if waits else None,
+            },
+        }
+
+
+pool_metrics: Dict[str, PoolMetrics] = {"sync": PoolMetrics(), "async": PoolMetrics()}
+
+
+class _TimedCheckoutMixin:
+    """Records how long each checkout waited for a connection"""
+    metrics_name = "sync"
+
+    def _do_get(self):
+        metrics = pool_metrics[self.metrics_name]
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            metrics.timeouts += 1
+            raise
+        metrics.record_wait((time.perf_counter() - started) * 1000)
+        return connection
+
+
+class TimedQueuePool(_TimedCheckoutMixin, QueuePool):
+    metrics_name = "sync"
+
+
+class TimedAsyncQueuePool(_TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    metrics_name = "async"
+
+
+def _configure_sqlite_connection(dbapi_connection, connection_record):
+    """
+    Per-connection SQLite tuning. WAL lets readers proceed while one writer
+    commits, and busy_timeout makes a second writer wait for the lock
+    instead of failing with "database is locked".
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={settings.sqlite_busy_timeout_ms}")
+    # Negative cache_size is in KiB rather than pages
+    cursor.execute(f"PRAGMA cache_size=-{settings.sqlite_cache_size_kb}")
+    cursor.execute(f"PRAGMA mmap_size={settings.sqlite_mmap_size_mb * 1024 * 1024}")
+    cursor.close()
+
+
+def create_database_engine(database_url: str, use_async: bool = False):
+    """Build the sync or async engine with pool settings and SQLite pragmas applied"""
+    is_sqlite = database_url.startswith("sqlite")
+    in_memory = is_sqlite and (":memory:" in database_url or database_url.split("://", 1)[1] in ("", "/"))
+    kwargs = {}
+
+    # SQLite needs check_same_thread=False, PostgreSQL doesn't support it
+    if is_sqlite and not use_async:
+        kwargs["connect_args"] = {"check_same_thread": False}
+
+    # In-memory SQLite keeps SQLAlchemy's single-connection pool
+    if not in_memory:
+        kwargs.update(
+            poolclass=TimedAsyncQueuePool if use_async else TimedQueuePool,
+            pool_size=settings.db_pool_size,
+            max_overflow=settings.db_max_overflow,
+            pool_timeout=settings.db_pool_timeout,
+        )
+        if not is_sqlite:
+            kwargs.update(
+                pool_recycle=settings.db_pool_recycle,
+                pool_pre_ping=settings.db_pool_pre_ping,
+            )
+
+    if use_async:
+        engine = create_async_engine(get_async_database_url(database_url), **kwargs)
+        if is_sqlite:
+            event.listen(engine.sync_engine, "connect", _configure_sqlite_connection)
+    else:
+        engine = create_engine(database_url, **kwargs)
+        if is_sqlite:
+            event.listen(engine, "connect", _configure_sqlite_connection)
+    return engine
+
+
+def get_async_database_url(database_url: str) -> str:
+    """Map a sync database URL onto its asyncio driver (aiosqlite / asyncpg)"""
+    if database_url.startswith("sqlite:"):
+        return database_url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    if database_url.startswith("postgres://"):
+        return database_url.replace("postgres://", "postgresql+asyncpg://", 1)
+    if database_url.startswith("postgresql://") or database_url.startswith("postgresql+psycopg2://"):
+        return "postgresql+asyncpg://" + database_url.split("://", 1)[1]
+    return database_url
+
+
+engine = create_database_engine(settings.database_url)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine for handlers that must not block the event loop (chat, notifications, time tracking)
+async_engine = create_database_engine(settings.database_url, use_async=True)
+
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+
+def get_pool_status() -> dict:
+    """Current pool occupancy plus checkout wait statistics for both engines"""
+    status = {}
+    for name, pool in (("sync", engine.pool), ("async", async_engine.pool)):
+        entry = {"pool_class": type(pool).__name__}
+        if isinstance(pool, QueuePool):
+            entry.update({
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                "overflow": max(0, pool.overflow()),
+                "max_overflow": pool._max_overflow,
+            })
+        entry.update(pool_metrics[name].snapshot())
+        status[name] = entry
+    return status
+
 Base = declarative_base()
 
 def get_db():
@@ -25,6 +168,10 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
 def init_database():
     """Initialize database with all models"""
     # Import all models to ensure they're registered
@@ -32,7 +179,7 @@ def init_database():
     from app.models.department import Department
     from app.models.task import Task
     from app.models.project import Project
-    from app.models.chat import ChatRoom, Message
+    from app.models.chat import ChatRoom, Message, ChatEvent
     from app.models.role import Role, Permission
     from app.models.time_entry import TimeEntry
     from app.models.feedback import Feedback
@@ -43,13 +190,13 @@ def init_database():
     from app.models.session import UserSession
     from app.models.performance import (
         PerformanceObjective, PerformanceKeyResult, ReviewCycle,
-        ReviewQuestion, ReviewResponse, Competency, CompetencyScore, KpiSnapshot
+        ReviewQuestion, ReviewResponse, Competency, CompetencyScore, KpiSnapshot, KpiDailyRollup
     )
     from app.models.notification import (
         InAppNotification, UserNotificationPreferences, NotificationType,
-        Notification, PushNotificationToken
+        Notification, NotificationOutbox, PushNotificationToken
     )
-    from app.models.insights import DailyFeedbackAggregate, FeedbackKeyword
+    from app.models.insights import DailyFeedbackAggregate, FeedbackKeyword, FeedbackKeywordDaily
     
     # Create all tables
     Base.metadata.create_all(bind=engine)
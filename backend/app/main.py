@@ -103,16 +103,78 @@ async def general_exception_handler(request: Request, exc: Exception):
         }
     )
 
-# Initialize KPI background scheduler on startup
+# Initialize background services on startup. Each one is started on its
+# own, so one failing does not keep the others from starting.
 @app.on_event("startup")
 async def startup_event():
     """Initialize background services on application startup"""
+    failed = []
+
     try:
         from app.services.kpi_scheduler import start_kpi_scheduler
         start_kpi_scheduler()
-        logger.info("✅ Background services initialized successfully")
     except Exception as e:
-        logger.error(f"❌ Error starting background services: {e}")
+        failed.append("KPI scheduler")
+        logger.error(f"❌ Error starting KPI scheduler: {e}")
+
+    try:
+        from app.utils.websocket_manager import manager
+        await manager.start()
+    except Exception as e:
+        failed.append("WebSocket manager")
+        logger.error(f"❌ Error starting WebSocket manager: {e}")
+
+    if config_settings.notification_dispatcher_enabled:
+        try:
+            from app.services.notification_dispatcher import notification_dispatcher
+            await notification_dispatcher.start()
+        except Exception as e:
+            failed.append("notification dispatcher")
+            logger.error(f"❌ Error starting notification dispatcher: {e}")
+
+    try:
+        from app.services.keyword_tracker import keyword_tracker
+        await keyword_tracker.start()
+    except Exception as e:
+        failed.append("keyword tracker")
+        logger.error(f"❌ Error starting keyword tracker: {e}")
+
+    try:
+        from app.services.search_index import search_index_service
+        search_index_service.init_index(engine)
+    except Exception as e:
+        failed.append("search index")
+        logger.error(f"❌ Error creating search index: {e}")
+
+    # In-memory indexes and rollup backfills, loaded from the database
+    from app.services.suggest_index import suggest_index
+    from app.services.kpi_rollup import kpi_rollup_service
+    from app.services.feedback_insights import keyword_rollup
+    from app.services.presence_index import presence_index
+    from app.services.booking_availability import booking_availability
+    loaders = [
+        ("suggest index", suggest_index.rebuild),
+        ("KPI rollups", kpi_rollup_service.backfill_if_empty),
+        ("feedback keyword rollup", keyword_rollup.backfill_if_empty),
+        ("presence index", presence_index.rebuild),
+        ("booking availability", booking_availability.rebuild),
+    ]
+    db = SessionLocal()
+    try:
+        for name, load in loaders:
+            try:
+                load(db)
+            except Exception as e:
+                db.rollback()
+                failed.append(name)
+                logger.error(f"❌ Error loading {name}: {e}")
+    finally:
+        db.close()
+
+    if failed:
+        logger.warning(f"⚠️ Background services started except: {', '.join(failed)}")
+    else:
+        logger.info("✅ Background services initialized successfully")
 
 @app.on_event("shutdown")
 async def shutdown_event():
@@ -120,9 +182,28 @@ async def shutdown_event():
     try:
         from app.services.kpi_scheduler import stop_kpi_scheduler
         stop_kpi_scheduler()
-        logger.info("✅ Background services stopped successfully")
     except Exception as e:
-        logger.error(f"❌ Error stopping background services: {e}")
+        logger.error(f"❌ Error stopping KPI scheduler: {e}")
+
+    try:
+        from app.utils.websocket_manager import manager
+        await manager.stop()
+    except Exception as e:
+        logger.error(f"❌ Error stopping WebSocket manager: {e}")
+
+    try:
+        from app.services.notification_dispatcher import notification_dispatcher
+        await notification_dispatcher.stop()
+    except Exception as e:
+        logger.error(f"❌ Error stopping notification dispatcher: {e}")
+
+    try:
+        from app.services.keyword_tracker import keyword_tracker
+        await keyword_tracker.stop()
+    except Exception as e:
+        logger.error(f"❌ Error stopping keyword tracker: {e}")
+
+    logger.info("✅ Background services stopped")
 
 # Include routers
 app.include_router(auth.router, prefix="/api/v1/auth", tags=["Authentication"])
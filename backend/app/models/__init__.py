@@ -3,7 +3,7 @@ from app.models.user import User
 from app.models.department import Department
 from app.models.task import Task
 from app.models.project import Project
-from app.models.chat import ChatRoom, Message
+from app.models.chat import ChatRoom, Message, ChatEvent
 from app.models.role import Role, Permission, RolePermission
 from app.models.custom_role import CustomRole
 from app.models.comment import Comment
@@ -20,7 +20,8 @@ from app.models.performance import (
     ReviewResponse,
     Competency,
     CompetencyScore,
-    KpiSnapshot
+    KpiSnapshot,
+    KpiDailyRollup
 )
 from app.models.notification import (
     InAppNotification,
@@ -29,10 +30,12 @@ from app.models.notification import (
 )
 from app.models.insights import (
     DailyFeedbackAggregate,
-    FeedbackKeyword
+    FeedbackKeyword,
+    FeedbackKeywordDaily
 )
 from app.models.notification import (
     Notification,
+    NotificationOutbox,
     PushNotificationToken
 )
 from app.models.office import Office, MeetingBooking
@@ -45,6 +48,7 @@ __all__ = [
     "Project",
     "ChatRoom",
     "Message",
+    "ChatEvent",
     "Role",
     "Permission",
     "RolePermission",
@@ -65,12 +69,15 @@ __all__ = [
     "Competency",
     "CompetencyScore",
     "KpiSnapshot",
+    "KpiDailyRollup",
     "InAppNotification",
     "UserNotificationPreferences",
     "NotificationType",
     "DailyFeedbackAggregate",
     "FeedbackKeyword",
+    "FeedbackKeywordDaily",
     "Notification",
+    "NotificationOutbox",
     "PushNotificationToken",
     "Office",
     "MeetingBooking"
@@ -39,3 +39,13 @@ class Message(Base):
     
     sender = relationship("User", back_populates="messages")
     chat = relationship("ChatRoom", back_populates="messages")
+
+class ChatEvent(Base):
+    """Outbound chat events shared between workers by the table-polling backplane"""
+    __tablename__ = "chat_events"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    chat_id = Column(Integer, nullable=False, index=True)
+    origin = Column(String(32), nullable=False)
+    payload = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
@@ -1,7 +1,7 @@
 from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean, Float, JSON
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
 from app.core.database import Base
+from datetime import datetime
 
 class Feedback(Base):
     __tablename__ = "feedback"
@@ -15,7 +15,9 @@ class Feedback(Base):
     sentiment_label = Column(String(8), nullable=True)  # 'positive', 'neutral', 'negative'
     sentiment_score = Column(Float, nullable=True)
     keywords = Column(JSON, nullable=True)
-    created_at = Column(DateTime, default=func.now(), nullable=False)
+    # Set in Python rather than by CURRENT_TIMESTAMP: SQLite stores that
+    # without microseconds, which the feedback keyset cursor compares against
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
     parent_id = Column(Integer, ForeignKey("feedback.id"), nullable=True, index=True)
     is_flagged = Column(Boolean, default=False, nullable=False)
     flagged_reason = Column(String, nullable=True)
@@ -1,7 +1,7 @@
 """
 Insights and Analytics Models
 """
-from sqlalchemy import Column, Integer, String, Float, Date, Text, DateTime
+from sqlalchemy import Column, Integer, String, Float, Date, Text, DateTime, Index, UniqueConstraint, literal_column
 from sqlalchemy.sql import func
 from app.core.database import Base
 
@@ -38,3 +38,35 @@ class FeedbackKeyword(Base):
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
+
+
+
+class FeedbackKeywordDaily(Base):
+    """
+    Keyword occurrences in Feedback.keywords per creation day.
+    Kept current by the feedback write hooks in
+    app.services.feedback_insights; windowed top keywords are sums of days.
+    """
+    __tablename__ = "feedback_keyword_daily"
+    __table_args__ = (UniqueConstraint("day", "keyword", name="uq_feedback_keyword_daily_day_keyword"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    day = Column(Date, nullable=False, index=True)
+    keyword = Column(String, nullable=False)
+    count = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+def keyword_context_key(columns):
+    """
+    Unique key of a tracked keyword. NULL sentiment/department are folded
+    to '' so they conflict like any other value (also the upsert target).
+    """
+    empty = literal_column("''")
+    return [
+        columns.keyword,
+        func.coalesce(columns.sentiment_context, empty),
+        func.coalesce(columns.department, empty),
+    ]
+
+
+Index('ux_feedback_keywords_context', *keyword_context_key(FeedbackKeyword.__table__.c), unique=True)
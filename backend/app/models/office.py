@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, JSON, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.core.database import Base
@@ -27,6 +27,10 @@ class Office(Base):
 class MeetingBooking(Base):
     """Meeting Booking Model"""
     __tablename__ = "meeting_bookings"
+    __table_args__ = (
+        # Overlap checks: one office, a time range, blocking statuses
+        Index("ix_meeting_bookings_office_time", "office_id", "start_time", "end_time", "status"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     office_id = Column(Integer, ForeignKey("offices.id", ondelete="CASCADE"), nullable=False)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Text, DateTime, Date, ForeignKey, Enum, Boolean
+from sqlalchemy import Column, Integer, String, Float, Text, DateTime, Date, ForeignKey, Enum, Boolean, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import enum
@@ -172,6 +172,36 @@ class KpiSnapshot(Base):
     measured_by = relationship("User", foreign_keys=[measured_by_id])
 
 
+class KpiDailyRollup(Base):
+    """
+    Per-user, per-day counters feeding the automated KPIs.
+    Kept current by the task and time entry write hooks in
+    app.services.kpi_rollup; KPI values are sums over a window of days.
+    """
+    __tablename__ = "kpi_daily_rollups"
+    __table_args__ = (UniqueConstraint("user_id", "day", name="uq_kpi_daily_rollups_user_day"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    day = Column(Date, nullable=False, index=True)
+
+    # Bucketed by creation day: assigned tasks, and how many of those are Done
+    tasks_created = Column(Integer, default=0, nullable=False)
+    tasks_created_done = Column(Integer, default=0, nullable=False)
+
+    # Bucketed by completion day (status Done)
+    tasks_due = Column(Integer, default=0, nullable=False)  # completed tasks with a due date
+    tasks_on_time = Column(Integer, default=0, nullable=False)
+    duration_days_sum = Column(Float, default=0, nullable=False)
+    duration_count = Column(Integer, default=0, nullable=False)
+
+    # Bucketed by clock-in day: completed time entries
+    hours_logged = Column(Float, default=0, nullable=False)
+    entries_logged = Column(Integer, default=0, nullable=False)
+
+    updated_at = Column(DateTime, nullable=False, index=True)
+
+
 class Competency(Base):
     __tablename__ = "competencies"
 
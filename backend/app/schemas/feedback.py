@@ -76,3 +76,9 @@ class FeedbackInsights(BaseModel):
     total_feedback: int
     window_days: int
 
+
+class ModerationWordlistUpdate(BaseModel):
+    # Added to / removed from the built-in lists
+    profanity: list[str] = []
+    severe: list[str] = []
+    allow: list[str] = []
@@ -56,6 +56,33 @@ class OfficeAvailability(BaseModel):
     next_available: Optional[datetime] = None
 
 
+class BookedSlot(BaseModel):
+    """A booking holding an office"""
+    id: int
+    title: str
+    start_time: datetime
+    end_time: datetime
+
+
+class OfficeFreeBusy(BaseModel):
+    """Schema for one office in a multi-room availability query"""
+    office_id: int
+    office_name: str
+    capacity: int
+    amenities: Optional[List[str]] = None
+    is_available: bool
+    busy: List[BookedSlot] = []
+
+
+class OfficeSlot(BaseModel):
+    """Schema for the first free slot found in an office"""
+    office_id: int
+    office_name: str
+    capacity: int
+    start_time: datetime
+    end_time: datetime
+
+
 # ==================== Meeting Booking Schemas ====================
 
 class MeetingBookingBase(BaseModel):
@@ -35,3 +35,18 @@ class SearchFilters(BaseModel):
     limit: int = 20
     offset: int = 0
 
+
+
+class SuggestItem(BaseModel):
+    """Single type-ahead suggestion"""
+    id: int
+    type: Literal['user', 'task', 'project', 'department', 'chat']
+    title: str
+    url: str
+
+
+class SuggestResponse(BaseModel):
+    """Type-ahead suggestions served from the in-memory index"""
+    query: str
+    suggestions: List[SuggestItem]
+    execution_time_ms: float
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from datetime import datetime
+from datetime import date, datetime
 from typing import Optional
 
 
@@ -63,6 +63,19 @@ class TimeEntryRecordResponse(BaseModel):
         from_attributes = True
 
 
+class TimeRecordSummaryResponse(BaseModel):
+    user_id: int
+    user_name: str
+    department_name: Optional[str] = None
+    period_start: Optional[date] = None  # the day, or the Monday of the week
+    iso_year: Optional[int] = None
+    iso_week: Optional[int] = None
+    entries: int
+    worked_hours: float
+    break_minutes: int
+    overtime_hours: Optional[float] = None
+
+
 class TimeTrackingStatusResponse(BaseModel):
     is_clocked_in: bool
     is_on_break: bool
@@ -0,0 +1,316 @@
+"""
+Office booking availability engine
+
+Per-office interval lists of the bookings that hold a room (status
+upcoming or ongoing), sorted by start time, so availability, free/busy and
+"first free slot" questions are answered from memory:
+- built from one query on first use
+- moved by create / update / cancel / status updates, which publish the
+  changed bookings as a user event; every worker (through the WebSocket
+  manager's backplane) applies them to its own index
+- rebuilt once older than BOOKING_AVAILABILITY_RESYNC_SECONDS, so writes
+  that bypass the API heal
+
+Creating or moving a booking still checks for conflicts in the database
+(an index range scan on (office_id, start_time, end_time, status)): only
+the database knows about a booking another worker committed a moment ago.
+"""
+
+import bisect
+import json
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import and_
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.office import MeetingBooking
+from app.utils.websocket_manager import manager
+
+logger = logging.getLogger(__name__)
+
+# Bookings in these states hold their room
+BLOCKING_STATUSES = ("upcoming", "ongoing")
+
+
+class BookedInterval(NamedTuple):
+    start_time: datetime
+    end_time: datetime
+    booking_id: int
+    title: str
+    status: str
+
+    def as_dict(self) -> dict:
+        return {
+            'id': self.booking_id,
+            'title': self.title,
+            'start_time': self.start_time,
+            'end_time': self.end_time
+        }
+
+
+def _parse(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+
+def as_naive_utc(value: datetime) -> datetime:
+    """Bookings are stored as naive UTC; bring timezone-aware input in line"""
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+class _OfficeIntervals:
+    """One office's blocking bookings, sorted by (start_time, end_time, booking_id)"""
+
+    def __init__(self):
+        self.intervals: List[BookedInterval] = []
+        self.starts: List[datetime] = []
+        # Longest booking seen: an overlap search only has to look back
+        # this far from the window start
+        self.max_length = timedelta(0)
+
+    def add(self, interval: BookedInterval) -> None:
+        position = bisect.bisect_left(self.intervals, interval)
+        self.intervals.insert(position, interval)
+        self.starts.insert(position, interval.start_time)
+        self.max_length = max(self.max_length, interval.end_time - interval.start_time)
+
+    def remove(self, interval: BookedInterval) -> None:
+        position = bisect.bisect_left(self.intervals, interval)
+        if position < len(self.intervals) and self.intervals[position] == interval:
+            del self.intervals[position]
+            del self.starts[position]
+
+    def overlapping(self, start: datetime, end: datetime) -> List[BookedInterval]:
+        """Intervals with start_time < end and end_time > start, by start time"""
+        low = bisect.bisect_left(self.starts, start - self.max_length)
+        high = bisect.bisect_left(self.starts, end)
+        return [interval for interval in self.intervals[low:high] if interval.end_time > start]
+
+
+def _intervals_from(rows: Iterable) -> Dict[int, _OfficeIntervals]:
+    offices: Dict[int, _OfficeIntervals] = {}
+    intervals = sorted(
+        (row.office_id, BookedInterval(row.start_time, row.end_time, row.id, row.title, row.status))
+        for row in rows
+    )
+    for office_id, interval in intervals:
+        office = offices.setdefault(office_id, _OfficeIntervals())
+        office.intervals.append(interval)
+        office.starts.append(interval.start_time)
+        office.max_length = max(office.max_length, interval.end_time - interval.start_time)
+    return offices
+
+
+class BookingAvailability:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._offices: Dict[int, _OfficeIntervals] = {}
+        # booking_id -> (office_id, interval), to find a booking's old place
+        self._bookings: Dict[int, Tuple[int, BookedInterval]] = {}
+        self._built_at: Optional[float] = None
+        # Recent changes, replayed over a rebuild that was reading while
+        # they arrived
+        self._seq = 0
+        self._recent: deque = deque(maxlen=10_000)
+        # Metrics (this worker only)
+        self.rebuilds = 0
+        self.events_applied = 0
+
+    def rebuild(self, db: Session) -> int:
+        """Reload from meeting_bookings; returns the number of blocking bookings"""
+        with self._lock:
+            started_seq = self._seq
+        rows = db.query(
+            MeetingBooking.id,
+            MeetingBooking.office_id,
+            MeetingBooking.title,
+            MeetingBooking.start_time,
+            MeetingBooking.end_time,
+            MeetingBooking.status
+        ).filter(MeetingBooking.status.in_(BLOCKING_STATUSES)).all()
+
+        offices = _intervals_from(rows)
+        bookings = {
+            interval.booking_id: (office_id, interval)
+            for office_id, office in offices.items()
+            for interval in office.intervals
+        }
+        with self._lock:
+            self._offices = offices
+            self._bookings = bookings
+            for seq, change in self._recent:
+                if seq > started_seq:
+                    self._apply_change(change)
+            self._built_at = time.monotonic()
+        self.rebuilds += 1
+        return len(bookings)
+
+    def ensure_fresh(self, db: Session) -> None:
+        """Rebuild if never built or older than BOOKING_AVAILABILITY_RESYNC_SECONDS"""
+        built_at = self._built_at
+        if built_at is None or time.monotonic() - built_at > settings.booking_availability_resync_seconds:
+            self.rebuild(db)
+
+    def _apply_change(self, change: dict) -> None:
+        previous = self._bookings.pop(change["id"], None)
+        if previous is not None:
+            self._offices[previous[0]].remove(previous[1])
+        if change.get("status") in BLOCKING_STATUSES:
+            interval = BookedInterval(
+                _parse(change["start_time"]),
+                _parse(change["end_time"]),
+                change["id"],
+                change["title"],
+                change["status"]
+            )
+            self._offices.setdefault(change["office_id"], _OfficeIntervals()).add(interval)
+            self._bookings[change["id"]] = (change["office_id"], interval)
+
+    def apply(self, changes: List[dict]) -> None:
+        """Move bookings to their new intervals (or out, once they stop blocking)"""
+        with self._lock:
+            for change in changes:
+                self._seq += 1
+                self._recent.append((self._seq, change))
+                self._apply_change(change)
+        self.events_applied += len(changes)
+
+    async def publish(self, bookings: Iterable[MeetingBooking]) -> None:
+        """Announce committed changes to `bookings` to every worker"""
+        changes = [
+            {
+                "id": booking.id,
+                "office_id": booking.office_id,
+                "title": booking.title,
+                "start_time": booking.start_time,
+                "end_time": booking.end_time,
+                "status": booking.status,
+            }
+            for booking in bookings
+        ]
+        if changes:
+            await manager.publish_user_event(json.dumps(
+                {"bookings": changes},
+                default=lambda value: value.isoformat()
+            ))
+
+    async def publish_removed(self, booking_ids: Iterable[int]) -> None:
+        """Announce that bookings no longer exist (their office was deleted)"""
+        changes = [{"id": booking_id, "status": None} for booking_id in booking_ids]
+        if changes:
+            await manager.publish_user_event(json.dumps({"bookings": changes}))
+
+    # ------------------------------------------------------------------
+    # Queries (call ensure_fresh first)
+    # ------------------------------------------------------------------
+
+    def conflicts(
+        self,
+        office_id: int,
+        start: datetime,
+        end: datetime,
+        exclude_booking_id: Optional[int] = None
+    ) -> List[BookedInterval]:
+        """Blocking bookings of one office overlapping [start, end), earliest first"""
+        start, end = as_naive_utc(start), as_naive_utc(end)
+        with self._lock:
+            office = self._offices.get(office_id)
+            if office is None:
+                return []
+            return [
+                interval for interval in office.overlapping(start, end)
+                if interval.booking_id != exclude_booking_id
+            ]
+
+    def busy(self, office_ids: Iterable[int], start: datetime, end: datetime) -> Dict[int, List[BookedInterval]]:
+        """office_id -> blocking bookings overlapping [start, end), for several offices"""
+        return {office_id: self.conflicts(office_id, start, end) for office_id in office_ids}
+
+    def current(self, office_ids: Iterable[int], now: datetime) -> Dict[int, BookedInterval]:
+        """office_id -> its ongoing booking covering `now`, where there is one"""
+        result = {}
+        with self._lock:
+            for office_id in office_ids:
+                office = self._offices.get(office_id)
+                if office is None:
+                    continue
+                high = bisect.bisect_right(office.starts, now)
+                for interval in office.intervals[bisect.bisect_left(office.starts, now - office.max_length):high]:
+                    if interval.status == "ongoing" and interval.end_time >= now:
+                        result[office_id] = interval
+                        break
+        return result
+
+    def first_free_slot(
+        self,
+        office_id: int,
+        duration: timedelta,
+        after: datetime,
+        before: datetime
+    ) -> Optional[datetime]:
+        """Earliest start >= after where `duration` fits before `before` without a conflict"""
+        after, before = as_naive_utc(after), as_naive_utc(before)
+        candidate = after
+        for interval in self.conflicts(office_id, after, before):
+            if interval.start_time >= candidate + duration:
+                break
+            candidate = max(candidate, interval.end_time)
+        return candidate if candidate + duration <= before else None
+
+    def booking_ids_for_office(self, office_id: int) -> List[int]:
+        with self._lock:
+            office = self._offices.get(office_id)
+            return [interval.booking_id for interval in office.intervals] if office else []
+
+    def get_metrics(self) -> dict:
+        return {
+            "offices": len(self._offices),
+            "blocking_bookings": len(self._bookings),
+            "rebuilds": self.rebuilds,
+            "events_applied": self.events_applied,
+            "age_seconds": round(time.monotonic() - self._built_at, 1) if self._built_at else None,
+        }
+
+
+booking_availability = BookingAvailability()
+
+
+def find_conflict_in_db(
+    db: Session,
+    office_id: int,
+    start: datetime,
+    end: datetime,
+    exclude_booking_id: Optional[int] = None
+) -> Optional[MeetingBooking]:
+    """The earliest blocking booking overlapping [start, end), read from the database"""
+    query = db.query(MeetingBooking).filter(
+        and_(
+            MeetingBooking.office_id == office_id,
+            MeetingBooking.status.in_(BLOCKING_STATUSES),
+            MeetingBooking.start_time < end,
+            MeetingBooking.end_time > start
+        )
+    )
+    if exclude_booking_id is not None:
+        query = query.filter(MeetingBooking.id != exclude_booking_id)
+    return query.order_by(MeetingBooking.start_time, MeetingBooking.end_time, MeetingBooking.id).first()
+
+
+async def deliver_booking_event(message_text: str) -> None:
+    """Apply booking changes published by any worker"""
+    try:
+        changes = json.loads(message_text).get("bookings")
+    except (ValueError, AttributeError):
+        return
+    if changes:
+        booking_availability.apply(changes)
+
+
+manager.add_user_event_handler(deliver_booking_event)
@@ -1,12 +1,14 @@
 from typing import List, Optional
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import and_, or_, desc, func
+from sqlalchemy import and_, or_, desc, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
 
 from app.models.chat import ChatRoom, Message, chat_participants
 from app.models.user import User
 from app.models.department import Department
 from app.schemas.chat import ChatRoomCreate, MessageCreate
+from app.services.suggest_index import suggest_index
 
 class ChatService:
     def get_user_chat_rooms(self, db: Session, user_id: int) -> List[ChatRoom]:
@@ -47,6 +49,17 @@ class ChatService:
             .all()
         )
 
+    async def get_chat_messages_async(self, db: AsyncSession, chat_id: int, limit: int = 50) -> List[Message]:
+        """Get messages for a chat room (async session)"""
+        result = await db.execute(
+            select(Message)
+            .where(Message.chat_id == chat_id)
+            .options(joinedload(Message.sender))
+            .order_by(desc(Message.timestamp))
+            .limit(limit)
+        )
+        return list(result.scalars().all())
+
     def get_or_create_private_chat(self, db: Session, user1_id: int, user2_id: int) -> ChatRoom:
         """Get or create a private chat between two users"""
         # Check if private chat already exists
@@ -119,6 +132,7 @@ class ChatService:
             
             db.commit()
             db.refresh(chat)
+            suggest_index.upsert('chat', chat.id, chat.name)
         
         return chat
 
@@ -146,6 +160,7 @@ class ChatService:
             
             db.commit()
             db.refresh(chat)
+            suggest_index.upsert('chat', chat.id, chat.name)
         
         return chat
 
@@ -167,6 +182,24 @@ class ChatService:
         db.refresh(message)
         return message
 
+    async def create_message_async(self, db: AsyncSession, message_data: MessageCreate, sender_id: int, chat_id: int) -> Message:
+        """Create a new message (async session)"""
+        message = Message(
+            text=message_data.text,
+            sender_id=sender_id,
+            chat_id=chat_id
+        )
+        db.add(message)
+        
+        # Update chat room timestamp
+        await db.execute(
+            update(ChatRoom).where(ChatRoom.id == chat_id).values(updated_at=datetime.utcnow())
+        )
+        
+        await db.commit()
+        await db.refresh(message)
+        return message
+
     def get_chat_by_id(self, db: Session, chat_id: int) -> Optional[ChatRoom]:
         """Get chat room by ID"""
         return db.query(ChatRoom).filter(ChatRoom.id == chat_id).first()
@@ -181,4 +214,16 @@ class ChatService:
         ).first()
         return result is not None
 
+    async def is_user_in_chat_async(self, db: AsyncSession, user_id: int, chat_id: int) -> bool:
+        """Check if user is a participant in the chat (async session)"""
+        result = await db.execute(
+            select(chat_participants.c.user_id).where(
+                and_(
+                    chat_participants.c.user_id == user_id,
+                    chat_participants.c.chat_id == chat_id
+                )
+            ).limit(1)
+        )
+        return result.first() is not None
+
 chat_service = ChatService()
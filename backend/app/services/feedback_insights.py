@@ -0,0 +1,293 @@
+"""
+Admin feedback insights
+
+The insights endpoint is answered from SQL aggregates instead of loading
+every feedback row in the window:
+- sentiment distribution, daily trend and top recipients are GROUP BY
+  queries over the created_at range (recipient names via one join)
+- top keywords are sums over feedback_keyword_daily, a per-day count of
+  the keywords stored on each feedback row
+
+Every feedback insert/update (created_at, keywords)/delete removes the
+row's previous keyword contribution and adds its new one in the same
+transaction (the same mapper-event approach as the KPI rollups). Bulk
+writes bypass the hooks; reanalyze_feedback applies its own deltas and
+`rebuild()` recomputes the rollup from the feedback table.
+
+Results are cached per window_days for FEEDBACK_INSIGHTS_CACHE_TTL_SECONDS.
+"""
+
+import logging
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.feedback import Feedback
+from app.models.insights import FeedbackKeywordDaily
+from app.models.user import User
+from app.schemas.feedback import (
+    FeedbackInsights,
+    FeedbackSentimentDistribution,
+    KeywordCount,
+    TrendPoint,
+    TopRecipient
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _as_date(value) -> Optional[date]:
+    """SQLite returns func.date() as text, PostgreSQL as a date"""
+    if value is None or isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def keyword_contributions(created_at: Optional[datetime], keywords: Optional[List[str]]) -> Counter:
+    """(day, keyword) -> occurrences for one feedback row"""
+    if not created_at or not keywords:
+        return Counter()
+    day = created_at.date() if isinstance(created_at, datetime) else _as_date(created_at)
+    return Counter((day, keyword) for keyword in keywords)
+
+
+class FeedbackKeywordRollup:
+    """Maintains and queries feedback_keyword_daily"""
+
+    def apply(self, connection: Connection, removed: Counter, added: Counter) -> None:
+        """Subtract `removed` and add `added` to their (day, keyword) counts"""
+        merged = Counter(added)
+        merged.subtract(removed)
+        rows = [
+            {'day': day, 'keyword': keyword, 'count': delta, 'updated_at': datetime.utcnow()}
+            for (day, keyword), delta in sorted(merged.items()) if delta
+        ]
+        if not rows:
+            return
+        table = FeedbackKeywordDaily.__table__
+        insert = postgresql_insert if connection.dialect.name == 'postgresql' else sqlite_insert
+        for start in range(0, len(rows), 500):
+            stmt = insert(table).values(rows[start:start + 500])
+            connection.execute(stmt.on_conflict_do_update(
+                index_elements=['day', 'keyword'],
+                set_={'count': table.c.count + stmt.excluded.count, 'updated_at': stmt.excluded.updated_at}
+            ))
+
+    def rebuild(self, db: Session) -> int:
+        """Recompute every day's keyword counts from feedback; returns the row count"""
+        counts: Counter = Counter()
+        for created_at, keywords in db.query(Feedback.created_at, Feedback.keywords).yield_per(5000):
+            counts.update(keyword_contributions(created_at, keywords))
+        now = datetime.utcnow()
+        rows = [
+            {'day': day, 'keyword': keyword, 'count': count, 'updated_at': now}
+            for (day, keyword), count in counts.items()
+        ]
+        db.query(FeedbackKeywordDaily).delete(synchronize_session=False)
+        if rows:
+            db.execute(FeedbackKeywordDaily.__table__.insert(), rows)
+        db.commit()
+        logger.info(f"Rebuilt {len(rows)} feedback keyword rollup rows")
+        return len(rows)
+
+    def backfill_if_empty(self, db: Session) -> None:
+        """Populate the rollup on first start against an existing database"""
+        if db.query(FeedbackKeywordDaily.id).first() is None and db.query(Feedback.id).first() is not None:
+            self.rebuild(db)
+
+    def top_keywords(self, db: Session, start_day: date, end_day: date, top_n: int = 20) -> List[Tuple[str, int]]:
+        total = func.sum(FeedbackKeywordDaily.count)
+        rows = db.query(FeedbackKeywordDaily.keyword, total.label('count')).filter(
+            FeedbackKeywordDaily.day >= start_day,
+            FeedbackKeywordDaily.day <= end_day
+        ).group_by(FeedbackKeywordDaily.keyword).having(total > 0).order_by(
+            total.desc(), FeedbackKeywordDaily.keyword
+        ).limit(top_n).all()
+        return [(row.keyword, row.count) for row in rows]
+
+
+keyword_rollup = FeedbackKeywordRollup()
+
+
+def compute_feedback_insights(db: Session, window_days: int) -> FeedbackInsights:
+    """Sentiment, keywords, daily trend and top recipients for the last window_days"""
+    end_date = datetime.utcnow()
+    start_date = end_date - timedelta(days=window_days)
+    in_window = Feedback.created_at >= start_date
+
+    # 1. Sentiment distribution
+    label = func.lower(Feedback.sentiment_label)
+    sentiment_counts = {'positive': 0, 'neutral': 0, 'negative': 0}
+    total_feedback = 0
+    for row in db.query(label.label('label'), func.count(Feedback.id).label('count')).filter(in_window).group_by(label):
+        total_feedback += row.count
+        if row.label in sentiment_counts:
+            sentiment_counts[row.label] += row.count
+
+    sentiment_dist = FeedbackSentimentDistribution(
+        positive=sentiment_counts['positive'],
+        neutral=sentiment_counts['neutral'],
+        negative=sentiment_counts['negative'],
+        total=total_feedback,
+        positive_pct=round((sentiment_counts['positive'] / max(total_feedback, 1)) * 100, 2),
+        neutral_pct=round((sentiment_counts['neutral'] / max(total_feedback, 1)) * 100, 2),
+        negative_pct=round((sentiment_counts['negative'] / max(total_feedback, 1)) * 100, 2)
+    )
+
+    # 2. Top keywords, from the per-day rollup (whole days)
+    top_keywords = [
+        KeywordCount(term=term, count=count)
+        for term, count in keyword_rollup.top_keywords(db, start_date.date(), end_date.date(), top_n=20)
+    ]
+
+    # 3. Daily trend; AVG skips rows without a score
+    day = func.date(Feedback.created_at)
+    trend = [
+        TrendPoint(
+            date=_as_date(row.day).isoformat(),
+            count=row.count,
+            avg_sentiment=round(row.avg_sentiment, 3) if row.avg_sentiment is not None else None
+        )
+        for row in db.query(
+            day.label('day'),
+            func.count(Feedback.id).label('count'),
+            func.avg(Feedback.sentiment_score).label('avg_sentiment')
+        ).filter(in_window).group_by(day).order_by(day)
+    ]
+
+    # 4. Top recipients; direct feedback is grouped per user
+    recipient_id = Feedback.recipient_id
+    volume = func.count(Feedback.id)
+    recipients = db.query(
+        Feedback.recipient_type,
+        recipient_id,
+        User.full_name,
+        volume.label('count')
+    ).outerjoin(User, User.id == recipient_id).filter(
+        in_window,
+        Feedback.recipient_type.in_(("ADMIN", "EVERYONE")) | (
+            (Feedback.recipient_type == "USER") & recipient_id.isnot(None)
+        )
+    ).group_by(Feedback.recipient_type, recipient_id, User.full_name).order_by(volume.desc()).all()
+
+    # ADMIN/EVERYONE rows may carry stray recipient ids; fold them together
+    merged: Dict[tuple, dict] = {}
+    for row in recipients:
+        if row.recipient_type == "USER":
+            key = ("USER", row.recipient_id)
+            name = row.full_name or "Unknown"
+            rid = row.recipient_id
+        else:
+            key = (row.recipient_type, None)
+            name = "Admin" if row.recipient_type == "ADMIN" else "Everyone"
+            rid = None
+        entry = merged.setdefault(key, {'id': rid, 'name': name, 'type': row.recipient_type, 'count': 0})
+        entry['count'] += row.count
+
+    top_recipients = sorted(merged.values(), key=lambda x: x['count'], reverse=True)[:10]
+
+    return FeedbackInsights(
+        sentiment=sentiment_dist,
+        keywords=top_keywords,
+        trend=trend,
+        recipients=[
+            TopRecipient(id=r['id'], name=r['name'], count=r['count'], recipient_type=r['type'])
+            for r in top_recipients
+        ],
+        total_feedback=total_feedback,
+        window_days=window_days
+    )
+
+
+class FeedbackInsightsCache:
+    """Computed insights per window_days, reused until the TTL runs out"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[int, Tuple[float, FeedbackInsights]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, db: Session, window_days: int) -> FeedbackInsights:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(window_days)
+            if entry and entry[0] > now:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        insights = compute_feedback_insights(db, window_days)
+        with self._lock:
+            self._entries[window_days] = (now + settings.feedback_insights_cache_ttl_seconds, insights)
+        return insights
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+feedback_insights_cache = FeedbackInsightsCache()
+
+
+# ----------------------------------------------------------------------
+# Write hooks
+# ----------------------------------------------------------------------
+
+def _read_row(connection: Connection, feedback_id: int) -> Optional[dict]:
+    row = connection.execute(
+        select(Feedback.created_at, Feedback.keywords).where(Feedback.id == feedback_id)
+    ).mappings().first()
+    return dict(row) if row else None
+
+
+def _contributions(row: Optional[dict]) -> Counter:
+    if not row:
+        return Counter()
+    return keyword_contributions(row.get('created_at'), row.get('keywords'))
+
+
+# Values are read back through the flush's connection so that created_at
+# is exactly what was stored (its datetime.utcnow default is applied by the
+# ORM at flush time)
+
+@event.listens_for(Feedback, 'after_insert')
+def _on_insert(mapper, connection, target):
+    keyword_rollup.apply(connection, Counter(), _contributions(_read_row(connection, target.id)))
+
+
+def _rollup_fields_changed(target) -> bool:
+    state = inspect(target)
+    return any(state.attrs[field].history.has_changes() for field in ('created_at', 'keywords'))
+
+
+# The previous values are read from the database before the UPDATE: after
+# a commit the attributes are expired and their history has no old value
+
+@event.listens_for(Feedback, 'before_update')
+def _before_update(mapper, connection, target):
+    if _rollup_fields_changed(target):
+        inspect(target).info['keyword_rollup_previous'] = _read_row(connection, target.id)
+
+
+@event.listens_for(Feedback, 'after_update')
+def _on_update(mapper, connection, target):
+    state = inspect(target)
+    if 'keyword_rollup_previous' not in state.info:
+        return
+    previous = state.info.pop('keyword_rollup_previous')
+    current = _read_row(connection, target.id)
+    keyword_rollup.apply(connection, _contributions(previous), _contributions(current))
+
+
+@event.listens_for(Feedback, 'before_delete')
+def _on_delete(mapper, connection, target):
+    keyword_rollup.apply(connection, _contributions(_read_row(connection, target.id)), Counter())
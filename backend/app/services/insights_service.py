@@ -2,22 +2,90 @@
 Insights service for aggregating and analyzing feedback data
 """
 from datetime import date, datetime, timedelta
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import case, func, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 import json
+from collections import Counter
 import re
 
 from app.models.feedback import Feedback
 from app.models.insights import DailyFeedbackAggregate, FeedbackKeyword
 from app.models.user import User
+from app.models.department import Department
 from app.utils.keyword_extractor import (
+    NgramVocabulary,
     extract_keywords,
+    extract_keyword_ids,
     get_top_keywords,
     categorize_keywords_by_sentiment,
     categorize_keywords_by_department
 )
-from app.utils.forecasting import forecast_with_confidence, simple_trend_analysis
+from app.services.feedback_insights import keyword_contributions, keyword_rollup
+from app.services.keyword_tracker import keyword_tracker
+from app.utils.forecasting import forecast_many_with_confidence, simple_trend_analysis
+
+
+# Positive words
+POSITIVE_WORDS = [
+    'great', 'excellent', 'amazing', 'wonderful', 'fantastic', 'awesome',
+    'good', 'nice', 'helpful', 'love', 'appreciate', 'thank', 'thanks',
+    'outstanding', 'brilliant', 'superb', 'perfect', 'best'
+]
+
+# Negative words
+NEGATIVE_WORDS = [
+    'bad', 'terrible', 'awful', 'horrible', 'poor', 'worst', 'hate',
+    'disappointing', 'frustrated', 'annoyed', 'angry', 'useless', 'waste',
+    'unfair', 'unprofessional', 'rude', 'slow', 'broken', 'issue', 'problem'
+]
+
+
+def score_sentiment(content: str) -> Tuple[str, float]:
+    """Sentiment label and score from positive/negative word counts"""
+    content_lower = content.lower()
+    
+    positive_count = sum(1 for word in POSITIVE_WORDS if word in content_lower)
+    negative_count = sum(1 for word in NEGATIVE_WORDS if word in content_lower)
+    
+    # Determine sentiment
+    if positive_count > negative_count:
+        return 'positive', min(1.0, 0.5 + (positive_count * 0.1))
+    elif negative_count > positive_count:
+        return 'negative', max(0.0, 0.5 - (negative_count * 0.1))
+    return 'neutral', 0.5
+
+
+def analyze_feedback_batch(contents: List[str], vocabulary: Optional[NgramVocabulary] = None) -> List[Dict]:
+    """
+    Analyze many feedback texts in one call (backfills, re-analysis)
+    
+    Args:
+        contents: Feedback text contents
+        vocabulary: Optional shared vocabulary; pass one in to keep the
+            keyword ids (in 'keyword_ids') comparable across calls
+    
+    Returns:
+        One dict per content with sentiment_label, sentiment_score,
+        keywords and keyword_ids
+    """
+    vocabulary = vocabulary if vocabulary is not None else NgramVocabulary()
+    # Limit to top 10 keywords
+    doc_ids = extract_keyword_ids(contents, vocabulary, include_bigrams=True, limit=10)
+    terms = vocabulary.terms
+    
+    results = []
+    for content, ids in zip(contents, doc_ids):
+        sentiment_label, sentiment_score = score_sentiment(content or '')
+        results.append({
+            'sentiment_label': sentiment_label,
+            'sentiment_score': sentiment_score,
+            'keywords': [terms[i] for i in ids],
+            'keyword_ids': ids
+        })
+    return results
 
 
 def analyze_feedback(content: str) -> Dict:
@@ -30,36 +98,7 @@ def analyze_feedback(content: str) -> Dict:
     Returns:
         Dict with sentiment_label, sentiment_score, and keywords
     """
-    # Simple sentiment analysis
-    content_lower = content.lower()
-    
-    # Positive words
-    positive_words = [
-        'great', 'excellent', 'amazing', 'wonderful', 'fantastic', 'awesome',
-        'good', 'nice', 'helpful', 'love', 'appreciate', 'thank', 'thanks',
-        'outstanding', 'brilliant', 'superb', 'perfect', 'best'
-    ]
-    
-    # Negative words
-    negative_words = [
-        'bad', 'terrible', 'awful', 'horrible', 'poor', 'worst', 'hate',
-        'disappointing', 'frustrated', 'annoyed', 'angry', 'useless', 'waste',
-        'unfair', 'unprofessional', 'rude', 'slow', 'broken', 'issue', 'problem'
-    ]
-    
-    positive_count = sum(1 for word in positive_words if word in content_lower)
-    negative_count = sum(1 for word in negative_words if word in content_lower)
-    
-    # Determine sentiment
-    if positive_count > negative_count:
-        sentiment_label = 'positive'
-        sentiment_score = min(1.0, 0.5 + (positive_count * 0.1))
-    elif negative_count > positive_count:
-        sentiment_label = 'negative'
-        sentiment_score = max(0.0, 0.5 - (negative_count * 0.1))
-    else:
-        sentiment_label = 'neutral'
-        sentiment_score = 0.5
+    sentiment_label, sentiment_score = score_sentiment(content)
     
     # Extract keywords
     keywords = extract_keywords(content, include_bigrams=True)
@@ -73,94 +112,104 @@ def analyze_feedback(content: str) -> Dict:
     }
 
 
-def compute_daily_aggregate(db: Session, target_date: date) -> Optional[DailyFeedbackAggregate]:
+def reanalyze_feedback(
+    db: Session,
+    batch_size: int = 1000,
+    start_after_id: int = 0,
+    dry_run: bool = False,
+    progress=None
+) -> Dict:
     """
-    Compute and store daily feedback aggregate for a specific date
+    Recompute sentiment and keywords for every stored feedback item
+    
+    Walks the feedback table by id in chunks, analyses each chunk with
+    analyze_feedback_batch and writes back only rows whose analysis
+    changed, one executemany UPDATE and commit per chunk (with the matching
+    feedback_keyword_daily deltas).
     
     Args:
         db: Database session
-        target_date: Date to aggregate
+        batch_size: Rows per chunk
+        start_after_id: Resume after this feedback id
+        dry_run: Analyse and count without writing
+        progress: Optional callback(stats) after each chunk
     
     Returns:
-        DailyFeedbackAggregate object
+        Dict with scanned, changed, last_id and per-sentiment counts
     """
-    # Check if aggregate already exists
-    existing = db.query(DailyFeedbackAggregate).filter(
-        DailyFeedbackAggregate.date == target_date
-    ).first()
-    
-    if existing:
-        # Update existing
-        aggregate = existing
-    else:
-        # Create new
-        aggregate = DailyFeedbackAggregate(date=target_date)
-    
-    # Get all feedback for this date
-    feedback_items = db.query(Feedback).filter(
-        func.date(Feedback.created_at) == target_date
-    ).all()
-    
-    if not feedback_items:
-        # No feedback for this date
-        aggregate.feedback_count = 0
-        aggregate.sentiment_avg = 0.0
-        aggregate.sentiment_positive_count = 0
-        aggregate.sentiment_neutral_count = 0
-        aggregate.sentiment_negative_count = 0
-        aggregate.anonymous_count = 0
-        aggregate.flagged_count = 0
-        aggregate.department_breakdown = json.dumps({})
-        aggregate.updated_at = datetime.utcnow()
+    vocabulary = NgramVocabulary()
+    stats = {"scanned": 0, "changed": 0, "last_id": start_after_id,
+             "sentiment": {"positive": 0, "neutral": 0, "negative": 0}}
+    last_id = start_after_id
+    
+    while True:
+        rows = db.query(
+            Feedback.id, Feedback.content, Feedback.sentiment_label,
+            Feedback.sentiment_score, Feedback.keywords, Feedback.created_at
+        ).filter(Feedback.id > last_id).order_by(Feedback.id).limit(batch_size).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
         
-        if not existing:
-            db.add(aggregate)
-        db.commit()
-        db.refresh(aggregate)
-        return aggregate
-    
-    # Calculate metrics
-    aggregate.feedback_count = len(feedback_items)
-    
-    # Sentiment counts
-    positive = sum(1 for f in feedback_items if f.sentiment_label and f.sentiment_label.value == 'positive')
-    neutral = sum(1 for f in feedback_items if f.sentiment_label and f.sentiment_label.value == 'neutral')
-    negative = sum(1 for f in feedback_items if f.sentiment_label and f.sentiment_label.value == 'negative')
-    
-    aggregate.sentiment_positive_count = positive
-    aggregate.sentiment_neutral_count = neutral
-    aggregate.sentiment_negative_count = negative
-    
-    # Average sentiment score
-    total_score = sum(f.sentiment_score or 0.0 for f in feedback_items)
-    aggregate.sentiment_avg = total_score / len(feedback_items) if feedback_items else 0.0
-    
-    # Anonymous count
-    aggregate.anonymous_count = sum(1 for f in feedback_items if f.is_anonymous)
-    
-    # Flagged count (if exists)
-    aggregate.flagged_count = sum(1 for f in feedback_items if getattr(f, 'is_flagged', False))
-    
-    # Department breakdown
-    dept_counts = {}
-    for f in feedback_items:
-        # Get author's department
-        if f.author_id:
-            author = db.query(User).filter(User.id == f.author_id).first()
-            if author and author.department:
-                dept_name = author.department.name if hasattr(author.department, 'name') else str(author.department)
-                dept_counts[dept_name] = dept_counts.get(dept_name, 0) + 1
-    
-    aggregate.department_breakdown = json.dumps(dept_counts)
-    aggregate.updated_at = datetime.utcnow()
+        changes = []
+        removed, added = Counter(), Counter()
+        for row, analysis in zip(rows, analyze_feedback_batch([row.content or '' for row in rows], vocabulary)):
+            stats["sentiment"][analysis['sentiment_label']] += 1
+            if (row.sentiment_label, row.sentiment_score, row.keywords) != (
+                analysis['sentiment_label'], analysis['sentiment_score'], analysis['keywords']
+            ):
+                removed.update(keyword_contributions(row.created_at, row.keywords))
+                added.update(keyword_contributions(row.created_at, analysis['keywords']))
+                changes.append({
+                    "id": row.id,
+                    "sentiment_label": analysis['sentiment_label'],
+                    "sentiment_score": analysis['sentiment_score'],
+                    "keywords": analysis['keywords']
+                })
+        
+        if changes and not dry_run:
+            # Bulk UPDATE bypasses the rollup hooks; apply the deltas here
+            db.execute(update(Feedback), changes)
+            keyword_rollup.apply(db.connection(), removed, added)
+            db.commit()
+        
+        stats["scanned"] += len(rows)
+        stats["changed"] += len(changes)
+        stats["last_id"] = last_id
+        if progress:
+            progress(stats)
     
-    if not existing:
-        db.add(aggregate)
+    return stats
+
+
+def compute_daily_aggregate(db: Session, target_date: date) -> Optional[DailyFeedbackAggregate]:
+    """
+    Compute and store daily feedback aggregate for a specific date
     
-    db.commit()
-    db.refresh(aggregate)
+    Args:
+        db: Database session
+        target_date: Date to aggregate
     
-    return aggregate
+    Returns:
+        DailyFeedbackAggregate object
+    """
+    aggregates = compute_aggregates_for_date_range(db, target_date, target_date)
+    return aggregates[0] if aggregates else None
+
+
+def _empty_aggregate_row(day: date) -> Dict:
+    return {
+        'date': day,
+        'feedback_count': 0,
+        'sentiment_avg': 0.0,
+        'sentiment_positive_count': 0,
+        'sentiment_neutral_count': 0,
+        'sentiment_negative_count': 0,
+        'anonymous_count': 0,
+        'flagged_count': 0,
+        'department_breakdown': {},
+        'score_total': 0.0,
+    }
 
 
 def compute_aggregates_for_date_range(
@@ -171,6 +220,10 @@ def compute_aggregates_for_date_range(
     """
     Compute aggregates for a range of dates
     
+    One grouped query (day x sentiment x author department) over a
+    created_at range, folded into a row per day - days without feedback
+    get zeroed rows - and upserted on date in a single transaction.
+    
     Args:
         db: Database session
         start_date: Start date
@@ -179,16 +232,74 @@ def compute_aggregates_for_date_range(
     Returns:
         List of DailyFeedbackAggregate objects
     """
-    aggregates = []
+    if end_date < start_date:
+        return []
+    
+    day = func.date(Feedback.created_at)
+    sentiment = func.lower(Feedback.sentiment_label)
+    groups = db.query(
+        day.label('day'),
+        sentiment.label('sentiment'),
+        Department.name.label('department'),
+        func.count(Feedback.id).label('count'),
+        func.sum(func.coalesce(Feedback.sentiment_score, 0.0)).label('score_total'),
+        func.sum(case((Feedback.is_anonymous == True, 1), else_=0)).label('anonymous'),
+        func.sum(case((Feedback.is_flagged == True, 1), else_=0)).label('flagged'),
+    ).outerjoin(
+        User, User.id == Feedback.author_id
+    ).outerjoin(
+        Department, Department.id == User.department_id
+    ).filter(
+        Feedback.created_at >= datetime.combine(start_date, datetime.min.time()),
+        Feedback.created_at < datetime.combine(end_date + timedelta(days=1), datetime.min.time())
+    ).group_by(day, sentiment, Department.name).all()
+    
+    rows = {}
     current_date = start_date
-    
     while current_date <= end_date:
-        agg = compute_daily_aggregate(db, current_date)
-        if agg:
-            aggregates.append(agg)
+        rows[current_date] = _empty_aggregate_row(current_date)
         current_date += timedelta(days=1)
     
-    return aggregates
+    for group in groups:
+        # SQLite returns the day as text, PostgreSQL as a date
+        group_day = group.day if isinstance(group.day, date) else date.fromisoformat(str(group.day))
+        row = rows.get(group_day)
+        if row is None:
+            continue
+        row['feedback_count'] += group.count
+        row['score_total'] += group.score_total or 0.0
+        row['anonymous_count'] += group.anonymous or 0
+        row['flagged_count'] += group.flagged or 0
+        if group.sentiment in ('positive', 'neutral', 'negative'):
+            row[f'sentiment_{group.sentiment}_count'] += group.count
+        if group.department:
+            breakdown = row['department_breakdown']
+            breakdown[group.department] = breakdown.get(group.department, 0) + group.count
+    
+    now = datetime.utcnow()
+    values = []
+    for row in rows.values():
+        score_total = row.pop('score_total')
+        row['sentiment_avg'] = score_total / row['feedback_count'] if row['feedback_count'] else 0.0
+        row['department_breakdown'] = json.dumps(row['department_breakdown'])
+        row['updated_at'] = now
+        values.append(row)
+    
+    table = DailyFeedbackAggregate.__table__
+    connection = db.connection()
+    insert = postgresql_insert if connection.dialect.name == 'postgresql' else sqlite_insert
+    for start in range(0, len(values), 500):
+        stmt = insert(table).values(values[start:start + 500])
+        connection.execute(stmt.on_conflict_do_update(
+            index_elements=['date'],
+            set_={column: stmt.excluded[column] for column in values[0] if column != 'date'}
+        ))
+    db.commit()
+    
+    return db.query(DailyFeedbackAggregate).filter(
+        DailyFeedbackAggregate.date >= start_date,
+        DailyFeedbackAggregate.date <= end_date
+    ).order_by(DailyFeedbackAggregate.date).all()
 
 
 def update_keyword_tracking(
@@ -209,37 +320,14 @@ def update_keyword_tracking(
     if not feedback.content:
         return
     
-    # Extract keywords
-    keywords = extract_keywords(feedback.content, include_bigrams=True)
-    
-    today = date.today()
-    
-    for keyword in keywords:
-        # Check if keyword already exists
-        existing = db.query(FeedbackKeyword).filter(
-            FeedbackKeyword.keyword == keyword,
-            FeedbackKeyword.sentiment_context == sentiment,
-            FeedbackKeyword.department == department
-        ).first()
-        
-        if existing:
-            # Update frequency and last seen
-            existing.frequency += 1
-            existing.last_seen = today
-            existing.updated_at = datetime.utcnow()
-        else:
-            # Create new keyword entry
-            new_keyword = FeedbackKeyword(
-                keyword=keyword,
-                frequency=1,
-                sentiment_context=sentiment,
-                department=department,
-                first_seen=today,
-                last_seen=today
-            )
-            db.add(new_keyword)
-    
-    db.commit()
+    # Counted in memory and upserted in one statement (or buffered, in
+    # deferred mode)
+    keyword_tracker.record(
+        db,
+        extract_keywords(feedback.content, include_bigrams=True),
+        sentiment,
+        department
+    )
 
 
 def get_top_keywords_from_db(
@@ -294,7 +382,8 @@ def get_forecast_data(
     db: Session,
     metric: str = "feedback_count",
     window_days: int = 90,
-    forecast_weeks: int = 4
+    forecast_weeks: int = 4,
+    by_department: bool = False
 ) -> Dict:
     """
     Get forecast for a specific metric
@@ -304,6 +393,8 @@ def get_forecast_data(
         metric: Metric to forecast ('feedback_count' or 'sentiment_avg')
         window_days: Historical window in days
         forecast_weeks: Number of weeks to forecast
+        by_department: Also forecast feedback_count per author department
+            (from each day's department breakdown), fitted in one batch
     
     Returns:
         Dict with historical and forecast data
@@ -331,17 +422,28 @@ def get_forecast_data(
     else:  # feedback_count
         values = [float(agg.feedback_count) for agg in aggregates]
     
-    # Generate forecast
-    forecast_result = forecast_with_confidence(
-        dates,
-        values,
-        forecast_weeks,
-        method="exponential"
-    )
+    series = {metric: (dates, values)}
+    if by_department:
+        breakdowns = [json.loads(agg.department_breakdown or "{}") for agg in aggregates]
+        departments = sorted({name for breakdown in breakdowns for name in breakdown})
+        for name in departments:
+            series[("department", name)] = (
+                dates, [float(breakdown.get(name, 0)) for breakdown in breakdowns]
+            )
+    
+    # Generate forecasts
+    forecasts = forecast_many_with_confidence(series, forecast_weeks)
+    forecast_result = forecasts.pop(metric)
     
     # Add trend analysis
     forecast_result["trend"] = simple_trend_analysis(values)
     
+    if by_department:
+        forecast_result["departments"] = {}
+        for (_, name), department_forecast in forecasts.items():
+            department_forecast["trend"] = simple_trend_analysis(series[("department", name)][1])
+            forecast_result["departments"][name] = department_forecast
+    
     return forecast_result
 
 
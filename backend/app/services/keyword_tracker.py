@@ -0,0 +1,215 @@
+"""
+Feedback keyword frequency tracking
+
+Keywords of a feedback post are counted in memory and written with one
+INSERT ... ON CONFLICT DO UPDATE per chunk of distinct (keyword, sentiment,
+department) keys, adding to `frequency` in the database instead of reading
+each row first. The unique index on those three columns (NULLs folded to
+'') is the conflict target.
+
+Modes (KEYWORD_TRACKING_MODE):
+- "immediate": written in the request's session and committed with it
+- "deferred":  buffered per worker and flushed every
+               KEYWORD_FLUSH_INTERVAL seconds, or sooner once
+               KEYWORD_FLUSH_MAX_PENDING distinct keys are waiting; a
+               failed flush puts its counts back into the buffer
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import engine
+from app.models.insights import FeedbackKeyword, keyword_context_key
+
+logger = logging.getLogger(__name__)
+
+# (keyword, sentiment_context, department)
+Key = Tuple[str, Optional[str], Optional[str]]
+
+# Rows per statement, well below SQLite's bound-parameter limit
+UPSERT_CHUNK_SIZE = 500
+
+
+def upsert_keyword_counts(connection: Connection, counts: Dict[Key, int], seen: Dict[Key, Tuple[date, date]]) -> int:
+    """
+    Add `counts` to feedback_keywords; seen[key] is the (first, last) day
+    the increments were recorded. Returns the number of keys written.
+    """
+    if not counts:
+        return 0
+    table = FeedbackKeyword.__table__
+    insert = postgresql_insert if connection.dialect.name == 'postgresql' else sqlite_insert
+    now = datetime.utcnow()
+    # Sorted so concurrent writers lock rows in the same order
+    keys = sorted(counts, key=lambda k: (k[0], k[1] or '', k[2] or ''))
+    for start in range(0, len(keys), UPSERT_CHUNK_SIZE):
+        rows = []
+        for keyword, sentiment, department in keys[start:start + UPSERT_CHUNK_SIZE]:
+            key = (keyword, sentiment, department)
+            first_seen, last_seen = seen[key]
+            rows.append({
+                'keyword': keyword,
+                'sentiment_context': sentiment,
+                'department': department,
+                'frequency': counts[key],
+                'first_seen': first_seen,
+                'last_seen': last_seen,
+                'updated_at': now,
+            })
+        stmt = insert(table).values(rows)
+        connection.execute(stmt.on_conflict_do_update(
+            index_elements=keyword_context_key(table.c),
+            set_={
+                'frequency': table.c.frequency + stmt.excluded.frequency,
+                'last_seen': stmt.excluded.last_seen,
+                'updated_at': stmt.excluded.updated_at,
+            }
+        ))
+    return len(keys)
+
+
+class KeywordTracker:
+    def __init__(self):
+        self.mode = settings.keyword_tracking_mode
+        self._lock = threading.Lock()
+        self._pending: Counter = Counter()
+        self._seen: Dict[Key, Tuple[date, date]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        # Metrics (this worker only)
+        self.recorded = 0
+        self.flushes = 0
+        self.rows_written = 0
+        self.last_flush_ms: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    @property
+    def deferred(self) -> bool:
+        return self.mode == 'deferred'
+
+    def record(
+        self,
+        db: Session,
+        keywords: Iterable[str],
+        sentiment: Optional[str],
+        department: Optional[str] = None,
+        commit: bool = True
+    ) -> None:
+        """Count one post's keywords (duplicates count once each)"""
+        counts = Counter((keyword, sentiment, department) for keyword in keywords)
+        if not counts:
+            return
+        today = date.today()
+        if not self.deferred:
+            upsert_keyword_counts(db.connection(), counts, dict.fromkeys(counts, (today, today)))
+            if commit:
+                db.commit()
+            self.recorded += sum(counts.values())
+            return
+
+        with self._lock:
+            self._add(counts, dict.fromkeys(counts, (today, today)))
+            self.recorded += sum(counts.values())
+            pending = len(self._pending)
+        if pending >= settings.keyword_flush_max_pending:
+            self.wake()
+
+    def _add(self, counts: Counter, seen: Dict[Key, Tuple[date, date]]) -> None:
+        """Merge into the buffer; caller holds the lock"""
+        self._pending.update(counts)
+        for key, (first, last) in seen.items():
+            previous = self._seen.get(key)
+            self._seen[key] = (min(first, previous[0]), max(last, previous[1])) if previous else (first, last)
+
+    def flush(self) -> int:
+        """Write everything buffered so far; returns the number of keys written"""
+        with self._lock:
+            counts, seen = self._pending, self._seen
+            self._pending, self._seen = Counter(), {}
+        if not counts:
+            return 0
+        started = time.perf_counter()
+        try:
+            with engine.begin() as connection:
+                written = upsert_keyword_counts(connection, counts, seen)
+        except Exception as e:
+            with self._lock:
+                self._add(counts, seen)
+            self.last_error = str(e)
+            logger.error(f"Keyword flush failed, {len(counts)} keys kept for retry: {e}")
+            raise
+        self.flushes += 1
+        self.rows_written += written
+        self.last_flush_ms = round((time.perf_counter() - started) * 1000, 2)
+        return written
+
+    async def start(self) -> None:
+        if not self.deferred:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Keyword tracker flushing every {settings.keyword_flush_interval}s")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._loop = None
+        if self._pending:
+            try:
+                await asyncio.to_thread(self.flush)
+            except Exception:
+                pass
+
+    def wake(self) -> None:
+        """Flush now instead of at the next interval (safe from any thread)"""
+        if self._loop is not None and self._wakeup is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.keyword_flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await asyncio.to_thread(self.flush)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Logged by flush; the counts stay buffered for the next run
+                pass
+
+    def get_metrics(self) -> Dict:
+        return {
+            "mode": self.mode,
+            "running": self._task is not None and not self._task.done(),
+            "pending_keys": len(self._pending),
+            "pending_increments": sum(self._pending.values()),
+            "recorded_increments": self.recorded,
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "last_flush_ms": self.last_flush_ms,
+            "last_error": self.last_error,
+        }
+
+
+keyword_tracker = KeywordTracker()
@@ -9,7 +9,7 @@ Automatically calculates and updates KPI metrics from existing data sources:
 
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional, Tuple
-from sqlalchemy import func, and_, case, extract
+from sqlalchemy import func, and_, case, extract, insert, or_
 from sqlalchemy.orm import Session
 
 from app.models.task import Task
@@ -17,11 +17,73 @@ from app.models.project import Project
 from app.models.time_entry import TimeEntry
 from app.models.performance import KpiSnapshot
 from app.models.user import User
+from app.core.config import settings
+from app.services.kpi_rollup import kpi_rollup_service
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+# KPI records shared by the batched and incremental engines
+
+def _task_completion_kpi(total: int, completed: int, window_days: int) -> Dict:
+    rate = float(completed) / float(total) * 100.0 if total > 0 else 0.0
+    return {
+        'metric_name': 'Task Completion Rate',
+        'value': round(rate, 1),
+        'unit': '%',
+        'period': 'quarterly',
+        'visibility': 'manager',
+        'notes': f'Calculated from {total} tasks in the last {window_days} days',
+    }
+
+
+def _collaboration_kpi(total: int) -> Dict:
+    return {
+        'metric_name': 'Team Collaboration Score',
+        'value': round(min((total or 1) / 10, 10), 1),
+        'unit': '/10',
+        'period': 'monthly',
+        'visibility': 'manager',
+        'notes': 'Based on task interactions and cross-team activities',
+    }
+
+
+def _on_time_kpi(total: int, on_time: int) -> Dict:
+    rate = float(on_time) / float(total) * 100.0 if total > 0 else 0.0
+    return {
+        'metric_name': 'On-Time Delivery Rate',
+        'value': round(rate, 1),
+        'unit': '%',
+        'period': 'quarterly',
+        'visibility': 'manager',
+        'notes': f'{on_time} of {total} tasks delivered on time',
+    }
+
+
+def _task_duration_kpi(avg_days: float) -> Dict:
+    return {
+        'metric_name': 'Average Task Duration',
+        'value': round(avg_days, 1),
+        'unit': 'days',
+        'period': 'monthly',
+        'visibility': 'manager',
+        'notes': 'Average time from creation to completion',
+    }
+
+
+def _productivity_kpi(total_hours: float, days_logged: int) -> Dict:
+    score = min((total_hours / float((days_logged or 1) * 8)) * 100.0, 100.0)
+    return {
+        'metric_name': 'Productivity Score',
+        'value': round(score, 1),
+        'unit': '%',
+        'period': 'monthly',
+        'visibility': 'manager',
+        'notes': f'{round(total_hours, 1)} hours logged in period',
+    }
+
+
 class KPICalculator:
     """Service for calculating automated KPI metrics"""
     
@@ -467,21 +529,280 @@ class KPICalculator:
         
         return kpi_snapshot
     
-    def calculate_for_all_users(self, days: int = 90) -> Dict[int, List[Dict]]:
-        """Calculate KPIs for all active users"""
-        users = self.db.query(User).filter(User.is_active == True).all()
-        
-        results = {}
-        for user in users:
-            logger.info(f"Calculating KPIs for user: {user.full_name} (ID: {user.id})")
+    def calculate_for_all_users(self, days: int = 90, user_ids: Optional[List[int]] = None) -> Dict[int, List[Dict]]:
+        """
+        Calculate KPIs for all active users (or the given subset of them).
+
+        Set-based: each metric is one aggregate query grouped by user, the
+        previous values come from one window-function query, and every
+        snapshot is inserted in a single transaction.
+        """
+        end_date = datetime.utcnow()
+        start_date = end_date - timedelta(days=days)
+
+        query = self.db.query(User.id).filter(User.is_active == True)
+        if user_ids is not None:
+            query = query.filter(User.id.in_(user_ids))
+        user_ids = [row.id for row in query.all()]
+        if not user_ids:
+            return {}
+
+        results: Dict[int, List[Dict]] = {user_id: [] for user_id in user_ids}
+        batch_metrics = [
+            self._batch_task_created_metrics,
+            self._batch_task_completed_metrics,
+            self._batch_productivity_scores,
+            self._batch_project_metrics,
+        ]
+        for metric_func in batch_metrics:
             try:
-                user_kpis = self.calculate_all_kpis(user_id=user.id, days=days)
-                results[user.id] = user_kpis
+                for user_id, kpi_data in metric_func(user_ids, start_date, end_date):
+                    results[user_id].append(kpi_data)
             except Exception as e:
-                logger.error(f"Error calculating KPIs for user {user.id}: {str(e)}")
+                logger.error(f"Error calculating {metric_func.__name__}: {str(e)}")
                 continue
-        
+
+        self._store_snapshots(results, start_date, datetime.utcnow())
+        return results
+
+    def calculate_incremental(self, days: int = 90, user_ids: Optional[List[int]] = None) -> Dict[int, List[Dict]]:
+        """
+        Calculate KPIs only for users whose daily rollup buckets changed since
+        their last automated snapshot, summing the buckets in the window
+        instead of rescanning tasks and time entries.
+
+        Pass `user_ids` when the caller has already selected the changed
+        users (e.g. one partition of a parallel run).
+        """
+        # Taken before reading the buckets so writes during the run are picked up next time
+        snapshot_date = datetime.utcnow()
+        end_date = snapshot_date
+        start_date = end_date - timedelta(days=days)
+        start_day, end_day = start_date.date(), end_date.date()
+
+        changed = kpi_rollup_service.changed_user_ids(self.db, start_day, days) if user_ids is None else user_ids
+        if not changed:
+            logger.info("No KPI inputs changed since the last run")
+            return {}
+        user_ids = [
+            row.id for row in self.db.query(User.id).filter(User.is_active == True, User.id.in_(changed)).all()
+        ]
+        if not user_ids:
+            return {}
+
+        totals = kpi_rollup_service.window_totals(self.db, start_day, end_day, user_ids)
+        results: Dict[int, List[Dict]] = {}
+        for user_id in user_ids:
+            row = totals.get(user_id)
+            sums = {key: value or 0 for key, value in row._asdict().items()} if row else {}
+            duration_count = sums.get('duration_count', 0)
+            results[user_id] = [
+                _task_completion_kpi(int(sums.get('tasks_created', 0)), int(sums.get('tasks_created_done', 0)), days),
+                _on_time_kpi(int(sums.get('tasks_due', 0)), int(sums.get('tasks_on_time', 0))),
+                _productivity_kpi(float(sums.get('hours_logged', 0)), int(sums.get('days_logged', 0))),
+                _task_duration_kpi(sums.get('duration_days_sum', 0) / duration_count if duration_count else 0),
+                _collaboration_kpi(int(sums.get('tasks_created', 0))),
+            ]
+
+        try:
+            for user_id, kpi_data in self._batch_project_metrics(user_ids, start_date, end_date):
+                results[user_id].append(kpi_data)
+        except Exception as e:
+            logger.error(f"Error calculating _batch_project_metrics: {str(e)}")
+
+        self._store_snapshots(results, start_date, snapshot_date)
+        return results
+
+    def _store_snapshots(self, results: Dict[int, List[Dict]], start_date: datetime, snapshot_date: datetime) -> None:
+        """Attach previous values and insert every snapshot in one transaction"""
+        previous_values = self._get_previous_kpi_values(start_date, list(results))
+        rows = []
+        for user_id, kpis in results.items():
+            for kpi_data in kpis:
+                kpi_data['previous_value'] = previous_values.get((user_id, kpi_data['metric_name']))
+                rows.append({
+                    'user_id': user_id,
+                    'kpi_name': kpi_data['metric_name'],
+                    'value': kpi_data['value'],
+                    'unit': kpi_data.get('unit'),
+                    'snapshot_date': snapshot_date,
+                    'notes': kpi_data.get('notes'),
+                    'period': kpi_data.get('period', 'monthly'),
+                    'visibility': kpi_data.get('visibility', 'manager'),
+                    'measured_by_id': user_id,
+                })
+
+        if rows:
+            try:
+                self.db.execute(insert(KpiSnapshot), rows)
+                self.db.commit()
+            except Exception:
+                self.db.rollback()
+                raise
+
+        logger.info(f"Stored {len(rows)} KPI snapshots for {len(results)} users in one transaction")
+
+    def _days_between(self, later, earlier):
+        """SQL expression for the difference between two timestamps in days"""
+        if self.db.get_bind().dialect.name == "sqlite":
+            return func.julianday(later) - func.julianday(earlier)
+        return func.extract('epoch', later - earlier) / 86400.0
+
+    def _batch_task_created_metrics(
+        self,
+        user_ids: List[int],
+        start_date: datetime,
+        end_date: datetime
+    ) -> List[Tuple[int, Dict]]:
+        """Task Completion Rate and Team Collaboration Score for every user"""
+        rows = self.db.query(
+            Task.assignee_id,
+            func.count(Task.id).label('total'),
+            func.sum(case((Task.status == 'Done', 1), else_=0)).label('completed')
+        ).filter(
+            Task.created_at >= start_date,
+            Task.created_at <= end_date,
+            Task.assignee_id.in_(user_ids)
+        ).group_by(Task.assignee_id).all()
+        stats = {row.assignee_id: row for row in rows}
+
+        window_days = (end_date - start_date).days
+        results = []
+        for user_id in user_ids:
+            row = stats.get(user_id)
+            total = row.total if row else 0
+            completed = (row.completed or 0) if row else 0
+            results.append((user_id, _task_completion_kpi(total, completed, window_days)))
+            results.append((user_id, _collaboration_kpi(total)))
+        return results
+
+    def _batch_task_completed_metrics(
+        self,
+        user_ids: List[int],
+        start_date: datetime,
+        end_date: datetime
+    ) -> List[Tuple[int, Dict]]:
+        """On-Time Delivery Rate and Average Task Duration for every user"""
+        has_due_date = Task.due_date.isnot(None)
+        rows = self.db.query(
+            Task.assignee_id,
+            func.sum(case((has_due_date, 1), else_=0)).label('total'),
+            func.sum(case((and_(has_due_date, Task.completed_at <= Task.due_date), 1), else_=0)).label('on_time'),
+            func.avg(case(
+                (and_(Task.created_at.isnot(None), Task.completed_at > Task.created_at),
+                 self._days_between(Task.completed_at, Task.created_at)),
+                else_=None
+            )).label('avg_days')
+        ).filter(
+            Task.status == 'Done',
+            Task.completed_at.isnot(None),
+            Task.completed_at >= start_date,
+            Task.completed_at <= end_date,
+            Task.assignee_id.in_(user_ids)
+        ).group_by(Task.assignee_id).all()
+        stats = {row.assignee_id: row for row in rows}
+
+        results = []
+        for user_id in user_ids:
+            row = stats.get(user_id)
+            total = (row.total or 0) if row else 0
+            on_time = (row.on_time or 0) if row else 0
+            avg_days = float(row.avg_days or 0) if row else 0
+            results.append((user_id, _on_time_kpi(total, on_time)))
+            results.append((user_id, _task_duration_kpi(avg_days)))
+        return results
+
+    def _batch_productivity_scores(
+        self,
+        user_ids: List[int],
+        start_date: datetime,
+        end_date: datetime
+    ) -> List[Tuple[int, Dict]]:
+        """Productivity Score (hours logged vs. 8h per day logged) for every user"""
+        rows = self.db.query(
+            TimeEntry.user_id,
+            func.sum(self._days_between(TimeEntry.clock_out, TimeEntry.clock_in) * 24.0).label('hours'),
+            func.count(func.distinct(func.date(TimeEntry.clock_in))).label('days_logged')
+        ).filter(
+            TimeEntry.clock_in >= start_date,
+            TimeEntry.clock_in <= end_date,
+            TimeEntry.clock_out.isnot(None),
+            TimeEntry.user_id.in_(user_ids)
+        ).group_by(TimeEntry.user_id).all()
+        stats = {row.user_id: row for row in rows}
+
+        results = []
+        for user_id in user_ids:
+            row = stats.get(user_id)
+            total_hours = float(row.hours or 0) if row else 0.0
+            days_logged = row.days_logged if row else 0
+            results.append((user_id, _productivity_kpi(total_hours, days_logged)))
         return results
+
+    def _batch_project_metrics(
+        self,
+        user_ids: List[int],
+        start_date: datetime,
+        end_date: datetime
+    ) -> List[Tuple[int, Dict]]:
+        """Innovation Projects and Active Projects Count (company-level, same for every user)"""
+        is_innovation = or_(
+            Project.title.ilike('%innovation%'),
+            Project.title.ilike('%r&d%'),
+            Project.description.ilike('%innovation%'),
+            Project.description.ilike('%research%')
+        )
+        row = self.db.query(
+            func.count(Project.id).label('total'),
+            func.sum(case((is_innovation, 1), else_=0)).label('innovation')
+        ).filter(
+            Project.created_at >= start_date,
+            Project.created_at <= end_date
+        ).first()
+        total_projects = row.total or 0
+        innovation_count = row.innovation or 0
+
+        results = []
+        for user_id in user_ids:
+            results.append((user_id, {
+                'metric_name': 'Innovation Projects',
+                'value': innovation_count,
+                'unit': 'count',
+                'period': 'quarterly',
+                'visibility': 'admin',
+                'notes': 'Projects with innovation or R&D keywords',
+            }))
+            results.append((user_id, {
+                'metric_name': 'Active Projects Count',
+                'value': total_projects,
+                'unit': 'count',
+                'period': 'quarterly',
+                'visibility': 'admin',
+                'notes': f'{total_projects} projects in period',
+            }))
+        return results
+
+    def _get_previous_kpi_values(
+        self,
+        before_date: datetime,
+        user_ids: Optional[List[int]] = None
+    ) -> Dict[Tuple[int, str], float]:
+        """Most recent value before `before_date` for every (user, metric) pair"""
+        filters = [KpiSnapshot.snapshot_date < before_date]
+        if user_ids is not None:
+            filters.append(KpiSnapshot.user_id.in_(user_ids))
+        ranked = self.db.query(
+            KpiSnapshot.user_id,
+            KpiSnapshot.kpi_name,
+            KpiSnapshot.value,
+            func.row_number().over(
+                partition_by=(KpiSnapshot.user_id, KpiSnapshot.kpi_name),
+                order_by=KpiSnapshot.snapshot_date.desc()
+            ).label('rank')
+        ).filter(*filters).subquery()
+
+        rows = self.db.query(ranked.c.user_id, ranked.c.kpi_name, ranked.c.value).filter(ranked.c.rank == 1).all()
+        return {(row.user_id, row.kpi_name): float(row.value) for row in rows}
     
     def calculate_company_wide_kpis(self, days: int = 90) -> List[Dict]:
         """Calculate aggregate KPIs across the entire company"""
@@ -489,12 +810,16 @@ class KPICalculator:
         return self.calculate_all_kpis(user_id=None, days=days)
 
 
-def run_kpi_calculation_job(db: Session, user_id: Optional[int] = None):
+def run_kpi_calculation_job(db: Session, user_id: Optional[int] = None, mode: Optional[str] = None):
     """
     Main entry point for KPI calculation job.
     Can be called from cron, API endpoint, or background task.
+
+    mode: "incremental" (only users whose rollups changed) or "full"
+    (every active user); defaults to KPI_CALCULATION_MODE.
     """
     calculator = KPICalculator(db)
+    mode = mode or settings.kpi_calculation_mode
     
     if user_id:
         # Calculate for specific user
@@ -502,7 +827,10 @@ def run_kpi_calculation_job(db: Session, user_id: Optional[int] = None):
         logger.info(f"Calculated {len(results)} KPIs for user {user_id}")
     else:
         # Calculate for all users + company-wide
-        user_results = calculator.calculate_for_all_users(days=90)
+        if mode == "incremental":
+            user_results = calculator.calculate_incremental(days=90)
+        else:
+            user_results = calculator.calculate_for_all_users(days=90)
         company_results = calculator.calculate_company_wide_kpis(days=90)
         
         total_kpis = sum(len(kpis) for kpis in user_results.values()) + len(company_results)
@@ -0,0 +1,267 @@
+"""
+Incremental KPI rollups
+
+Keeps per-user daily counters in kpi_daily_rollups so that the scheduled
+KPI job can sum a window of buckets instead of rescanning 90 days of tasks
+and time entries:
+- tasks: counted on their creation day (created / Done) and, once Done,
+  on their completion day (on-time / duration)
+- time entries: hours logged on their clock-in day, once clocked out
+
+Every task or time entry write removes the row's previous contribution
+and adds its new one, in the same transaction as the ORM flush (the same
+mapper-event approach as the search index). Bulk `query.update()` calls
+and writes from the Streamlit app bypass the hooks; `rebuild()`
+recomputes every bucket from the source tables.
+"""
+
+import logging
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import case, event, func, inspect, select
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from app.models.performance import KpiDailyRollup, KpiSnapshot
+from app.models.task import Task
+from app.models.time_entry import TimeEntry
+
+logger = logging.getLogger(__name__)
+
+COUNTERS = (
+    'tasks_created', 'tasks_created_done',
+    'tasks_due', 'tasks_on_time', 'duration_days_sum', 'duration_count',
+    'hours_logged', 'entries_logged',
+)
+
+TASK_FIELDS = ('assignee_id', 'status', 'created_at', 'completed_at', 'due_date')
+ENTRY_FIELDS = ('user_id', 'clock_in', 'clock_out')
+
+# Snapshot names written by the automated KPI engine
+AUTOMATED_KPI_NAMES = (
+    'Task Completion Rate', 'On-Time Delivery Rate', 'Productivity Score',
+    'Innovation Projects', 'Average Task Duration', 'Active Projects Count',
+    'Team Collaboration Score',
+)
+
+Contribution = Tuple[int, date, Dict[str, float]]
+
+
+def _naive(value: Optional[datetime]) -> Optional[datetime]:
+    if value is not None and value.tzinfo is not None:
+        return value.replace(tzinfo=None)
+    return value
+
+
+def _is_on_time(completed_at: datetime, due_date: str) -> bool:
+    # Same ordering as the SQL comparison against SQLite's text timestamps
+    return completed_at.strftime('%Y-%m-%d %H:%M:%S.%f') <= due_date
+
+
+def task_contributions(values: Optional[dict]) -> List[Contribution]:
+    """Bucket deltas one task contributes, given its column values"""
+    if not values or not values.get('assignee_id'):
+        return []
+    user_id = values['assignee_id']
+    created_at = values.get('created_at')
+    completed_at = values.get('completed_at')
+    is_done = values.get('status') == 'Done'
+    contributions = []
+
+    if isinstance(created_at, datetime):
+        contributions.append((user_id, created_at.date(), {
+            'tasks_created': 1,
+            'tasks_created_done': 1 if is_done else 0,
+        }))
+
+    if is_done and isinstance(completed_at, datetime):
+        deltas = {}
+        due_date = values.get('due_date')
+        if due_date:
+            deltas['tasks_due'] = 1
+            deltas['tasks_on_time'] = 1 if _is_on_time(completed_at, due_date) else 0
+        if isinstance(created_at, datetime) and completed_at > created_at:
+            deltas['duration_days_sum'] = (completed_at - created_at).total_seconds() / 86400
+            deltas['duration_count'] = 1
+        if deltas:
+            contributions.append((user_id, completed_at.date(), deltas))
+
+    return contributions
+
+
+def entry_contributions(values: Optional[dict]) -> List[Contribution]:
+    """Bucket deltas one time entry contributes, given its column values"""
+    if not values or not values.get('user_id'):
+        return []
+    clock_in, clock_out = values.get('clock_in'), values.get('clock_out')
+    if not isinstance(clock_in, datetime) or not isinstance(clock_out, datetime):
+        return []
+    return [(values['user_id'], clock_in.date(), {
+        'hours_logged': (clock_out - clock_in).total_seconds() / 3600,
+        'entries_logged': 1,
+    })]
+
+
+class KpiRollupService:
+    """Maintains and queries the per-user daily KPI buckets"""
+
+    def apply(self, connection: Connection, removed: List[Contribution], added: List[Contribution]) -> None:
+        """Subtract `removed` and add `added` to their buckets"""
+        merged: Dict[Tuple[int, date], Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        for sign, contributions in ((-1, removed), (1, added)):
+            for user_id, day, deltas in contributions:
+                for counter, delta in deltas.items():
+                    merged[(user_id, day)][counter] += sign * delta
+
+        now = datetime.utcnow()
+        for (user_id, day), deltas in merged.items():
+            if not any(deltas.values()):
+                continue
+            row = {counter: deltas.get(counter, 0) for counter in COUNTERS}
+            row.update(user_id=user_id, day=day, updated_at=now)
+            self._upsert(connection, row)
+
+    def _upsert(self, connection: Connection, row: dict) -> None:
+        table = KpiDailyRollup.__table__
+        insert = postgresql_insert if connection.dialect.name == 'postgresql' else sqlite_insert
+        stmt = insert(table).values(**row)
+        update = {counter: table.c[counter] + stmt.excluded[counter] for counter in COUNTERS}
+        update['updated_at'] = stmt.excluded.updated_at
+        connection.execute(stmt.on_conflict_do_update(index_elements=['user_id', 'day'], set_=update))
+
+    def rebuild(self, db: Session) -> int:
+        """Recompute every bucket from tasks and time entries; returns the bucket count"""
+        buckets: Dict[Tuple[int, date], Dict[str, float]] = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+
+        def add(contributions: Iterable[Contribution]):
+            for user_id, day, deltas in contributions:
+                bucket = buckets[(user_id, day)]
+                for counter, delta in deltas.items():
+                    bucket[counter] += delta
+
+        for row in db.query(*[getattr(Task, field) for field in TASK_FIELDS]).yield_per(5000):
+            add(task_contributions(row._asdict()))
+        for row in db.query(*[getattr(TimeEntry, field) for field in ENTRY_FIELDS]).yield_per(5000):
+            add(entry_contributions(row._asdict()))
+
+        now = datetime.utcnow()
+        rows = [
+            {'user_id': user_id, 'day': day, 'updated_at': now, **counters}
+            for (user_id, day), counters in buckets.items()
+        ]
+        db.query(KpiDailyRollup).delete(synchronize_session=False)
+        if rows:
+            db.execute(KpiDailyRollup.__table__.insert(), rows)
+        db.commit()
+        logger.info(f"Rebuilt {len(rows)} KPI rollup buckets")
+        return len(rows)
+
+    def backfill_if_empty(self, db: Session) -> None:
+        """Populate the buckets on first start against an existing database"""
+        if db.query(KpiDailyRollup.id).first() is None:
+            self.rebuild(db)
+
+    def window_totals(self, db: Session, start_day: date, end_day: date, user_ids: Iterable[int]):
+        """Summed counters per user over [start_day, end_day], plus distinct days logged"""
+        user_ids = list(user_ids)
+        if not user_ids:
+            return {}
+        rows = db.query(
+            KpiDailyRollup.user_id,
+            *[func.sum(getattr(KpiDailyRollup, counter)).label(counter) for counter in COUNTERS],
+            func.sum(case((KpiDailyRollup.entries_logged > 0, 1), else_=0)).label('days_logged')
+        ).filter(
+            KpiDailyRollup.day >= start_day,
+            KpiDailyRollup.day <= end_day,
+            KpiDailyRollup.user_id.in_(user_ids)
+        ).group_by(KpiDailyRollup.user_id).all()
+        return {row.user_id: row for row in rows}
+
+    def changed_user_ids(self, db: Session, start_day: date, days: int) -> Set[int]:
+        """
+        Users whose KPI inputs changed since their last automated snapshot:
+        a bucket was written after it, or a bucket that was inside the window
+        then has since dropped out of it.
+        """
+        last_snapshots = db.query(
+            KpiSnapshot.user_id,
+            func.max(KpiSnapshot.snapshot_date).label('last_snapshot')
+        ).filter(
+            KpiSnapshot.kpi_name.in_(AUTOMATED_KPI_NAMES)
+        ).group_by(KpiSnapshot.user_id).subquery()
+
+        rows = db.query(
+            KpiDailyRollup.user_id,
+            func.max(KpiDailyRollup.updated_at).label('last_update'),
+            func.max(case((KpiDailyRollup.day < start_day, KpiDailyRollup.day), else_=None)).label('last_expired_day'),
+            last_snapshots.c.last_snapshot
+        ).outerjoin(
+            last_snapshots, last_snapshots.c.user_id == KpiDailyRollup.user_id
+        ).group_by(KpiDailyRollup.user_id, last_snapshots.c.last_snapshot).all()
+
+        changed = set()
+        for row in rows:
+            last_snapshot = _naive(row.last_snapshot)
+            if last_snapshot is None or _naive(row.last_update) > last_snapshot:
+                changed.add(row.user_id)
+                continue
+            expired = row.last_expired_day
+            if isinstance(expired, str):
+                expired = date.fromisoformat(expired)
+            if expired is not None and expired >= (last_snapshot - timedelta(days=days)).date():
+                changed.add(row.user_id)
+        return changed
+
+
+kpi_rollup_service = KpiRollupService()
+
+
+# ----------------------------------------------------------------------
+# Write hooks
+# ----------------------------------------------------------------------
+
+def _read_row(connection: Connection, model, fields, row_id) -> Optional[dict]:
+    columns = [getattr(model, field) for field in fields]
+    row = connection.execute(select(*columns).where(model.id == row_id)).mappings().first()
+    return dict(row) if row else None
+
+
+def _register_hooks(model, fields, contributions):
+    # Values are read back through the flush's connection so that column
+    # defaults (created_at/clock_in = now()) and unloaded attributes are exact
+
+    def after_insert(mapper, connection, target):
+        current = _read_row(connection, model, fields, target.id)
+        kpi_rollup_service.apply(connection, [], contributions(current))
+
+    # The previous row is read before the UPDATE: after a commit the
+    # attributes are expired and their history carries no old value
+    def before_update(mapper, connection, target):
+        state = inspect(target)
+        if any(state.attrs[field].history.has_changes() for field in fields):
+            state.info['kpi_rollup_previous'] = _read_row(connection, model, fields, target.id)
+
+    def after_update(mapper, connection, target):
+        state = inspect(target)
+        if 'kpi_rollup_previous' not in state.info:
+            return
+        previous = state.info.pop('kpi_rollup_previous')
+        current = _read_row(connection, model, fields, target.id)
+        kpi_rollup_service.apply(connection, contributions(previous), contributions(current))
+
+    def before_delete(mapper, connection, target):
+        previous = _read_row(connection, model, fields, target.id)
+        kpi_rollup_service.apply(connection, contributions(previous), [])
+
+    event.listen(model, 'after_insert', after_insert)
+    event.listen(model, 'before_update', before_update)
+    event.listen(model, 'after_update', after_update)
+    event.listen(model, 'before_delete', before_delete)
+
+
+_register_hooks(Task, TASK_FIELDS, task_contributions)
+_register_hooks(TimeEntry, ENTRY_FIELDS, entry_contributions)
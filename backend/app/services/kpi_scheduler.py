@@ -5,35 +5,197 @@ Runs KPI calculation jobs on a scheduled basis (every 6 hours by default).
 
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
-from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
 from sqlalchemy.orm import Session
-from app.core.database import SessionLocal
-from app.services.kpi_calculator import run_kpi_calculation_job
+from app.core.config import settings
+from app.core.database import SessionLocal, engine
+from app.models.user import User
+from app.services.kpi_calculator import KPICalculator
+from app.services.kpi_rollup import kpi_rollup_service
+import copy
 import logging
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
 # Global scheduler instance
 scheduler = None
 
+KPI_WINDOW_DAYS = 90
 
-def kpi_calculation_job():
+# Held for the whole run; a run that outlasts the cron interval makes the
+# next trigger (or a manual one) skip instead of running on top of it
+_run_lock = threading.Lock()
+_state_lock = threading.Lock()
+_job_state = {
+    "running": False,
+    "current_run": None,
+    "last_run": None,
+    "skipped_overlapping_runs": 0,
+}
+
+
+def _partition_users(db: Session, user_ids: Optional[List[int]] = None) -> List[List[int]]:
+    """Split active users into partitions by department or by ID range"""
+    query = db.query(User.id, User.department_id).filter(User.is_active == True)
+    if user_ids is not None:
+        query = query.filter(User.id.in_(user_ids))
+    rows = query.order_by(User.id).all()
+    size = max(1, settings.kpi_job_partition_size)
+
+    if settings.kpi_job_partition_by == "department":
+        groups: Dict[Optional[int], List[int]] = {}
+        for row in rows:
+            groups.setdefault(row.department_id, []).append(row.id)
+        ordered = list(groups.values())
+    else:
+        ordered = [[row.id for row in rows]]
+
+    # Large departments are split further so one partition can't dominate the run
+    return [ids[i:i + size] for ids in ordered for i in range(0, len(ids), size)]
+
+
+def _init_worker_process():
+    # Connections inherited from the parent process must not be shared
+    engine.dispose(close=False)
+
+
+def _run_partition(partition_id: int, user_ids: List[int], mode: str, days: int) -> dict:
+    """Calculate one partition with its own session (runs in a pool worker)"""
+    started = time.perf_counter()
+    db = SessionLocal()
+    try:
+        calculator = KPICalculator(db)
+        if mode == "incremental":
+            results = calculator.calculate_incremental(days=days, user_ids=user_ids)
+        else:
+            results = calculator.calculate_for_all_users(days=days, user_ids=user_ids)
+        return {
+            "partition": partition_id,
+            "users": len(user_ids),
+            "snapshots": sum(len(kpis) for kpis in results.values()),
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+    finally:
+        db.close()
+
+
+def run_partitioned_kpi_job(mode: Optional[str] = None, days: int = KPI_WINDOW_DAYS) -> dict:
+    """
+    Calculate KPIs for every active user, partitioned over a thread or
+    process pool (KPI_JOB_EXECUTOR / KPI_JOB_WORKERS), then company-wide.
+    """
+    mode = mode or settings.kpi_calculation_mode
+    db: Session = SessionLocal()
+    try:
+        candidates = None
+        if mode == "incremental":
+            start_day = (datetime.utcnow() - timedelta(days=days)).date()
+            candidates = list(kpi_rollup_service.changed_user_ids(db, start_day, days))
+        partitions = _partition_users(db, candidates)
+    finally:
+        db.close()
+
+    run = {
+        "started_at": datetime.utcnow().isoformat(),
+        "finished_at": None,
+        "mode": mode,
+        "executor": settings.kpi_job_executor,
+        "workers": settings.kpi_job_workers,
+        "partition_by": settings.kpi_job_partition_by,
+        "partitions_total": len(partitions),
+        "partitions_done": 0,
+        "partitions_failed": 0,
+        "users": sum(len(p) for p in partitions),
+        "snapshots": 0,
+        "partitions": [],
+    }
+    with _state_lock:
+        _job_state["current_run"] = run
+
+    started = time.perf_counter()
+    if partitions:
+        if settings.kpi_job_executor == "process":
+            pool = ProcessPoolExecutor(max_workers=settings.kpi_job_workers, initializer=_init_worker_process)
+        else:
+            pool = ThreadPoolExecutor(max_workers=settings.kpi_job_workers, thread_name_prefix="kpi-partition")
+        with pool:
+            futures = {
+                pool.submit(_run_partition, partition_id, user_ids, mode, days): (partition_id, user_ids)
+                for partition_id, user_ids in enumerate(partitions)
+            }
+            for future in as_completed(futures):
+                partition_id, user_ids = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.error(f"❌ KPI partition {partition_id} ({len(user_ids)} users) failed: {e}")
+                    result = {"partition": partition_id, "users": len(user_ids), "error": str(e)}
+                with _state_lock:
+                    run["partitions"].append(result)
+                    if "error" in result:
+                        run["partitions_failed"] += 1
+                    else:
+                        run["partitions_done"] += 1
+                        run["snapshots"] += result["snapshots"]
+
+    db = SessionLocal()
+    try:
+        company_results = KPICalculator(db).calculate_company_wide_kpis(days=days)
+    finally:
+        db.close()
+
+    with _state_lock:
+        run["snapshots"] += len(company_results)
+        run["seconds"] = round(time.perf_counter() - started, 3)
+        run["finished_at"] = datetime.utcnow().isoformat()
+    logger.info(
+        f"Calculated {run['snapshots']} KPIs for {run['users']} users in {run['partitions_total']} partitions "
+        f"({run['partitions_failed']} failed) in {run['seconds']}s"
+    )
+    return run
+
+
+def kpi_job_running() -> bool:
+    """Whether a partitioned KPI run (scheduled or manual) holds the run lock"""
+    return _run_lock.locked()
+
+
+def kpi_calculation_job(mode: Optional[str] = None):
     """
     Background job that runs KPI calculations.
-    This function will be called by the scheduler.
+    Called by the scheduler, and by manual all-user triggers, so the two
+    never overlap.
     """
+    if not _run_lock.acquire(blocking=False):
+        with _state_lock:
+            _job_state["skipped_overlapping_runs"] += 1
+        logger.warning("⏭️ Skipping KPI calculation: the previous run is still in progress")
+        return
+
     logger.info("=" * 60)
-    logger.info(f"Starting scheduled KPI calculation job at {datetime.utcnow().isoformat()}")
+    logger.info(f"Starting KPI calculation job at {datetime.utcnow().isoformat()}")
     logger.info("=" * 60)
     
-    db: Session = SessionLocal()
+    with _state_lock:
+        _job_state["running"] = True
     try:
-        result = run_kpi_calculation_job(db, user_id=None)
-        logger.info(f"✅ KPI calculation job completed successfully: {result}")
+        result = run_partitioned_kpi_job(mode)
+        logger.info(f"✅ KPI calculation job completed: {result['partitions_done']}/{result['partitions_total']} partitions")
     except Exception as e:
         logger.error(f"❌ KPI calculation job failed: {str(e)}", exc_info=True)
+        with _state_lock:
+            if _job_state["current_run"] is not None:
+                _job_state["current_run"]["error"] = str(e)
     finally:
-        db.close()
+        with _state_lock:
+            _job_state["running"] = False
+            _job_state["last_run"] = _job_state["current_run"]
+            _job_state["current_run"] = None
+        _run_lock.release()
     
     logger.info("=" * 60)
 
@@ -59,6 +221,8 @@ def start_kpi_scheduler():
         id='kpi_calculation',
         name='Automated KPI Calculation',
         replace_existing=True,
+        max_instances=1,
+        coalesce=True,
         misfire_grace_time=3600  # Allow 1 hour grace period if job misses scheduled time
     )
     
@@ -97,11 +261,15 @@ def get_scheduler_status():
     """
     global scheduler
     
+    with _state_lock:
+        kpi_job = copy.deepcopy(_job_state)
+    
     if scheduler is None:
         return {
             "status": "not_initialized",
             "running": False,
-            "jobs": []
+            "jobs": [],
+            "kpi_job": kpi_job
         }
     
     jobs = []
@@ -116,7 +284,8 @@ def get_scheduler_status():
     return {
         "status": "running" if scheduler.running else "stopped",
         "running": scheduler.running,
-        "jobs": jobs
+        "jobs": jobs,
+        "kpi_job": kpi_job
     }
 
 
@@ -0,0 +1,390 @@
+"""
+Unread notification counters and live notification events
+
+`get_unread_count` is served from a per-user counter instead of a COUNT(*)
+per poll. Counters are filled on first read and then moved by deltas:
+- ORM writes to Notification (create_notification, marking one read) are
+  picked up by mapper events
+- bulk statements (create_notifications_bulk, mark all read) record their
+  deltas explicitly with `record()`
+Deltas are collected on the session and applied when it commits, so a
+rolled-back write never moves a counter. The same commit hook publishes
+the new counts and notifications to the user's /notifications/ws sockets
+through the WebSocket manager (and its backplane, across workers).
+
+Stores (NOTIFICATION_COUNTER_STORE):
+- memory: per-process dict; other workers' commits only drop the counts
+  they touch (re-read on next use), so it stays correct with several
+  workers at the cost of a COUNT after each remote change
+- redis:  shared keys on a Redis-compatible server (scripts/pubsub_server.py
+  speaks enough of the protocol), with a TTL so a missed update heals
+"""
+
+import json
+import logging
+import socket
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, Optional
+from urllib.parse import urlparse
+
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.notification import Notification
+from app.utils.chat_backplane import encode_command
+from app.utils.websocket_manager import manager
+
+logger = logging.getLogger(__name__)
+
+MAX_CACHED_USERS = 100_000
+
+NOTIFICATION_FIELDS = ('type', 'title', 'message', 'data', 'is_read', 'created_at')
+
+
+class MemoryCounterStore:
+    def __init__(self, max_users: int = MAX_CACHED_USERS):
+        self.max_users = max_users
+        self._lock = threading.Lock()
+        self._counts: Dict[int, int] = {}
+        # Write sequence number of the last delta per user, so a count read
+        # from the database before that delta is never cached
+        self._seq = 0
+        self._floor = 0
+        self._touched: Dict[int, int] = {}
+
+    def get(self, user_id: int) -> Optional[int]:
+        with self._lock:
+            return self._counts.get(user_id)
+
+    def begin_read(self, user_id: int) -> int:
+        with self._lock:
+            return self._seq
+
+    def prime(self, user_id: int, count: int, token: int) -> None:
+        with self._lock:
+            if token < self._floor or self._touched.get(user_id, -1) > token:
+                return
+            if len(self._counts) >= self.max_users:
+                self._counts = {}
+                self._touched = {}
+                self._floor = self._seq
+            self._counts.setdefault(user_id, count)
+
+    def apply(self, deltas: Dict[int, int]) -> Dict[int, Optional[int]]:
+        with self._lock:
+            self._seq += 1
+            for user_id, delta in deltas.items():
+                self._touched[user_id] = self._seq
+                if user_id in self._counts:
+                    self._counts[user_id] = max(0, self._counts[user_id] + delta)
+            return {user_id: self._counts.get(user_id) for user_id in deltas}
+
+    def invalidate(self, user_ids: Iterable[int]) -> None:
+        with self._lock:
+            self._seq += 1
+            for user_id in user_ids:
+                self._counts.pop(user_id, None)
+                self._touched[user_id] = self._seq
+
+
+def _read_reply(stream):
+    """Read one RESP value from a blocking socket file"""
+    line = stream.readline()
+    if not line:
+        raise ConnectionError("Connection closed by server")
+    prefix, body = line[:1], line[1:-2]
+    if prefix == b"+":
+        return body.decode()
+    if prefix == b"-":
+        raise RuntimeError(body.decode())
+    if prefix == b":":
+        return int(body)
+    if prefix == b"$":
+        length = int(body)
+        return None if length == -1 else stream.read(length + 2)[:-2]
+    if prefix == b"*":
+        length = int(body)
+        return None if length == -1 else [_read_reply(stream) for _ in range(length)]
+    raise RuntimeError(f"Unexpected RESP prefix: {prefix!r}")
+
+
+class RedisCounterStore:
+    """
+    Counters shared by all workers. Values are stored as count + 1, so an
+    INCRBY that landed on a missing key (result == delta) is detected and
+    the key dropped instead of caching a count that was never read.
+    """
+
+    KEY_PREFIX = "notifications:unread:"
+
+    def __init__(self, url: str, ttl_seconds: int):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._sock: Optional[socket.socket] = None
+        self._stream = None
+
+    def _key(self, user_id: int) -> str:
+        return f"{self.KEY_PREFIX}{user_id}"
+
+    def _pipeline(self, *commands) -> list:
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._sock is None:
+                        self._sock = socket.create_connection((self.host, self.port), timeout=2)
+                        self._stream = self._sock.makefile("rb")
+                    self._sock.sendall(b"".join(encode_command(*command) for command in commands))
+                    replies = []
+                    for _ in commands:
+                        # Read every reply, even after an error, to keep the stream in step
+                        try:
+                            replies.append(_read_reply(self._stream))
+                        except RuntimeError as e:
+                            replies.append(e)
+                except (OSError, ConnectionError) as e:
+                    self._close()
+                    if attempt == 1:
+                        raise ConnectionError(f"Counter store unavailable: {e}")
+                    continue
+                errors = [reply for reply in replies if isinstance(reply, RuntimeError)]
+                if errors:
+                    raise errors[0]
+                return replies
+
+    def _close(self) -> None:
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = None
+        self._stream = None
+
+    def get(self, user_id: int) -> Optional[int]:
+        try:
+            value = self._pipeline(("GET", self._key(user_id)))[0]
+        except (ConnectionError, RuntimeError) as e:
+            logger.warning(f"Unread counter store: {e}")
+            return None
+        return None if value is None else int(value) - 1
+
+    def begin_read(self, user_id: int) -> int:
+        return 0
+
+    def prime(self, user_id: int, count: int, token: int) -> None:
+        try:
+            self._pipeline(("SET", self._key(user_id), count + 1, "EX", self.ttl_seconds, "NX"))
+        except (ConnectionError, RuntimeError) as e:
+            logger.warning(f"Unread counter store: {e}")
+
+    def apply(self, deltas: Dict[int, int]) -> Dict[int, Optional[int]]:
+        user_ids = list(deltas)
+        try:
+            results = self._pipeline(*[("INCRBY", self._key(uid), deltas[uid]) for uid in user_ids])
+            missing = [uid for uid, result in zip(user_ids, results) if result == deltas[uid]]
+            if missing:
+                self._pipeline(*[("DEL", self._key(uid)) for uid in missing])
+        except (ConnectionError, RuntimeError) as e:
+            logger.error(f"Failed to update unread counters: {e}")
+            return dict.fromkeys(user_ids)
+        return {
+            uid: None if result == deltas[uid] else max(0, result - 1)
+            for uid, result in zip(user_ids, results)
+        }
+
+    def invalidate(self, user_ids: Iterable[int]) -> None:
+        keys = [self._key(uid) for uid in user_ids]
+        if keys:
+            try:
+                self._pipeline(("DEL", *keys))
+            except (ConnectionError, RuntimeError) as e:
+                logger.warning(f"Unread counter store: {e}")
+
+
+def create_counter_store(kind: Optional[str] = None):
+    """Build the store selected by NOTIFICATION_COUNTER_STORE"""
+    kind = (kind or settings.notification_counter_store).lower()
+    if kind == "redis":
+        return RedisCounterStore(settings.notification_counter_store_url, settings.notification_counter_ttl_seconds)
+    if kind != "memory":
+        logger.warning(f"Unknown notification counter store '{kind}', using in-process counters")
+    return MemoryCounterStore()
+
+
+class UnreadCounters:
+    def __init__(self, store=None):
+        self.store = store or create_counter_store()
+        self.hits = 0
+        self.misses = 0
+
+    async def get_unread_count(self, db, user_id: int) -> int:
+        """Cached unread count; `db` is an AsyncSession"""
+        cached = self.store.get(user_id)
+        if cached is not None:
+            self.hits += 1
+            return cached
+        self.misses += 1
+        token = self.store.begin_read(user_id)
+        result = await db.execute(
+            select(func.count(Notification.id)).where(
+                Notification.user_id == user_id,
+                Notification.is_read == False
+            )
+        )
+        count = result.scalar_one()
+        self.store.prime(user_id, count, token)
+        return count
+
+    def record(self, db, deltas: Optional[Dict[int, int]] = None, notification: Optional[dict] = None,
+               recipients: Optional[Dict[int, Optional[int]]] = None) -> None:
+        """
+        Queue counter deltas and a new-notification event on the session
+        (Session or AsyncSession); both take effect when it commits.
+        `notification` holds the fields shared by all `recipients`
+        ({user_id: notification_id}).
+        """
+        info = db.info
+        if deltas:
+            pending = info.setdefault('unread_deltas', defaultdict(int))
+            for user_id, delta in deltas.items():
+                pending[user_id] += delta
+        if notification is not None and recipients:
+            info.setdefault('notification_events', []).append({
+                "notification": notification,
+                "recipients": recipients,
+            })
+
+    def get_metrics(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "store": type(self.store).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+        }
+
+
+unread_counters = UnreadCounters()
+
+
+def notification_fields(notification: Notification) -> dict:
+    """The JSON-ready fields of a notification shared by every recipient"""
+    fields = {field: getattr(notification, field) for field in NOTIFICATION_FIELDS}
+    if fields['created_at'] is not None:
+        fields['created_at'] = fields['created_at'].isoformat()
+    return fields
+
+
+# ----------------------------------------------------------------------
+# Write hooks
+# ----------------------------------------------------------------------
+
+def _on_insert(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is None or target.is_read:
+        return
+    unread_counters.record(session, {target.user_id: 1}, notification_fields(target), {target.user_id: target.id})
+
+
+def _on_update(mapper, connection, target):
+    history = inspect(target).attrs.is_read.history
+    if not history.has_changes():
+        return
+    was_read = bool(history.deleted[0]) if history.deleted else False
+    if bool(target.is_read) != was_read:
+        session = Session.object_session(target)
+        if session is not None:
+            unread_counters.record(session, {target.user_id: -1 if target.is_read else 1})
+
+
+def _on_delete(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None and not target.is_read:
+        unread_counters.record(session, {target.user_id: -1})
+
+
+event.listen(Notification, 'after_insert', _on_insert)
+event.listen(Notification, 'after_update', _on_update)
+event.listen(Notification, 'after_delete', _on_delete)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_after_commit(session):
+    deltas = session.info.pop('unread_deltas', None)
+    events = session.info.pop('notification_events', None)
+    if not deltas and not events:
+        return
+    counts = unread_counters.store.apply({uid: d for uid, d in deltas.items() if d}) if deltas else {}
+    manager.publish_user_event_threadsafe(json.dumps({
+        "origin": manager.backplane.origin,
+        "counts": counts,
+        "notifications": events or [],
+    }, default=str))
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop('unread_deltas', None)
+    session.info.pop('notification_events', None)
+
+
+# ----------------------------------------------------------------------
+# Socket delivery (runs on every worker)
+# ----------------------------------------------------------------------
+
+async def _count_for_socket(user_id: int) -> int:
+    from app.core.database import AsyncSessionLocal
+    async with AsyncSessionLocal() as db:
+        return await unread_counters.get_unread_count(db, user_id)
+
+
+async def deliver_user_event(message_text: str) -> None:
+    """Send one committed batch of counter changes and notifications to local sockets"""
+    try:
+        payload = json.loads(message_text)
+    except ValueError:
+        return
+    # JSON object keys arrive as strings
+    counts = {int(uid): count for uid, count in payload.get("counts", {}).items()}
+    groups = [
+        (group["notification"], {int(uid): nid for uid, nid in group["recipients"].items()})
+        for group in payload.get("notifications", [])
+    ]
+    user_ids = set(counts)
+    for _, recipients in groups:
+        user_ids.update(recipients)
+
+    remote = payload.get("origin") != manager.backplane.origin
+    if user_ids and remote and isinstance(unread_counters.store, MemoryCounterStore):
+        # Another worker's commit: its counts come from its own process,
+        # and this worker's cached counts for these users are now stale
+        unread_counters.store.invalidate(user_ids)
+        counts = {}
+
+    for user_id in user_ids:
+        if not manager.has_user(user_id):
+            continue
+        count = counts.get(user_id)
+        if count is None:
+            # The writer's store did not know this user's count
+            try:
+                count = await _count_for_socket(user_id)
+            except Exception as e:
+                logger.error(f"Failed to count unread notifications for user {user_id}: {e}")
+        received = [(fields, recipients[user_id]) for fields, recipients in groups if user_id in recipients]
+        for fields, notification_id in received:
+            manager.send_to_user(user_id, {
+                "type": "notification",
+                "notification": dict(fields, id=notification_id, user_id=user_id),
+                "unread_count": count,
+            })
+        if not received:
+            manager.send_to_user(user_id, {"type": "unread_count", "unread_count": count})
+
+
+manager.add_user_event_handler(deliver_user_event)
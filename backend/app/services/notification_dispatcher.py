@@ -0,0 +1,612 @@
+"""
+Background delivery of email and push notifications
+
+Request handlers only write `notification_outbox` rows, in the same
+transaction as the `Notification` they belong to. The dispatcher (one
+asyncio task per worker, started with the app) drains the outbox:
+- claims a batch of due rows with a claim token, so several workers can
+  share one outbox without delivering a row twice
+- loads everything the batch needs (notifications, users, preferences,
+  push tokens, organization settings) in a handful of IN queries
+- sends each channel in chunks on a worker thread, at most
+  `notification_<channel>_concurrency` chunks at a time; SMTP connections
+  and the push HTTP session are kept open between batches
+- marks rows sent/skipped, or reschedules them with exponential backoff
+  until `notification_max_attempts`, after which they are marked failed
+
+Rows claimed by a worker that dies are picked up again once their claim
+lease expires.
+"""
+
+import asyncio
+import logging
+import math
+import queue
+import smtplib
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from datetime import datetime, timedelta
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import Dict, List, Optional, Tuple
+
+import requests
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.notification import (
+    Notification, NotificationOutbox, PushNotificationToken, UserNotificationPreferences
+)
+from app.models.organization_settings import OrganizationSettings
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+CHANNELS = ('email', 'push')
+
+# How long a claimed row stays invisible to other workers
+CLAIM_LEASE_SECONDS = 300
+
+# Push messages per gateway request
+PUSH_REQUEST_SIZE = 500
+
+
+class Delivery:
+    """One claimed outbox row with everything needed to send it"""
+
+    def __init__(self, row, notification, recipient):
+        self.outbox_id = row.id
+        self.channel = row.channel
+        self.user_id = row.user_id
+        self.attempts = row.attempts
+        self.enqueued_at = row.created_at
+        self.type = notification.type
+        self.title = notification.title
+        self.message = notification.message
+        self.data = notification.data or {}
+        # Email address, or list of (token, platform) for push
+        self.recipient = recipient
+
+
+# ----------------------------------------------------------------------
+# Transports
+# ----------------------------------------------------------------------
+# send(deliveries) runs on a worker thread and returns one entry per
+# delivery: None if it was delivered, otherwise the error message.
+
+def build_email(delivery: Delivery, sender: str) -> MIMEMultipart:
+    msg = MIMEMultipart()
+    msg['From'] = sender
+    msg['To'] = delivery.recipient
+    msg['Subject'] = delivery.title
+
+    body = f"""
+            {delivery.message}
+
+            ---
+            This is an automated notification from your HR system.
+            """
+
+    msg.attach(MIMEText(body, 'plain'))
+    return msg
+
+
+class LogEmailTransport:
+    """Prints instead of sending (development default)"""
+
+    def send(self, deliveries: List[Delivery]) -> List[Optional[str]]:
+        for delivery in deliveries:
+            print(f"📧 Email notification sent to {delivery.recipient}: {delivery.title}")
+        return [None] * len(deliveries)
+
+    def close(self) -> None:
+        pass
+
+
+class LogPushTransport:
+    """Prints instead of sending (development default)"""
+
+    def send(self, deliveries: List[Delivery]) -> List[Optional[str]]:
+        for delivery in deliveries:
+            for _, platform in delivery.recipient:
+                if platform == 'web':
+                    print(f"🔔 Web push sent: {delivery.title}")
+                elif platform in ('ios', 'android'):
+                    print(f"📱 {platform.title()} push sent: {delivery.title}")
+                elif platform == 'desktop':
+                    print(f"🖥️ Desktop push sent: {delivery.title}")
+        return [None] * len(deliveries)
+
+    def close(self) -> None:
+        pass
+
+
+class MemoryTransport:
+    """Keeps delivered messages in memory; `fail_next` injects errors for tests"""
+
+    def __init__(self):
+        self.sent: List[Delivery] = []
+        self.fail_next = 0
+        self._lock = threading.Lock()
+
+    def send(self, deliveries: List[Delivery]) -> List[Optional[str]]:
+        results = []
+        with self._lock:
+            for delivery in deliveries:
+                if self.fail_next > 0:
+                    self.fail_next -= 1
+                    results.append("Injected failure")
+                else:
+                    self.sent.append(delivery)
+                    results.append(None)
+        return results
+
+    def close(self) -> None:
+        pass
+
+
+class SmtpEmailTransport:
+    """
+    Sends over a small pool of persistent SMTP connections; each chunk
+    checks out one connection and sends all its messages on it.
+    """
+
+    def __init__(self, host: str, port: int, username: Optional[str], password: Optional[str],
+                 use_tls: bool, sender: str):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.sender = sender
+        self._idle: "queue.LifoQueue[smtplib.SMTP]" = queue.LifoQueue()
+
+    def _connect(self) -> smtplib.SMTP:
+        connection = smtplib.SMTP(self.host, self.port, timeout=30)
+        if self.use_tls:
+            connection.starttls()
+        if self.username:
+            connection.login(self.username, self.password or "")
+        return connection
+
+    def _checkout(self) -> smtplib.SMTP:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+    def send(self, deliveries: List[Delivery]) -> List[Optional[str]]:
+        try:
+            connection = self._checkout()
+        except Exception as e:
+            return [f"SMTP connect failed: {e}"] * len(deliveries)
+
+        results: List[Optional[str]] = []
+        for delivery in deliveries:
+            if connection is None:
+                results.append("SMTP connection lost")
+                continue
+            msg = build_email(delivery, self.sender).as_string()
+            try:
+                try:
+                    connection.sendmail(self.sender, [delivery.recipient], msg)
+                except smtplib.SMTPServerDisconnected:
+                    # Idle connection dropped by the server: reconnect once
+                    connection = self._connect()
+                    connection.sendmail(self.sender, [delivery.recipient], msg)
+                results.append(None)
+            except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused) as e:
+                # Rejected by the server; the connection is still usable
+                results.append(f"SMTP send failed: {e}")
+            except Exception as e:
+                results.append(f"SMTP send failed: {e}")
+                connection = None
+
+        if connection is not None:
+            self._idle.put(connection)
+        return results
+
+    def close(self) -> None:
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                connection.quit()
+            except Exception:
+                pass
+
+
+class HttpPushTransport:
+    """
+    Posts batches to a push gateway over a keep-alive session:
+    {"messages": [{token, platform, title, body, data}, ...]}. The gateway
+    may answer {"results": [{"ok": bool, "error": str}, ...]} per message;
+    otherwise any 2xx response counts as delivered.
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self.session = requests.Session()
+
+    def _post(self, messages: List[dict]) -> List[Optional[str]]:
+        try:
+            response = self.session.post(self.url, json={"messages": messages}, timeout=30)
+        except Exception as e:
+            return [f"Push gateway unreachable: {e}"] * len(messages)
+        if response.status_code >= 300:
+            return [f"Push gateway returned {response.status_code}"] * len(messages)
+        try:
+            results = response.json().get("results")
+        except ValueError:
+            results = None
+        if not isinstance(results, list) or len(results) != len(messages):
+            return [None] * len(messages)
+        return [None if r.get("ok") else (r.get("error") or "Rejected by push gateway") for r in results]
+
+    def send(self, deliveries: List[Delivery]) -> List[Optional[str]]:
+        messages, owners = [], []
+        for index, delivery in enumerate(deliveries):
+            for token, platform in delivery.recipient:
+                messages.append({
+                    "token": token,
+                    "platform": platform,
+                    "title": delivery.title,
+                    "body": delivery.message,
+                    "data": delivery.data,
+                })
+                owners.append(index)
+
+        token_results = []
+        for start in range(0, len(messages), PUSH_REQUEST_SIZE):
+            token_results.extend(self._post(messages[start:start + PUSH_REQUEST_SIZE]))
+
+        # A delivery succeeds if any of the user's devices accepted it
+        errors: Dict[int, List[str]] = defaultdict(list)
+        delivered = set()
+        for owner, error in zip(owners, token_results):
+            if error is None:
+                delivered.add(owner)
+            else:
+                errors[owner].append(error)
+        return [None if i in delivered else "; ".join(errors[i]) for i in range(len(deliveries))]
+
+    def close(self) -> None:
+        self.session.close()
+
+
+def create_transport(channel: str, kind: Optional[str] = None):
+    """Build the transport selected by NOTIFICATION_<CHANNEL>_TRANSPORT"""
+    if channel == 'email':
+        kind = (kind or settings.notification_email_transport).lower()
+        if kind == 'smtp':
+            return SmtpEmailTransport(
+                settings.smtp_host, settings.smtp_port, settings.smtp_username,
+                settings.smtp_password, settings.smtp_use_tls, settings.notification_email_from
+            )
+    else:
+        kind = (kind or settings.notification_push_transport).lower()
+        if kind == 'http':
+            return HttpPushTransport(settings.push_gateway_url)
+    if kind == 'memory':
+        return MemoryTransport()
+    if kind != 'log':
+        logger.warning(f"Unknown {channel} transport '{kind}', logging deliveries instead")
+    return LogEmailTransport() if channel == 'email' else LogPushTransport()
+
+
+# ----------------------------------------------------------------------
+# Dispatcher
+# ----------------------------------------------------------------------
+
+class NotificationDispatcher:
+    def __init__(self):
+        self.transports: Dict[str, object] = {}
+        self.concurrency = {
+            'email': settings.notification_email_concurrency,
+            'push': settings.notification_push_concurrency,
+        }
+        self._limits: Dict[str, asyncio.Semaphore] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        # Metrics (this worker only)
+        self.batches = 0
+        self.counts = {channel: defaultdict(int) for channel in CHANNELS}
+        self.lag_seconds: deque = deque(maxlen=1000)
+        self.recent_sends: deque = deque()
+        self.last_batch_ms: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def configure(self, email_transport=None, push_transport=None) -> None:
+        """Set transports explicitly (tests, benchmarks); defaults come from settings"""
+        self.transports = {
+            'email': email_transport or create_transport('email'),
+            'push': push_transport or create_transport('push'),
+        }
+
+    async def start(self) -> None:
+        if not self.transports:
+            self.configure()
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info(
+            f"Notification dispatcher started (email: {type(self.transports['email']).__name__}, "
+            f"push: {type(self.transports['push']).__name__})"
+        )
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._loop = None
+        for transport in self.transports.values():
+            await asyncio.to_thread(transport.close)
+
+    def wake(self) -> None:
+        """Start the next poll now instead of after the poll interval (safe from any thread)"""
+        if self._loop is not None and self._wakeup is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def _run(self) -> None:
+        backoff = settings.notification_dispatch_poll_interval
+        while True:
+            try:
+                processed = await self.run_once()
+                backoff = settings.notification_dispatch_poll_interval
+                if processed:
+                    # More may be waiting; go straight back for the next batch
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error(f"Notification dispatch failed: {e}")
+                backoff = min(backoff * 2, 30)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=backoff)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def run_once(self) -> int:
+        """Claim, deliver and record one batch; returns the number of rows processed"""
+        if not self.transports:
+            self.configure()
+        started = time.perf_counter()
+        deliveries, resolved = await asyncio.to_thread(self._claim_batch)
+        if not deliveries and not resolved:
+            return 0
+
+        by_channel: Dict[str, List[Delivery]] = defaultdict(list)
+        for delivery in deliveries:
+            by_channel[delivery.channel].append(delivery)
+
+        outcomes: List[Tuple[Delivery, Optional[str]]] = []
+        await asyncio.gather(*[
+            self._send_channel(channel, items, outcomes) for channel, items in by_channel.items()
+        ])
+        await asyncio.to_thread(self._record, outcomes, resolved)
+
+        self.batches += 1
+        self.last_batch_ms = round((time.perf_counter() - started) * 1000, 3)
+        return len(deliveries) + len(resolved)
+
+    async def _send_channel(self, channel: str, deliveries: List[Delivery], outcomes: list) -> None:
+        transport = self.transports[channel]
+        if channel not in self._limits:
+            self._limits[channel] = asyncio.Semaphore(max(1, self.concurrency[channel]))
+        limit = self._limits[channel]
+        chunk_size = math.ceil(len(deliveries) / max(1, self.concurrency[channel]))
+
+        async def send_chunk(chunk: List[Delivery]):
+            async with limit:
+                try:
+                    results = await asyncio.to_thread(transport.send, chunk)
+                except Exception as e:
+                    results = [f"{type(transport).__name__} failed: {e}"] * len(chunk)
+            outcomes.extend(zip(chunk, results))
+
+        await asyncio.gather(*[
+            send_chunk(deliveries[start:start + chunk_size])
+            for start in range(0, len(deliveries), chunk_size)
+        ])
+
+    # -- database side (worker thread) ---------------------------------
+
+    def _claim_batch(self) -> Tuple[List[Delivery], Dict[int, Tuple[str, str]]]:
+        """
+        Claim due rows and load what they need. Returns the deliveries to
+        send and {outbox_id: (channel, reason)} for rows that need no delivery.
+        """
+        db = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            due = (
+                (NotificationOutbox.status.in_(('pending', 'sending'))) &
+                (NotificationOutbox.next_attempt_at <= now)
+            )
+            ids = [row.id for row in db.execute(
+                select(NotificationOutbox.id).where(due)
+                .order_by(NotificationOutbox.next_attempt_at)
+                .limit(settings.notification_dispatch_batch_size)
+            )]
+            if not ids:
+                return [], {}
+
+            token = uuid.uuid4().hex
+            db.execute(
+                update(NotificationOutbox)
+                .where(NotificationOutbox.id.in_(ids), due)
+                .values(status='sending', claim_token=token,
+                        next_attempt_at=now + timedelta(seconds=CLAIM_LEASE_SECONDS))
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+
+            rows = db.query(NotificationOutbox).filter(NotificationOutbox.claim_token == token).all()
+            return self._prepare(db, rows)
+        finally:
+            db.close()
+
+    def _prepare(self, db: Session, rows) -> Tuple[List[Delivery], Dict[int, Tuple[str, str]]]:
+        if not rows:
+            return [], {}
+        user_ids = {row.user_id for row in rows}
+        notifications = {
+            n.id: n for n in db.query(Notification).filter(
+                Notification.id.in_({row.notification_id for row in rows})
+            )
+        }
+        users = {
+            u.id: u for u in db.query(User.id, User.email, User.is_active).filter(User.id.in_(user_ids))
+        }
+        preferences = {
+            p.user_id: p for p in db.query(UserNotificationPreferences).filter(
+                UserNotificationPreferences.user_id.in_(user_ids)
+            )
+        }
+        tokens: Dict[int, List[Tuple[str, str]]] = defaultdict(list)
+        if any(row.channel == 'push' for row in rows):
+            for t in db.query(PushNotificationToken.user_id, PushNotificationToken.token,
+                              PushNotificationToken.platform).filter(
+                PushNotificationToken.user_id.in_(user_ids),
+                PushNotificationToken.is_active == True
+            ):
+                tokens[t.user_id].append((t.token, t.platform))
+        org_settings = db.query(OrganizationSettings).first()
+        channel_enabled = {
+            'email': getattr(org_settings, 'email_notifications_enabled', True),
+            'push': getattr(org_settings, 'push_notifications_enabled', True),
+        }
+
+        deliveries, resolved = [], {}
+        for row in rows:
+            notification = notifications.get(row.notification_id)
+            user = users.get(row.user_id)
+            prefs = preferences.get(row.user_id)
+            if notification is None or user is None or not user.is_active:
+                resolved[row.id] = (row.channel, "Recipient or notification no longer exists")
+            elif not channel_enabled.get(row.channel, False):
+                resolved[row.id] = (row.channel, f"{row.channel} notifications disabled for the organization")
+            elif prefs is not None and not getattr(prefs, f"{row.channel}_{notification.type}", True):
+                resolved[row.id] = (row.channel, "Disabled in user preferences")
+            elif row.channel == 'email':
+                if user.email:
+                    deliveries.append(Delivery(row, notification, user.email))
+                else:
+                    resolved[row.id] = (row.channel, "User has no email address")
+            elif row.channel == 'push':
+                if tokens.get(row.user_id):
+                    deliveries.append(Delivery(row, notification, tokens[row.user_id]))
+                else:
+                    resolved[row.id] = (row.channel, "User has no active push tokens")
+            else:
+                resolved[row.id] = (row.channel, f"Unknown channel {row.channel}")
+        return deliveries, resolved
+
+    def _record(self, outcomes: List[Tuple[Delivery, Optional[str]]], resolved: Dict[int, Tuple[str, str]]) -> None:
+        now = datetime.utcnow()
+        changes = []
+        for outbox_id, (channel, reason) in resolved.items():
+            changes.append({'id': outbox_id, 'status': 'skipped', 'claim_token': None, 'last_error': reason})
+            self.counts[channel]['skipped'] += 1
+        sent = 0
+        for delivery, error in outcomes:
+            counts = self.counts[delivery.channel]
+            if error is None:
+                changes.append({'id': delivery.outbox_id, 'status': 'sent', 'claim_token': None,
+                                'attempts': delivery.attempts + 1, 'sent_at': now, 'last_error': None})
+                counts['sent'] += 1
+                sent += 1
+                if delivery.enqueued_at is not None:
+                    self.lag_seconds.append((now - delivery.enqueued_at).total_seconds())
+                continue
+
+            attempts = delivery.attempts + 1
+            counts['errors'] += 1
+            self.last_error = error
+            if attempts >= settings.notification_max_attempts:
+                counts['failed'] += 1
+                logger.warning(f"Giving up on {delivery.channel} notification {delivery.outbox_id}: {error}")
+                changes.append({'id': delivery.outbox_id, 'status': 'failed', 'claim_token': None,
+                                'attempts': attempts, 'last_error': error})
+            else:
+                delay = min(settings.notification_retry_base_seconds * 2 ** (attempts - 1),
+                            settings.notification_retry_max_seconds)
+                changes.append({'id': delivery.outbox_id, 'status': 'pending', 'claim_token': None,
+                                'attempts': attempts, 'last_error': error,
+                                'next_attempt_at': now + timedelta(seconds=delay)})
+
+        db = SessionLocal()
+        try:
+            # Bulk UPDATE by primary key; rows are grouped by the keys they set
+            by_keys: Dict[tuple, List[dict]] = defaultdict(list)
+            for change in changes:
+                by_keys[tuple(sorted(change))].append(change)
+            for group in by_keys.values():
+                db.execute(update(NotificationOutbox), group)
+            db.commit()
+        finally:
+            db.close()
+
+        if sent:
+            self.recent_sends.append((time.monotonic(), sent))
+
+    def get_metrics(self, db: Session) -> dict:
+        """Outbox backlog and delivery statistics for this worker"""
+        now = datetime.utcnow()
+        backlog = {
+            row.status: {"count": row.count, "oldest": row.oldest}
+            for row in db.query(
+                NotificationOutbox.status,
+                func.count(NotificationOutbox.id).label('count'),
+                func.min(NotificationOutbox.created_at).label('oldest')
+            ).filter(
+                NotificationOutbox.status.in_(('pending', 'sending', 'failed'))
+            ).group_by(NotificationOutbox.status)
+        }
+        waiting = [backlog[s]["oldest"] for s in ('pending', 'sending') if s in backlog and backlog[s]["oldest"]]
+
+        horizon = time.monotonic() - 60
+        while self.recent_sends and self.recent_sends[0][0] < horizon:
+            self.recent_sends.popleft()
+        lags = sorted(self.lag_seconds)
+
+        def percentile(p: float) -> Optional[float]:
+            if not lags:
+                return None
+            return round(lags[min(len(lags) - 1, int(len(lags) * p))], 3)
+
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "transports": {channel: type(t).__name__ for channel, t in self.transports.items()},
+            "queue": {
+                "pending": backlog.get('pending', {}).get('count', 0),
+                "in_flight": backlog.get('sending', {}).get('count', 0),
+                "failed": backlog.get('failed', {}).get('count', 0),
+                "oldest_pending_age_seconds": round((now - min(waiting)).total_seconds(), 3) if waiting else 0,
+            },
+            "delivery": {
+                "per_channel": {channel: dict(counts) for channel, counts in self.counts.items()},
+                "sent_per_second_1m": round(sum(count for _, count in self.recent_sends) / 60, 3),
+                "lag_seconds_p50": percentile(0.5),
+                "lag_seconds_p99": percentile(0.99),
+                "batches": self.batches,
+                "last_batch_ms": self.last_batch_ms,
+                "last_error": self.last_error,
+            },
+        }
+
+
+notification_dispatcher = NotificationDispatcher()
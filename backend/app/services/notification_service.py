@@ -3,19 +3,22 @@ Comprehensive Notification Service
 Handles all types of notifications: in-app, email, and push notifications
 """
 
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List, Optional, Dict, Any
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from collections import defaultdict
 from datetime import datetime, timedelta
 import json
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-import requests
-import os
+import logging
 
-from app.models.notification import Notification, PushNotificationToken
+from app.models.notification import Notification, NotificationOutbox, PushNotificationToken
 from app.models.user import User
 from app.models.organization_settings import OrganizationSettings
+from app.services.notification_counters import unread_counters
+from app.services.notification_dispatcher import notification_dispatcher
+
+logger = logging.getLogger(__name__)
 
 class NotificationService:
     def __init__(self):
@@ -90,16 +93,14 @@ class NotificationService:
             }
         }
 
-    def create_notification(
+    def _render(
         self,
-        db: Session,
-        user_id: int,
         notification_type: str,
-        title: Optional[str] = None,
-        message: Optional[str] = None,
-        data: Optional[Dict[str, Any]] = None
-    ) -> Notification:
-        """Create a new notification"""
+        title: Optional[str],
+        message: Optional[str],
+        data: Optional[Dict[str, Any]]
+    ) -> Tuple[str, str]:
+        """Title and message for a notification, from the type's template unless given"""
         
         # Get notification template
         template = self.notification_types.get(notification_type, {})
@@ -115,6 +116,24 @@ class NotificationService:
             except KeyError:
                 pass  # Use original message if formatting fails
         
+        return notification_title, notification_message
+
+    def create_notification(
+        self,
+        db: Session,
+        user_id: int,
+        notification_type: str,
+        title: Optional[str] = None,
+        message: Optional[str] = None,
+        data: Optional[Dict[str, Any]] = None,
+        channels: Sequence[str] = ()
+    ) -> Notification:
+        """
+        Create a new notification. `channels` ('email', 'push') are queued
+        for background delivery in the same transaction.
+        """
+        notification_title, notification_message = self._render(notification_type, title, message, data)
+        
         # Create notification
         notification = Notification(
             user_id=user_id,
@@ -125,13 +144,98 @@ class NotificationService:
         )
         
         db.add(notification)
+        if channels:
+            db.flush()
+            self.enqueue_delivery(db, [(notification.id, user_id)], channels, commit=False)
         db.commit()
         db.refresh(notification)
+        if channels:
+            notification_dispatcher.wake()
         
         print(f"🔔 NOTIFICATION CREATED: [{notification_type}] for user {user_id} - {notification_title}")
         
         return notification
 
+    def create_notifications_bulk(
+        self,
+        db: Session,
+        user_ids: Iterable[int],
+        notification_type: str,
+        title: Optional[str] = None,
+        message: Optional[str] = None,
+        data: Optional[Dict[str, Any]] = None,
+        per_user_data: Optional[Dict[int, Dict[str, Any]]] = None,
+        exclude_user_id: Optional[int] = None,
+        channels: Sequence[str] = (),
+        commit: bool = True
+    ) -> int:
+        """
+        Create the same notification for many users with one multi-row
+        insert. `per_user_data` overrides `data` for individual recipients;
+        the template is rendered once per distinct payload. Duplicate ids and
+        `exclude_user_id` (usually the sender) are skipped, and `channels`
+        are queued for background delivery in the same transaction. Returns
+        the number of notifications created.
+        """
+        recipients = list(dict.fromkeys(uid for uid in user_ids if uid is not None and uid != exclude_user_id))
+        if not recipients:
+            return 0
+        
+        per_user_data = per_user_data or {}
+        rendered: Dict[str, Tuple[str, str]] = {}
+        payloads: Dict[str, Dict[str, Any]] = {}
+        payload_of: Dict[int, str] = {}
+        now = datetime.utcnow()
+        rows = []
+        for user_id in recipients:
+            payload = per_user_data.get(user_id, data) or {}
+            key = json.dumps(payload, sort_keys=True, default=str)
+            if key not in rendered:
+                rendered[key] = self._render(notification_type, title, message, payload)
+                payloads[key] = payload
+            payload_of[user_id] = key
+            notification_title, notification_message = rendered[key]
+            rows.append({
+                'user_id': user_id,
+                'type': notification_type,
+                'title': notification_title,
+                'message': notification_message,
+                'data': payload,
+                'is_read': False,
+                'created_at': now,
+            })
+        
+        created = db.execute(insert(Notification).returning(Notification.id, Notification.user_id), rows).all()
+        if channels:
+            self.enqueue_delivery(db, [(row.id, row.user_id) for row in created], channels, commit=False)
+        
+        # Bulk inserts bypass the ORM events that keep unread counters current
+        ids_by_payload: Dict[str, Dict[int, int]] = defaultdict(dict)
+        for row in created:
+            ids_by_payload[payload_of[row.user_id]][row.user_id] = row.id
+        for key, recipients in ids_by_payload.items():
+            notification_title, notification_message = rendered[key]
+            unread_counters.record(
+                db,
+                deltas=dict.fromkeys(recipients, 1),
+                notification={
+                    'type': notification_type,
+                    'title': notification_title,
+                    'message': notification_message,
+                    'data': payloads[key],
+                    'is_read': False,
+                    'created_at': now.isoformat(),
+                },
+                recipients=recipients
+            )
+        if commit:
+            db.commit()
+            if channels:
+                notification_dispatcher.wake()
+        
+        logger.info(f"Created {len(rows)} [{notification_type}] notifications ({len(rendered)} distinct payloads)")
+        return len(rows)
+
     def get_user_notifications(
         self,
         db: Session,
@@ -147,49 +251,68 @@ class NotificationService:
         
         return query.order_by(Notification.created_at.desc()).limit(limit).all()
 
-    def mark_notification_read(
+    async def get_user_notifications_async(
         self,
-        db: Session,
+        db: AsyncSession,
+        user_id: int,
+        limit: int = 50,
+        unread_only: bool = False
+    ) -> List[Notification]:
+        """Get notifications for a user (async session)"""
+        query = select(Notification).where(Notification.user_id == user_id)
+        
+        if unread_only:
+            query = query.where(Notification.is_read == False)
+        
+        result = await db.execute(query.order_by(Notification.created_at.desc()).limit(limit))
+        return list(result.scalars().all())
+
+    async def mark_notification_read(
+        self,
+        db: AsyncSession,
         notification_id: int,
         user_id: int
     ) -> bool:
         """Mark a notification as read"""
-        notification = db.query(Notification).filter(
-            Notification.id == notification_id,
-            Notification.user_id == user_id
-        ).first()
+        result = await db.execute(
+            select(Notification).where(
+                Notification.id == notification_id,
+                Notification.user_id == user_id
+            )
+        )
+        notification = result.scalars().first()
         
         if notification:
             notification.is_read = True
             notification.read_at = datetime.utcnow()
-            db.commit()
+            await db.commit()
             return True
         
         return False
 
-    def mark_all_notifications_read(
+    async def mark_all_notifications_read(
         self,
-        db: Session,
+        db: AsyncSession,
         user_id: int
     ) -> int:
         """Mark all notifications as read for a user"""
-        updated = db.query(Notification).filter(
-            Notification.user_id == user_id,
-            Notification.is_read == False
-        ).update({
-            'is_read': True,
-            'read_at': datetime.utcnow()
-        })
+        result = await db.execute(
+            update(Notification)
+            .where(
+                Notification.user_id == user_id,
+                Notification.is_read == False
+            )
+            .values(is_read=True, read_at=datetime.utcnow())
+        )
         
-        db.commit()
-        return updated
+        if result.rowcount:
+            unread_counters.record(db, {user_id: -result.rowcount})
+        await db.commit()
+        return result.rowcount
 
-    def get_unread_count(self, db: Session, user_id: int) -> int:
-        """Get unread notification count for a user"""
-        return db.query(Notification).filter(
-            Notification.user_id == user_id,
-            Notification.is_read == False
-        ).count()
+    async def get_unread_count(self, db: AsyncSession, user_id: int) -> int:
+        """Get unread notification count for a user (cached per user)"""
+        return await unread_counters.get_unread_count(db, user_id)
 
     def should_send_notification(
         self,
@@ -227,49 +350,40 @@ class NotificationService:
         
         return True
 
+    def enqueue_delivery(
+        self,
+        db: Session,
+        notifications: Sequence[Tuple[int, int]],
+        channels: Sequence[str],
+        commit: bool = True
+    ) -> int:
+        """
+        Queue email/push delivery of (notification_id, user_id) pairs in the
+        notification outbox; the background dispatcher sends them. Preferences
+        are checked at delivery time.
+        """
+        rows = [
+            {'notification_id': notification_id, 'user_id': user_id, 'channel': channel}
+            for notification_id, user_id in notifications
+            for channel in channels
+        ]
+        if not rows:
+            return 0
+        
+        db.execute(insert(NotificationOutbox), rows)
+        if commit:
+            db.commit()
+            notification_dispatcher.wake()
+        return len(rows)
+
     def send_email_notification(
         self,
         db: Session,
         user_id: int,
         notification: Notification
     ) -> bool:
-        """Send email notification"""
-        if not self.should_send_notification(db, user_id, notification.type, 'email'):
-            return False
-        
-        try:
-            user = db.query(User).filter(User.id == user_id).first()
-            if not user or not user.email:
-                return False
-            
-            # Get organization settings for email config
-            org_settings = db.query(OrganizationSettings).first()
-            if not org_settings or not org_settings.email_notifications_enabled:
-                return False
-            
-            # Create email
-            msg = MIMEMultipart()
-            msg['From'] = org_settings.email_from or "noreply@company.com"
-            msg['To'] = user.email
-            msg['Subject'] = notification.title
-            
-            body = f"""
-            {notification.message}
-            
-            ---
-            This is an automated notification from your HR system.
-            """
-            
-            msg.attach(MIMEText(body, 'plain'))
-            
-            # Send email (implement based on your email service)
-            # For now, just log
-            print(f"📧 Email notification sent to {user.email}: {notification.title}")
-            return True
-            
-        except Exception as e:
-            print(f"❌ Failed to send email notification: {e}")
-            return False
+        """Queue an email for an existing notification"""
+        return self.enqueue_delivery(db, [(notification.id, user_id)], ['email']) > 0
 
     def send_push_notification(
         self,
@@ -277,60 +391,8 @@ class NotificationService:
         user_id: int,
         notification: Notification
     ) -> bool:
-        """Send push notification"""
-        if not self.should_send_notification(db, user_id, notification.type, 'push'):
-            return False
-        
-        try:
-            # Get user's push tokens
-            tokens = db.query(PushNotificationToken).filter(
-                PushNotificationToken.user_id == user_id,
-                PushNotificationToken.is_active == True
-            ).all()
-            
-            if not tokens:
-                return False
-            
-            # Send to each token
-            for token in tokens:
-                self._send_to_push_service(token, notification)
-            
-            return True
-            
-        except Exception as e:
-            print(f"❌ Failed to send push notification: {e}")
-            return False
-
-    def _send_to_push_service(self, token: PushNotificationToken, notification: Notification):
-        """Send push notification to specific service"""
-        try:
-            if token.platform == 'web':
-                # Web push notification
-                self._send_web_push(token.token, notification)
-            elif token.platform in ['ios', 'android']:
-                # Mobile push notification
-                self._send_mobile_push(token.token, notification, token.platform)
-            elif token.platform == 'desktop':
-                # Desktop push notification
-                self._send_desktop_push(token.token, notification)
-                
-        except Exception as e:
-            print(f"❌ Failed to send push to {token.platform}: {e}")
-
-    def _send_web_push(self, token: str, notification: Notification):
-        """Send web push notification"""
-        # Implement web push using service worker
-        print(f"🔔 Web push sent: {notification.title}")
-
-    def _send_mobile_push(self, token: str, notification: Notification, platform: str):
-        """Send mobile push notification"""
-        # Implement mobile push using FCM/APNS
-        print(f"📱 {platform.title()} push sent: {notification.title}")
-
-    def _send_desktop_push(self, token: str, notification: Notification):
-        """Send desktop push notification"""
-        # Implement desktop push
-        print(f"🖥️ Desktop push sent: {notification.title}")
+        """Queue a push notification for an existing notification"""
+        return self.enqueue_delivery(db, [(notification.id, user_id)], ['push']) > 0
 
     def register_push_token(
         self,
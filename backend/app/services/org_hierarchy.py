@@ -0,0 +1,274 @@
+"""
+Org hierarchy service
+
+Loads the user/manager graph once, builds a children adjacency map in a
+single pass and caches serialised org-chart responses (full tree,
+department-filtered views, root-scoped and depth-limited subtrees).
+
+The cache is dropped whenever a commit touches a user's position in the
+chart (create, delete, name/title/avatar/department/manager change) or a
+department's name, so readers never see a tree older than the last
+committed write. The commit also publishes an invalidation as a user
+event, so every other worker (through the WebSocket manager's backplane)
+drops its cache too; a cache older than ORG_CHART_RESYNC_SECONDS is
+dropped regardless, for writes that bypass the ORM.
+"""
+
+import json
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.department import Department
+from app.models.user import User
+from app.utils.websocket_manager import manager
+
+logger = logging.getLogger(__name__)
+
+# User attributes that appear in (or shape) the org chart
+WATCHED_USER_FIELDS = ('full_name', 'job_role', 'avatar_url', 'department_id', 'manager_id')
+
+MAX_CACHED_VIEWS = 256
+
+ORG_CHART_INVALIDATED = json.dumps({"org_chart": "invalidated"})
+
+
+class OrgSnapshot:
+    """The hierarchy as of one load; never modified after it is built"""
+
+    def __init__(self, rows):
+        self.nodes: Dict[int, dict] = {}
+        self.manager_of: Dict[int, Optional[int]] = {}
+        self.department_of: Dict[int, Optional[int]] = {}
+        self.order: List[int] = []
+        self._full_view = None
+        for row in rows:
+            self.order.append(row.id)
+            self.manager_of[row.id] = row.manager_id
+            self.department_of[row.id] = row.department_id
+            self.nodes[row.id] = {
+                "id": str(row.id),
+                "name": row.full_name,
+                "title": row.job_role or "Employee",
+                "department": row.department_name,
+                "avatar_url": row.avatar_url,
+            }
+
+    def view(self, user_ids: Optional[Set[int]] = None) -> Tuple[List[int], List[int], Dict[int, List[int]]]:
+        """
+        Roots, unassigned users and children map for the given users (all
+        users if None). Users are in the tree if they have a manager or
+        someone reports to them; everyone else is unassigned.
+        """
+        if user_ids is None and self._full_view is not None:
+            return self._full_view
+        members = self.order if user_ids is None else [uid for uid in self.order if uid in user_ids]
+        managers_with_reports = {self.manager_of[uid] for uid in members if self.manager_of[uid] is not None}
+
+        assigned, unassigned = [], []
+        for uid in members:
+            if self.manager_of[uid] is not None or uid in managers_with_reports:
+                assigned.append(uid)
+            else:
+                unassigned.append(uid)
+
+        assigned_set = set(assigned)
+        children: Dict[int, List[int]] = {}
+        roots = []
+        for uid in assigned:
+            manager_id = self.manager_of[uid]
+            if manager_id is None or manager_id not in assigned_set:
+                roots.append(uid)
+            else:
+                children.setdefault(manager_id, []).append(uid)
+        if user_ids is None:
+            self._full_view = (roots, unassigned, children)
+        return roots, unassigned, children
+
+    def with_manager_chains(self, user_ids: List[int]) -> Set[int]:
+        """The given users plus everyone above them"""
+        included: Set[int] = set()
+        for uid in user_ids:
+            current = uid
+            while current is not None and current not in included:
+                included.add(current)
+                manager_id = self.manager_of.get(current)
+                current = manager_id if manager_id in self.nodes else None
+        return included
+
+    def serialise(self, uid: int, children: Dict[int, List[int]], depth: Optional[int]) -> dict:
+        """Nested node for `uid`; below `depth` levels only child_count is filled in"""
+        reports = children.get(uid, [])
+        node = dict(self.nodes[uid], child_count=len(reports))
+        if depth is not None and depth <= 1:
+            node["children"] = []
+        else:
+            next_depth = None if depth is None else depth - 1
+            node["children"] = [self.serialise(child, children, next_depth) for child in reports]
+        return node
+
+
+class OrgHierarchyService:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = 0
+        self._snapshot: Optional[OrgSnapshot] = None
+        self._views: Dict[tuple, bytes] = {}
+        # When the cached snapshot (and the views built from it) was loaded
+        self._loaded_at: Optional[float] = None
+        self.builds = 0
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._version += 1
+            self._snapshot = None
+            self._views = {}
+            self._loaded_at = None
+
+    def _expire_if_stale(self) -> None:
+        loaded_at = self._loaded_at
+        if loaded_at is not None and time.monotonic() - loaded_at > settings.org_chart_resync_seconds:
+            self.invalidate()
+
+    def _get_snapshot(self, db: Session) -> OrgSnapshot:
+        with self._lock:
+            if self._snapshot is not None:
+                return self._snapshot
+            version = self._version
+
+        rows = db.query(
+            User.id, User.full_name, User.job_role, User.avatar_url,
+            User.department_id, User.manager_id, Department.name.label("department_name")
+        ).outerjoin(Department, User.department_id == Department.id).order_by(User.id).all()
+        snapshot = OrgSnapshot(rows)
+
+        with self._lock:
+            # Keep it only if nothing was committed while it was being built
+            if version == self._version:
+                self._snapshot = snapshot
+                self._loaded_at = time.monotonic()
+                self.builds += 1
+        return snapshot
+
+    def get_chart(
+        self,
+        db: Session,
+        department_id: Optional[int] = None,
+        root_id: Optional[int] = None,
+        depth: Optional[int] = None
+    ) -> Optional[bytes]:
+        """
+        Serialised {"assigned": [...], "unassigned": [...]} for the requested
+        view, or None if `root_id` is not part of it.
+        """
+        self._expire_if_stale()
+        key = (department_id, root_id, depth)
+        with self._lock:
+            cached = self._views.get(key)
+            version = self._version
+        if cached is not None:
+            return cached
+
+        snapshot = self._get_snapshot(db)
+        user_ids = None
+        if department_id:
+            # Department members plus their entire manager chain
+            members = [uid for uid in snapshot.order if snapshot.department_of[uid] == department_id]
+            user_ids = snapshot.with_manager_chains(members)
+
+        roots, unassigned, children = snapshot.view(user_ids)
+        if root_id is not None:
+            if root_id not in snapshot.nodes or (user_ids is not None and root_id not in user_ids):
+                return None
+            chart = {"assigned": [snapshot.serialise(root_id, children, depth)], "unassigned": []}
+        else:
+            chart = {
+                "assigned": [snapshot.serialise(uid, children, depth) for uid in roots],
+                "unassigned": [dict(snapshot.nodes[uid], child_count=0, children=[]) for uid in unassigned],
+            }
+        body = json.dumps(chart).encode()
+
+        with self._lock:
+            if version == self._version:
+                if len(self._views) >= MAX_CACHED_VIEWS:
+                    self._views = {}
+                self._views[key] = body
+        return body
+
+    def get_children(self, db: Session, user_id: int, depth: int = 1) -> Optional[List[dict]]:
+        """Direct reports of `user_id` (expanded `depth` levels) for lazy loading"""
+        self._expire_if_stale()
+        snapshot = self._get_snapshot(db)
+        if user_id not in snapshot.nodes:
+            return None
+        _, _, children = snapshot.view()
+        return [snapshot.serialise(child, children, depth) for child in children.get(user_id, [])]
+
+
+org_hierarchy = OrgHierarchyService()
+
+
+# ----------------------------------------------------------------------
+# Invalidation hooks
+# ----------------------------------------------------------------------
+# Writes mark the session; the cache is dropped once the transaction
+# commits, so a rebuild can never cache data older than the write.
+
+def _mark_dirty(target) -> None:
+    session = Session.object_session(target)
+    if session is not None:
+        session.info['org_chart_dirty'] = True
+
+
+def _on_insert_or_delete(mapper, connection, target):
+    _mark_dirty(target)
+
+
+def _on_user_update(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[field].history.has_changes() for field in WATCHED_USER_FIELDS):
+        _mark_dirty(target)
+
+
+def _on_department_update(mapper, connection, target):
+    if inspect(target).attrs.name.history.has_changes():
+        _mark_dirty(target)
+
+
+event.listen(User, 'after_insert', _on_insert_or_delete)
+event.listen(User, 'after_delete', _on_insert_or_delete)
+event.listen(User, 'after_update', _on_user_update)
+event.listen(Department, 'after_update', _on_department_update)
+event.listen(Department, 'after_delete', _on_insert_or_delete)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(session):
+    if session.info.pop('org_chart_dirty', False):
+        org_hierarchy.invalidate()
+        # Other workers; this one handles its own copy of the event too,
+        # after the invalidation above
+        manager.publish_user_event_threadsafe(ORG_CHART_INVALIDATED)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop('org_chart_dirty', None)
+
+
+async def deliver_org_chart_event(message_text: str) -> None:
+    """Drop the cached chart when any worker commits an org chart change"""
+    try:
+        invalidated = json.loads(message_text).get("org_chart") == "invalidated"
+    except (ValueError, AttributeError):
+        return
+    if invalidated:
+        org_hierarchy.invalidate()
+
+
+manager.add_user_event_handler(deliver_org_chart_event)
@@ -0,0 +1,222 @@
+"""
+Attendance presence index
+
+An in-process map of user_id -> open time entry (clock-in time, break and
+terrain state), plus each user's latest clock-in of the day, so the
+attendance board endpoints answer from memory instead of scanning
+time_entries:
+- rebuilt at startup from one query (open entries and today's clock-ins)
+- moved by clock_in / clock_out / start_break / end_break / toggle_terrain,
+  which publish the changed entry as a user event; every worker (through
+  the WebSocket manager's backplane) applies it to its own index and
+  pushes it to its /time/ws/attendance sockets
+- rebuilt again once it is older than PRESENCE_RESYNC_SECONDS, so writes
+  that bypass the service (scripts, another deployment) heal
+"""
+
+import json
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, NamedTuple, Optional
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.time_entry import TimeEntry
+from app.utils.websocket_manager import manager
+
+logger = logging.getLogger(__name__)
+
+
+class Presence(NamedTuple):
+    entry_id: int
+    clock_in: datetime
+    break_start: Optional[datetime]
+    break_end: Optional[datetime]
+    is_terrain: bool
+
+    @property
+    def is_on_break(self) -> bool:
+        return bool(self.break_start and not self.break_end)
+
+    def duration_minutes(self, now: Optional[datetime] = None) -> int:
+        return int(((now or datetime.utcnow()) - self.clock_in).total_seconds() / 60)
+
+
+def _today_start() -> datetime:
+    return datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _parse(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+
+def presence_status(presence: Optional[Presence]) -> dict:
+    """Board fields for one user's presence (JSON-ready)"""
+    if presence is None:
+        return {
+            "is_clocked_in": False,
+            "is_on_break": False,
+            "is_terrain": False,
+            "clock_in": None,
+            "current_duration_minutes": None,
+        }
+    return {
+        "is_clocked_in": True,
+        "is_on_break": presence.is_on_break,
+        "is_terrain": presence.is_terrain,
+        "clock_in": presence.clock_in.isoformat(),
+        "current_duration_minutes": presence.duration_minutes(),
+    }
+
+
+def _apply_change(
+    open_entries: Dict[int, Presence],
+    last_clock_in: Dict[int, datetime],
+    user_id: int,
+    entry: Optional[dict]
+) -> None:
+    if entry is None or entry.get("clock_out"):
+        open_entries.pop(user_id, None)
+    else:
+        open_entries[user_id] = Presence(
+            entry["id"],
+            _parse(entry["clock_in"]),
+            _parse(entry.get("break_start")),
+            _parse(entry.get("break_end")),
+            bool(entry.get("is_terrain"))
+        )
+    if entry is not None and entry.get("clock_in"):
+        clock_in = _parse(entry["clock_in"])
+        if clock_in > last_clock_in.get(user_id, datetime.min):
+            last_clock_in[user_id] = clock_in
+
+
+class PresenceIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._open: Dict[int, Presence] = {}
+        self._last_clock_in: Dict[int, datetime] = {}
+        self._built_at: Optional[float] = None
+        # Recent changes, replayed over a rebuild that was reading while
+        # they arrived
+        self._seq = 0
+        self._recent: deque = deque(maxlen=10_000)
+        # Metrics (this worker only)
+        self.rebuilds = 0
+        self.events_applied = 0
+
+    def rebuild(self, db: Session) -> int:
+        """Reload from time_entries; returns the number of open entries"""
+        with self._lock:
+            started_seq = self._seq
+        rows = db.query(
+            TimeEntry.id,
+            TimeEntry.user_id,
+            TimeEntry.clock_in,
+            TimeEntry.clock_out,
+            TimeEntry.break_start,
+            TimeEntry.break_end,
+            TimeEntry.is_terrain
+        ).filter(
+            or_(TimeEntry.clock_out.is_(None), TimeEntry.clock_in >= _today_start())
+        ).order_by(TimeEntry.clock_in).all()
+
+        open_entries: Dict[int, Presence] = {}
+        last_clock_in: Dict[int, datetime] = {}
+        for row in rows:
+            if row.clock_in is not None:
+                last_clock_in[row.user_id] = row.clock_in
+            if row.clock_out is None and row.clock_in is not None:
+                # A user with several open entries shows the latest
+                open_entries[row.user_id] = Presence(
+                    row.id, row.clock_in, row.break_start, row.break_end, bool(row.is_terrain)
+                )
+
+        with self._lock:
+            for seq, user_id, entry in self._recent:
+                if seq > started_seq:
+                    _apply_change(open_entries, last_clock_in, user_id, entry)
+            self._open = open_entries
+            self._last_clock_in = last_clock_in
+            self._built_at = time.monotonic()
+        self.rebuilds += 1
+        return len(open_entries)
+
+    def ensure_fresh(self, db: Session) -> None:
+        """Rebuild if never built or older than PRESENCE_RESYNC_SECONDS"""
+        built_at = self._built_at
+        if built_at is None or time.monotonic() - built_at > settings.presence_resync_seconds:
+            self.rebuild(db)
+
+    def get(self, user_id: int) -> Optional[Presence]:
+        return self._open.get(user_id)
+
+    def open_entries(self) -> Dict[int, Presence]:
+        with self._lock:
+            return dict(self._open)
+
+    def clocked_in_since(self, since: datetime) -> set:
+        """Users with a clock-in at or after `since` (today's clock-ins are indexed)"""
+        with self._lock:
+            return {user_id for user_id, clock_in in self._last_clock_in.items() if clock_in >= since}
+
+    def apply(self, user_id: int, entry: Optional[dict]) -> None:
+        """Set one user's presence from an event's entry fields"""
+        with self._lock:
+            self._seq += 1
+            self._recent.append((self._seq, user_id, entry))
+            _apply_change(self._open, self._last_clock_in, user_id, entry)
+        self.events_applied += 1
+
+    async def publish(self, entry: TimeEntry) -> None:
+        """Announce a committed change to `entry` to every worker"""
+        fields = {
+            "id": entry.id,
+            "clock_in": entry.clock_in,
+            "clock_out": entry.clock_out,
+            "break_start": entry.break_start,
+            "break_end": entry.break_end,
+            "is_terrain": bool(entry.is_terrain),
+        }
+        await manager.publish_user_event(json.dumps(
+            {"presence": {"user_id": entry.user_id, "entry": fields}},
+            default=lambda value: value.isoformat()
+        ))
+
+    def get_metrics(self) -> dict:
+        return {
+            "open_entries": len(self._open),
+            "clocked_in_today": len(self.clocked_in_since(_today_start())),
+            "rebuilds": self.rebuilds,
+            "events_applied": self.events_applied,
+            "age_seconds": round(time.monotonic() - self._built_at, 1) if self._built_at else None,
+        }
+
+
+presence_index = PresenceIndex()
+
+
+async def deliver_presence_event(message_text: str) -> None:
+    """Apply a presence change and push it to local attendance board sockets"""
+    try:
+        change = json.loads(message_text).get("presence")
+    except (ValueError, AttributeError):
+        return
+    if not change:
+        return
+    user_id = change["user_id"]
+    presence_index.apply(user_id, change.get("entry"))
+    if manager.has_attendance_sockets():
+        manager.send_to_attendance({
+            "type": "presence",
+            "user_id": user_id,
+            **presence_status(presence_index.get(user_id)),
+        })
+
+
+manager.add_user_event_handler(deliver_presence_event)
@@ -0,0 +1,318 @@
+"""
+Full-text search index service
+
+Maintains an inverted index over users, tasks, projects, departments,
+feedback and chat rooms so that universal search never has to scan the
+source tables:
+- SQLite: an FTS5 virtual table ranked with bm25()
+- PostgreSQL: a tsvector table with a GIN index ranked with ts_rank_cd()
+
+The index is kept up to date by SQLAlchemy mapper events that write into
+the same transaction as the ORM flush. Bulk `query.update()`/`delete()`
+calls and writes from the Streamlit app bypass those hooks, so `rebuild()`
+can be used to resynchronise the index from the source tables.
+"""
+
+import logging
+import re
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import bindparam, event, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+from app.models.chat import ChatRoom
+from app.models.department import Department
+from app.models.feedback import Feedback
+from app.models.project import Project
+from app.models.task import Task
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+# Entity type -> (model, title attribute, body attributes)
+INDEXED_ENTITIES = {
+    'user': (User, 'full_name', ('email', 'job_role')),
+    'task': (Task, 'title', ('description',)),
+    'project': (Project, 'title', ('description',)),
+    'department': (Department, 'name', ('description',)),
+    'feedback': (Feedback, None, ('content',)),
+    'chat': (ChatRoom, 'name', ()),
+}
+
+# SQLite packs the entity into the FTS rowid (entity_id * 8 + type code) so
+# that upserts and deletes are rowid lookups instead of full index scans.
+TYPE_CODES = {'user': 1, 'task': 2, 'project': 3, 'department': 4, 'feedback': 5, 'chat': 6}
+CODE_TYPES = {code: entity_type for entity_type, code in TYPE_CODES.items()}
+ROWID_STRIDE = 8
+
+TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+SQLITE_SCHEMA = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+        title, body,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+    """,
+]
+
+POSTGRES_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS search_documents (
+        entity_type VARCHAR(16) NOT NULL,
+        entity_id INTEGER NOT NULL,
+        title TEXT,
+        body TEXT,
+        document TSVECTOR NOT NULL,
+        PRIMARY KEY (entity_type, entity_id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_search_documents_document ON search_documents USING GIN (document)",
+]
+
+
+def _document_for(entity_type: str, target) -> Tuple[Optional[str], str]:
+    """Build the (title, body) pair that gets indexed for an entity"""
+    _, title_attr, body_attrs = INDEXED_ENTITIES[entity_type]
+    title = getattr(target, title_attr) if title_attr else None
+    body = ' '.join(str(getattr(target, attr)) for attr in body_attrs if getattr(target, attr))
+    return title, body
+
+
+class SearchIndexService:
+    """Incrementally maintained full-text index used by universal search"""
+
+    def __init__(self):
+        self.dialect: Optional[str] = None
+        self.available = False
+
+    # ------------------------------------------------------------------
+    # Schema and bootstrap
+    # ------------------------------------------------------------------
+
+    def init_index(self, engine: Engine) -> None:
+        """Create the index structures and backfill them if they are empty"""
+        dialect = engine.dialect.name
+        if dialect not in ('sqlite', 'postgresql'):
+            logger.warning(f"Full-text search index not supported on '{dialect}', using table scans")
+            return
+
+        try:
+            with engine.begin() as conn:
+                for statement in (SQLITE_SCHEMA if dialect == 'sqlite' else POSTGRES_SCHEMA):
+                    conn.execute(text(statement))
+        except Exception as e:
+            # Most commonly a SQLite build compiled without FTS5
+            logger.warning(f"Could not create full-text search index, using table scans: {e}")
+            return
+
+        self.dialect = dialect
+        self.available = True
+
+        with engine.begin() as conn:
+            table = 'search_index' if dialect == 'sqlite' else 'search_documents'
+            if conn.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar() == 0:
+                counts = self.rebuild(conn)
+                logger.info(f"Search index built: {counts}")
+
+    def rebuild(self, conn: Connection) -> Dict[str, int]:
+        """Drop every indexed document and re-index all source tables"""
+        self._clear(conn)
+        counts = {}
+        for entity_type, (model, title_attr, body_attrs) in INDEXED_ENTITIES.items():
+            columns = [model.__table__.c[attr] for attr in ('id', title_attr, *body_attrs) if attr]
+            rows = conn.execute(select(*columns)).mappings()
+            batch = []
+            counts[entity_type] = 0
+            for row in rows:
+                title = row[title_attr] if title_attr else None
+                body = ' '.join(str(row[attr]) for attr in body_attrs if row[attr])
+                if not title and not body:
+                    continue
+                batch.append(self._params(entity_type, row['id'], title, body))
+                if len(batch) >= 1000:
+                    self._write(conn, batch)
+                    counts[entity_type] += len(batch)
+                    batch = []
+            if batch:
+                self._write(conn, batch)
+                counts[entity_type] += len(batch)
+        return counts
+
+    # ------------------------------------------------------------------
+    # Write path
+    # ------------------------------------------------------------------
+
+    def _params(self, entity_type: str, entity_id: int, title: Optional[str], body: str) -> dict:
+        if self.dialect == 'sqlite':
+            return {'rowid': entity_id * ROWID_STRIDE + TYPE_CODES[entity_type], 'title': title or '', 'body': body}
+        return {'entity_type': entity_type, 'entity_id': entity_id, 'title': title or '', 'body': body}
+
+    def _clear(self, conn: Connection) -> None:
+        conn.execute(text("DELETE FROM search_index" if self.dialect == 'sqlite' else "DELETE FROM search_documents"))
+
+    def _write(self, conn: Connection, params: List[dict]) -> None:
+        if self.dialect == 'sqlite':
+            conn.execute(
+                text("DELETE FROM search_index WHERE rowid = :rowid"),
+                [{'rowid': p['rowid']} for p in params]
+            )
+            conn.execute(text("INSERT INTO search_index (rowid, title, body) VALUES (:rowid, :title, :body)"), params)
+        else:
+            conn.execute(text("""
+                INSERT INTO search_documents (entity_type, entity_id, title, body, document)
+                VALUES (
+                    :entity_type, :entity_id, :title, :body,
+                    setweight(to_tsvector('simple', :title), 'A') || setweight(to_tsvector('simple', :body), 'B')
+                )
+                ON CONFLICT (entity_type, entity_id) DO UPDATE
+                SET title = excluded.title, body = excluded.body, document = excluded.document
+            """), params)
+
+    def _delete(self, conn: Connection, entity_type: str, entity_id: int) -> None:
+        if self.dialect == 'sqlite':
+            conn.execute(
+                text("DELETE FROM search_index WHERE rowid = :rowid"),
+                {'rowid': entity_id * ROWID_STRIDE + TYPE_CODES[entity_type]}
+            )
+        else:
+            conn.execute(
+                text("DELETE FROM search_documents WHERE entity_type = :entity_type AND entity_id = :entity_id"),
+                {'entity_type': entity_type, 'entity_id': entity_id}
+            )
+
+    def index_entity(self, conn: Connection, entity_type: str, target) -> None:
+        """Insert or replace the document for a single entity"""
+        if not self.available:
+            return
+        title, body = _document_for(entity_type, target)
+        if not title and not body:
+            self._delete(conn, entity_type, target.id)
+            return
+        self._write(conn, [self._params(entity_type, target.id, title, body)])
+
+    def remove_entity(self, conn: Connection, entity_type: str, entity_id: int) -> None:
+        """Remove a single entity from the index"""
+        if self.available:
+            self._delete(conn, entity_type, entity_id)
+
+    # ------------------------------------------------------------------
+    # Read path
+    # ------------------------------------------------------------------
+
+    def build_match_query(self, q: str) -> Optional[str]:
+        """
+        Turn free text into a prefix-matching full-text query.
+        Every token must match, the last one (or all of them) as a prefix
+        so partially typed words still find results.
+        """
+        tokens = TOKEN_PATTERN.findall(q.lower())
+        if not tokens:
+            return None
+        if self.dialect == 'sqlite':
+            return ' AND '.join(f'"{token}"*' for token in tokens)
+        return ' & '.join(f'{token}:*' for token in tokens)
+
+    def search(
+        self,
+        db: Session,
+        q: str,
+        types: List[str],
+        limit: int,
+        offset: int
+    ) -> Tuple[List[Tuple[str, int, float]], Dict[str, int]]:
+        """
+        Run a ranked search over the index.
+
+        Returns:
+            ([(entity_type, entity_id, score), ...] for the requested page,
+             {entity_type: total matches} over the whole result set)
+        """
+        match = self.build_match_query(q)
+        if not match or not types:
+            return [], {t: 0 for t in types}
+
+        if self.dialect == 'sqlite':
+            codes = [TYPE_CODES[t] for t in types if t in TYPE_CODES]
+            type_filter = f"(rowid % {ROWID_STRIDE}) IN :codes"
+            counts = db.execute(
+                text(f"""
+                    SELECT rowid % {ROWID_STRIDE} AS code, COUNT(*) FROM search_index
+                    WHERE search_index MATCH :match AND {type_filter}
+                    GROUP BY code
+                """).bindparams(bindparam('codes', expanding=True)),
+                {'match': match, 'codes': codes}
+            ).all()
+            # bm25() is lower-is-better; title hits weigh ten times body hits
+            rows = db.execute(
+                text(f"""
+                    SELECT rowid, -bm25(search_index, 10.0, 1.0) AS score FROM search_index
+                    WHERE search_index MATCH :match AND {type_filter}
+                    ORDER BY bm25(search_index, 10.0, 1.0)
+                    LIMIT :limit OFFSET :offset
+                """).bindparams(bindparam('codes', expanding=True)),
+                {'match': match, 'codes': codes, 'limit': limit, 'offset': offset}
+            ).all()
+            by_type = {t: 0 for t in types}
+            by_type.update({CODE_TYPES[code]: count for code, count in counts})
+            hits = [
+                (CODE_TYPES[rowid % ROWID_STRIDE], rowid // ROWID_STRIDE, score)
+                for rowid, score in rows
+            ]
+            return hits, by_type
+
+        # PostgreSQL: ts_rank_cd over weighted tsvectors
+        counts = db.execute(
+            text("""
+                SELECT entity_type, COUNT(*) FROM search_documents
+                WHERE document @@ to_tsquery('simple', :match) AND entity_type IN :types
+                GROUP BY entity_type
+            """).bindparams(bindparam('types', expanding=True)),
+            {'match': match, 'types': types}
+        ).all()
+        rows = db.execute(
+            text("""
+                SELECT entity_type, entity_id, ts_rank_cd(document, to_tsquery('simple', :match)) AS score
+                FROM search_documents
+                WHERE document @@ to_tsquery('simple', :match) AND entity_type IN :types
+                ORDER BY score DESC, entity_id
+                LIMIT :limit OFFSET :offset
+            """).bindparams(bindparam('types', expanding=True)),
+            {'match': match, 'types': types, 'limit': limit, 'offset': offset}
+        ).all()
+        by_type = {t: 0 for t in types}
+        by_type.update(dict(counts))
+        return [(entity_type, entity_id, float(score)) for entity_type, entity_id, score in rows], by_type
+
+
+search_index_service = SearchIndexService()
+
+
+# ----------------------------------------------------------------------
+# Write hooks
+# ----------------------------------------------------------------------
+
+def _register_hooks(entity_type: str, model) -> None:
+    _, title_attr, body_attrs = INDEXED_ENTITIES[entity_type]
+    watched = [attr for attr in (title_attr, *body_attrs) if attr]
+
+    def after_insert(mapper, connection, target):
+        search_index_service.index_entity(connection, entity_type, target)
+
+    def after_update(mapper, connection, target):
+        state = inspect(target)
+        if any(state.attrs[attr].history.has_changes() for attr in watched):
+            search_index_service.index_entity(connection, entity_type, target)
+
+    def after_delete(mapper, connection, target):
+        search_index_service.remove_entity(connection, entity_type, target.id)
+
+    event.listen(model, 'after_insert', after_insert)
+    event.listen(model, 'after_update', after_update)
+    event.listen(model, 'after_delete', after_delete)
+
+
+for _entity_type, (_model, _, _) in INDEXED_ENTITIES.items():
+    _register_hooks(_entity_type, _model)
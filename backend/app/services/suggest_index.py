@@ -0,0 +1,235 @@
+"""
+In-memory type-ahead index for the command palette
+
+Keeps a sorted array of normalised keys for user names, task titles,
+project titles, department names and chat room names, and answers
+prefix lookups with bisect so `/search/suggest` never touches the
+database. Every word of a label is indexed, so "smi" finds "John Smith".
+
+The index is process-local: it is built at startup and kept current by
+the routers that create, update and delete the indexed entities.
+"""
+
+import bisect
+import logging
+import re
+import sys
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.models.chat import ChatRoom
+from app.models.department import Department
+from app.models.project import Project
+from app.models.task import Task
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+SUGGEST_TYPES = ('user', 'task', 'project', 'department', 'chat')
+
+SUGGEST_URLS = {
+    'user': '/people/{id}',
+    'task': '/tasks/{id}',
+    'project': '/projects/{id}',
+    'department': '/people/org-chart?department={id}',
+    'chat': '/chat?room={id}',
+}
+
+WORD_START = re.compile(r'\w+', re.UNICODE)
+
+# Number of candidates scanned per requested suggestion before ranking
+CANDIDATE_FACTOR = 4
+
+
+def normalize(text: str) -> str:
+    """Lowercase and collapse whitespace"""
+    return ' '.join(text.lower().split())
+
+
+class SuggestIndex:
+    """Sorted-array prefix index with bisect lookups"""
+
+    def __init__(self, latency_samples: int = 1000):
+        # Sorted (key, entity_type, entity_id, is_label_start) tuples
+        self._keys: List[Tuple[str, str, int, bool]] = []
+        # (entity_type, entity_id) -> (label, keys inserted for it)
+        self._entries: Dict[Tuple[str, int], Tuple[str, List[Tuple[str, str, int, bool]]]] = {}
+        self._lock = threading.Lock()
+        self._latencies_ms = deque(maxlen=latency_samples)
+        self.built_at: Optional[float] = None
+
+    def _keys_for(self, entity_type: str, entity_id: int, label: str) -> List[Tuple[str, str, int, bool]]:
+        normalized = normalize(label)
+        keys = []
+        seen = set()
+        for match in WORD_START.finditer(normalized):
+            key = normalized[match.start():]
+            if key not in seen:
+                seen.add(key)
+                keys.append((key, entity_type, entity_id, match.start() == 0))
+        return keys
+
+    def _insert_locked(self, entity_type: str, entity_id: int, label: str) -> None:
+        self._remove_locked(entity_type, entity_id)
+        keys = self._keys_for(entity_type, entity_id, label)
+        for key in keys:
+            bisect.insort(self._keys, key)
+        self._entries[(entity_type, entity_id)] = (label, keys)
+
+    def _remove_locked(self, entity_type: str, entity_id: int) -> None:
+        entry = self._entries.pop((entity_type, entity_id), None)
+        if entry is None:
+            return
+        for key in entry[1]:
+            position = bisect.bisect_left(self._keys, key)
+            if position < len(self._keys) and self._keys[position] == key:
+                del self._keys[position]
+
+    def upsert(self, entity_type: str, entity_id: int, label: Optional[str]) -> None:
+        """Add or replace an entity; an empty label removes it"""
+        with self._lock:
+            if label:
+                self._insert_locked(entity_type, entity_id, label)
+            else:
+                self._remove_locked(entity_type, entity_id)
+
+    def remove(self, entity_type: str, entity_id: int) -> None:
+        """Remove an entity from the index"""
+        with self._lock:
+            self._remove_locked(entity_type, entity_id)
+
+    def rebuild(self, db: Session) -> Dict[str, int]:
+        """Rebuild the whole index from the database"""
+        sources = [
+            ('user', db.query(User.id, User.full_name)),
+            # Private task titles must not leak through the palette
+            ('task', db.query(Task.id, Task.title).filter(Task.is_private != True)),
+            ('project', db.query(Project.id, Project.title)),
+            ('department', db.query(Department.id, Department.name)),
+            ('chat', db.query(ChatRoom.id, ChatRoom.name).filter(ChatRoom.name.isnot(None))),
+        ]
+
+        keys = []
+        entries = {}
+        counts = {}
+        for entity_type, query in sources:
+            counts[entity_type] = 0
+            for entity_id, label in query:
+                if not label:
+                    continue
+                entity_keys = self._keys_for(entity_type, entity_id, label)
+                keys.extend(entity_keys)
+                entries[(entity_type, entity_id)] = (label, entity_keys)
+                counts[entity_type] += 1
+        keys.sort()
+
+        with self._lock:
+            self._keys = keys
+            self._entries = entries
+            self.built_at = time.time()
+        return counts
+
+    def suggest(self, prefix: str, types: Optional[List[str]] = None, limit: int = 10) -> List[dict]:
+        """
+        Return up to `limit` entities with a word starting with `prefix`.
+        Matches at the start of the label rank before mid-label matches,
+        shorter labels before longer ones.
+        """
+        start = time.perf_counter()
+        needle = normalize(prefix)
+        allowed = set(types) if types else None
+        candidates = {}
+
+        if needle:
+            keys = self._keys
+            position = bisect.bisect_left(keys, (needle,))
+            while position < len(keys) and len(candidates) < limit * CANDIDATE_FACTOR:
+                key, entity_type, entity_id, is_label_start = keys[position]
+                if not key.startswith(needle):
+                    break
+                position += 1
+                if allowed is not None and entity_type not in allowed:
+                    continue
+                ident = (entity_type, entity_id)
+                if ident not in candidates or is_label_start:
+                    candidates[ident] = is_label_start
+
+        results = []
+        for (entity_type, entity_id), is_label_start in candidates.items():
+            entry = self._entries.get((entity_type, entity_id))
+            if entry is None:
+                continue
+            results.append({
+                'id': entity_id,
+                'type': entity_type,
+                'title': entry[0],
+                'url': SUGGEST_URLS[entity_type].format(id=entity_id),
+                'is_label_start': is_label_start,
+            })
+        results.sort(key=lambda r: (not r['is_label_start'], len(r['title']), r['title']))
+        for result in results:
+            del result['is_label_start']
+
+        self._latencies_ms.append((time.perf_counter() - start) * 1000)
+        return results[:limit]
+
+    def memory_report(self) -> dict:
+        """Approximate memory held by the index plus lookup latency percentiles"""
+        with self._lock:
+            keys = list(self._keys)
+            entries = dict(self._entries)
+
+        key_bytes = sys.getsizeof(keys) + sum(
+            sys.getsizeof(k) + sys.getsizeof(k[0]) for k in keys
+        )
+        entry_bytes = sys.getsizeof(entries) + sum(
+            sys.getsizeof(ident) + sys.getsizeof(entry) + sys.getsizeof(entry[0]) + sys.getsizeof(entry[1])
+            for ident, entry in entries.items()
+        )
+
+        by_type = {t: 0 for t in SUGGEST_TYPES}
+        for entity_type, _ in entries:
+            by_type[entity_type] = by_type.get(entity_type, 0) + 1
+
+        latencies = sorted(self._latencies_ms)
+
+        def percentile(p: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))], 4)
+
+        return {
+            'entities': len(entries),
+            'entities_by_type': by_type,
+            'keys': len(keys),
+            'approx_bytes': key_bytes + entry_bytes,
+            'approx_megabytes': round((key_bytes + entry_bytes) / (1024 * 1024), 2),
+            'built_at': self.built_at,
+            'lookup_latency_ms': {
+                'samples': len(latencies),
+                'p50': percentile(0.50),
+                'p99': percentile(0.99),
+            },
+        }
+
+
+suggest_index = SuggestIndex()
+
+
+if __name__ == "__main__":
+    # Build the index from the configured database and print its footprint
+    import json
+    from app.core.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        counts = suggest_index.rebuild(db)
+        print(f"Built suggest index in {(time.perf_counter() - started) * 1000:.1f} ms: {counts}")
+        print(json.dumps(suggest_index.memory_report(), indent=2))
+    finally:
+        db.close()
@@ -0,0 +1,231 @@
+"""
+Streaming time record export
+
+Rows are read with a server-side cursor (stream_results + yield_per) as
+plain columns rather than ORM objects, and encoded as they arrive, so
+memory stays flat however many records match:
+- csv:     the same columns and formatting as the original export
+- csv.gz:  that CSV through a streaming gzip compressor
+- parquet: typed columns, one row group per batch
+- arrow:   Arrow IPC stream, one record batch per batch
+Parquet and Arrow need pyarrow, which is imported only for those formats.
+"""
+
+import csv
+import io
+import logging
+import zlib
+from datetime import datetime
+from typing import Iterator, List, Optional
+
+from sqlalchemy import and_
+
+from app.core.database import SessionLocal
+from app.models.department import Department
+from app.models.time_entry import TimeEntry
+from app.models.user import User
+from app.services.time_tracking_service import TimeTrackingService
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched per round trip, and per CSV chunk / Parquet row group
+EXPORT_BATCH_SIZE = 5000
+
+EXPORT_FORMATS = {
+    # format: (media type, file extension)
+    "csv": ("text/csv", "csv"),
+    "csv.gz": ("application/gzip", "csv.gz"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+}
+
+CSV_HEADER = [
+    'Employee Name',
+    'Department',
+    'Clock In',
+    'Clock Out',
+    'Total Worked Hours',
+    'Break Duration (minutes)',
+    'Terrain Work'
+]
+
+
+def require_pyarrow():
+    """Import pyarrow for the columnar formats; raises ImportError if it is not installed"""
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+    return pyarrow
+
+
+def iter_export_rows(
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    user_id: Optional[int] = None,
+    department_id: Optional[int] = None,
+    is_terrain: Optional[bool] = None,
+    batch_size: int = EXPORT_BATCH_SIZE
+) -> Iterator[List[tuple]]:
+    """
+    Batches of (user_name, department_name, clock_in, clock_out,
+    worked_hours, break_minutes, is_terrain), newest clock-in first.
+    Uses its own session: the response body is produced after the request's
+    session has been released.
+    """
+    db = SessionLocal()
+    try:
+        filters = TimeTrackingService.time_record_filters(
+            start_date, end_date, user_id, department_id, is_terrain
+        )
+        query = db.query(
+            User.full_name,
+            Department.name,
+            TimeEntry.clock_in,
+            TimeEntry.clock_out,
+            TimeEntry.break_start,
+            TimeEntry.break_end,
+            TimeEntry.is_terrain
+        ).join(
+            User, User.id == TimeEntry.user_id
+        ).outerjoin(
+            Department, Department.id == User.department_id
+        )
+        if filters:
+            query = query.filter(and_(*filters))
+        query = query.order_by(TimeEntry.clock_in.desc()).execution_options(
+            stream_results=True, yield_per=batch_size
+        )
+
+        batch = []
+        for row in query:
+            batch.append((
+                row.full_name,
+                row.name,
+                row.clock_in,
+                row.clock_out,
+                TimeTrackingService.calculate_worked_hours(row),
+                TimeTrackingService.calculate_break_duration(row),
+                bool(row.is_terrain)
+            ))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    finally:
+        db.close()
+
+
+def _csv_row(record: tuple) -> list:
+    user_name, department_name, clock_in, clock_out, worked_hours, break_minutes, is_terrain = record
+    return [
+        user_name,
+        department_name or 'N/A',
+        # Same text as strftime('%Y-%m-%d %H:%M:%S'), but cheaper
+        clock_in.isoformat(' ', 'seconds'),
+        clock_out.isoformat(' ', 'seconds') if clock_out else 'Still working',
+        f"{worked_hours:.2f}" if worked_hours else 'N/A',
+        break_minutes or 0,
+        'Yes' if is_terrain else 'No'
+    ]
+
+
+def stream_csv(batches: Iterator[List[tuple]]) -> Iterator[bytes]:
+    """CSV text, one chunk per batch"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+    for batch in batches:
+        writer.writerows(_csv_row(record) for record in batch)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def stream_gzip(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    """gzip-compress a byte stream as it goes"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands over what was written since the last drain"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _record_batch(pa, schema, batch: List[tuple]):
+    columns = list(zip(*batch))
+    return pa.RecordBatch.from_arrays(
+        [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+        schema=schema
+    )
+
+
+def _arrow_schema(pa):
+    return pa.schema([
+        ("employee_name", pa.string()),
+        ("department", pa.string()),
+        ("clock_in", pa.timestamp("s")),
+        ("clock_out", pa.timestamp("s")),
+        ("total_worked_hours", pa.float64()),
+        ("break_duration_minutes", pa.int64()),
+        ("terrain_work", pa.bool_()),
+    ])
+
+
+def stream_columnar(batches: Iterator[List[tuple]], format: str) -> Iterator[bytes]:
+    """Parquet (one row group per batch) or an Arrow IPC stream"""
+    pa = require_pyarrow()
+    schema = _arrow_schema(pa)
+    sink = _ChunkSink()
+    if format == "parquet":
+        writer = pa.parquet.ParquetWriter(sink, schema, compression="snappy")
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+    try:
+        for batch in batches:
+            if format == "parquet":
+                writer.write_batch(_record_batch(pa, schema, batch), row_group_size=len(batch))
+            else:
+                writer.write_batch(_record_batch(pa, schema, batch))
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def stream_export(batches: Iterator[List[tuple]], format: str = "csv") -> Iterator[bytes]:
+    """Encode export batches in one of EXPORT_FORMATS"""
+    if format == "csv":
+        return stream_csv(batches)
+    if format == "csv.gz":
+        return stream_gzip(stream_csv(batches))
+    return stream_columnar(batches, format)
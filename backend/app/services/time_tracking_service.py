@@ -1,38 +1,54 @@
-from datetime import datetime, timedelta
-from typing import List, Optional
+from datetime import date, datetime, timedelta
+from typing import List, Optional, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import and_, or_
+from sqlalchemy import Integer, and_, asc, case, cast, desc, func, or_, select
 from fastapi import HTTPException, status
 from app.models.time_entry import TimeEntry
 from app.models.user import User
 from app.models.department import Department
+from app.services.presence_index import presence_index
 from app.schemas.time_entry import (
     TimeEntryResponse,
     ActiveUserResponse,
     TimeEntryRecordResponse,
+    TimeRecordSummaryResponse,
     TimeTrackingStatusResponse,
     UserWithStatusResponse
 )
 
+# Hours per week above which worked time counts as overtime
+WEEKLY_OVERTIME_HOURS = 40
+
+
+def _as_date(value) -> Optional[date]:
+    """SQLite returns func.date() as text, PostgreSQL as a date"""
+    if value is None or isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
 
 class TimeTrackingService:
     """Service for handling time tracking business logic"""
     
     @staticmethod
-    def get_active_entry(db: Session, user_id: int) -> Optional[TimeEntry]:
+    async def get_active_entry(db: AsyncSession, user_id: int) -> Optional[TimeEntry]:
         """Get the current active time entry for a user (not clocked out)"""
-        return db.query(TimeEntry).filter(
-            and_(
-                TimeEntry.user_id == user_id,
-                TimeEntry.clock_out.is_(None)
-            )
-        ).first()
+        result = await db.execute(
+            select(TimeEntry).where(
+                and_(
+                    TimeEntry.user_id == user_id,
+                    TimeEntry.clock_out.is_(None)
+                )
+            ).limit(1)
+        )
+        return result.scalars().first()
     
     @staticmethod
-    def clock_in(db: Session, user_id: int, is_terrain: bool = False) -> TimeEntry:
+    async def clock_in(db: AsyncSession, user_id: int, is_terrain: bool = False) -> TimeEntry:
         """Clock in a user (starts with 1 hour already logged)"""
         # Check if user is already clocked in
-        active_entry = TimeTrackingService.get_active_entry(db, user_id)
+        active_entry = await TimeTrackingService.get_active_entry(db, user_id)
         if active_entry:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -46,14 +62,15 @@ class TimeTrackingService:
             is_terrain=is_terrain
         )
         db.add(time_entry)
-        db.commit()
-        db.refresh(time_entry)
+        await db.commit()
+        await db.refresh(time_entry)
+        await presence_index.publish(time_entry)
         return time_entry
     
     @staticmethod
-    def clock_out(db: Session, user_id: int, work_summary: Optional[str] = None) -> TimeEntry:
+    async def clock_out(db: AsyncSession, user_id: int, work_summary: Optional[str] = None) -> TimeEntry:
         """Clock out a user"""
-        active_entry = TimeTrackingService.get_active_entry(db, user_id)
+        active_entry = await TimeTrackingService.get_active_entry(db, user_id)
         if not active_entry:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -69,14 +86,15 @@ class TimeTrackingService:
         if work_summary:
             active_entry.work_summary = work_summary.strip()
         
-        db.commit()
-        db.refresh(active_entry)
+        await db.commit()
+        await db.refresh(active_entry)
+        await presence_index.publish(active_entry)
         return active_entry
     
     @staticmethod
-    def start_break(db: Session, user_id: int) -> TimeEntry:
+    async def start_break(db: AsyncSession, user_id: int) -> TimeEntry:
         """Start a break"""
-        active_entry = TimeTrackingService.get_active_entry(db, user_id)
+        active_entry = await TimeTrackingService.get_active_entry(db, user_id)
         if not active_entry:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -92,14 +110,15 @@ class TimeTrackingService:
         # Start new break
         active_entry.break_start = datetime.utcnow()
         active_entry.break_end = None
-        db.commit()
-        db.refresh(active_entry)
+        await db.commit()
+        await db.refresh(active_entry)
+        await presence_index.publish(active_entry)
         return active_entry
     
     @staticmethod
-    def end_break(db: Session, user_id: int) -> TimeEntry:
+    async def end_break(db: AsyncSession, user_id: int) -> TimeEntry:
         """End a break"""
-        active_entry = TimeTrackingService.get_active_entry(db, user_id)
+        active_entry = await TimeTrackingService.get_active_entry(db, user_id)
         if not active_entry:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -114,14 +133,15 @@ class TimeTrackingService:
         
         # End break
         active_entry.break_end = datetime.utcnow()
-        db.commit()
-        db.refresh(active_entry)
+        await db.commit()
+        await db.refresh(active_entry)
+        await presence_index.publish(active_entry)
         return active_entry
     
     @staticmethod
-    def toggle_terrain(db: Session, user_id: int) -> TimeEntry:
+    async def toggle_terrain(db: AsyncSession, user_id: int) -> TimeEntry:
         """Toggle terrain work status"""
-        active_entry = TimeTrackingService.get_active_entry(db, user_id)
+        active_entry = await TimeTrackingService.get_active_entry(db, user_id)
         if not active_entry:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -129,14 +149,15 @@ class TimeTrackingService:
             )
         
         active_entry.is_terrain = not active_entry.is_terrain
-        db.commit()
-        db.refresh(active_entry)
+        await db.commit()
+        await db.refresh(active_entry)
+        await presence_index.publish(active_entry)
         return active_entry
     
     @staticmethod
-    def get_current_status(db: Session, user_id: int) -> TimeTrackingStatusResponse:
+    async def get_current_status(db: AsyncSession, user_id: int) -> TimeTrackingStatusResponse:
         """Get current time tracking status for a user"""
-        active_entry = TimeTrackingService.get_active_entry(db, user_id)
+        active_entry = await TimeTrackingService.get_active_entry(db, user_id)
         
         if not active_entry:
             return TimeTrackingStatusResponse(
@@ -162,27 +183,29 @@ class TimeTrackingService:
     
     @staticmethod
     def get_active_users(db: Session) -> List[ActiveUserResponse]:
-        """Get all currently active (clocked in) users"""
-        active_entries = db.query(TimeEntry).options(
-            joinedload(TimeEntry.user).joinedload(User.department)
-        ).filter(
-            TimeEntry.clock_out.is_(None)
-        ).all()
+        """Get all currently active (clocked in) users, from the presence index"""
+        presence_index.ensure_fresh(db)
+        open_entries = presence_index.open_entries()
+        if not open_entries:
+            return []
         
+        users = db.query(User).options(
+            joinedload(User.department)
+        ).filter(User.id.in_(list(open_entries))).all()
+        
+        now = datetime.utcnow()
         result = []
-        for entry in active_entries:
-            is_on_break = bool(entry.break_start and not entry.break_end)
-            duration_minutes = int((datetime.utcnow() - entry.clock_in).total_seconds() / 60)
-            
+        for user in users:
+            presence = open_entries[user.id]
             result.append(ActiveUserResponse(
-                id=entry.user.id,
-                full_name=entry.user.full_name,
-                email=entry.user.email,
-                department_name=entry.user.department.name if entry.user.department else None,
-                clock_in=entry.clock_in,
-                is_on_break=is_on_break,
-                is_terrain=entry.is_terrain,
-                current_duration_minutes=duration_minutes
+                id=user.id,
+                full_name=user.full_name,
+                email=user.email,
+                department_name=user.department.name if user.department else None,
+                clock_in=presence.clock_in,
+                is_on_break=presence.is_on_break,
+                is_terrain=presence.is_terrain,
+                current_duration_minutes=presence.duration_minutes(now)
             ))
         
         return result
@@ -190,26 +213,18 @@ class TimeTrackingService:
     @staticmethod
     def get_not_clocked_in_users(db: Session) -> List[dict]:
         """Get all users who haven't clocked in today"""
-        # Get all active entries for today
+        presence_index.ensure_fresh(db)
         today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        clocked_in_user_ids = presence_index.clocked_in_since(today_start)
         
-        clocked_in_user_ids = db.query(TimeEntry.user_id).filter(
-            TimeEntry.clock_in >= today_start
-        ).distinct().all()
-        clocked_in_user_ids = [uid[0] for uid in clocked_in_user_ids]
-        
-        # Get all users who haven't clocked in
-        not_clocked_in = db.query(User).options(
+        users = db.query(User).options(
             joinedload(User.department)
-        ).filter(
-            and_(
-                User.is_active == True,
-                ~User.id.in_(clocked_in_user_ids)
-            )
-        ).all()
+        ).filter(User.is_active == True).all()
         
         result = []
-        for user in not_clocked_in:
+        for user in users:
+            if user.id in clocked_in_user_ids:
+                continue
             result.append({
                 "id": user.id,
                 "full_name": user.full_name,
@@ -245,20 +260,14 @@ class TimeTrackingService:
         return int(break_duration.total_seconds() / 60)
     
     @staticmethod
-    def get_time_records(
-        db: Session,
+    def time_record_filters(
         start_date: Optional[datetime] = None,
         end_date: Optional[datetime] = None,
         user_id: Optional[int] = None,
         department_id: Optional[int] = None,
         is_terrain: Optional[bool] = None
-    ) -> List[TimeEntryRecordResponse]:
-        """Get time tracking records with filters"""
-        query = db.query(TimeEntry).options(
-            joinedload(TimeEntry.user).joinedload(User.department)
-        )
-        
-        # Apply filters
+    ) -> list:
+        """Filter clauses for time record queries (joined to User)"""
         filters = []
         
         if start_date:
@@ -276,78 +285,304 @@ class TimeTrackingService:
         if is_terrain is not None:
             filters.append(TimeEntry.is_terrain == is_terrain)
         
+        return filters
+    
+    @staticmethod
+    def _seconds_between(dialect: str, later, earlier):
+        """SQL expression for the difference between two timestamps in seconds"""
+        if dialect == "sqlite":
+            # julianday is a float; round off its sub-millisecond noise
+            return func.round((func.julianday(later) - func.julianday(earlier)) * 86400.0, 3)
+        return func.extract('epoch', later - earlier)
+    
+    @staticmethod
+    def worked_seconds_column(dialect: str):
+        """
+        SQL counterpart of calculate_worked_hours, in whole seconds:
+        NULL until clocked out, minus the break once it has ended
+        """
+        seconds = TimeTrackingService._seconds_between
+        break_seconds = case(
+            (and_(TimeEntry.break_start.isnot(None), TimeEntry.break_end.isnot(None)),
+             seconds(dialect, TimeEntry.break_end, TimeEntry.break_start)),
+            else_=0
+        )
+        return case(
+            (TimeEntry.clock_out.isnot(None),
+             cast(func.round(seconds(dialect, TimeEntry.clock_out, TimeEntry.clock_in) - break_seconds), Integer)),
+            else_=None
+        )
+    
+    @staticmethod
+    def break_minutes_column(dialect: str, now: datetime):
+        """SQL counterpart of calculate_break_duration (a running break counts up to `now`)"""
+        minutes = TimeTrackingService._seconds_between(
+            dialect, func.coalesce(TimeEntry.break_end, now), TimeEntry.break_start
+        ) / 60
+        if dialect != "sqlite":
+            # CAST rounds on PostgreSQL; int() in Python truncates
+            minutes = func.trunc(minutes)
+        return case(
+            (TimeEntry.break_start.isnot(None), cast(minutes, Integer)),
+            else_=None
+        )
+    
+    @staticmethod
+    def _decode_record_cursor(cursor: str, sort_by: str):
+        """Parse '<sort value>_<id>' from encode_record_cursor"""
+        value, _, entry_id = cursor.rpartition("_")
+        try:
+            entry_id = int(entry_id)
+            if sort_by == "clock_in":
+                value = datetime.fromisoformat(value)
+            elif sort_by == "worked_hours":
+                value = int(value)
+            elif not value:
+                raise ValueError(cursor)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid cursor"
+            )
+        return value, entry_id
+    
+    @staticmethod
+    def encode_record_cursor(row, sort_by: str) -> str:
+        """Keyset cursor for the page after `row`: '<sort value>_<id>'"""
+        value = row.sort_key
+        if sort_by == "clock_in":
+            value = row.clock_in.isoformat()
+        return f"{value}_{row.id}"
+    
+    @staticmethod
+    def get_time_records_page(
+        db: Session,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        user_id: Optional[int] = None,
+        department_id: Optional[int] = None,
+        is_terrain: Optional[bool] = None,
+        sort_by: str = "clock_in",
+        order: str = "desc",
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[TimeEntryRecordResponse], Optional[str]]:
+        """
+        Time tracking records with filters, plus the cursor of the next page.
+        
+        Worked hours and break minutes are computed in the query. Rows are
+        ordered by (sort key, id) - clock_in, worked_hours (open entries
+        last ascending) or user_name - so a cursor from the previous page
+        continues right after its row. Without a limit every matching row
+        is returned; the next cursor is only set when a page is full.
+        """
+        dialect = db.get_bind().dialect.name
+        worked_seconds = TimeTrackingService.worked_seconds_column(dialect)
+        sort_key = {
+            "clock_in": TimeEntry.clock_in,
+            "worked_hours": func.coalesce(worked_seconds, -1),
+            "user_name": User.full_name,
+        }[sort_by]
+        
+        query = db.query(
+            TimeEntry.id,
+            TimeEntry.user_id,
+            User.full_name,
+            Department.name.label('department_name'),
+            TimeEntry.clock_in,
+            TimeEntry.clock_out,
+            TimeEntry.break_start,
+            TimeEntry.break_end,
+            TimeEntry.is_terrain,
+            worked_seconds.label('worked_seconds'),
+            TimeTrackingService.break_minutes_column(dialect, datetime.utcnow()).label('break_minutes'),
+            sort_key.label('sort_key')
+        ).join(
+            User, User.id == TimeEntry.user_id
+        ).outerjoin(
+            Department, Department.id == User.department_id
+        )
+        
+        # Apply filters
+        filters = TimeTrackingService.time_record_filters(
+            start_date, end_date, user_id, department_id, is_terrain
+        )
         if filters:
-            query = query.join(User).filter(and_(*filters))
-        else:
-            query = query.join(User)
+            query = query.filter(and_(*filters))
+        
+        if cursor:
+            value, entry_id = TimeTrackingService._decode_record_cursor(cursor, sort_by)
+            if order == "desc":
+                query = query.filter(or_(
+                    sort_key < value,
+                    and_(sort_key == value, TimeEntry.id < entry_id)
+                ))
+            else:
+                query = query.filter(or_(
+                    sort_key > value,
+                    and_(sort_key == value, TimeEntry.id > entry_id)
+                ))
         
-        entries = query.order_by(TimeEntry.clock_in.desc()).all()
+        direction = desc if order == "desc" else asc
+        query = query.order_by(direction(sort_key), direction(TimeEntry.id))
+        if limit:
+            query = query.limit(limit)
+        rows = query.all()
+        
+        records = [
+            TimeEntryRecordResponse(
+                id=row.id,
+                user_id=row.user_id,
+                user_name=row.full_name,
+                department_name=row.department_name,
+                clock_in=row.clock_in,
+                clock_out=row.clock_out,
+                break_start=row.break_start,
+                break_end=row.break_end,
+                is_terrain=row.is_terrain,
+                total_worked_hours=row.worked_seconds / 3600 if row.worked_seconds is not None else None,
+                break_duration_minutes=row.break_minutes
+            )
+            for row in rows
+        ]
+        next_cursor = None
+        if limit and len(rows) == limit:
+            next_cursor = TimeTrackingService.encode_record_cursor(rows[-1], sort_by)
+        return records, next_cursor
+    
+    @staticmethod
+    def get_time_records(
+        db: Session,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        user_id: Optional[int] = None,
+        department_id: Optional[int] = None,
+        is_terrain: Optional[bool] = None
+    ) -> List[TimeEntryRecordResponse]:
+        """Get time tracking records with filters, newest clock-in first"""
+        records, _ = TimeTrackingService.get_time_records_page(
+            db, start_date, end_date, user_id, department_id, is_terrain
+        )
+        return records
+    
+    @staticmethod
+    def _week_start(dialect: str, timestamp):
+        """SQL expression for the Monday of the ISO week containing `timestamp`"""
+        if dialect == "sqlite":
+            # Forward to the week's Sunday (or stay on it), back to its Monday
+            return func.date(timestamp, 'weekday 0', '-6 days')
+        return func.date(func.date_trunc('week', timestamp))
+    
+    @staticmethod
+    def get_time_summary(
+        db: Session,
+        group_by: str = "week",
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        user_id: Optional[int] = None,
+        department_id: Optional[int] = None,
+        is_terrain: Optional[bool] = None
+    ) -> List[TimeRecordSummaryResponse]:
+        """
+        Worked-time totals per user, per user and day, or per user and ISO
+        week, from GROUP BY queries. Entries count towards the day/week
+        they were clocked in; hours only include clocked-out entries.
+        
+        Overtime is the hours above WEEKLY_OVERTIME_HOURS in a week; a
+        user's total overtime is the sum over their weeks. Days have none.
+        """
+        dialect = db.get_bind().dialect.name
+        if group_by == "day":
+            period = func.date(TimeEntry.clock_in)
+        else:
+            period = TimeTrackingService._week_start(dialect, TimeEntry.clock_in)
+        
+        query = db.query(
+            TimeEntry.user_id,
+            User.full_name,
+            Department.name.label('department_name'),
+            period.label('period'),
+            func.count(TimeEntry.id).label('entries'),
+            func.coalesce(func.sum(TimeTrackingService.worked_seconds_column(dialect)), 0).label('worked_seconds'),
+            func.coalesce(func.sum(TimeTrackingService.break_minutes_column(dialect, datetime.utcnow())), 0).label('break_minutes')
+        ).join(
+            User, User.id == TimeEntry.user_id
+        ).outerjoin(
+            Department, Department.id == User.department_id
+        )
+        filters = TimeTrackingService.time_record_filters(
+            start_date, end_date, user_id, department_id, is_terrain
+        )
+        if filters:
+            query = query.filter(and_(*filters))
+        rows = query.group_by(
+            TimeEntry.user_id, User.full_name, Department.name, period
+        ).order_by(User.full_name, TimeEntry.user_id, period).all()
         
         result = []
-        for entry in entries:
-            result.append(TimeEntryRecordResponse(
-                id=entry.id,
-                user_id=entry.user_id,
-                user_name=entry.user.full_name,
-                department_name=entry.user.department.name if entry.user.department else None,
-                clock_in=entry.clock_in,
-                clock_out=entry.clock_out,
-                break_start=entry.break_start,
-                break_end=entry.break_end,
-                is_terrain=entry.is_terrain,
-                total_worked_hours=TimeTrackingService.calculate_worked_hours(entry),
-                break_duration_minutes=TimeTrackingService.calculate_break_duration(entry)
+        for row in rows:
+            hours = row.worked_seconds / 3600
+            period_start = _as_date(row.period)
+            overtime = None
+            if group_by != "day":
+                overtime = max(hours - WEEKLY_OVERTIME_HOURS, 0)
+            if group_by == "user":
+                # Fold this user's weeks into one row
+                if result and result[-1].user_id == row.user_id:
+                    total = result[-1]
+                    total.entries += row.entries
+                    total.worked_hours += hours
+                    total.break_minutes += int(row.break_minutes)
+                    total.overtime_hours += overtime
+                    continue
+                period_start = None
+            iso_year, iso_week = (period_start.isocalendar()[:2]
+                                  if group_by == "week" else (None, None))
+            result.append(TimeRecordSummaryResponse(
+                user_id=row.user_id,
+                user_name=row.full_name,
+                department_name=row.department_name,
+                period_start=period_start,
+                iso_year=iso_year,
+                iso_week=iso_week,
+                entries=row.entries,
+                worked_hours=hours,
+                break_minutes=int(row.break_minutes),
+                overtime_hours=overtime
             ))
         
+        for summary in result:
+            summary.worked_hours = round(summary.worked_hours, 2)
+            if summary.overtime_hours is not None:
+                summary.overtime_hours = round(summary.overtime_hours, 2)
         return result
     
     @staticmethod
     def get_all_users_with_status(db: Session) -> List[UserWithStatusResponse]:
         """Get all users with their current time tracking status"""
+        presence_index.ensure_fresh(db)
+        open_entries = presence_index.open_entries()
+        
         # Get all active users
         all_users = db.query(User).options(
             joinedload(User.department)
         ).filter(User.is_active == True).all()
         
+        now = datetime.utcnow()
         result = []
         for user in all_users:
-            # Get active time entry if exists
-            active_entry = db.query(TimeEntry).filter(
-                and_(
-                    TimeEntry.user_id == user.id,
-                    TimeEntry.clock_out.is_(None)
-                )
-            ).first()
-            
-            if active_entry:
-                is_on_break = bool(active_entry.break_start and not active_entry.break_end)
-                duration_minutes = int((datetime.utcnow() - active_entry.clock_in).total_seconds() / 60)
-                
-                result.append(UserWithStatusResponse(
-                    id=user.id,
-                    full_name=user.full_name,
-                    email=user.email,
-                    department_name=user.department.name if user.department else None,
-                    job_role=user.job_role,
-                    is_clocked_in=True,
-                    is_on_break=is_on_break,
-                    is_terrain=active_entry.is_terrain,
-                    clock_in=active_entry.clock_in,
-                    current_duration_minutes=duration_minutes
-                ))
-            else:
-                result.append(UserWithStatusResponse(
-                    id=user.id,
-                    full_name=user.full_name,
-                    email=user.email,
-                    department_name=user.department.name if user.department else None,
-                    job_role=user.job_role,
-                    is_clocked_in=False,
-                    is_on_break=False,
-                    is_terrain=False,
-                    clock_in=None,
-                    current_duration_minutes=None
-                ))
+            presence = open_entries.get(user.id)
+            result.append(UserWithStatusResponse(
+                id=user.id,
+                full_name=user.full_name,
+                email=user.email,
+                department_name=user.department.name if user.department else None,
+                job_role=user.job_role,
+                is_clocked_in=presence is not None,
+                is_on_break=presence.is_on_break if presence else False,
+                is_terrain=presence.is_terrain if presence else False,
+                clock_in=presence.clock_in if presence else None,
+                current_duration_minutes=presence.duration_minutes(now) if presence else None
+            ))
         
         return result
-
@@ -0,0 +1,338 @@
+"""
+Pub/sub backplanes for chat fan-out across workers
+
+`ConnectionManager` only knows the sockets held by its own process. A
+backplane carries every broadcast to the other workers, each of which
+subscribes only to the chat rooms it has local sockets for:
+- MemoryBackplane: single process, nothing leaves the worker
+- RedisBackplane: PUBLISH/SUBSCRIBE over the Redis wire protocol (works
+  against Redis or the stand-in in scripts/pubsub_server.py)
+- TableBackplane: workers append to the chat_events table and poll it,
+  for deployments that only share a database
+
+Payloads are tagged with the publishing worker's origin so a worker never
+re-delivers its own broadcasts (those are delivered locally first).
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Optional, Set
+from urllib.parse import urlparse
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+MessageHandler = Callable[[int, str], Awaitable[None]]
+
+CHANNEL_PREFIX = "chat:"
+
+
+class Backplane:
+    """Base class: delivers nothing beyond the local process"""
+
+    def __init__(self):
+        self.origin = uuid.uuid4().hex
+        self.handler: Optional[MessageHandler] = None
+        self.channels: Set[int] = set()
+
+    def set_handler(self, handler: MessageHandler) -> None:
+        self.handler = handler
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    async def subscribe(self, chat_id: int) -> None:
+        self.channels.add(chat_id)
+
+    async def unsubscribe(self, chat_id: int) -> None:
+        self.channels.discard(chat_id)
+
+    async def publish(self, chat_id: int, message_text: str) -> None:
+        pass
+
+    def _wrap(self, message_text: str) -> str:
+        return f"{self.origin}|{message_text}"
+
+    async def _dispatch(self, chat_id: int, payload: str) -> None:
+        origin, _, message_text = payload.partition("|")
+        if origin == self.origin or chat_id not in self.channels or self.handler is None:
+            return
+        try:
+            await self.handler(chat_id, message_text)
+        except Exception as e:
+            logger.error(f"Backplane delivery to chat {chat_id} failed: {e}")
+
+
+class MemoryBackplane(Backplane):
+    """In-process backplane; broadcasts stay within the worker"""
+
+
+# ----------------------------------------------------------------------
+# Redis wire protocol
+# ----------------------------------------------------------------------
+
+def encode_command(*args) -> bytes:
+    """Encode a command as a RESP array of bulk strings"""
+    parts = [f"*{len(args)}\r\n".encode()]
+    for arg in args:
+        data = arg if isinstance(arg, bytes) else str(arg).encode()
+        parts.append(f"${len(data)}\r\n".encode() + data + b"\r\n")
+    return b"".join(parts)
+
+
+async def read_reply(reader: asyncio.StreamReader):
+    """Read one RESP value"""
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("Connection closed by server")
+    prefix, body = line[:1], line[1:-2]
+    if prefix == b"+":
+        return body.decode()
+    if prefix == b"-":
+        raise RuntimeError(body.decode())
+    if prefix == b":":
+        return int(body)
+    if prefix == b"$":
+        length = int(body)
+        if length == -1:
+            return None
+        data = await reader.readexactly(length + 2)
+        return data[:-2]
+    if prefix == b"*":
+        length = int(body)
+        if length == -1:
+            return None
+        return [await read_reply(reader) for _ in range(length)]
+    raise RuntimeError(f"Unexpected RESP prefix: {prefix!r}")
+
+
+class RedisBackplane(Backplane):
+    """PUBLISH/SUBSCRIBE over a Redis-compatible server"""
+
+    def __init__(self, url: str):
+        super().__init__()
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self._publish_conn = None
+        self._publish_lock = asyncio.Lock()
+        self._subscribe_writer: Optional[asyncio.StreamWriter] = None
+        self._listener: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._listener:
+            self._listener.cancel()
+        for writer in (self._subscribe_writer, self._publish_conn[1] if self._publish_conn else None):
+            if writer is not None:
+                writer.close()
+
+    async def _listen(self) -> None:
+        """Hold the subscriber connection open, reconnecting with backoff"""
+        backoff = 0.5
+        while True:
+            try:
+                reader, writer = await asyncio.open_connection(self.host, self.port)
+                self._subscribe_writer = writer
+                if self.channels:
+                    writer.write(encode_command("SUBSCRIBE", *[f"{CHANNEL_PREFIX}{c}" for c in self.channels]))
+                    await writer.drain()
+                backoff = 0.5
+                while True:
+                    reply = await read_reply(reader)
+                    if isinstance(reply, list) and len(reply) == 3 and reply[0] == b"message":
+                        chat_id = int(reply[1].decode()[len(CHANNEL_PREFIX):])
+                        await self._dispatch(chat_id, reply[2].decode())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Redis backplane subscriber disconnected ({e}), retrying in {backoff}s")
+            self._subscribe_writer = None
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 10)
+
+    async def _send_subscription(self, command: str, chat_id: int) -> None:
+        writer = self._subscribe_writer
+        if writer is None:
+            # Picked up by the resubscribe on (re)connect
+            return
+        writer.write(encode_command(command, f"{CHANNEL_PREFIX}{chat_id}"))
+        await writer.drain()
+
+    async def subscribe(self, chat_id: int) -> None:
+        if chat_id not in self.channels:
+            self.channels.add(chat_id)
+            await self._send_subscription("SUBSCRIBE", chat_id)
+
+    async def unsubscribe(self, chat_id: int) -> None:
+        if chat_id in self.channels:
+            self.channels.discard(chat_id)
+            await self._send_subscription("UNSUBSCRIBE", chat_id)
+
+    async def publish(self, chat_id: int, message_text: str) -> None:
+        async with self._publish_lock:
+            for attempt in range(2):
+                try:
+                    if self._publish_conn is None:
+                        self._publish_conn = await asyncio.open_connection(self.host, self.port)
+                    reader, writer = self._publish_conn
+                    writer.write(encode_command("PUBLISH", f"{CHANNEL_PREFIX}{chat_id}", self._wrap(message_text)))
+                    await writer.drain()
+                    await read_reply(reader)
+                    return
+                except Exception as e:
+                    self._publish_conn = None
+                    if attempt == 1:
+                        logger.error(f"Redis backplane publish to chat {chat_id} failed: {e}")
+
+
+# ----------------------------------------------------------------------
+# Shared-table poller
+# ----------------------------------------------------------------------
+
+class TableBackplane(Backplane):
+    """
+    LISTEN/NOTIFY-style fan-out through the chat_events table.
+    Publishing inserts a row; every worker polls for rows newer than the
+    last one it saw in the rooms it is subscribed to.
+
+    Concurrent transactions can commit out of id order (PostgreSQL), so a
+    lower id may appear after a higher one was seen: ids down to where
+    last_id stood late_commit_seconds ago are read again, and rows already
+    delivered are skipped by id.
+    """
+
+    def __init__(self, poll_interval: float, retention_seconds: int, late_commit_seconds: float = 10):
+        super().__init__()
+        self.poll_interval = poll_interval
+        self.retention = timedelta(seconds=retention_seconds)
+        self.late_commit_seconds = late_commit_seconds
+        self.last_id = 0
+        # (monotonic time, last_id) after each poll; the oldest one kept is
+        # where the late-commit re-read starts
+        self._marks: deque = deque()
+        self._delivered: Set[int] = set()
+        self._poller: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        self.last_id = await asyncio.to_thread(self._latest_id)
+        self._marks.append((time.monotonic(), self.last_id))
+        self._poller = asyncio.create_task(self._poll())
+
+    def _reread_floor(self) -> int:
+        """Rows above this id may still turn up below last_id"""
+        cutoff = time.monotonic() - self.late_commit_seconds
+        while len(self._marks) > 1 and self._marks[1][0] <= cutoff:
+            self._marks.popleft()
+        floor = self._marks[0][1] if self._marks else self.last_id
+        self._delivered = {event_id for event_id in self._delivered if event_id > floor}
+        return floor
+
+    async def stop(self) -> None:
+        if self._poller:
+            self._poller.cancel()
+
+    def _latest_id(self) -> int:
+        from sqlalchemy import func
+        from app.core.database import SessionLocal
+        from app.models.chat import ChatEvent
+
+        db = SessionLocal()
+        try:
+            return db.query(func.max(ChatEvent.id)).scalar() or 0
+        finally:
+            db.close()
+
+    def _insert(self, chat_id: int, message_text: str) -> None:
+        from app.core.database import SessionLocal
+        from app.models.chat import ChatEvent
+
+        db = SessionLocal()
+        try:
+            db.add(ChatEvent(chat_id=chat_id, origin=self.origin, payload=message_text))
+            db.commit()
+        finally:
+            db.close()
+
+    def _fetch(self, channels: Set[int], prune: bool, floor: int):
+        from app.core.database import SessionLocal
+        from app.models.chat import ChatEvent
+
+        db = SessionLocal()
+        try:
+            if prune:
+                db.query(ChatEvent).filter(
+                    ChatEvent.created_at < datetime.utcnow() - self.retention
+                ).delete(synchronize_session=False)
+                db.commit()
+            if not channels:
+                return db.query(ChatEvent.id).order_by(ChatEvent.id.desc()).limit(1).all()
+            query = db.query(ChatEvent.id, ChatEvent.chat_id, ChatEvent.payload).filter(
+                ChatEvent.origin != self.origin,
+                ChatEvent.chat_id.in_(channels)
+            )
+            # Late commits below last_id (few; no limit), then new rows
+            late = []
+            if floor < self.last_id:
+                late = query.filter(
+                    ChatEvent.id > floor,
+                    ChatEvent.id <= self.last_id
+                ).order_by(ChatEvent.id).all()
+            new = query.filter(ChatEvent.id > self.last_id).order_by(ChatEvent.id).limit(1000).all()
+            return late + new
+        finally:
+            db.close()
+
+    async def _poll(self) -> None:
+        polls = 0
+        prune_every = max(1, int(60 / self.poll_interval))
+        while True:
+            try:
+                floor = self._reread_floor()
+                rows = await asyncio.to_thread(self._fetch, set(self.channels), polls % prune_every == 0, floor)
+                for row in rows:
+                    self.last_id = max(self.last_id, row[0])
+                    if len(row) != 3 or row[0] in self._delivered:
+                        continue
+                    self._delivered.add(row[0])
+                    if self.handler is not None and row[1] in self.channels:
+                        await self.handler(row[1], row[2])
+                self._marks.append((time.monotonic(), self.last_id))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Chat backplane poll failed: {e}")
+            polls += 1
+            await asyncio.sleep(self.poll_interval)
+
+    async def publish(self, chat_id: int, message_text: str) -> None:
+        try:
+            await asyncio.to_thread(self._insert, chat_id, message_text)
+        except Exception as e:
+            logger.error(f"Chat backplane publish to chat {chat_id} failed: {e}")
+
+
+def create_backplane(kind: Optional[str] = None) -> Backplane:
+    """Build the backplane selected by CHAT_BACKPLANE"""
+    kind = (kind or settings.chat_backplane).lower()
+    if kind == "redis":
+        return RedisBackplane(settings.chat_backplane_url)
+    if kind == "table":
+        return TableBackplane(
+            settings.chat_backplane_poll_interval,
+            settings.chat_backplane_retention_seconds,
+            settings.chat_backplane_late_commit_seconds
+        )
+    if kind != "memory":
+        logger.warning(f"Unknown chat backplane '{kind}', using in-process delivery")
+    return MemoryBackplane()
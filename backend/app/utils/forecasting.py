@@ -1,36 +1,54 @@
 """
 Forecasting utility for time series prediction
-Implements simple moving average and exponential smoothing
+
+Series are held as NumPy arrays:
+- moving_average uses a cumulative sum, O(n) for any window
+- holt (level + trend) and holt_winters (additive, 7-day season) are fitted
+  by a grid search over the smoothing factors. The recurrences step through
+  the days once, updating every (series, parameter set) pair in one vector
+  operation, so forecast_batch fits a whole group of series in a single pass
+- prediction intervals come from the one-step residual variance scaled by
+  the model's h-step variance factor
 """
-from typing import List, Dict, Tuple, Optional
-from datetime import date, timedelta
-import statistics
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple, Union
+from datetime import date, datetime, timedelta
+from statistics import NormalDist
+
+import numpy as np
+
+SEASON_LENGTH = 7
+
+# Smoothing factors tried when fitting, in error-correction form:
+# level += alpha * e, trend += beta * e, season += gamma * e
+ALPHA_GRID = (0.05, 0.1, 0.2, 0.3, 0.5, 0.7, 0.9)
+BETA_GRID = (0.0, 0.01, 0.05, 0.1, 0.2)
+GAMMA_GRID = (0.0, 0.05, 0.1, 0.2, 0.3)
+
+METHODS = ("auto", "holt_winters", "holt", "exponential", "moving_average")
 
 
 def moving_average(values: List[float], window: int = 7) -> List[float]:
     """
     Calculate moving average with specified window
-    
+
     Args:
         values: Time series values
         window: Window size for averaging
-    
+
     Returns:
-        List of moving averages
+        List of moving averages (the first window - 1 points average
+        what is available so far)
     """
     if len(values) < window:
         return values
-    
-    ma = []
-    for i in range(len(values)):
-        if i < window - 1:
-            # Not enough data yet, use what we have
-            ma.append(statistics.mean(values[:i+1]))
-        else:
-            # Use full window
-            ma.append(statistics.mean(values[i-window+1:i+1]))
-    
-    return ma
+
+    series = np.asarray(values, dtype=float)
+    totals = np.cumsum(series)
+    ma = np.empty_like(series)
+    ma[:window] = totals[:window] / np.arange(1, window + 1)
+    ma[window:] = (totals[window:] - totals[:-window]) / window
+
+    return ma.tolist()
 
 
 def exponential_smoothing(
@@ -39,82 +57,329 @@ def exponential_smoothing(
 ) -> List[float]:
     """
     Apply exponential smoothing to time series
-    
+
     Args:
         values: Time series values
         alpha: Smoothing factor (0 < alpha < 1)
             Lower alpha = more smoothing
             Higher alpha = more responsive to recent values
-    
+
     Returns:
         Smoothed values
     """
     if not values:
         return []
-    
+
     smoothed = [values[0]]  # First value stays the same
-    
+
     for i in range(1, len(values)):
         # S_t = alpha * Y_t + (1 - alpha) * S_{t-1}
         next_val = alpha * values[i] + (1 - alpha) * smoothed[-1]
         smoothed.append(next_val)
-    
+
     return smoothed
 
 
+def daily_series(
+    dates: Sequence[date],
+    values: Sequence[float],
+    fill: Optional[float] = None
+) -> Tuple[List[date], np.ndarray]:
+    """
+    Place observations on a gap-free daily calendar
+
+    The latest observation on a day wins, whatever order the input is in
+    (plain dates count as midnight). Missing days take `fill`, or the
+    previous day's value when fill is None.
+
+    Returns:
+        (days, values) from the first to the last observed day
+    """
+    if not dates:
+        return [], np.zeros(0)
+
+    days = [d.date() if isinstance(d, datetime) else d for d in dates]
+    # Sorted by full timestamp, so the assignment below leaves each day's
+    # latest observation in place
+    stamps = [d if isinstance(d, datetime) else datetime.combine(d, datetime.min.time()) for d in dates]
+    order = sorted(range(len(days)), key=stamps.__getitem__)
+    start = days[order[0]]
+    offsets = np.array([(days[i] - start).days for i in order])
+
+    series = np.full(int(offsets[-1]) + 1, np.nan)
+    series[offsets] = np.asarray(values, dtype=float)[order]
+
+    missing = np.isnan(series)
+    if missing.any():
+        if fill is None:
+            last_seen = np.maximum.accumulate(np.where(missing, 0, np.arange(len(series))))
+            series = series[last_seen]
+        else:
+            series[missing] = fill
+
+    return [start + timedelta(days=i) for i in range(len(series))], series
+
+
+def _parameter_grid(seasonal: bool) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(alpha, beta, gamma) arrays; beta <= alpha and gamma <= 1 - alpha"""
+    combos = [
+        (alpha, beta, gamma)
+        for alpha in ALPHA_GRID
+        for beta in BETA_GRID if beta <= alpha
+        for gamma in (GAMMA_GRID if seasonal else (0.0,)) if gamma <= 1 - alpha
+    ]
+    alpha, beta, gamma = np.array(combos).T
+    return alpha, beta, gamma
+
+
+def _fit_smoothing(series: np.ndarray, season: int) -> Dict:
+    """
+    Fit Holt (season=0) or additive Holt-Winters to each row of `series`
+
+    Every row is run with every parameter set of the grid at once; the set
+    with the smallest one-step squared error wins per row.
+    """
+    count, length = series.shape
+    alpha, beta, gamma = _parameter_grid(season > 0)
+    grid = alpha.size
+
+    if season:
+        # Level and trend at the end of the first season, from the means of
+        # the first two; seasonal offsets from the first season's line
+        first = series[:, :season].mean(axis=1)
+        trend = (series[:, season:2 * season].mean(axis=1) - first) / season
+        centred = np.arange(season) - (season - 1) / 2
+        line = first[:, None] + trend[:, None] * centred
+        level = line[:, -1]
+        seasonal = np.repeat((series[:, :season] - line)[:, None, :], grid, axis=1)
+        start = season
+    else:
+        level = series[:, 1]
+        trend = series[:, 1] - series[:, 0]
+        seasonal = None
+        start = 2
+
+    level = np.repeat(level[:, None], grid, axis=1)
+    trend = np.repeat(trend[:, None], grid, axis=1)
+    sse = np.zeros((count, grid))
+
+    for t in range(start, length):
+        observed = series[:, t, None]
+        if season:
+            phase = t % season
+            error = observed - (level + trend + seasonal[:, :, phase])
+            seasonal[:, :, phase] += gamma * error
+        else:
+            error = observed - (level + trend)
+        level = level + trend + alpha * error
+        trend = trend + beta * error
+        sse += error * error
+
+    rows = np.arange(count)
+    best = sse.argmin(axis=1)
+    residuals = length - start
+    smoothing_params = 3 if season else 2
+    best_sse = sse[rows, best]
+
+    return {
+        "method": "holt_winters" if season else "holt",
+        "alpha": alpha[best],
+        "beta": beta[best],
+        "gamma": gamma[best],
+        "level": level[rows, best],
+        "trend": trend[rows, best],
+        "seasonal": seasonal[rows, best] if season else None,
+        "sigma2": best_sse / max(residuals - smoothing_params, 1),
+        # Level, trend and seasonal starting values count as parameters too
+        "aic": residuals * np.log(np.maximum(best_sse / residuals, 1e-12))
+               + 2 * (smoothing_params + 2 + season),
+    }
+
+
+def _project_smoothing(fit: Dict, length: int, horizon: int, season: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Point forecasts and their variances for steps 1..horizon"""
+    steps = np.arange(1, horizon + 1)
+    alpha, beta, gamma = (fit[name][:, None] for name in ("alpha", "beta", "gamma"))
+
+    point = fit["level"][:, None] + steps * fit["trend"][:, None]
+    factor = 1 + (steps - 1) * (alpha ** 2 + alpha * beta * steps + beta ** 2 * steps * (2 * steps - 1) / 6)
+    if season:
+        point = point + fit["seasonal"][:, (length - 1 + steps) % season]
+        cycles = (steps - 1) // season
+        factor = factor + gamma * cycles * (2 * alpha + gamma + beta * season * (cycles + 1))
+
+    return point, fit["sigma2"][:, None] * factor
+
+
+def _project_naive(series: np.ndarray, horizon: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Repeat the last value; variance grows like a random walk"""
+    steps = np.arange(1, horizon + 1)
+    if series.shape[1] > 1:
+        sigma2 = (np.diff(series, axis=1) ** 2).mean(axis=1)
+    else:
+        sigma2 = np.zeros(series.shape[0])
+    return np.repeat(series[:, -1:], horizon, axis=1), sigma2[:, None] * steps
+
+
+def _project_moving_average(series: np.ndarray, horizon: int, window: int = 7) -> Tuple[np.ndarray, np.ndarray]:
+    """Repeat the mean of the last `window` days; variance from the rolling one-step errors"""
+    length = series.shape[1]
+    window = min(window, length)
+    totals = np.cumsum(series, axis=1)
+    point = totals[:, -1] - (totals[:, -window - 1] if length > window else 0)
+    point = point / window
+
+    if length > window:
+        # Mean of days t-window..t-1 against day t, for t >= window
+        previous = totals[:, window - 1:-1] - np.hstack([np.zeros((series.shape[0], 1)), totals[:, :-window - 1]])
+        errors = series[:, window:] - previous / window
+        sigma2 = (errors ** 2).mean(axis=1)
+    else:
+        sigma2 = np.zeros(series.shape[0])
+
+    return np.repeat(point[:, None], horizon, axis=1), np.repeat(sigma2[:, None], horizon, axis=1)
+
+
+def _forecast_group(series: np.ndarray, horizon: int, method: str, season: int) -> Tuple[np.ndarray, np.ndarray, List[Dict]]:
+    """Forecast equal-length series; returns points, variances and per-row model info"""
+    count, length = series.shape
+
+    if method == "moving_average":
+        point, variance = _project_moving_average(series, horizon)
+        return point, variance, [{"method": "moving_average"}] * count
+
+    candidates = []
+    if method in ("auto", "holt_winters") and length >= 2 * season:
+        candidates.append(season)
+    if length >= 3 and (method == "auto" or not candidates):
+        candidates.append(0)
+    if not candidates:
+        point, variance = _project_naive(series, horizon)
+        return point, variance, [{"method": "naive"}] * count
+
+    fits = [(_fit_smoothing(series, fit_season), fit_season) for fit_season in candidates]
+    projections = [_project_smoothing(fit, length, horizon, fit_season) for fit, fit_season in fits]
+    # Lower AIC wins when both models were fitted
+    chosen = np.argmin(np.vstack([fit["aic"] for fit, _ in fits]), axis=0)
+    rows = np.arange(count)
+    point = np.stack([p for p, _ in projections])[chosen, rows]
+    variance = np.stack([v for _, v in projections])[chosen, rows]
+
+    models = []
+    for row, index in enumerate(chosen):
+        fit = fits[index][0]
+        model = {
+            "method": fit["method"],
+            "alpha": float(fit["alpha"][row]),
+            "beta": float(fit["beta"][row]),
+        }
+        if fit["method"] == "holt_winters":
+            model["gamma"] = float(fit["gamma"][row])
+        models.append(model)
+
+    return point, variance, models
+
+
+def forecast_batch(
+    series: Dict[Hashable, Tuple[Sequence[date], Sequence[float]]],
+    horizon: int = 28,
+    method: str = "auto",
+    confidence: float = 0.95,
+    non_negative: Union[bool, Dict[Hashable, bool]] = True,
+    season_length: int = SEASON_LENGTH
+) -> Dict[Hashable, Dict]:
+    """
+    Forecast many daily series at once (e.g. one per department or KPI)
+
+    Each series is placed on a daily calendar (see daily_series), then
+    series of equal length are stacked and fitted together.
+
+    Args:
+        series: key -> (dates, values)
+        horizon: Days to forecast after each series' last day
+        method: 'auto' (Holt-Winters or Holt, whichever has the lower AIC;
+            Holt-Winters needs two full seasons), 'holt_winters', 'holt'
+            ('exponential' is an alias), or 'moving_average'. Series too
+            short for the chosen model fall back to Holt, then to repeating
+            the last value ('naive').
+        confidence: Prediction interval level
+        non_negative: Clamp forecasts and lower bounds at 0 (counts); a
+            dict sets it per key (keys left out are clamped)
+        season_length: Days per season
+
+    Returns:
+        key -> dict with future "dates", "values", "lower", "upper",
+        "method" (model used), "params" (smoothing factors) and
+        "residual_std"
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown forecasting method '{method}'")
+
+    z_score = NormalDist().inv_cdf(0.5 + confidence / 2)
+    results: Dict[Hashable, Dict] = {}
+
+    groups: Dict[int, List[Tuple[Hashable, date, np.ndarray]]] = {}
+    for key, (dates, values) in series.items():
+        days, daily = daily_series(dates, values)
+        if not days:
+            results[key] = {
+                "dates": [], "values": [], "lower": [], "upper": [],
+                "method": "none", "params": {}, "residual_std": 0.0
+            }
+            continue
+        groups.setdefault(len(daily), []).append((key, days[-1], daily))
+
+    for members in groups.values():
+        stacked = np.vstack([daily for _, _, daily in members])
+        point, variance, models = _forecast_group(stacked, horizon, method, season_length)
+        margin = z_score * np.sqrt(np.maximum(variance, 0))
+        lower, upper = point - margin, point + margin
+        if isinstance(non_negative, dict):
+            clamp = np.array([non_negative.get(key, True) for key, _, _ in members])[:, None]
+        else:
+            clamp = non_negative
+        if np.any(clamp):
+            point = np.where(clamp, np.maximum(point, 0), point)
+            lower = np.where(clamp, np.maximum(lower, 0), lower)
+            upper = np.where(clamp, np.maximum(upper, 0), upper)
+
+        for row, (key, last_day, _) in enumerate(members):
+            model = dict(models[row])
+            results[key] = {
+                "dates": [last_day + timedelta(days=i) for i in range(1, horizon + 1)],
+                "values": point[row].tolist(),
+                "lower": lower[row].tolist(),
+                "upper": upper[row].tolist(),
+                "method": model.pop("method"),
+                "params": model,
+                "residual_std": float(np.sqrt(max(variance[row, 0], 0))) if horizon else 0.0
+            }
+
+    return results
+
+
 def forecast_next_n_values(
     values: List[float],
     n: int = 4,
-    method: str = "exponential",
-    alpha: float = 0.3
+    method: str = "auto"
 ) -> List[float]:
     """
-    Forecast next N values using exponential smoothing or moving average
-    
+    Forecast next N values of a daily series
+
     Args:
-        values: Historical time series values
+        values: Historical time series values, one per day
         n: Number of future values to forecast
-        method: 'exponential' or 'moving_average'
-        alpha: Smoothing factor for exponential method
-    
+        method: See forecast_batch
+
     Returns:
         List of N forecasted values
     """
     if not values:
         return [0.0] * n
-    
-    if len(values) < 3:
-        # Not enough data, return last value
-        return [values[-1]] * n
-    
-    if method == "exponential":
-        # Apply exponential smoothing to existing data
-        smoothed = exponential_smoothing(values, alpha)
-        last_smoothed = smoothed[-1]
-        
-        # Calculate trend from last few values
-        if len(smoothed) >= 3:
-            recent_trend = (smoothed[-1] - smoothed[-3]) / 2
-        else:
-            recent_trend = 0
-        
-        # Forecast next N values with trend
-        forecasts = []
-        for i in range(1, n + 1):
-            forecast_val = last_smoothed + (recent_trend * i)
-            # Ensure non-negative for counts
-            forecast_val = max(0, forecast_val)
-            forecasts.append(forecast_val)
-        
-        return forecasts
-    
-    else:  # moving_average
-        # Use last 7 values for average
-        window = min(7, len(values))
-        avg = statistics.mean(values[-window:])
-        
-        # Simple projection: repeat average
-        return [avg] * n
+
+    start = date.today()
+    dates = [start + timedelta(days=i) for i in range(len(values))]
+    return forecast_batch({0: (dates, values)}, n, method)[0]["values"]
 
 
 def calculate_confidence_interval(
@@ -123,119 +388,126 @@ def calculate_confidence_interval(
 ) -> Tuple[float, float]:
     """
     Calculate confidence interval for forecast
-    
+
     Args:
         values: Historical values
         confidence: Confidence level (e.g., 0.95 for 95%)
-    
+
     Returns:
-        Tuple of (lower_bound, upper_bound) as percentage of mean
+        Tuple of (lower_bound, upper_bound) around the mean
     """
     if not values or len(values) < 2:
         return (0.0, 0.0)
-    
-    mean = statistics.mean(values)
-    
-    try:
-        stdev = statistics.stdev(values)
-        # Simple approximation: ~2 std devs for 95% CI
-        z_score = 1.96 if confidence >= 0.95 else 1.645
-        margin = z_score * stdev
-        
-        lower = max(0, mean - margin)
-        upper = mean + margin
-        
-        return (lower, upper)
-    except statistics.StatisticsError:
-        # Not enough variance
-        return (mean, mean)
+
+    series = np.asarray(values, dtype=float)
+    mean = float(series.mean())
+    margin = NormalDist().inv_cdf(0.5 + confidence / 2) * float(series.std(ddof=1))
+
+    return (max(0.0, mean - margin), mean + margin)
+
+
+def forecast_many_with_confidence(
+    series: Dict[Hashable, Tuple[List[date], List[float]]],
+    forecast_weeks: int = 4,
+    method: str = "auto",
+    confidence: float = 0.95,
+    non_negative: bool = True
+) -> Dict[Hashable, Dict]:
+    """
+    Weekly forecasts with prediction intervals for several daily series
+
+    Each week is the mean of its seven daily forecasts. Its bounds are the
+    mean of the daily margins, which is never narrower than the interval of
+    the weekly mean itself.
+
+    Returns:
+        key -> dict as returned by forecast_with_confidence
+    """
+    valid = {
+        key: (dates, values) for key, (dates, values) in series.items()
+        if dates and values and len(dates) == len(values)
+    }
+    daily = forecast_batch(valid, forecast_weeks * 7, method, confidence, non_negative=False)
+
+    results = {}
+    for key, (dates, values) in series.items():
+        if key not in valid:
+            results[key] = {
+                "historical": [],
+                "forecast": [],
+                "confidence_lower": [],
+                "confidence_upper": []
+            }
+            continue
+
+        result = daily[key]
+        weekly_shape = (forecast_weeks, 7)
+        point = np.asarray(result["values"]).reshape(weekly_shape)
+        margin = (np.asarray(result["upper"]) - np.asarray(result["values"])).reshape(weekly_shape)
+        if non_negative:
+            point = np.maximum(point, 0)
+        weekly = point.mean(axis=1)
+        weekly_margin = margin.mean(axis=1)
+        lower = weekly - weekly_margin
+        if non_negative:
+            lower = np.maximum(lower, 0)
+
+        last_date = dates[-1]
+        forecast_dates = [last_date + timedelta(weeks=i + 1) for i in range(forecast_weeks)]
+
+        results[key] = {
+            "historical": [
+                {"date": str(d), "value": v}
+                for d, v in zip(dates, values)
+            ],
+            "forecast": [
+                {
+                    "date": str(d),
+                    "value": float(v),
+                    "lower": float(l),
+                    "upper": float(u)
+                }
+                for d, v, l, u in zip(forecast_dates, weekly, lower, weekly + weekly_margin)
+            ],
+            "method": result["method"],
+            "params": result["params"],
+            "confidence_level": confidence
+        }
+
+    return results
 
 
 def forecast_with_confidence(
     dates: List[date],
     values: List[float],
     forecast_weeks: int = 4,
-    method: str = "exponential"
+    method: str = "auto",
+    confidence: float = 0.95,
+    non_negative: bool = True
 ) -> Dict:
     """
     Generate forecast with confidence intervals
-    
+
     Args:
         dates: List of dates for historical data
         values: List of values corresponding to dates
         forecast_weeks: Number of weeks to forecast
-        method: Forecasting method
-    
+        method: Forecasting method (see forecast_batch)
+        confidence: Prediction interval level
+        non_negative: Clamp forecasts and bounds at 0
+
     Returns:
         Dict with historical data, forecast, and confidence intervals
     """
-    if not dates or not values or len(dates) != len(values):
-        return {
-            "historical": [],
-            "forecast": [],
-            "confidence_lower": [],
-            "confidence_upper": []
-        }
-    
-    # Calculate confidence interval from historical data
-    lower_pct, upper_pct = calculate_confidence_interval(values)
-    
-    # Generate forecast
-    forecast_vals = forecast_next_n_values(values, forecast_weeks * 7, method)
-    
-    # Generate future dates (weekly intervals for simplicity)
-    last_date = dates[-1]
-    forecast_dates = [last_date + timedelta(weeks=i+1) for i in range(forecast_weeks)]
-    
-    # Aggregate forecast to weekly (average every 7 days)
-    weekly_forecast = []
-    for i in range(forecast_weeks):
-        week_vals = forecast_vals[i*7:(i+1)*7]
-        weekly_forecast.append(statistics.mean(week_vals) if week_vals else 0)
-    
-    # Calculate CI for each forecast point
-    ci_lower = []
-    ci_upper = []
-    
-    for forecast_val in weekly_forecast:
-        if forecast_val > 0:
-            # Use historical variance to estimate CI
-            variance_pct = (upper_pct - lower_pct) / (2 * statistics.mean(values)) if statistics.mean(values) > 0 else 0.2
-            margin = forecast_val * variance_pct
-            ci_lower.append(max(0, forecast_val - margin))
-            ci_upper.append(forecast_val + margin)
-        else:
-            ci_lower.append(0)
-            ci_upper.append(0)
-    
-    # Prepare output
-    historical = [
-        {"date": str(d), "value": v}
-        for d, v in zip(dates, values)
-    ]
-    
-    forecast = [
-        {
-            "date": str(d),
-            "value": v,
-            "lower": l,
-            "upper": u
-        }
-        for d, v, l, u in zip(forecast_dates, weekly_forecast, ci_lower, ci_upper)
-    ]
-    
-    return {
-        "historical": historical,
-        "forecast": forecast,
-        "method": method,
-        "confidence_level": 0.95
-    }
+    return forecast_many_with_confidence(
+        {0: (dates, values)}, forecast_weeks, method, confidence, non_negative
+    )[0]
 
 
 def simple_trend_analysis(values: List[float]) -> Dict[str, float]:
     """
     Calculate simple trend metrics
-    
+
     Returns:
         Dict with trend direction, slope, and change percentage
     """
@@ -245,17 +517,18 @@ def simple_trend_analysis(values: List[float]) -> Dict[str, float]:
             "slope": 0.0,
             "change_pct": 0.0
         }
-    
+
     # Compare first half to second half
-    mid = len(values) // 2
-    first_half_avg = statistics.mean(values[:mid])
-    second_half_avg = statistics.mean(values[mid:])
-    
+    series = np.asarray(values, dtype=float)
+    mid = len(series) // 2
+    first_half_avg = float(series[:mid].mean())
+    second_half_avg = float(series[mid:].mean())
+
     if first_half_avg == 0:
         change_pct = 0.0
     else:
         change_pct = ((second_half_avg - first_half_avg) / first_half_avg) * 100
-    
+
     # Determine direction
     if abs(change_pct) < 5:
         direction = "stable"
@@ -263,13 +536,12 @@ def simple_trend_analysis(values: List[float]) -> Dict[str, float]:
         direction = "increasing"
     else:
         direction = "decreasing"
-    
+
     # Calculate simple slope
     slope = (second_half_avg - first_half_avg) / mid if mid > 0 else 0
-    
+
     return {
         "direction": direction,
         "slope": round(slope, 2),
         "change_pct": round(change_pct, 2)
     }
-
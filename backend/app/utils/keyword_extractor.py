@@ -3,7 +3,7 @@ Keyword extraction utility for feedback analysis
 Extracts meaningful terms with stopword filtering and n-gram support
 """
 import re
-from typing import List, Dict, Tuple
+from typing import List, Dict, Hashable, Iterable, Optional, Tuple
 from collections import Counter
 from datetime import date
 
@@ -37,47 +37,41 @@ def clean_text(text: str) -> str:
     return text.strip()
 
 
-def extract_unigrams(text: str, min_length: int = 3) -> List[str]:
-    """Extract single words (unigrams) excluding stopwords"""
-    words = clean_text(text).split()
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text: str, min_length: int = 3) -> List[str]:
+    """
+    The token stream every n-gram is built from: cleaned once, stopwords
+    and words shorter than min_length dropped
+    """
+    # Same tokens as clean_text(text).split(), in one regex pass
     return [
-        word for word in words
+        word for word in _TOKEN_RE.findall(text.lower())
         if len(word) >= min_length and word not in STOPWORDS
     ]
 
 
+def ngrams_from_tokens(tokens: List[str], n: int) -> List[str]:
+    """Space-joined n-grams over consecutive tokens"""
+    if n == 1:
+        return list(tokens)
+    return [" ".join(tokens[i:i + n]) for i in range(len(tokens) - n + 1)]
+
+
+def extract_unigrams(text: str, min_length: int = 3) -> List[str]:
+    """Extract single words (unigrams) excluding stopwords"""
+    return tokenize(text, min_length)
+
+
 def extract_bigrams(text: str) -> List[str]:
     """Extract two-word phrases (bigrams)"""
-    words = clean_text(text).split()
-    # Filter out stopwords first
-    filtered_words = [w for w in words if w not in STOPWORDS and len(w) >= 3]
-    
-    if len(filtered_words) < 2:
-        return []
-    
-    bigrams = []
-    for i in range(len(filtered_words) - 1):
-        bigram = f"{filtered_words[i]} {filtered_words[i+1]}"
-        bigrams.append(bigram)
-    
-    return bigrams
+    return ngrams_from_tokens(tokenize(text), 2)
 
 
 def extract_trigrams(text: str) -> List[str]:
     """Extract three-word phrases (trigrams)"""
-    words = clean_text(text).split()
-    # Filter out stopwords first
-    filtered_words = [w for w in words if w not in STOPWORDS and len(w) >= 3]
-    
-    if len(filtered_words) < 3:
-        return []
-    
-    trigrams = []
-    for i in range(len(filtered_words) - 2):
-        trigram = f"{filtered_words[i]} {filtered_words[i+1]} {filtered_words[i+2]}"
-        trigrams.append(trigram)
-    
-    return trigrams
+    return ngrams_from_tokens(tokenize(text), 3)
 
 
 def extract_keywords(
@@ -98,22 +92,100 @@ def extract_keywords(
     Returns:
         List of extracted keywords
     """
-    keywords = []
-    
-    # Always extract unigrams
-    keywords.extend(extract_unigrams(text, min_word_length))
+    tokens = tokenize(text, min_word_length)
+    # Bigrams/trigrams always use the default minimum word length
+    phrase_tokens = tokens if min_word_length == 3 else tokenize(text)
     
-    # Optionally add bigrams
+    keywords = list(tokens)
     if include_bigrams:
-        keywords.extend(extract_bigrams(text))
-    
-    # Optionally add trigrams
+        keywords.extend(ngrams_from_tokens(phrase_tokens, 2))
     if include_trigrams:
-        keywords.extend(extract_trigrams(text))
+        keywords.extend(ngrams_from_tokens(phrase_tokens, 3))
     
     return keywords
 
 
+class NgramVocabulary:
+    """
+    Interns n-grams to integer ids so batches are counted as ints and each
+    distinct string is kept once, however many documents repeat it
+    """
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self._terms: List[str] = []
+
+    def intern(self, terms: Iterable[str]) -> List[int]:
+        ids = self.ids
+        # A new term gets the next id: len(ids) is read before the insert
+        return [ids.setdefault(term, len(ids)) for term in terms]
+
+    @property
+    def terms(self) -> List[str]:
+        """Id -> term"""
+        if len(self._terms) != len(self.ids):
+            self._terms = list(self.ids)
+        return self._terms
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+def extract_keyword_ids(
+    texts: Iterable[str],
+    vocabulary: NgramVocabulary,
+    include_bigrams: bool = True,
+    include_trigrams: bool = False,
+    limit: Optional[int] = None
+) -> List[List[int]]:
+    """
+    Batch form of extract_keywords: every text is tokenised once and its
+    n-grams (same order as extract_keywords) returned as vocabulary ids.
+    With a limit, only the first `limit` n-grams are built.
+    """
+    sizes = [1] + ([2] if include_bigrams else []) + ([3] if include_trigrams else [])
+    result = []
+    for text in texts:
+        if not text:
+            result.append([])
+            continue
+        tokens = tokenize(text)
+        keywords = []
+        for n in sizes:
+            if limit is not None and len(keywords) >= limit:
+                break
+            keywords.extend(ngrams_from_tokens(tokens, n))
+        if limit is not None:
+            keywords = keywords[:limit]
+        result.append(vocabulary.intern(keywords))
+    return result
+
+
+def count_keywords_by_group(
+    texts: List[str],
+    groups: List[Hashable],
+    top_n: int = 20,
+    include_bigrams: bool = True,
+    include_trigrams: bool = False
+) -> Dict[Hashable, List[Tuple[str, int]]]:
+    """
+    Top keywords per group (sentiment, department, ...) with one
+    tokenisation per text; groups[i] is the group of texts[i]
+    """
+    vocabulary = NgramVocabulary()
+    doc_ids = extract_keyword_ids(texts, vocabulary, include_bigrams, include_trigrams)
+    counters: Dict[Hashable, Counter] = {}
+    for group, ids in zip(groups, doc_ids):
+        counter = counters.get(group)
+        if counter is None:
+            counter = counters[group] = Counter()
+        counter.update(ids)
+    return {
+        group: [(vocabulary.terms[term_id], count) for term_id, count in counter.most_common(top_n)]
+        for group, counter in counters.items()
+    }
+
+
 def get_top_keywords(
     texts: List[str],
     top_n: int = 20,
@@ -132,18 +204,10 @@ def get_top_keywords(
     Returns:
         List of (keyword, frequency) tuples sorted by frequency
     """
-    all_keywords = []
-    
-    for text in texts:
-        if text:
-            keywords = extract_keywords(text, include_bigrams, include_trigrams)
-            all_keywords.extend(keywords)
-    
-    # Count frequencies
-    keyword_counts = Counter(all_keywords)
-    
-    # Return top N
-    return keyword_counts.most_common(top_n)
+    texts = [text for text in texts if text]
+    return count_keywords_by_group(
+        texts, [None] * len(texts), top_n, include_bigrams, include_trigrams
+    ).get(None, [])
 
 
 def categorize_keywords_by_sentiment(
@@ -160,25 +224,17 @@ def categorize_keywords_by_sentiment(
     Returns:
         Dict with sentiment keys ('positive', 'negative', 'neutral') and keyword lists
     """
-    positive_texts = []
-    negative_texts = []
-    neutral_texts = []
-    
-    for item in feedback_items:
-        content = item.get('content', '')
-        sentiment = item.get('sentiment', 'neutral')
-        
-        if sentiment == 'positive':
-            positive_texts.append(content)
-        elif sentiment == 'negative':
-            negative_texts.append(content)
-        else:
-            neutral_texts.append(content)
+    texts = [item.get('content', '') for item in feedback_items]
+    sentiments = [
+        item.get('sentiment') if item.get('sentiment') in ('positive', 'negative') else 'neutral'
+        for item in feedback_items
+    ]
+    counts = count_keywords_by_group(texts, sentiments, top_n)
     
     return {
-        'positive': get_top_keywords(positive_texts, top_n),
-        'negative': get_top_keywords(negative_texts, top_n),
-        'neutral': get_top_keywords(neutral_texts, top_n)
+        'positive': counts.get('positive', []),
+        'negative': counts.get('negative', []),
+        'neutral': counts.get('neutral', [])
     }
 
 
@@ -196,19 +252,6 @@ def categorize_keywords_by_department(
     Returns:
         Dict with department names as keys and keyword lists as values
     """
-    dept_texts = {}
-    
-    for item in feedback_items:
-        content = item.get('content', '')
-        department = item.get('department', 'Unknown')
-        
-        if department not in dept_texts:
-            dept_texts[department] = []
-        dept_texts[department].append(content)
-    
-    result = {}
-    for dept, texts in dept_texts.items():
-        result[dept] = get_top_keywords(texts, top_n)
-    
-    return result
-
+    texts = [item.get('content', '') for item in feedback_items]
+    departments = [item.get('department', 'Unknown') for item in feedback_items]
+    return count_keywords_by_group(texts, departments, top_n)
@@ -2,8 +2,18 @@
 Content moderation utilities
 Comprehensive profanity and inappropriate content filter
 """
-from typing import Tuple, Optional
+from typing import Dict, Iterable, List, NamedTuple, Tuple, Optional
+import json
+import logging
+import os
 import re
+import tempfile
+import threading
+import time
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
 
 # Comprehensive profanity wordlist
 PROFANITY_LIST = [
@@ -64,68 +74,236 @@ SEVERE_VIOLATIONS = [
     'suicide', 'rape', 'molest', 'torture',
 ]
 
-def check_content_moderation(content: str) -> Tuple[bool, Optional[str]]:
+SEVERITY_SEVERE = "severe"
+SEVERITY_PROFANITY = "profanity"
+
+
+class ModerationHit(NamedTuple):
+    word: str
+    start: int
+    end: int
+    severity: str
+
+
+class ModerationResult(NamedTuple):
+    is_flagged: bool
+    reason: Optional[str]
+    hits: List[ModerationHit]
+
+
+def _trie_pattern(words: Iterable[str]) -> str:
     """
-    Check content for moderation violations.
-    Uses word boundaries to avoid false positives.
-    
-    Returns:
-        (is_flagged, reason)
-        - is_flagged: True if content should be blocked
-        - reason: Description of why it was blocked
+    One regex alternation for all words, factored by common prefix so each
+    position is rejected after its first character instead of once per word
     """
-    if not content:
-        return False, None
-    
-    content_lower = content.lower()
-    
-    # Check for severe violations first (highest priority)
-    for word in SEVERE_VIOLATIONS:
-        # Use word boundaries for single words, substring match for phrases
-        if ' ' in word:
-            # Phrase - use substring
-            if word in content_lower:
-                return True, f"Severe violation: contains inappropriate content"
-        else:
-            # Single word - use word boundary
-            pattern = r'\b' + re.escape(word) + r'\b'
-            if re.search(pattern, content_lower):
-                return True, f"Severe violation: contains inappropriate content"
-    
-    # Check for profanity
-    found_profanity = []
-    for word in PROFANITY_LIST:
-        # Use word boundaries to avoid false positives
-        # e.g., "assassin" won't match "ass", "classic" won't match "ass"
-        if ' ' in word:
-            # Phrase - use substring
-            if word in content_lower:
-                found_profanity.append(word)
-        else:
-            # Single word - use word boundary
-            pattern = r'\b' + re.escape(word) + r'\b'
-            if re.search(pattern, content_lower):
-                found_profanity.append(word)
-    
+    trie: dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node: dict) -> str:
+        end = '' in node
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if end:
+            body = '(?:' + body + ')?'
+        return body
+
+    return build(trie)
+
+
+class ModerationMatcher:
+    """
+    Wordlists compiled into two regexes, each scanned once per text:
+    single words must sit on word boundaries (\\b on both ends, as
+    before), phrases match anywhere. Matches are found through a lookahead
+    so that overlapping entries ("son of a bitch" and "bitch") are all
+    reported. Immutable; reloading builds a new matcher.
+    """
+
+    def __init__(self, profanity: Iterable[str], severe: Iterable[str]):
+        self.severity: Dict[str, str] = {}
+        for word in profanity:
+            self.severity[word.lower()] = SEVERITY_PROFANITY
+        for word in severe:
+            # Severe wins for words in both lists
+            self.severity[word.lower()] = SEVERITY_SEVERE
+
+        words = [w for w in self.severity if ' ' not in w]
+        phrases = [w for w in self.severity if ' ' in w]
+        self._word_re = re.compile(r'(?=\b(' + _trie_pattern(words) + r')\b)', re.IGNORECASE) if words else None
+        self._phrase_re = re.compile('(?=(' + _trie_pattern(phrases) + '))', re.IGNORECASE) if phrases else None
+
+    def scan(self, content: str) -> List[ModerationHit]:
+        """Every wordlist hit in `content`, in order of position"""
+        hits = []
+        if self._word_re is not None:
+            for match in self._word_re.finditer(content):
+                word = match.group(1).lower()
+                hits.append(ModerationHit(word, match.start(1), match.end(1), self.severity[word]))
+        if self._phrase_re is not None:
+            for match in self._phrase_re.finditer(content):
+                phrase = match.group(1).lower()
+                hits.append(ModerationHit(phrase, match.start(1), match.end(1), self.severity[phrase]))
+        hits.sort(key=lambda hit: (hit.start, hit.end))
+        return hits
+
+
+def _evaluate(content: str, hits: List[ModerationHit]) -> Tuple[bool, Optional[str]]:
+    """The block decision and reason, with the same precedence as always"""
+    if any(hit.severity == SEVERITY_SEVERE for hit in hits):
+        return True, f"Severe violation: contains inappropriate content"
+
+    found_profanity = {hit.word for hit in hits}
     if found_profanity:
         # Don't reveal the actual words in the error message for privacy
         return True, f"Contains inappropriate language ({len(found_profanity)} violations)"
-    
+
     # Check for all caps (possible shouting/aggression)
     if len(content) > 20 and content.isupper():
         return True, "All caps text (possible aggressive tone)"
-    
+
     # Check for excessive exclamation marks
     if content.count('!') > 5:
         return True, "Excessive exclamation marks"
-    
+
     # Check for excessive question marks
     if content.count('?') > 5:
         return True, "Excessive question marks"
-    
+
     return False, None
 
 
+class ModerationEngine:
+    """
+    The active matcher: built-in lists plus the custom wordlist file
+    (MODERATION_WORDLIST_PATH, JSON with "profanity", "severe" and "allow"
+    lists). The file is re-read when its modification time changes,
+    checked at most every MODERATION_RELOAD_INTERVAL seconds, so edits made
+    by any worker apply everywhere without a restart.
+    """
+
+    def __init__(self, path: Optional[str] = None, reload_interval: Optional[float] = None):
+        self.path = path or settings.moderation_wordlist_path
+        self.reload_interval = settings.moderation_reload_interval if reload_interval is None else reload_interval
+        self.custom = {"profanity": [], "severe": [], "allow": []}
+        self.version = 0
+        self.loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._mtime: Optional[float] = None
+        self._checked_at = 0.0
+        self._matcher: Optional[ModerationMatcher] = None
+        self.reload()
+
+    def _build(self) -> ModerationMatcher:
+        allow = {word.lower() for word in self.custom["allow"]}
+        return ModerationMatcher(
+            [w for w in PROFANITY_LIST + self.custom["profanity"] if w.lower() not in allow],
+            [w for w in SEVERE_VIOLATIONS + self.custom["severe"] if w.lower() not in allow],
+        )
+
+    def _file_mtime(self) -> Optional[float]:
+        try:
+            return os.stat(self.path).st_mtime
+        except OSError:
+            return None
+
+    def reload(self) -> None:
+        """Re-read the custom wordlist file and swap in a freshly compiled matcher"""
+        with self._lock:
+            mtime = self._file_mtime()
+            custom = {"profanity": [], "severe": [], "allow": []}
+            if mtime is not None:
+                try:
+                    with open(self.path) as f:
+                        data = json.load(f)
+                    for key in custom:
+                        custom[key] = [str(w).strip() for w in data.get(key, []) if str(w).strip()]
+                except (OSError, ValueError, AttributeError) as e:
+                    logger.error(f"Ignoring moderation wordlist {self.path}, failed to read it: {e}")
+                    # Don't retry until the file changes again
+                    self._mtime = mtime
+                    if self._matcher is not None:
+                        return
+                    custom = {"profanity": [], "severe": [], "allow": []}
+            self.custom = custom
+            self._matcher = self._build()
+            self._mtime = mtime
+            self._checked_at = time.monotonic()
+            self.version += 1
+            self.loaded_at = time.time()
+            logger.info(f"Moderation wordlist loaded ({len(self._matcher.severity)} entries)")
+
+    def _maybe_reload(self) -> None:
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return
+        self._checked_at = now
+        if self._file_mtime() != self._mtime:
+            self.reload()
+
+    def save_custom(self, profanity: List[str], severe: List[str], allow: List[str]) -> None:
+        """Write the custom wordlist file and apply it immediately"""
+        data = {"profanity": profanity, "severe": severe, "allow": allow}
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, self.path)
+        self.reload()
+
+    @property
+    def matcher(self) -> ModerationMatcher:
+        self._maybe_reload()
+        return self._matcher
+
+    def moderate(self, content: str) -> ModerationResult:
+        if not content:
+            return ModerationResult(False, None, [])
+        hits = self.matcher.scan(content)
+        is_flagged, reason = _evaluate(content, hits)
+        return ModerationResult(is_flagged, reason, hits)
+
+    def moderate_many(self, contents: Iterable[str]) -> List[ModerationResult]:
+        """Moderate a batch (e.g. re-screening stored feedback) against one matcher"""
+        matcher = self.matcher
+        results = []
+        for content in contents:
+            if not content:
+                results.append(ModerationResult(False, None, []))
+                continue
+            hits = matcher.scan(content)
+            is_flagged, reason = _evaluate(content, hits)
+            results.append(ModerationResult(is_flagged, reason, hits))
+        return results
+
+
+moderation_engine = ModerationEngine()
+
+
+def check_content_moderation(content: str) -> Tuple[bool, Optional[str]]:
+    """
+    Check content for moderation violations.
+    Uses word boundaries to avoid false positives.
+    
+    Returns:
+        (is_flagged, reason)
+        - is_flagged: True if content should be blocked
+        - reason: Description of why it was blocked
+    """
+    result = moderation_engine.moderate(content)
+    return result.is_flagged, result.reason
+
+
+def moderate_many(contents: Iterable[str]) -> List[ModerationResult]:
+    """Batch form of moderation for re-screening stored content"""
+    return moderation_engine.moderate_many(contents)
+
+
 def sanitize_content(content: str) -> str:
     """
     Clean/sanitize content before saving.
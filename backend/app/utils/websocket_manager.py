@@ -1,55 +1,291 @@
-from typing import Dict, List, Set
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+from collections import deque
 from fastapi import WebSocket
+import asyncio
 import json
+import logging
+import time
+
+from app.core.config import settings
+from app.utils.chat_backplane import Backplane, create_backplane
+
+logger = logging.getLogger(__name__)
+
+# Event types that may be discarded for clients that fall behind
+DROPPABLE_TYPES = {"typing_start", "typing_end"}
+
+# WebSocket close code for "try again later"
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+# Per-user sockets (e.g. the notification channel) live in rooms keyed by
+# the negated user id. Events for them travel between workers on one
+# shared backplane channel rather than one channel per user.
+USER_EVENTS_CHANNEL = 0
+
+# Admin attendance board sockets share one local room. It is never
+# subscribed on the backplane: presence changes arrive as user events and
+# each worker pushes them to its own board sockets.
+ATTENDANCE_ROOM = 0
+
+
+def user_room(user_id: int) -> int:
+    return -user_id
+
+
+class ClientConnection:
+    """Outbound side of one socket: a bounded queue drained by its own writer task"""
+
+    def __init__(self, websocket: WebSocket, manager: "ConnectionManager"):
+        self.websocket = websocket
+        self.manager = manager
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=manager.max_queued_messages)
+        self.writer = asyncio.get_running_loop().create_task(self._drain())
+
+    async def _drain(self):
+        while True:
+            message_text = await self.queue.get()
+            started = time.perf_counter()
+            try:
+                await self.websocket.send_text(message_text)
+            except Exception:
+                # Remove broken connection
+                self.manager.disconnect(self.websocket)
+                return
+            self.manager.record_send((time.perf_counter() - started) * 1000)
+
+    def close(self):
+        self.writer.cancel()
+
 
 class ConnectionManager:
-    def __init__(self):
+    def __init__(self, backplane: Optional[Backplane] = None):
         # Dictionary to store active connections by chat room ID
         self.active_connections: Dict[int, List[WebSocket]] = {}
         # Dictionary to store user info for each connection
         self.user_connections: Dict[WebSocket, dict] = {}
+        # Outbound queue and writer task for each connection
+        self.clients: Dict[WebSocket, ClientConnection] = {}
+        # Carries broadcasts to sockets held by other workers
+        self.backplane = backplane or create_backplane()
+        self.backplane.set_handler(self._deliver_local)
+        # Handle USER_EVENTS_CHANNEL payloads, on every worker; each
+        # handler ignores payloads that are not meant for it
+        self.user_event_handlers: List[Callable[[str], Awaitable[None]]] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        # Slow-consumer policy
+        self.drop_typing_queue_depth = settings.ws_drop_typing_queue_depth
+        self.max_queued_messages = settings.ws_max_queued_messages
+
+        # Metrics
+        self.messages_sent = 0
+        self.messages_dropped = 0
+        self.slow_consumer_disconnects = 0
+        self.send_latencies_ms = deque(maxlen=2000)
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        await self.backplane.start()
+        await self.backplane.subscribe(USER_EVENTS_CHANNEL)
+
+    async def stop(self):
+        self._loop = None
+        await self.backplane.stop()
 
     async def connect(self, websocket: WebSocket, chat_id: int, user_info: dict):
         await websocket.accept()
-        
+
         if chat_id not in self.active_connections:
             self.active_connections[chat_id] = []
-        
+
         self.active_connections[chat_id].append(websocket)
         self.user_connections[websocket] = {
             "chat_id": chat_id,
             "user_id": user_info["user_id"],
             "full_name": user_info["full_name"]
         }
+        self.clients[websocket] = ClientConnection(websocket, self)
+
+        # First local socket in this room: start receiving its broadcasts
+        if len(self.active_connections[chat_id]) == 1 and chat_id > 0:
+            await self.backplane.subscribe(chat_id)
+
+    async def connect_user(self, websocket: WebSocket, user_info: dict):
+        """Register a socket that receives events addressed to one user"""
+        await self.connect(websocket, user_room(user_info["user_id"]), user_info)
+
+    def add_user_event_handler(self, handler: Callable[[str], Awaitable[None]]):
+        self.user_event_handlers.append(handler)
+
+    async def _handle_user_event(self, message_text: str):
+        for handler in self.user_event_handlers:
+            try:
+                await handler(message_text)
+            except Exception as e:
+                logger.error(f"User event handler {handler.__name__} failed: {e}")
+
+    async def connect_attendance(self, websocket: WebSocket, user_info: dict):
+        """Register an admin attendance board socket"""
+        await self.connect(websocket, ATTENDANCE_ROOM, user_info)
+
+    def send_to_socket(self, websocket: WebSocket, message: dict):
+        """Queue a message for one local socket, behind anything already queued"""
+        client = self.clients.get(websocket)
+        if client is not None and client.queue.qsize() < self.max_queued_messages:
+            client.queue.put_nowait(json.dumps(message, default=str))
+
+    def has_attendance_sockets(self) -> bool:
+        return ATTENDANCE_ROOM in self.active_connections
+
+    def send_to_attendance(self, message: dict):
+        """Queue a message for this worker's attendance board sockets"""
+        self._enqueue_local(ATTENDANCE_ROOM, json.dumps(message, default=str), False)
+
+    def has_user(self, user_id: int) -> bool:
+        return user_room(user_id) in self.active_connections
+
+    def send_to_user(self, user_id: int, message: dict):
+        """Queue a message for this worker's sockets of one user"""
+        self._enqueue_local(user_room(user_id), json.dumps(message, default=str), False)
+
+    async def publish_user_event(self, message_text: str):
+        """Hand an event to the user event handlers on this and every other worker"""
+        await self._handle_user_event(message_text)
+        await self.backplane.publish(USER_EVENTS_CHANNEL, message_text)
+
+    def publish_user_event_threadsafe(self, message_text: str):
+        """publish_user_event() from sync code on any thread; dropped if the manager is not running"""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            loop.create_task(self.publish_user_event(message_text))
+        else:
+            asyncio.run_coroutine_threadsafe(self.publish_user_event(message_text), loop)
 
     def disconnect(self, websocket: WebSocket):
+        client = self.clients.pop(websocket, None)
+        if client is not None:
+            client.close()
+
         if websocket in self.user_connections:
             user_info = self.user_connections[websocket]
             chat_id = user_info["chat_id"]
-            
+
             if chat_id in self.active_connections:
                 if websocket in self.active_connections[chat_id]:
                     self.active_connections[chat_id].remove(websocket)
-                
-                # Remove empty chat room
+
+                # Remove empty chat room and stop listening for it
                 if not self.active_connections[chat_id]:
                     del self.active_connections[chat_id]
-            
+                    if chat_id > 0:
+                        asyncio.get_running_loop().create_task(self._unsubscribe_if_idle(chat_id))
+
             del self.user_connections[websocket]
 
+    async def _unsubscribe_if_idle(self, chat_id: int):
+        # A socket may have joined the room again before this task ran
+        if chat_id not in self.active_connections:
+            await self.backplane.unsubscribe(chat_id)
+
     async def send_personal_message(self, message: str, websocket: WebSocket):
         await websocket.send_text(message)
 
     async def broadcast_to_chat(self, message: dict, chat_id: int, exclude_websocket: WebSocket = None):
-        if chat_id in self.active_connections:
-            message_text = json.dumps(message, default=str)
-            for connection in self.active_connections[chat_id]:
-                if exclude_websocket is None or connection != exclude_websocket:
-                    try:
-                        await connection.send_text(message_text)
-                    except:
-                        # Remove broken connection
-                        self.disconnect(connection)
+        # Serialise once; every queue shares the same string
+        message_text = json.dumps(message, default=str)
+        droppable = message.get("type") in DROPPABLE_TYPES
+        self._enqueue_local(chat_id, message_text, droppable, exclude_websocket)
+        await self.backplane.publish(chat_id, message_text)
+
+    async def _deliver_local(self, chat_id: int, message_text: str):
+        """Backplane handler for broadcasts published by other workers"""
+        if chat_id == USER_EVENTS_CHANNEL:
+            await self._handle_user_event(message_text)
+            return
+        if chat_id not in self.active_connections:
+            return
+        try:
+            droppable = json.loads(message_text).get("type") in DROPPABLE_TYPES
+        except ValueError:
+            droppable = False
+        self._enqueue_local(chat_id, message_text, droppable)
+
+    def _enqueue_local(self, chat_id: int, message_text: str, droppable: bool, exclude_websocket: WebSocket = None):
+        """Queue a message for every local socket in the room without waiting on any of them"""
+        # Iterate over a snapshot: slow consumers are removed along the way
+        for connection in list(self.active_connections.get(chat_id, ())):
+            if connection is exclude_websocket:
+                continue
+            client = self.clients.get(connection)
+            if client is None:
+                continue
+
+            depth = client.queue.qsize()
+            if droppable and depth >= self.drop_typing_queue_depth:
+                self.messages_dropped += 1
+                continue
+            if depth >= self.max_queued_messages:
+                self._drop_slow_consumer(connection)
+                continue
+            client.queue.put_nowait(message_text)
+
+    def _drop_slow_consumer(self, websocket: WebSocket):
+        user_info = self.user_connections.get(websocket, {})
+        logger.warning(
+            f"Disconnecting slow WebSocket consumer (user {user_info.get('user_id')}, "
+            f"chat {user_info.get('chat_id')}): {self.max_queued_messages} messages queued"
+        )
+        self.slow_consumer_disconnects += 1
+        self.disconnect(websocket)
+        asyncio.get_running_loop().create_task(self._close_quietly(websocket))
+
+    async def _close_quietly(self, websocket: WebSocket):
+        try:
+            await websocket.close(code=SLOW_CONSUMER_CLOSE_CODE, reason="Too many queued messages")
+        except Exception:
+            pass
+
+    def record_send(self, latency_ms: float):
+        self.messages_sent += 1
+        self.send_latencies_ms.append(latency_ms)
+
+    def get_metrics(self) -> dict:
+        """Queue depth and send latency statistics for this worker"""
+        depths = [client.queue.qsize() for client in self.clients.values()]
+        latencies = sorted(self.send_latencies_ms)
+
+        def percentile(p: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))], 3)
+
+        return {
+            "connections": len(self.clients),
+            "rooms": sum(1 for room in self.active_connections if room > 0),
+            "user_channels": sum(1 for room in self.active_connections if room < 0),
+            "attendance_sockets": len(self.active_connections.get(ATTENDANCE_ROOM, ())),
+            "queue_depth": {
+                "total": sum(depths),
+                "max": max(depths) if depths else 0,
+                "limit": self.max_queued_messages,
+                "drop_typing_at": self.drop_typing_queue_depth,
+            },
+            "messages_sent": self.messages_sent,
+            "messages_dropped": self.messages_dropped,
+            "slow_consumer_disconnects": self.slow_consumer_disconnects,
+            "send_latency_ms": {
+                "samples": len(latencies),
+                "p50": percentile(0.50),
+                "p99": percentile(0.99),
+                "max": round(latencies[-1], 3) if latencies else None,
+            },
+        }
 
     def get_chat_participants(self, chat_id: int) -> List[dict]:
         participants = []
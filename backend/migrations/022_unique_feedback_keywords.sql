@@ -0,0 +1,39 @@
+-- Migration 022: One feedback_keywords row per (keyword, sentiment, department)
+-- Lets keyword tracking upsert (INSERT ... ON CONFLICT DO UPDATE) instead of
+-- SELECT-then-INSERT/UPDATE per keyword. NULL sentiment/department are folded
+-- to '' in the key so they deduplicate too.
+
+-- Fold duplicate rows into the oldest one
+UPDATE feedback_keywords
+SET frequency = (
+        SELECT SUM(d.frequency) FROM feedback_keywords d
+        WHERE d.keyword = feedback_keywords.keyword
+          AND COALESCE(d.sentiment_context, '') = COALESCE(feedback_keywords.sentiment_context, '')
+          AND COALESCE(d.department, '') = COALESCE(feedback_keywords.department, '')
+    ),
+    first_seen = (
+        SELECT MIN(d.first_seen) FROM feedback_keywords d
+        WHERE d.keyword = feedback_keywords.keyword
+          AND COALESCE(d.sentiment_context, '') = COALESCE(feedback_keywords.sentiment_context, '')
+          AND COALESCE(d.department, '') = COALESCE(feedback_keywords.department, '')
+    ),
+    last_seen = (
+        SELECT MAX(d.last_seen) FROM feedback_keywords d
+        WHERE d.keyword = feedback_keywords.keyword
+          AND COALESCE(d.sentiment_context, '') = COALESCE(feedback_keywords.sentiment_context, '')
+          AND COALESCE(d.department, '') = COALESCE(feedback_keywords.department, '')
+    )
+WHERE id IN (
+    SELECT MIN(id) FROM feedback_keywords
+    GROUP BY keyword, COALESCE(sentiment_context, ''), COALESCE(department, '')
+    HAVING COUNT(*) > 1
+);
+
+DELETE FROM feedback_keywords
+WHERE id NOT IN (
+    SELECT MIN(id) FROM feedback_keywords
+    GROUP BY keyword, COALESCE(sentiment_context, ''), COALESCE(department, '')
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS ux_feedback_keywords_context
+    ON feedback_keywords (keyword, COALESCE(sentiment_context, ''), COALESCE(department, ''));
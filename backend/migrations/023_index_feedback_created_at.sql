@@ -0,0 +1,4 @@
+-- Migration 023: Index feedback.created_at
+-- Daily aggregates and insights filter feedback by created_at ranges
+
+CREATE INDEX IF NOT EXISTS ix_feedback_created_at ON feedback(created_at);
@@ -0,0 +1,5 @@
+-- Migration 024: Composite index for booking conflict checks
+-- Overlap queries filter one office's bookings by time range and status
+
+CREATE INDEX IF NOT EXISTS ix_meeting_bookings_office_time
+    ON meeting_bookings(office_id, start_time, end_time, status);
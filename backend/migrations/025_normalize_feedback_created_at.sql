@@ -0,0 +1,8 @@
+-- Migration 025: Normalize feedback.created_at text (SQLite)
+-- Rows stamped by CURRENT_TIMESTAMP have no fractional seconds, so they
+-- compare below the same instant bound as 'YYYY-MM-DD HH:MM:SS.ffffff'
+-- and the feedback keyset cursor would return its own row again
+
+UPDATE feedback
+SET created_at = created_at || '.000000'
+WHERE length(created_at) = 19;
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""Run migration 022: Unique feedback keyword key for upserts"""
+
+import sqlite3
+import sys
+
+def run_migration():
+    """Execute migration 022"""
+    try:
+        # Connect to database
+        conn = sqlite3.connect('hr_app.db')
+        cursor = conn.cursor()
+        
+        cursor.execute("SELECT COUNT(*) FROM feedback_keywords")
+        before = cursor.fetchone()[0]
+        
+        # Read migration file
+        with open('migrations/022_unique_feedback_keywords.sql', 'r') as f:
+            migration_sql = f.read()
+        
+        # Execute migration
+        cursor.executescript(migration_sql)
+        conn.commit()
+        
+        cursor.execute("SELECT COUNT(*) FROM feedback_keywords")
+        after = cursor.fetchone()[0]
+        
+        print("✅ Migration 022 completed successfully!")
+        print(f"   - Merged {before - after} duplicate keyword rows ({after} remain)")
+        print("   - Created ux_feedback_keywords_context unique index")
+        
+        cursor.close()
+        conn.close()
+        
+        return True
+        
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+        return False
+
+if __name__ == "__main__":
+    success = run_migration()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""Run migration 023: Index feedback.created_at"""
+
+import sqlite3
+import sys
+
+def run_migration():
+    """Execute migration 023"""
+    try:
+        # Connect to database
+        conn = sqlite3.connect('hr_app.db')
+        cursor = conn.cursor()
+        
+        # Read migration file
+        with open('migrations/023_index_feedback_created_at.sql', 'r') as f:
+            migration_sql = f.read()
+        
+        # Execute migration
+        cursor.executescript(migration_sql)
+        conn.commit()
+        
+        print("✅ Migration 023 completed successfully!")
+        print("   - Created ix_feedback_created_at index")
+        
+        cursor.close()
+        conn.close()
+        
+        return True
+        
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+        return False
+
+if __name__ == "__main__":
+    success = run_migration()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""Run migration 024: Index meeting bookings by office and time"""
+
+import sqlite3
+import sys
+
+def run_migration():
+    """Execute migration 024"""
+    try:
+        # Connect to database
+        conn = sqlite3.connect('hr_app.db')
+        cursor = conn.cursor()
+        
+        # Read migration file
+        with open('migrations/024_index_meeting_bookings_office_time.sql', 'r') as f:
+            migration_sql = f.read()
+        
+        # Execute migration
+        cursor.executescript(migration_sql)
+        conn.commit()
+        
+        print("✅ Migration 024 completed successfully!")
+        print("   - Added index ix_meeting_bookings_office_time (office_id, start_time, end_time, status)")
+        
+        cursor.close()
+        conn.close()
+        
+        return True
+        
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+        return False
+
+if __name__ == "__main__":
+    success = run_migration()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""Run migration 025: Normalize feedback.created_at text"""
+
+import sqlite3
+import sys
+
+def run_migration():
+    """Execute migration 025"""
+    try:
+        # Connect to database
+        conn = sqlite3.connect('hr_app.db')
+        cursor = conn.cursor()
+        
+        # Read migration file
+        with open('migrations/025_normalize_feedback_created_at.sql', 'r') as f:
+            migration_sql = f.read()
+        
+        # Execute migration
+        cursor.executescript(migration_sql)
+        conn.commit()
+        
+        print("✅ Migration 025 completed successfully!")
+        print("   - Added fractional seconds to CURRENT_TIMESTAMP-stamped feedback rows")
+        
+        cursor.close()
+        conn.close()
+        
+        return True
+        
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+        return False
+
+if __name__ == "__main__":
+    success = run_migration()
+    sys.exit(0 if success else 1)
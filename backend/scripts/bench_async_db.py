@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Benchmark: concurrent request throughput with the sync vs async database session.
+
+Mounts two copies of the unread-notification-count handler on a bench app:
+- /sync  — the previous pattern: `async def` handler using the sync SessionLocal
+           (every query blocks the event loop)
+- /async — the API's session layer: get_async_db + await
+Both run the same query and are driven in-process through ASGI with N
+concurrent requests, so only the session layer differs.
+
+Network round-trips are what the event loop is blocked on, so run this
+against PostgreSQL for representative numbers:
+    DATABASE_URL=postgresql://... python scripts/bench_async_db.py --requests 1000 --concurrency 1 10 50
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from fastapi import Depends, FastAPI
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.config import settings
+from app.core.database import get_async_db, engine, async_engine
+from app.models import Base
+from app.models.notification import Notification
+
+bench_app = FastAPI()
+
+# Same pool size as the app's engine, but checkouts give up after a second.
+# Once concurrency exceeds the pool (5 + 10 overflow) the blocked event loop
+# cannot run the session teardowns that would return connections, so sync
+# requests stall until the checkout times out; these show up as errors.
+sync_engine = create_engine(
+    settings.database_url,
+    connect_args={"check_same_thread": False} if "sqlite" in settings.database_url else {},
+    pool_timeout=1,
+)
+SyncSession = sessionmaker(autocommit=False, autoflush=False, bind=sync_engine)
+
+
+def get_sync_db():
+    db = SyncSession()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@bench_app.get("/sync")
+async def unread_count_sync(user_id: int = 1, db: Session = Depends(get_sync_db)):
+    count = db.query(Notification).filter(
+        Notification.user_id == user_id,
+        Notification.is_read == False
+    ).count()
+    return {"unread_count": count}
+
+
+@bench_app.get("/async")
+async def unread_count_async(user_id: int = 1, db: AsyncSession = Depends(get_async_db)):
+    # The uncached query: the API serves this count from unread_counters now
+    result = await db.execute(
+        select(func.count(Notification.id)).where(
+            Notification.user_id == user_id,
+            Notification.is_read == False
+        )
+    )
+    return {"unread_count": result.scalar_one()}
+
+
+async def call(path):
+    """Issue one GET through the ASGI interface and return its latency in ms"""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+        "root_path": "", "headers": [], "client": ("127.0.0.1", 0), "server": ("bench", 80),
+    }
+    status = {}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status["code"] = message["status"]
+
+    started = time.perf_counter()
+    await bench_app(scope, receive, send)
+    if status.get("code") != 200:
+        raise RuntimeError(f"{path} returned {status.get('code')}")
+    return (time.perf_counter() - started) * 1000
+
+
+async def run_variant(path, total, concurrency):
+    limit = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = []
+
+    async def one():
+        async with limit:
+            try:
+                latencies.append(await call(path))
+            except Exception as e:
+                errors.append(e)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[one() for _ in range(total)])
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "rps": len(latencies) / elapsed,
+        "p50": statistics.median(latencies) if latencies else float("nan"),
+        "p99": latencies[max(0, int(len(latencies) * 0.99) - 1)] if latencies else float("nan"),
+        "errors": len(errors),
+    }
+
+
+async def main(args):
+    Base.metadata.create_all(bind=engine)
+    print(f"Database: {engine.url.render_as_string(hide_password=True)}")
+    print(f"{'variant':<8} {'concurrency':>11} {'req/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for concurrency in args.concurrency:
+        for path in ("/sync", "/async"):
+            # Warm up connection pools, then measure
+            await run_variant(path, min(50, args.requests), concurrency)
+            result = await run_variant(path, args.requests, concurrency)
+            print(
+                f"{path[1:]:<8} {concurrency:>11} {result['rps']:>10.0f} "
+                f"{result['p50']:>9.2f} {result['p99']:>9.2f} {result['errors']:>7}"
+            )
+    sync_engine.dispose()
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sync vs async session throughput benchmark")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 20])
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-user KPI calculation vs the set-based engine.
+
+Seeds a throwaway SQLite database with N users (plus tasks, time entries
+and projects), then runs
+- per-user: the previous job shape, calculate_all_kpis() once per user
+- batched:  KPICalculator.calculate_for_all_users()
+and reports wall time, SQL statements and commits for each, and whether
+both produced the same values.
+
+Usage:
+    python scripts/bench_kpi_engine.py --users 2000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.core.database import Base
+from app.models import *  # noqa: F401,F403 - register every table
+from app.models.performance import KpiSnapshot
+from app.models.project import Project
+from app.models.task import Task
+from app.models.time_entry import TimeEntry
+from app.models.user import User
+from app.services.kpi_calculator import KPICalculator
+
+STATUSES = ["To-Do", "In-Progress", "Done", "Done"]
+
+
+class StatementCounter:
+    def __init__(self, engine):
+        self.statements = 0
+        self.commits = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+        event.listen(engine, "commit", self._on_commit)
+
+    def _on_execute(self, *args):
+        self.statements += 1
+
+    def _on_commit(self, *args):
+        self.commits += 1
+
+    def reset(self):
+        self.statements = 0
+        self.commits = 0
+
+
+def seed(session, users, tasks_per_user, entries_per_user):
+    now = datetime.utcnow()
+    rng = random.Random(42)
+    session.add_all([
+        User(email=f"user{i}@bench.local", full_name=f"Bench User {i}", hashed_password="x", is_active=True)
+        for i in range(users)
+    ])
+    session.flush()
+    user_ids = [u.id for u in session.query(User.id).all()]
+
+    session.add_all([
+        Project(title=rng.choice(["Innovation lab", "Website", "R&D pilot", "Migration"]),
+                created_by=user_ids[0], created_at=now - timedelta(days=rng.randint(0, 120)))
+        for _ in range(max(10, users // 20))
+    ])
+
+    tasks = []
+    entries = []
+    for user_id in user_ids:
+        for _ in range(tasks_per_user):
+            created = now - timedelta(days=rng.randint(0, 120), hours=rng.randint(0, 23))
+            status = rng.choice(STATUSES)
+            completed = created + timedelta(days=rng.randint(0, 10)) if status == "Done" else None
+            due = (created + timedelta(days=rng.randint(1, 8))).isoformat() if rng.random() < 0.8 else None
+            tasks.append(Task(title="Bench task", status=status, priority="Medium", assignee_id=user_id,
+                              created_by=user_id, created_at=created, completed_at=completed, due_date=due))
+        for _ in range(entries_per_user):
+            clock_in = now - timedelta(days=rng.randint(0, 120), hours=rng.randint(0, 8))
+            entries.append(TimeEntry(user_id=user_id, clock_in=clock_in,
+                                     clock_out=clock_in + timedelta(minutes=rng.randint(60, 600))))
+    session.add_all(tasks)
+    session.add_all(entries)
+    session.commit()
+    return user_ids
+
+
+def run_per_user(session, user_ids):
+    calculator = KPICalculator(session)
+    results = {}
+    for user_id in user_ids:
+        results[user_id] = {s.kpi_name: s.value for s in calculator.calculate_all_kpis(user_id=user_id, days=90)}
+    return results
+
+
+def run_batched(session):
+    results = KPICalculator(session).calculate_for_all_users(days=90)
+    return {user_id: {k["metric_name"]: k["value"] for k in kpis} for user_id, kpis in results.items()}
+
+
+def main(args):
+    import logging
+    logging.disable(logging.INFO)
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix="kpi_bench_"), "bench.db")
+    engine = create_engine(f"sqlite:///{db_path}")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    counter = StatementCounter(engine)
+
+    print(f"🌱 Seeding {args.users} users ({args.tasks} tasks, {args.entries} time entries each)...")
+    user_ids = seed(session, args.users, args.tasks, args.entries)
+
+    print(f"{'engine':<10} {'seconds':>9} {'statements':>11} {'commits':>8}")
+    measured = {}
+    for name, runner in (("per-user", lambda: run_per_user(session, user_ids)),
+                         ("batched", lambda: run_batched(session))):
+        if name == "per-user" and args.skip_per_user:
+            continue
+        counter.reset()
+        started = time.perf_counter()
+        measured[name] = runner()
+        elapsed = time.perf_counter() - started
+        print(f"{name:<10} {elapsed:>9.2f} {counter.statements:>11} {counter.commits:>8}")
+
+    if len(measured) == 2:
+        mismatches = [
+            (user_id, metric, value, measured["batched"][user_id].get(metric))
+            for user_id, metrics in measured["per-user"].items()
+            for metric, value in metrics.items()
+            if abs(value - measured["batched"][user_id].get(metric, float("nan"))) > 0.05
+        ]
+        if mismatches:
+            print(f"❌ {len(mismatches)} values differ, e.g. {mismatches[:3]}")
+        else:
+            print("✅ Both engines produced identical KPI values")
+
+    print(f"📊 {session.query(KpiSnapshot).count()} snapshots stored in {db_path}")
+    session.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-user vs set-based KPI engine benchmark")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--tasks", type=int, default=20, help="Tasks per user")
+    parser.add_argument("--entries", type=int, default=30, help="Time entries per user")
+    parser.add_argument("--skip-per-user", action="store_true", help="Only run the batched engine")
+    main(parser.parse_args())
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Benchmark: feedback moderation, per-word regex loop vs compiled matcher.
+
+Builds clean and offending texts of ~1 KB and ~50 KB from ordinary workplace
+words (plus near misses like "classic" / "assessment") and times:
+- per-word: the previous check_content_moderation, one re.search with \\b
+            boundaries per wordlist entry
+- engine:   moderation_engine, the wordlists compiled into one trie-shaped
+            regex for words and one for phrases, each scanned once
+Clean text is the common (and worst) case for the per-word loop, which can
+stop at the first severe hit. Both must reach the same verdicts.
+
+Usage:
+    python scripts/bench_moderation.py --sizes 1024 51200 --repeat 50
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.utils.moderation import PROFANITY_LIST, SEVERE_VIOLATIONS, moderation_engine
+
+FILLER = (
+    "the team shipped release planning sprint review customer classic assessment "
+    "passion class assistant hello shell document deadline quarter thanks great "
+    "work meeting notes follow up backlog design feedback killer-app skills "
+).split()
+
+
+def per_word_check(content):
+    """check_content_moderation before the compiled matcher"""
+    if not content:
+        return False, None
+    content_lower = content.lower()
+    for word in SEVERE_VIOLATIONS:
+        if ' ' in word:
+            if word in content_lower:
+                return True, "Severe violation: contains inappropriate content"
+        elif re.search(r'\b' + re.escape(word) + r'\b', content_lower):
+            return True, "Severe violation: contains inappropriate content"
+    found_profanity = []
+    for word in PROFANITY_LIST:
+        if ' ' in word:
+            if word in content_lower:
+                found_profanity.append(word)
+        elif re.search(r'\b' + re.escape(word) + r'\b', content_lower):
+            found_profanity.append(word)
+    if found_profanity:
+        return True, f"Contains inappropriate language ({len(found_profanity)} violations)"
+    if len(content) > 20 and content.isupper():
+        return True, "All caps text (possible aggressive tone)"
+    if content.count('!') > 5:
+        return True, "Excessive exclamation marks"
+    if content.count('?') > 5:
+        return True, "Excessive question marks"
+    return False, None
+
+
+def make_text(size, rng, offending=None):
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(FILLER)
+        words.append(word)
+        length += len(word) + 1
+    if offending:
+        words[rng.randrange(len(words))] = offending
+    return " ".join(words)[:size]
+
+
+def timed(fn, text, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn(text)
+    return (time.perf_counter() - started) * 1000 / repeat
+
+
+def verify(rng):
+    """Same block decision and category on a mixed corpus"""
+    samples = [make_text(200, rng) for _ in range(200)]
+    samples += [make_text(200, rng, rng.choice(PROFANITY_LIST)) for _ in range(200)]
+    samples += [make_text(200, rng, rng.choice(SEVERE_VIOLATIONS)) for _ in range(200)]
+    samples += ["ass-essment", "a$$hole", "Son of a Bitch", "HATE CRIME!", "WHY IS THIS STILL BROKEN TODAY", "?" * 6]
+    mismatches = 0
+    for text, result in zip(samples, moderation_engine.moderate_many(samples)):
+        old = per_word_check(text)
+        if old[0] != result.is_flagged or (old[1] or "").split(" (")[0] != (result.reason or "").split(" (")[0]:
+            mismatches += 1
+            print(f"❌ {text[:60]!r}: per-word={old} engine={(result.is_flagged, result.reason)}")
+    print(f"✅ {len(samples) - mismatches}/{len(samples)} verdicts agree")
+
+
+def main(args):
+    rng = random.Random(42)
+    verify(rng)
+
+    print(f"{'input':<22} {'per-word ms':>12} {'engine ms':>10} {'speedup':>8} {'hits':>5}")
+    for size in args.sizes:
+        cases = [
+            ("clean", make_text(size, rng)),
+            ("profanity", make_text(size, rng, "crap")),
+            ("severe", make_text(size, rng, "torture")),
+        ]
+        for name, text in cases:
+            old_ms = timed(per_word_check, text, args.repeat)
+            new_ms = timed(moderation_engine.moderate, text, args.repeat)
+            hits = len(moderation_engine.moderate(text).hits)
+            label = f"{name} {size // 1024} KB"
+            print(f"{label:<22} {old_ms:>12.3f} {new_ms:>10.3f} {old_ms / new_ms:>7.1f}x {hits:>5}")
+
+    texts = [make_text(1024, rng) for _ in range(args.batch)]
+    started = time.perf_counter()
+    moderation_engine.moderate_many(texts)
+    print(f"📦 moderate_many: {args.batch} x 1 KB in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Moderation matcher benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1024, 51200])
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--batch", type=int, default=1000, help="Texts for the moderate_many run")
+    main(parser.parse_args())
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Benchmark: public feedback request latency vs number of notified users.
+
+Seeds a throwaway SQLite database, then posts EVERYONE feedback through the
+real POST /api/v1/feedback endpoint with 100 / 1,000 / 10,000 active users,
+once per fan-out strategy:
+- per-recipient: the previous shape, create_notification() per user
+                 (add + commit + refresh + print each)
+- bulk:          create_notifications_bulk(), one multi-row insert and commit
+and reports request latency, SQL statements and commits for each.
+
+Usage:
+    python scripts/bench_notification_fanout.py --recipients 100 1000 10000
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+DB_PATH = os.path.join(tempfile.mkdtemp(prefix="notify_bench_"), "bench.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event, insert, update
+
+from app.api.auth import get_current_user
+from app.core.database import Base, SessionLocal, engine
+from app.main import app
+from app.models.notification import Notification
+from app.models.user import User
+from app.services.notification_service import NotificationService, notification_service
+
+
+def per_recipient_fanout(self, db, user_ids, notification_type, title=None, message=None, data=None,
+                         per_user_data=None, exclude_user_id=None, commit=True):
+    """The fan-out loop the endpoints used before create_notifications_bulk"""
+    created = 0
+    for user_id in user_ids:
+        if user_id != exclude_user_id:
+            self.create_notification(
+                db=db, user_id=user_id, notification_type=notification_type,
+                title=title, message=message, data=data
+            )
+            created += 1
+    return created
+
+
+class StatementCounter:
+    def __init__(self):
+        self.statements = 0
+        self.commits = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+        event.listen(engine, "commit", self._on_commit)
+
+    def _on_execute(self, *args):
+        self.statements += 1
+
+    def _on_commit(self, *args):
+        self.commits += 1
+
+    def reset(self):
+        self.statements = 0
+        self.commits = 0
+
+
+def seed(total_users):
+    db = SessionLocal()
+    db.execute(insert(User), [
+        {"email": f"user{i}@bench.local", "full_name": f"Bench User {i}", "hashed_password": "x",
+         "is_active": True, "role": "employee"}
+        for i in range(total_users)
+    ])
+    db.commit()
+    sender = db.query(User).order_by(User.id).first()
+    db.expunge(sender)
+    db.close()
+    return sender
+
+
+def activate(recipients):
+    """Leave exactly `recipients` active users besides the sender"""
+    db = SessionLocal()
+    first_id = db.query(User.id).order_by(User.id).first()[0]
+    db.execute(update(User).values(is_active=User.id <= first_id + recipients))
+    db.query(Notification).delete()
+    db.commit()
+    db.close()
+
+
+def main(args):
+    import logging
+    logging.disable(logging.INFO)
+
+    Base.metadata.create_all(bind=engine)
+    print(f"🌱 Seeding {max(args.recipients) + 1} users into {DB_PATH}...")
+    sender = seed(max(args.recipients) + 1)
+    app.dependency_overrides[get_current_user] = lambda: sender
+    client = TestClient(app)
+    counter = StatementCounter()
+
+    strategies = [("bulk", NotificationService.create_notifications_bulk)]
+    if not args.skip_per_recipient:
+        strategies.insert(0, ("per-recipient", per_recipient_fanout))
+
+    print(f"{'strategy':<14} {'recipients':>10} {'latency ms':>11} {'statements':>11} {'commits':>8} {'rows':>7}")
+    for recipients in args.recipients:
+        for name, fanout in strategies:
+            activate(recipients)
+            notification_service.create_notifications_bulk = fanout.__get__(notification_service)
+            counter.reset()
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                response = client.post("/api/v1/feedback", json={
+                    "content": "Great quarter everyone, thanks for the hard work",
+                    "recipient_type": "EVERYONE",
+                })
+            elapsed = (time.perf_counter() - started) * 1000
+            if response.status_code != 201:
+                raise RuntimeError(f"{name}: {response.status_code} {response.text}")
+            db = SessionLocal()
+            rows = db.query(Notification).count()
+            db.close()
+            print(f"{name:<14} {recipients:>10} {elapsed:>11.1f} {counter.statements:>11} {counter.commits:>8} {rows:>7}")
+
+    del notification_service.create_notifications_bulk
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Notification fan-out latency benchmark")
+    parser.add_argument("--recipients", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--skip-per-recipient", action="store_true", help="Only run the bulk fan-out")
+    main(parser.parse_args())
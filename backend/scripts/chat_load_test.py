@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Load test for multi-worker chat fan-out.
+
+Opens many WebSocket connections to the company chat, spread round-robin
+over one or more server URLs (one per worker/node, or a single URL in
+front of `uvicorn --workers N`), sends messages from a few of them and
+reports how many deliveries arrived and their end-to-end latency.
+
+Usage:
+    python scripts/chat_load_test.py --urls http://localhost:8000,http://localhost:8001 \\
+        --sockets 2000 --messages 20
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import requests
+import websockets
+
+MARKER = "loadtest:"
+
+
+def login(base_url, email, password):
+    response = requests.post(
+        f"{base_url}/api/v1/auth/login",
+        data={"username": email, "password": password}
+    )
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+def get_company_chat_id(base_url, token):
+    response = requests.get(
+        f"{base_url}/api/v1/chat/company",
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    response.raise_for_status()
+    return response.json()["id"]
+
+
+async def open_socket(url, stats, latencies, connect_limit):
+    """Connect and record every load-test message this socket receives"""
+    async with connect_limit:
+        try:
+            socket = await websockets.connect(url, open_timeout=30, max_queue=None)
+        except Exception as e:
+            stats["connect_failures"] += 1
+            stats["last_error"] = str(e)
+            return None
+    stats["connected"] += 1
+
+    async def receive():
+        try:
+            async for raw in socket:
+                data = json.loads(raw)
+                text = data.get("text") or ""
+                if data.get("type") == "message" and text.startswith(MARKER):
+                    sent_at = float(text.split(":")[2])
+                    latencies.append((time.time() - sent_at) * 1000)
+                    stats["delivered"] += 1
+        except websockets.ConnectionClosed:
+            stats["closed_early"] += 1
+
+    return socket, asyncio.create_task(receive())
+
+
+async def run(args):
+    base_urls = [u.strip().rstrip("/") for u in args.urls.split(",") if u.strip()]
+    token = login(base_urls[0], args.email, args.password)
+    chat_id = get_company_chat_id(base_urls[0], token)
+
+    stats = {"connected": 0, "connect_failures": 0, "closed_early": 0, "delivered": 0, "last_error": None}
+    latencies = []
+    connect_limit = asyncio.Semaphore(args.connect_concurrency)
+
+    ws_urls = [
+        base.replace("http://", "ws://").replace("https://", "wss://") + f"/api/v1/chat/ws/{chat_id}?token={token}"
+        for base in base_urls
+    ]
+
+    print(f"🔌 Opening {args.sockets} sockets across {len(ws_urls)} URL(s) for chat {chat_id}...")
+    started = time.time()
+    opened = await asyncio.gather(*[
+        open_socket(ws_urls[i % len(ws_urls)], stats, latencies, connect_limit)
+        for i in range(args.sockets)
+    ])
+    sockets = [s for s in opened if s is not None]
+    print(f"   connected {stats['connected']} in {time.time() - started:.1f}s "
+          f"({stats['connect_failures']} failures{': ' + stats['last_error'] if stats['last_error'] else ''})")
+    if not sockets:
+        return
+
+    # Give every worker time to subscribe before sending
+    await asyncio.sleep(args.settle)
+
+    senders = [sockets[i % len(sockets)][0] for i in range(min(len(ws_urls), len(sockets)))]
+    print(f"📨 Sending {args.messages} messages from {len(senders)} socket(s)...")
+    for n in range(args.messages):
+        sender = senders[n % len(senders)]
+        await sender.send(json.dumps({"type": "message", "text": f"{MARKER}{n}:{time.time()}"}))
+        await asyncio.sleep(args.interval)
+
+    expected = args.messages * len(sockets)
+    deadline = time.time() + args.timeout
+    while stats["delivered"] < expected and time.time() < deadline:
+        await asyncio.sleep(0.1)
+
+    for socket, receiver in sockets:
+        receiver.cancel()
+        await socket.close()
+
+    print("\n📊 Results")
+    print(f"   Deliveries: {stats['delivered']}/{expected} ({stats['delivered'] / expected * 100:.1f}%)")
+    print(f"   Sockets closed early: {stats['closed_early']}")
+    if latencies:
+        latencies.sort()
+        print(f"   Latency p50: {statistics.median(latencies):.1f} ms")
+        print(f"   Latency p95: {latencies[max(0, int(len(latencies) * 0.95) - 1)]:.1f} ms")
+        print(f"   Latency p99: {latencies[max(0, int(len(latencies) * 0.99) - 1)]:.1f} ms")
+        print(f"   Latency max: {latencies[-1]:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Multi-worker chat fan-out load test")
+    parser.add_argument("--urls", default="http://localhost:8000", help="Comma-separated server base URLs")
+    parser.add_argument("--email", default="admin@company.com")
+    parser.add_argument("--password", default="password123")
+    parser.add_argument("--sockets", type=int, default=1000)
+    parser.add_argument("--messages", type=int, default=10)
+    parser.add_argument("--interval", type=float, default=0.2, help="Seconds between sent messages")
+    parser.add_argument("--connect-concurrency", type=int, default=100)
+    parser.add_argument("--settle", type=float, default=2.0, help="Seconds to wait after connecting")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Seconds to wait for deliveries")
+    asyncio.run(run(parser.parse_args()))
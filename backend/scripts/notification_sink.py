@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Local fake SMTP server and push gateway for notification delivery tests.
+
+Accepts mail over SMTP (HELO/EHLO, MAIL, RCPT, DATA, RSET, NOOP, QUIT) and
+push batches over HTTP (POST /push, the format HttpPushTransport sends),
+counts everything it receives and prints a line per message. --fail-rate
+rejects a share of messages (SMTP 451 / {"ok": false}) to exercise retries.
+
+Point the app at it with:
+    NOTIFICATION_EMAIL_TRANSPORT=smtp SMTP_HOST=127.0.0.1 SMTP_PORT=1025
+    NOTIFICATION_PUSH_TRANSPORT=http PUSH_GATEWAY_URL=http://127.0.0.1:8025/push
+
+Usage:
+    python scripts/notification_sink.py --smtp-port 1025 --http-port 8025 --fail-rate 0.1
+"""
+import argparse
+import asyncio
+import json
+import random
+
+received = {"email": 0, "push": 0, "rejected": 0}
+
+
+def should_fail(fail_rate):
+    if random.random() < fail_rate:
+        received["rejected"] += 1
+        return True
+    return False
+
+
+async def handle_smtp(reader, writer, args):
+    """Serve one SMTP session"""
+    async def reply(line):
+        writer.write(f"{line}\r\n".encode())
+        await writer.drain()
+
+    await reply("220 notification-sink ESMTP")
+    recipients = []
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            command = line.decode(errors="replace").strip()
+            verb = command[:4].upper()
+            if verb in ("HELO", "EHLO"):
+                await reply("250 notification-sink")
+            elif verb == "MAIL":
+                recipients = []
+                await reply("250 OK")
+            elif verb == "RCPT":
+                recipients.append(command.partition(":")[2].strip(" <>"))
+                await reply("250 OK")
+            elif verb == "DATA":
+                await reply("354 End data with <CR><LF>.<CR><LF>")
+                subject = ""
+                while True:
+                    data_line = await reader.readline()
+                    if not data_line or data_line in (b".\r\n", b".\n"):
+                        break
+                    if data_line.lower().startswith(b"subject:"):
+                        subject = data_line.decode(errors="replace")[8:].strip()
+                if should_fail(args.fail_rate):
+                    await reply("451 Temporary failure (injected)")
+                else:
+                    received["email"] += 1
+                    if not args.quiet:
+                        print(f"📧 {', '.join(recipients)}: {subject}")
+                    await reply("250 OK queued")
+            elif verb == "RSET":
+                recipients = []
+                await reply("250 OK")
+            elif verb == "NOOP":
+                await reply("250 OK")
+            elif verb == "QUIT":
+                await reply("221 Bye")
+                break
+            else:
+                await reply("502 Command not implemented")
+    finally:
+        writer.close()
+
+
+async def handle_http(reader, writer, args):
+    """Serve keep-alive HTTP requests; only POST /push is understood"""
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            method, path, _ = request_line.decode().split(" ", 2)
+            headers = {}
+            while True:
+                header = await reader.readline()
+                if header in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = header.decode().partition(":")
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+            if method == "POST" and path == "/push":
+                messages = json.loads(body or b"{}").get("messages", [])
+                results = []
+                for message in messages:
+                    if should_fail(args.fail_rate):
+                        results.append({"ok": False, "error": "Injected failure"})
+                    else:
+                        received["push"] += 1
+                        results.append({"ok": True})
+                        if not args.quiet:
+                            print(f"🔔 {message.get('platform')} {message.get('token', '')[:12]}: {message.get('title')}")
+                status, payload = "200 OK", json.dumps({"results": results}).encode()
+            else:
+                status, payload = "404 Not Found", b'{"detail": "Not Found"}'
+
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(payload)}\r\n\r\n".encode() + payload
+            )
+            await writer.drain()
+    except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def report():
+    last = dict(received)
+    while True:
+        await asyncio.sleep(5)
+        if received != last:
+            print(f"📊 email={received['email']} push={received['push']} rejected={received['rejected']}")
+            last = dict(received)
+
+
+async def main(args):
+    smtp_server = await asyncio.start_server(lambda r, w: handle_smtp(r, w, args), args.host, args.smtp_port)
+    http_server = await asyncio.start_server(lambda r, w: handle_http(r, w, args), args.host, args.http_port)
+    print(f"📮 Fake SMTP on {args.host}:{args.smtp_port}, push gateway on http://{args.host}:{args.http_port}/push")
+    asyncio.create_task(report())
+    async with smtp_server, http_server:
+        await asyncio.gather(smtp_server.serve_forever(), http_server.serve_forever())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake SMTP server and push gateway")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--smtp-port", type=int, default=1025)
+    parser.add_argument("--http-port", type=int, default=8025)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Share of messages to reject")
+    parser.add_argument("--quiet", action="store_true", help="Only print the periodic totals")
+    try:
+        asyncio.run(main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Minimal Redis-compatible pub/sub server for local multi-worker chat.
+
+Speaks just enough of the Redis protocol (PING, SUBSCRIBE, UNSUBSCRIBE,
+PUBLISH) for CHAT_BACKPLANE=redis when no Redis server is available, plus
+GET, SET (NX, EX), INCRBY and DEL for NOTIFICATION_COUNTER_STORE=redis.
+
+Usage:
+    python scripts/pubsub_server.py --port 6379
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.utils.chat_backplane import encode_command, read_reply
+
+subscribers = defaultdict(set)
+
+# key -> (value, expires_at or None)
+values = {}
+
+
+def get_value(key):
+    entry = values.get(key)
+    if entry is None:
+        return None
+    if entry[1] is not None and entry[1] <= time.monotonic():
+        del values[key]
+        return None
+    return entry[0]
+
+
+def encode_bulk(value):
+    if value is None:
+        return b"$-1\r\n"
+    return f"${len(value)}\r\n".encode() + value + b"\r\n"
+
+
+def encode_subscription_reply(kind, channel, count):
+    """Encode a [kind, channel, count] reply to (UN)SUBSCRIBE"""
+    bulk = encode_command(kind, channel)
+    # Reuse the bulk-string encoding but announce three elements
+    return b"*3\r\n" + bulk[bulk.index(b"\r\n") + 2:] + f":{count}\r\n".encode()
+
+
+async def handle_client(reader, writer):
+    """Serve one client connection until it disconnects"""
+    channels = set()
+    try:
+        while True:
+            command = await read_reply(reader)
+            if not isinstance(command, list) or not command:
+                continue
+            name = command[0].decode().upper()
+            args = command[1:]
+
+            if name == "PING":
+                writer.write(b"+PONG\r\n")
+            elif name == "SUBSCRIBE":
+                for channel in args:
+                    channels.add(channel)
+                    subscribers[channel].add(writer)
+                    writer.write(encode_subscription_reply("subscribe", channel, len(channels)))
+            elif name == "UNSUBSCRIBE":
+                for channel in args or list(channels):
+                    channels.discard(channel)
+                    subscribers[channel].discard(writer)
+                    writer.write(encode_subscription_reply("unsubscribe", channel, len(channels)))
+            elif name == "PUBLISH" and len(args) == 2:
+                channel, payload = args
+                receivers = list(subscribers.get(channel, ()))
+                message = encode_command("message", channel, payload)
+                for receiver in receivers:
+                    receiver.write(message)
+                writer.write(f":{len(receivers)}\r\n".encode())
+            elif name == "GET" and len(args) == 1:
+                writer.write(encode_bulk(get_value(args[0])))
+            elif name == "SET" and len(args) >= 2:
+                key, value = args[0], args[1]
+                options = [arg.decode().upper() for arg in args[2:]]
+                ttl = int(options[options.index("EX") + 1]) if "EX" in options else None
+                if "NX" in options and get_value(key) is not None:
+                    writer.write(b"$-1\r\n")
+                else:
+                    values[key] = (value, time.monotonic() + ttl if ttl else None)
+                    writer.write(b"+OK\r\n")
+            elif name == "INCRBY" and len(args) == 2:
+                key = args[0]
+                expires_at = values[key][1] if get_value(key) is not None else None
+                try:
+                    result = int(get_value(key) or 0) + int(args[1])
+                except ValueError:
+                    writer.write(b"-ERR value is not an integer or out of range\r\n")
+                else:
+                    values[key] = (str(result).encode(), expires_at)
+                    writer.write(f":{result}\r\n".encode())
+            elif name == "DEL":
+                removed = sum(1 for key in args if get_value(key) is not None and values.pop(key, None))
+                writer.write(f":{removed}\r\n".encode())
+            else:
+                writer.write(f"-ERR unsupported command '{name}'\r\n".encode())
+            await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        for channel in channels:
+            subscribers[channel].discard(writer)
+        writer.close()
+
+
+async def main(host, port):
+    server = await asyncio.start_server(handle_client, host, port)
+    print(f"📡 Pub/sub server listening on {host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local Redis-compatible pub/sub server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6379)
+    args = parser.parse_args()
+    try:
+        asyncio.run(main(args.host, args.port))
+    except KeyboardInterrupt:
+        print("\n🛑 Pub/sub server stopped")
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Re-run sentiment and keyword analysis over the whole feedback table.
+
+Walks feedback by id in chunks through reanalyze_feedback(): each chunk is
+tokenised once per document, n-grams are interned to integer ids and only
+rows whose analysis changed are written back (one UPDATE batch and commit
+per chunk). Use after changing the word lists or the keyword extractor.
+
+Usage:
+    python scripts/reanalyze_feedback.py --batch-size 2000
+    python scripts/reanalyze_feedback.py --dry-run --top-keywords 15
+    python scripts/reanalyze_feedback.py --start-after-id 120000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.core.database import SessionLocal
+from app.models.feedback import Feedback
+from app.services.insights_service import reanalyze_feedback
+from app.utils.keyword_extractor import categorize_keywords_by_sentiment
+
+
+def main(args):
+    db = SessionLocal()
+    started = time.perf_counter()
+
+    def progress(stats):
+        elapsed = time.perf_counter() - started
+        print(f"⏳ {stats['scanned']} scanned, {stats['changed']} changed, "
+              f"last id {stats['last_id']} ({stats['scanned'] / elapsed:,.0f} docs/s)")
+
+    try:
+        mode = "dry run" if args.dry_run else "writing changes"
+        print(f"🔍 Re-analysing feedback in chunks of {args.batch_size} ({mode})...")
+        stats = reanalyze_feedback(
+            db, batch_size=args.batch_size, start_after_id=args.start_after_id,
+            dry_run=args.dry_run, progress=progress
+        )
+        elapsed = time.perf_counter() - started
+        print(f"✅ {stats['scanned']} feedback items in {elapsed:.1f}s, {stats['changed']} "
+              f"{'would change' if args.dry_run else 'updated'}")
+        print(f"📊 Sentiment: {stats['sentiment']}")
+
+        if args.top_keywords:
+            rows = db.query(Feedback.content, Feedback.sentiment_label).filter(
+                Feedback.id > args.start_after_id
+            ).all()
+            by_sentiment = categorize_keywords_by_sentiment(
+                [{"content": row.content, "sentiment": row.sentiment_label} for row in rows],
+                top_n=args.top_keywords
+            )
+            for sentiment, keywords in by_sentiment.items():
+                print(f"🔑 {sentiment}: " + ", ".join(f"{term} ({count})" for term, count in keywords))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-analyse sentiment and keywords for all feedback")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Rows per chunk")
+    parser.add_argument("--start-after-id", type=int, default=0, help="Resume after this feedback id")
+    parser.add_argument("--dry-run", action="store_true", help="Analyse without writing")
+    parser.add_argument("--top-keywords", type=int, default=0, help="Also print top N keywords per sentiment")
+    main(parser.parse_args())
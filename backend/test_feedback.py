@@ -77,6 +77,34 @@ def test_get_sent_feedback(token):
     else:
         print("✗ Failed to get sent feedback:", response.text)
 
+def test_cursor_pagination(token):
+    """Test walking received and sent feedback page by page with X-Next-Cursor"""
+    headers = {"Authorization": f"Bearer {token}"}
+    for endpoint in ("my", "sent"):
+        expected = requests.get(f"{BASE_URL}/feedback/{endpoint}", params={"limit": 100}, headers=headers).json()
+        seen = []
+        cursor = None
+        while True:
+            params = {"limit": 2}
+            if cursor:
+                params["cursor"] = cursor
+            response = requests.get(f"{BASE_URL}/feedback/{endpoint}", params=params, headers=headers)
+            if response.status_code != 200:
+                print(f"✗ Failed to page {endpoint} feedback:", response.text)
+                return
+            page_ids = [fb["id"] for fb in response.json()]
+            if any(fb_id in seen for fb_id in page_ids):
+                print(f"✗ {endpoint} feedback pages repeat items: {page_ids}")
+                return
+            seen.extend(page_ids)
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+        if seen == [fb["id"] for fb in expected]:
+            print(f"✓ Walked {len(seen)} {endpoint} feedback items by cursor")
+        else:
+            print(f"✗ Cursor pages of {endpoint} feedback differ from the full list")
+
 def test_admin_endpoints(token):
     """Test admin endpoints"""
     headers = {"Authorization": f"Bearer {token}"}
@@ -119,6 +147,7 @@ def main():
     print("\n--- Testing Feedback Retrieval ---")
     test_get_my_feedback(token)
     test_get_sent_feedback(token)
+    test_cursor_pagination(token)
     
     print("\n--- Testing Admin Endpoints ---")
     test_admin_endpoints(token)
@@ -14,10 +14,45 @@ const NotificationBell: React.FC = () => {
   useEffect(() => {
     loadNotifications();
     
-    // Poll for new notifications every 10 seconds (for faster updates)
-    const interval = setInterval(loadNotifications, 10000);
+    // Live updates over WebSocket; poll only while it is disconnected
+    let socket: WebSocket | null = null;
+    let pollTimer: ReturnType<typeof setInterval> | null = null;
+    let reconnectTimer: ReturnType<typeof setTimeout> | null = null;
+    let unmounted = false;
+
+    const stopPolling = () => {
+      if (pollTimer) {
+        clearInterval(pollTimer);
+        pollTimer = null;
+      }
+    };
+
+    const connect = () => {
+      socket = notificationService.createWebSocket();
+      socket.onopen = stopPolling;
+      socket.onmessage = (event) => {
+        const message = JSON.parse(event.data);
+        if (message.type === 'notification') {
+          setNotifications(prev => [message.notification, ...prev].slice(0, 20));
+        }
+        if (typeof message.unread_count === 'number') {
+          setUnreadCount(message.unread_count);
+        }
+      };
+      socket.onclose = () => {
+        if (unmounted) return;
+        if (!pollTimer) pollTimer = setInterval(loadNotifications, 30000);
+        reconnectTimer = setTimeout(connect, 15000);
+      };
+    };
+    connect();
     
-    return () => clearInterval(interval);
+    return () => {
+      unmounted = true;
+      stopPolling();
+      if (reconnectTimer) clearTimeout(reconnectTimer);
+      socket?.close();
+    };
   }, []);
 
   useEffect(() => {
@@ -34,9 +69,12 @@ const NotificationBell: React.FC = () => {
 
   const loadNotifications = async () => {
     try {
-      const data = await notificationService.getNotifications(20, false);
+      const [data, count] = await Promise.all([
+        notificationService.getNotifications(20, false),
+        notificationService.getUnreadCount()
+      ]);
       setNotifications(data);
-      setUnreadCount(data.filter(n => !n.is_read).length);
+      setUnreadCount(count);
     } catch (err) {
       console.error('Failed to load notifications:', err);
     }
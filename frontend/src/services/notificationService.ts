@@ -1,4 +1,5 @@
 import { api } from './authService';
+import API_BASE_URL from '../config';
 
 export interface Notification {
   id: number;
@@ -215,6 +216,13 @@ export const notificationService = {
     return response.data.unread_count;
   },
 
+  // Live unread count and new notifications
+  createWebSocket: (): WebSocket => {
+    const token = localStorage.getItem('access_token');
+    const wsUrl = API_BASE_URL.replace('http', 'ws') + `/api/v1/notifications/ws?token=${token}`;
+    return new WebSocket(wsUrl);
+  },
+
   // Mark notification as read
   markAsRead: async (notificationId: number): Promise<void> => {
     await api.patch(`/api/v1/notifications/${notificationId}/read`);